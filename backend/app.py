@@ -4,6 +4,9 @@ from fastapi.responses import FileResponse
 from fastapi.staticfiles import StaticFiles
 from sqlmodel import Session, select
 from contextlib import asynccontextmanager
+from anyio import to_thread
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.exc import IntegrityError
 import os
 from datetime import datetime
 from typing import List, Optional
@@ -65,12 +68,30 @@ from backend.schemas import (
 )
 from backend.utils import (
     determine_severity_mq3_only, check_duplicate, check_duplicate_alert,
-    get_recent_history, check_debounce, get_or_create_device_settings
+    get_recent_history, check_debounce, get_or_create_device_settings,
+    parse_device_timestamp, find_existing_telemetry_ids, build_alert_message,
+    insert_telemetry_or_duplicate
+)
+from backend.openai_client import get_fallback_alert, explanation_cache
+from backend.enrichment import AlertEnrichmentQueue
+from backend.history_buffer import history_buffer
+from backend.dedup_filter import telemetry_filter
+from backend.write_behind import TelemetryWriteBehind
+from backend.retention import telemetry_retention
+from backend.partitions import merge_rows, storage_partitions
+from backend.export_jobs import export_jobs
+from backend.websocket_manager import ConnectionManager
+from backend.rollups import ensure_rollups
+from backend import auth_cache
+from backend.rate_limit import login_rate_limiter
+from backend.shared_state import shared_state
+from backend.pubsub import create_bus
+from backend.database import (
+    engine, create_db_and_tables, get_session, get_db_runner, DatabaseRunner,
+    DB_POOL_SIZE, DB_MAX_OVERFLOW
 )
-from backend.openai_client import call_openai, get_fallback_alert
-from backend.database import engine, create_db_and_tables, get_session
 from backend.auth import get_current_user, get_current_admin, reset_rate_limit_for_ip
-from backend.routers import auth, duplicates, profile, preferences, health, alerts_export, alerts_history, maps
+from backend.routers import auth, duplicates, profile, preferences, health, alerts_export, alerts_history, maps, telemetry_export, export_jobs as export_jobs_router
 import logging
 
 # Configure logging
@@ -78,39 +99,38 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # WebSocket connection manager
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+manager = ConnectionManager()
 
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
+# Fills in OpenAI text for alerts after they are stored with fallback text
+enrichment_queue = AlertEnrichmentQueue()
 
-    def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
 
-    async def broadcast(self, message: dict):
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except:
-                pass
-    
-    async def broadcast_ping(self):
-        """Broadcast ping message to all connected clients"""
-        ping_message = {
-            "type": "ping",
-            "server_time": datetime.utcnow().isoformat() + "Z"
-        }
-        await self.broadcast(ping_message)
+def _after_write_behind_flush(session: Session, rows: List[dict]):
+    """Readings committed by the write-behind buffer enter the dedup filter and history buffer"""
+    telemetry_filter.record(session, [(row["device_id"], row["ts"]) for row in rows])
+    for row in rows:
+        history_buffer.append(
+            row["device_id"], row["ts"], row["mq3"], row["mq135"],
+            row["temp_c"], row["humidity_pct"], row["lat"], row["lon"]
+        )
 
 
-manager = ConnectionManager()
+# Group-commits SAFE readings when WRITE_BEHIND_ENABLED
+write_behind = TelemetryWriteBehind(on_flush=_after_write_behind_flush)
+
+# Carries alert messages to the WebSocket clients of every worker
+alert_bus = create_bus()
+alert_bus.subscribe("alerts", manager.broadcast)
 
 # Track last telemetry received time
 last_telemetry_received_at: Optional[datetime] = None
 
+# Maximum readings accepted by POST /api/v1/telemetry/batch
+MAX_TELEMETRY_BATCH = int(os.getenv("MAX_TELEMETRY_BATCH", "500"))
+
+# Worker threads for sync routes; defaults to the DB pool capacity so a thread never waits on a connection
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", str(DB_POOL_SIZE + DB_MAX_OVERFLOW)))
+
 
 # Background task for WebSocket ping (runs globally, not per connection)
 async def websocket_ping_task():
@@ -122,6 +142,16 @@ async def websocket_ping_task():
             await manager.broadcast_ping()
         except:
             pass
+        try:
+            # Heartbeat: keeps this worker's client count in the shared health view
+            await run_in_threadpool(health.publish_ws_client_count)
+        except Exception as e:
+            logger.warning(f"Could not publish WebSocket client count: {e}")
+
+
+async def broadcast_alert(message: dict):
+    """Send an alert message to the sockets of this worker and, via the pub/sub bus, every other worker"""
+    await alert_bus.publish("alerts", message)
 
 
 @asynccontextmanager
@@ -130,12 +160,52 @@ async def lifespan(app: FastAPI):
     import asyncio
     create_db_and_tables()
     
+    # One-time rollup backfill for databases that predate the rollup tables
+    with Session(engine) as session:
+        ensure_rollups(session)
+    
+    # Readings acknowledged by write-behind but not committed before a crash
+    await run_in_threadpool(write_behind.recover)
+    
+    # Seed the duplicate pre-filter with the newest stored readings
+    await run_in_threadpool(telemetry_filter.rebuild, engine)
+    
+    # Sync routes (all DB work) run on this threadpool; keep it in line with the connection pool
+    to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    
     # Start WebSocket ping task
     ping_task = asyncio.create_task(websocket_ping_task())
     
+    # Start alert enrichment workers
+    enrichment_queue.start(broadcast=broadcast_alert)
+    
+    # Start the SAFE reading group-commit task
+    write_behind.start()
+    
+    # Start pruning/downsampling old raw telemetry (TELEMETRY_RETENTION_ENABLED)
+    telemetry_retention.start()
+    
+    # Start moving old months into partition files (PARTITIONING_ENABLED)
+    storage_partitions.start()
+    
+    # Receive alerts ingested by other workers
+    await alert_bus.start()
+    
+    # Resume export jobs left queued (or orphaned by a dead worker)
+    await run_in_threadpool(export_jobs.start)
+    export_jobs.start_maintenance()
+    
     yield
     
     # Cleanup
+    await write_behind.stop()  # flushes queued readings
+    await telemetry_retention.stop()
+    await storage_partitions.stop()
+    await export_jobs.stop_maintenance()
+    await run_in_threadpool(export_jobs.stop)  # running jobs are queued again
+    await enrichment_queue.stop()
+    await alert_bus.stop()
+    shared_state.remove_worker()
     ping_task.cancel()
     try:
         await ping_task
@@ -169,12 +239,27 @@ app.include_router(duplicates.router)
 app.include_router(profile.router)
 app.include_router(preferences.router)
 app.include_router(alerts_export.router)
+app.include_router(telemetry_export.router)
+app.include_router(export_jobs_router.router)
 app.include_router(alerts_history.router)
 app.include_router(maps.router)
 
 # Setup health router with manager reference (must import here to avoid circular import)
 from backend.routers import health
 health.set_manager(manager)
+health.register_metrics("llm_cache", explanation_cache.stats)
+health.register_metrics("enrichment", enrichment_queue.stats)
+health.register_metrics("history_buffer", history_buffer.stats)
+health.register_metrics("dedup_filter", telemetry_filter.stats)
+health.register_metrics("write_behind", write_behind.stats)
+health.register_metrics("retention", telemetry_retention.stats)
+health.register_metrics("partitions", storage_partitions.stats)
+health.register_metrics("export_jobs", export_jobs.stats)
+health.register_metrics("websocket", manager.stats)
+health.register_metrics("auth_cache", auth_cache.stats)
+health.register_metrics("rate_limit", login_rate_limiter.stats)
+health.register_metrics("shared_state", shared_state.stats)
+health.register_metrics("pubsub", alert_bus.stats)
 app.include_router(health.router)
 
 # Serve ESP32 INO file
@@ -223,125 +308,203 @@ async def reset_rate_limit_endpoint(
     return {"message": "Rate limit reset successfully", "ip": ip_address or "all"}
 
 
+async def _mark_telemetry_received_async():
+    """Update last telemetry received time (for health endpoint); the shared-state write stays off the event loop"""
+    global last_telemetry_received_at
+    last_telemetry_received_at = datetime.utcnow()
+    from backend.routers import health
+    await health.set_last_telemetry_time_async(last_telemetry_received_at)
+
+
+def _telemetry_values(telemetry: TelemetryCreate, ts: datetime) -> dict:
+    """Column values of the Telemetry row for an incoming payload"""
+    return {
+        "device_id": telemetry.device_id,
+        "ts": ts,
+        "mq3": telemetry.sensors.mq3,
+        "mq135": telemetry.sensors.mq135,
+        "temp_c": telemetry.sensors.temp_c,
+        "humidity_pct": telemetry.sensors.humidity_pct,
+        "lat": telemetry.gps.lat if telemetry.gps else None,
+        "lon": telemetry.gps.lon if telemetry.gps else None,
+        "alt": telemetry.gps.alt if telemetry.gps else None,
+        "received_at": datetime.utcnow()
+    }
+
+
+def _build_telemetry_row(telemetry: TelemetryCreate, ts: datetime) -> Telemetry:
+    """Map an incoming payload onto a Telemetry row"""
+    return Telemetry(**_telemetry_values(telemetry, ts))
+
+
+def _duplicate_payload(telemetry: TelemetryCreate) -> str:
+    """Raw JSON kept with a duplicate (FastAPI already parsed the body, so we reconstruct it)"""
+    import json
+    return json.dumps(telemetry.dict())
+
+
+def _build_duplicate_row(telemetry: TelemetryCreate, ts: datetime, original_id: int) -> TelemetryDuplicate:
+    """Map a duplicate payload onto a TelemetryDuplicate row"""
+    return TelemetryDuplicate(
+        original_telemetry_id=original_id,
+        device_id=telemetry.device_id,
+        timestamp=ts,
+        payload_json=_duplicate_payload(telemetry),
+        is_merged=False,
+        is_ignored=False
+    )
+
+
+def _duplicate_response(original_id: Optional[int] = None, duplicate_id: Optional[int] = None) -> dict:
+    response = {
+        "status": "duplicate",
+        "message": "Telemetry with same device_id and timestamp already exists."
+    }
+    if original_id is not None:
+        response["original_id"] = original_id
+        response["duplicate_id"] = duplicate_id
+    return response
+
+
+def _alert_exists_response(existing_alert: Alert) -> dict:
+    return {
+        "status": "alert_exists",
+        "severity": existing_alert.severity,
+        "notified": existing_alert.notified,
+        "message": "Alert already exists for this telemetry"
+    }
+
+
+def _build_alert(session: Session, telemetry: TelemetryCreate, ts: datetime, severity: str) -> Alert:
+    """
+    Build (but do not commit) the alert for a WARNING/HIGH reading.
+    The alert starts with fallback text; OpenAI text is filled in later by the enrichment queue.
+    """
+    fallback = get_fallback_alert(
+        severity=severity,
+        mq3=telemetry.sensors.mq3,
+        mq135=telemetry.sensors.mq135
+    )
+
+    # Check debounce
+    is_debounced = check_debounce(session, telemetry.device_id, severity)
+    notified = not is_debounced if severity == "HIGH" else True
+
+    return Alert(
+        device_id=telemetry.device_id,
+        ts=ts,
+        severity=severity,
+        short_message=fallback["short_message"],
+        explanation=fallback.get("explanation", ""),
+        recommended_action=fallback.get("recommended_action", ""),
+        confidence=fallback.get("confidence", "medium"),
+        mq3=telemetry.sensors.mq3,
+        mq135=telemetry.sensors.mq135,
+        lat=telemetry.gps.lat if telemetry.gps else None,
+        lon=telemetry.gps.lon if telemetry.gps else None,
+        alt=telemetry.gps.alt if telemetry.gps else None,
+        notified=notified
+    )
+
+
+def _enrichment_prompt(session: Session, telemetry: TelemetryCreate) -> dict:
+    """Keyword arguments for call_openai, captured at ingest time"""
+    return {
+        "device_id": telemetry.device_id,
+        "timestamp": telemetry.timestamp,
+        "mq3": telemetry.sensors.mq3,
+        "mq135": telemetry.sensors.mq135,
+        "temp_c": telemetry.sensors.temp_c,
+        "humidity_pct": telemetry.sensors.humidity_pct,
+        "lat": telemetry.gps.lat if telemetry.gps else None,
+        "lon": telemetry.gps.lon if telemetry.gps else None,
+        "recent_history": get_recent_history(session, telemetry.device_id, limit=10)
+    }
+
+
+def _log_alert_gps(alert: Alert):
+    # Log alert with GPS if available (structured logging)
+    if alert.lat and alert.lon and alert.lat != 0.0 and alert.lon != 0.0:
+        logger.info(
+            f"Alert with GPS: device_id={alert.device_id}, severity={alert.severity}, "
+            f"lat={alert.lat}, lon={alert.lon}, mq3={alert.mq3}, mq135={alert.mq135}"
+        )
+
+
+async def _publish(messages: List[dict], enrichment_jobs: List[tuple]):
+    """Broadcast alert messages and queue their enrichment once the DB work has committed"""
+    for message in messages:
+        await broadcast_alert(message)
+    for alert_id, prompt in enrichment_jobs:
+        enrichment_queue.submit(alert_id, prompt)
+
+
 @app.post("/api/v1/telemetry")
 async def create_telemetry(
     telemetry: TelemetryCreate,
-    session: Session = Depends(get_session),
+    db: DatabaseRunner = Depends(get_db_runner),
     api_key: str = Depends(verify_api_key)
 ):
     """
     Accept telemetry data from ESP32 device.
-    Validates API key, checks duplicates, determines severity, calls OpenAI if needed.
+    Validates API key, checks duplicates, determines severity, queues OpenAI enrichment if needed.
     Note: This endpoint uses device API key authentication (not JWT) for ESP32 devices.
+    DB work runs on the async engine when ASYNC_DB_ENABLED, otherwise in the threadpool.
     """
-    import json
-    global last_telemetry_received_at
-    
     # Update last telemetry time (for health endpoint)
-    last_telemetry_received_at = datetime.utcnow()
-    from backend.routers import health
-    health.set_last_telemetry_time(last_telemetry_received_at)
-    
-    # Get raw JSON payload for duplicate storage
-    # Note: FastAPI already parsed the body, so we reconstruct it
-    raw_payload = json.dumps(telemetry.dict())
+    await _mark_telemetry_received_async()
     
     # Parse timestamp
     try:
-        # Handle timezone-aware and naive timestamps
-        ts_str = telemetry.timestamp.replace('Z', '+00:00')
-        ts = datetime.fromisoformat(ts_str)
-        # Convert to UTC naive datetime if timezone-aware
-        if ts.tzinfo is not None:
-            from datetime import timezone
-            ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+        ts = parse_device_timestamp(telemetry.timestamp)
     except (ValueError, AttributeError) as e:
         raise HTTPException(status_code=400, detail=f"Invalid timestamp format: {e}")
 
-    # Check for existing telemetry with same (device_id, timestamp)
-    existing_statement = select(Telemetry).where(
-        Telemetry.device_id == telemetry.device_id,
-        Telemetry.ts == ts
-    )
-    existing_telemetry = session.exec(existing_statement).first()
-    
-    # If duplicate exists, store it and return duplicate response
-    if existing_telemetry:
-        # Store duplicate entry
-        duplicate_entry = TelemetryDuplicate(
-            original_telemetry_id=existing_telemetry.id,
-            device_id=telemetry.device_id,
-            timestamp=ts,
-            payload_json=raw_payload,
-            is_merged=False,
-            is_ignored=False
+    # SAFE readings are acknowledged once queued (and journaled); a duplicate is recorded at flush
+    if write_behind.enabled and determine_severity_mq3_only(telemetry.sensors.mq3) == "SAFE":
+        queued = await run_in_threadpool(
+            write_behind.submit, _telemetry_values(telemetry, ts), _duplicate_payload(telemetry)
         )
-        session.add(duplicate_entry)
-        session.commit()
-        session.refresh(duplicate_entry)
-        
-        # Return duplicate response (200 OK with duplicate status)
-        return {
-            "status": "duplicate",
-            "message": "Telemetry with same device_id and timestamp already exists.",
-            "original_id": existing_telemetry.id,
-            "duplicate_id": duplicate_entry.id
-        }
+        if queued:
+            return {
+                "status": "SAFE",
+                "mq3": telemetry.sensors.mq3
+            }
 
-    # Save telemetry (with error handling for constraint violations)
+    response, messages, enrichment_jobs = await db.run(_ingest_telemetry, telemetry, ts)
+    await _publish(messages, enrichment_jobs)
+    return response
+
+
+def _ingest_telemetry(session: Session, telemetry: TelemetryCreate, ts: datetime):
+    """
+    Store one reading (and its alert). Returns (response, alert messages, enrichment jobs);
+    the caller publishes the messages and jobs from the event loop.
+    """
+    # One conflict-aware insert: a new id, or the duplicate recorded against the original
+    values = _telemetry_values(telemetry, ts)
     try:
-        db_telemetry = Telemetry(
-            device_id=telemetry.device_id,
-            ts=ts,
-            mq3=telemetry.sensors.mq3,
-            mq135=telemetry.sensors.mq135,
-            temp_c=telemetry.sensors.temp_c,
-            humidity_pct=telemetry.sensors.humidity_pct,
-            lat=telemetry.gps.lat if telemetry.gps else None,
-            lon=telemetry.gps.lon if telemetry.gps else None,
-            alt=telemetry.gps.alt if telemetry.gps else None
+        telemetry_id, original_id, duplicate_id = insert_telemetry_or_duplicate(
+            session, values, _duplicate_payload(telemetry)
         )
-        session.add(db_telemetry)
         session.commit()
-        session.refresh(db_telemetry)
     except Exception as e:
         session.rollback()
-        # If it's a unique constraint violation, handle as duplicate
-        error_str = str(e).upper()
-        if "UNIQUE" in error_str or "unique_device_timestamp" in error_str or "INTEGRITY" in error_str:
-            # Try to find existing telemetry
-            existing_statement = select(Telemetry).where(
-                Telemetry.device_id == telemetry.device_id,
-                Telemetry.ts == ts
-            )
-            existing_telemetry = session.exec(existing_statement).first()
-            
-            if existing_telemetry:
-                # Store duplicate entry
-                duplicate_entry = TelemetryDuplicate(
-                    original_telemetry_id=existing_telemetry.id,
-                    device_id=telemetry.device_id,
-                    timestamp=ts,
-                    payload_json=raw_payload,
-                    is_merged=False,
-                    is_ignored=False
-                )
-                session.add(duplicate_entry)
-                session.commit()
-                session.refresh(duplicate_entry)
-                
-                return {
-                    "status": "duplicate",
-                    "message": "Telemetry with same device_id and timestamp already exists.",
-                    "original_id": existing_telemetry.id,
-                    "duplicate_id": duplicate_entry.id
-                }
-            else:
-                return {
-                    "status": "duplicate",
-                    "message": "Telemetry with same device_id and timestamp already exists."
-                }
         raise HTTPException(status_code=500, detail=f"Error saving telemetry: {e}")
+    
+    if telemetry_id is None:
+        # Return duplicate response (200 OK with duplicate status)
+        if original_id is None:
+            return _duplicate_response(), [], []
+        telemetry_filter.record(session, [(values["device_id"], values["ts"])])
+        return _duplicate_response(original_id, duplicate_id), [], []
+    telemetry_filter.record(session, [(values["device_id"], values["ts"])])
+
+    # Only committed, non-duplicate readings enter the recent-history buffer
+    history_buffer.append(
+        values["device_id"], values["ts"], values["mq3"], values["mq135"],
+        values["temp_c"], values["humidity_pct"], values["lat"], values["lon"]
+    )
 
     # Determine severity (MQ3-only)
     severity = determine_severity_mq3_only(telemetry.sensors.mq3)
@@ -351,33 +514,7 @@ async def create_telemetry(
         return {
             "status": "SAFE",
             "mq3": telemetry.sensors.mq3
-        }
-
-    # For WARNING or HIGH, call OpenAI
-    recent_history = get_recent_history(session, telemetry.device_id, limit=10)
-    
-    ai_response = call_openai(
-        device_id=telemetry.device_id,
-        timestamp=telemetry.timestamp,
-        mq3=telemetry.sensors.mq3,
-        mq135=telemetry.sensors.mq135,
-        temp_c=telemetry.sensors.temp_c,
-        humidity_pct=telemetry.sensors.humidity_pct,
-        lat=telemetry.gps.lat if telemetry.gps else None,
-        lon=telemetry.gps.lon if telemetry.gps else None,
-        recent_history=recent_history
-    )
-
-    # Use AI response or fallback
-    if not ai_response:
-        ai_response = get_fallback_alert(
-            severity=severity,
-            mq3=telemetry.sensors.mq3,
-            mq135=telemetry.sensors.mq135
-        )
-
-    # Ensure severity matches MQ3 logic (AI might return different)
-    ai_response["severity"] = severity
+        }, [], []
 
     # Check if alert already exists for this telemetry (prevent duplicate alerts)
     if check_duplicate_alert(session, telemetry.device_id, ts):
@@ -387,34 +524,12 @@ async def create_telemetry(
             Alert.ts == ts
         )
         existing_alert = session.exec(statement).first()
-        return {
-            "status": "alert_exists",
-            "severity": existing_alert.severity,
-            "notified": existing_alert.notified,
-            "message": "Alert already exists for this telemetry"
-        }
-
-    # Check debounce
-    is_debounced = check_debounce(session, telemetry.device_id, severity)
-    notified = not is_debounced if severity == "HIGH" else True
+        return _alert_exists_response(existing_alert), [], []
 
+    # For WARNING or HIGH, store the alert right away with fallback text
     # Create alert (with error handling for duplicates)
     try:
-        alert = Alert(
-            device_id=telemetry.device_id,
-            ts=ts,
-            severity=ai_response["severity"],
-            short_message=ai_response["short_message"],
-            explanation=ai_response.get("explanation", ""),
-            recommended_action=ai_response.get("recommended_action", ""),
-            confidence=ai_response.get("confidence", "medium"),
-            mq3=telemetry.sensors.mq3,
-            mq135=telemetry.sensors.mq135,
-            lat=telemetry.gps.lat if telemetry.gps else None,
-            lon=telemetry.gps.lon if telemetry.gps else None,
-            alt=telemetry.gps.alt if telemetry.gps else None,
-            notified=notified
-        )
+        alert = _build_alert(session, telemetry, ts, severity)
         session.add(alert)
         session.commit()
         session.refresh(alert)
@@ -428,78 +543,254 @@ async def create_telemetry(
             )
         ).first()
         if existing_alert:
-            return {
-                "status": "alert_exists",
-                "severity": existing_alert.severity,
-                "notified": existing_alert.notified,
-                "message": "Alert already exists for this telemetry"
-            }
+            return _alert_exists_response(existing_alert), [], []
         raise HTTPException(status_code=500, detail=f"Error creating alert: {e}")
 
-    # Update last telemetry received time (for health endpoint)
-    # Note: last_telemetry_received_at is already declared as global at function start
-    last_telemetry_received_at = datetime.utcnow()
-    from backend.routers import health
-    health.set_last_telemetry_time(last_telemetry_received_at)
-    
-    # Log alert with GPS if available (structured logging)
-    if alert.lat and alert.lon and alert.lat != 0.0 and alert.lon != 0.0:
-        logger.info(
-            f"Alert with GPS: device_id={alert.device_id}, severity={alert.severity}, "
-            f"lat={alert.lat}, lon={alert.lon}, mq3={alert.mq3}, mq135={alert.mq135}"
-        )
+    _log_alert_gps(alert)
     
     # Broadcast alert via WebSocket (updated format with "data" key)
-    # Format timestamp as ISO with 'Z' suffix to indicate UTC
-    ts_iso = alert.ts.isoformat()
-    if not ts_iso.endswith('Z'):
-        ts_iso = ts_iso + 'Z'
+    messages = [build_alert_message(alert)]
     
-    alert_data = {
-        "type": "new_alert",
-        "data": {
-            "id": alert.id,
-            "device_id": alert.device_id,
-            "ts": ts_iso,
-            "severity": alert.severity,
-            "short_message": alert.short_message,
-            "lat": alert.lat if alert.lat else None,
-            "lon": alert.lon if alert.lon else None,
-            "mq3": alert.mq3,
-            "mq135": alert.mq135,
-            "notified": alert.notified
-        }
-    }
-    await manager.broadcast(alert_data)
+    # OpenAI text arrives later as an "alert_updated" message
+    enrichment_jobs = [(alert.id, _enrichment_prompt(session, telemetry))] if enrichment_queue.enabled else []
 
     return {
         "status": "alert_created",
         "severity": alert.severity,
         "notified": alert.notified
-    }
+    }, messages, enrichment_jobs
+
+
+@app.post("/api/v1/telemetry/batch")
+async def create_telemetry_batch(
+    readings: List[TelemetryCreate],
+    db: DatabaseRunner = Depends(get_db_runner),
+    api_key: str = Depends(verify_api_key)
+):
+    """
+    Accept a batch of telemetry readings buffered on a device or gateway.
+    Duplicates are resolved with one set-based lookup and all new rows are
+    inserted in a single transaction.
+    Returns one status per reading (same shape as POST /api/v1/telemetry), in request order.
+    """
+    if not readings:
+        raise HTTPException(status_code=400, detail="Batch must contain at least one reading")
+    if len(readings) > MAX_TELEMETRY_BATCH:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large ({len(readings)} readings, max {MAX_TELEMETRY_BATCH})"
+        )
+    
+    # Update last telemetry time (for health endpoint)
+    await _mark_telemetry_received_async()
+    
+    # Parse all timestamps up front so a malformed item rejects the batch before any write
+    parsed = []
+    for index, telemetry in enumerate(readings):
+        try:
+            parsed.append((telemetry, parse_device_timestamp(telemetry.timestamp)))
+        except (ValueError, AttributeError) as e:
+            raise HTTPException(status_code=400, detail=f"Invalid timestamp format at index {index}: {e}")
+    
+    response, messages, enrichment_jobs = await db.run(_ingest_telemetry_batch, parsed)
+    await _publish(messages, enrichment_jobs)
+    return response
+
+
+def _insert_batch_on_conflict(
+    session: Session, parsed: List[tuple], new_rows: dict, known_ids: dict, results: List[Optional[dict]]
+):
+    """
+    Insert new_rows one conflict-aware INSERT at a time (the batch retry path).
+    Keys another writer committed in the meantime become duplicates and are
+    dropped from new_rows; known_ids gets the id of every stored original.
+    """
+    for key, (index, row) in list(new_rows.items()):
+        telemetry, ts = parsed[index]
+        telemetry_id, original_id, duplicate_id = insert_telemetry_or_duplicate(
+            session, _telemetry_values(telemetry, ts), _duplicate_payload(telemetry)
+        )
+        if telemetry_id is None:
+            del new_rows[key]
+            results[index] = _duplicate_response(original_id, duplicate_id)
+            if original_id is not None:
+                known_ids[key] = original_id
+        else:
+            row.id = telemetry_id
+            known_ids[key] = telemetry_id
+
+
+def _ingest_telemetry_batch(session: Session, parsed: List[tuple], retried: bool = False):
+    """Store a parsed batch in two transactions; same return shape as _ingest_telemetry()"""
+    # Resolve duplicates against unique_device_timestamp in one set-based query
+    known_ids = find_existing_telemetry_ids(
+        session, [(telemetry.device_id, ts) for telemetry, ts in parsed]
+    )
+    
+    # First occurrence of an unseen key becomes a telemetry row, everything else a duplicate
+    new_rows = {}
+    duplicate_items = []
+    for index, (telemetry, ts) in enumerate(parsed):
+        key = (telemetry.device_id, ts)
+        if key in known_ids or key in new_rows:
+            duplicate_items.append(index)
+        else:
+            new_rows[key] = (index, _build_telemetry_row(telemetry, ts))
+    
+    results: List[Optional[dict]] = [None] * len(parsed)
+    try:
+        if retried:
+            _insert_batch_on_conflict(session, parsed, new_rows, known_ids, results)
+        else:
+            session.add_all([row for _, row in new_rows.values()])
+            # Flush assigns ids so in-batch duplicates can reference their original
+            session.flush()
+            for key, (_, row) in new_rows.items():
+                known_ids.setdefault(key, row.id)
+        
+        duplicate_rows = []
+        for index in duplicate_items:
+            telemetry, ts = parsed[index]
+            original_id = known_ids.get((telemetry.device_id, ts))
+            if original_id is None:
+                # The original was deleted before the retry could link to it (retention)
+                results[index] = _duplicate_response()
+                continue
+            duplicate_rows.append((index, _build_duplicate_row(telemetry, ts, original_id)))
+        session.add_all([row for _, row in duplicate_rows])
+        session.flush()
+        for index, row in duplicate_rows:
+            results[index] = _duplicate_response(row.original_telemetry_id, row.id)
+        
+        # Capture buffer entries before commit expires the row objects
+        buffered = [
+            (row.device_id, row.ts, row.mq3, row.mq135, row.temp_c, row.humidity_pct, row.lat, row.lon)
+            for _, row in new_rows.values()
+        ]
+        session.commit()
+    except IntegrityError as e:
+        session.rollback()
+        if retried:
+            raise HTTPException(status_code=500, detail=f"Error saving telemetry batch: {e}")
+        # A reading stored concurrently (or outside this process) got past the duplicate lookup
+        logger.warning("Telemetry batch hit an existing reading; retrying with conflict-aware inserts")
+        if telemetry_filter.covers(session):
+            telemetry_filter.rebuild(session.get_bind())
+        return _ingest_telemetry_batch(session, parsed, retried=True)
+    except Exception as e:
+        session.rollback()
+        raise HTTPException(status_code=500, detail=f"Error saving telemetry batch: {e}")
+    
+    telemetry_filter.record(session, [(values[0], values[1]) for values in buffered])
+    for values in buffered:
+        history_buffer.append(*values)
+    
+    # Severity per new reading; WARNING/HIGH readings get alerts in a second transaction
+    alert_items = []
+    for index, _ in new_rows.values():
+        telemetry, ts = parsed[index]
+        severity = determine_severity_mq3_only(telemetry.sensors.mq3)
+        if severity == "SAFE":
+            results[index] = {
+                "status": "SAFE",
+                "mq3": telemetry.sensors.mq3
+            }
+        else:
+            alert_items.append((index, severity))
+    
+    alerts = []
+    messages = []
+    enrichment_jobs = []
+    if alert_items:
+        try:
+            for index, severity in sorted(alert_items):
+                telemetry, ts = parsed[index]
+                existing_alert = session.exec(
+                    select(Alert).where(
+                        Alert.device_id == telemetry.device_id,
+                        Alert.ts == ts
+                    )
+                ).first()
+                if existing_alert:
+                    results[index] = _alert_exists_response(existing_alert)
+                    continue
+                
+                # Pending alerts are autoflushed, so debounce sees earlier alerts in this batch
+                alert = _build_alert(session, telemetry, ts, severity)
+                session.add(alert)
+                alerts.append((index, alert))
+            
+            session.flush()
+            messages = [build_alert_message(alert) for _, alert in alerts]
+            enrichment_jobs = [
+                (alert.id, _enrichment_prompt(session, parsed[index][0]))
+                for index, alert in alerts
+            ] if enrichment_queue.enabled else []
+            for index, alert in alerts:
+                results[index] = {
+                    "status": "alert_created",
+                    "severity": alert.severity,
+                    "notified": alert.notified
+                }
+                _log_alert_gps(alert)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            raise HTTPException(status_code=500, detail=f"Error creating alerts for batch: {e}")
+    
+    return {
+        "received": len(parsed),
+        "inserted": len(new_rows),
+        "duplicates": len(parsed) - len(new_rows),
+        "alerts_created": len(alerts),
+        "results": results
+    }, messages, enrichment_jobs
 
 
 # Alerts endpoint moved to alerts_export.py router
 
 
 @app.get("/api/v1/telemetry", response_model=List[TelemetryResponse])
-async def get_telemetry(
+def get_telemetry(
     device_id: Optional[str] = None,
     limit: int = 100,
+    from_time: Optional[str] = None,
+    to_time: Optional[str] = None,
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user)
 ):
-    """Get telemetry data, optionally filtered by device_id - Requires authentication"""
+    """
+    Get telemetry data, optionally filtered by device_id and device timestamp range - Requires authentication
+    With partitioning, archived months overlapping the range are read newest first until `limit` is filled.
+    """
+    try:
+        from_dt = parse_device_timestamp(from_time) if from_time else None
+        to_dt = parse_device_timestamp(to_time) if to_time else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid timestamp format: {e}")
+    
     statement = select(Telemetry)
     if device_id:
         statement = statement.where(Telemetry.device_id == device_id)
+    if from_dt:
+        statement = statement.where(Telemetry.ts >= from_dt)
+    if to_dt:
+        statement = statement.where(Telemetry.ts <= to_dt)
     statement = statement.order_by(Telemetry.received_at.desc()).limit(limit)
     telemetries = session.exec(statement).all()
+    
+    archived = []
+    for partition in storage_partitions.overlapping(session, from_dt, to_dt):
+        if len(telemetries) + sum(len(rows) for rows in archived) >= limit:
+            break
+        archived += storage_partitions.read([partition], statement)
+    if archived:
+        telemetries = merge_rows([telemetries, *archived], key=lambda t: t.received_at, limit=limit, reverse=True)
     return telemetries
 
 
 @app.post("/api/v1/device-settings/{device_id}", response_model=DeviceSettingsResponse)
-async def update_device_settings(
+def update_device_settings(
     device_id: str,
     settings_update: DeviceSettingsUpdate,
     session: Session = Depends(get_session),
@@ -519,7 +810,7 @@ async def update_device_settings(
 
 
 @app.get("/api/v1/device-settings/{device_id}", response_model=DeviceSettingsResponse)
-async def get_device_settings(
+def get_device_settings(
     device_id: str,
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user)
@@ -546,46 +837,35 @@ async def websocket_alerts(websocket: WebSocket):
     await manager.connect(websocket)
     try:
         while True:
-            # Wait for client messages (e.g., {"subscribe": "device_id"})
+            # Wait for client messages (e.g., {"subscribe": "device_id"} or {"action": "subscribe", ...})
             data = await websocket.receive_text()
             try:
                 import json
                 msg = json.loads(data)
+            except ValueError:
+                continue
+            if not isinstance(msg, dict):
+                continue
+            try:
                 if msg.get("subscribe"):
-                    # Could filter by device_id here if needed
-                    await websocket.send_json({"type": "subscribed", "device_id": msg.get("subscribe")})
-            except:
-                pass
+                    # Legacy single-device form
+                    manager.subscribe(websocket, device_ids=[msg["subscribe"]])
+                    await manager.send_personal(websocket, {"type": "subscribed", "device_id": msg.get("subscribe")})
+                elif msg.get("action") == "subscribe":
+                    subscription = manager.subscribe(
+                        websocket,
+                        device_ids=msg.get("device_ids"),
+                        min_severity=msg.get("min_severity"),
+                        bbox=msg.get("bbox")
+                    )
+                    await manager.send_personal(websocket, {"type": "subscription", "subscription": subscription})
+                elif msg.get("action") == "unsubscribe":
+                    subscription = manager.unsubscribe(websocket, device_ids=msg.get("device_ids"))
+                    await manager.send_personal(websocket, {"type": "subscription", "subscription": subscription})
+            except (ValueError, TypeError) as e:
+                await manager.send_personal(websocket, {"type": "error", "detail": str(e)})
     except WebSocketDisconnect:
-        manager.disconnect(websocket)
-
-
-# Background task for WebSocket ping (runs globally, not per connection)
-async def websocket_ping_task():
-    """Background task to send ping messages to all WebSocket clients every 15 seconds"""
-    import asyncio
-    while True:
-        await asyncio.sleep(15)
-        try:
-            await manager.broadcast_ping()
-        except:
-            pass
-
-
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    """Lifespan context manager with background tasks"""
-    import asyncio
-    create_db_and_tables()
-    
-    # Start WebSocket ping task
-    ping_task = asyncio.create_task(websocket_ping_task())
-    
-    yield
-    
-    # Cleanup
-    ping_task.cancel()
-    try:
-        await ping_task
-    except asyncio.CancelledError:
         pass
+    finally:
+        # Also covers clients the manager already evicted
+        manager.disconnect(websocket)
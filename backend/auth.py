@@ -4,16 +4,21 @@ Handles JWT tokens, password hashing, and user authentication
 """
 
 import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 import bcrypt
 from fastapi import Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer
 from sqlmodel import Session, select
 
 from backend.models import User, UserRole
 from backend.database import engine
+from backend import auth_cache
+from backend.rate_limit import login_rate_limiter
 
 # OAuth2 scheme (using login-json endpoint)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login-json")
@@ -23,8 +28,10 @@ JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key-change-in-producti
 JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
 
-# Rate limiting (simple in-memory for demo)
-login_attempts = {}
+# bcrypt runs on its own small pool: a login storm queues here instead of
+# occupying the event loop or the threadpool that serves DB work
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -50,6 +57,18 @@ def get_password_hash(password: str) -> str:
     return hashed.decode('utf-8')
 
 
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """verify_password() on the bcrypt pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_executor, verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """get_password_hash() on the bcrypt pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_executor, get_password_hash, password)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create a JWT access token"""
     to_encode = data.copy()
@@ -63,12 +82,16 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
 
 
 def decode_access_token(token: str) -> Optional[dict]:
-    """Decode and verify a JWT token"""
+    """Decode and verify a JWT token (verified payloads are cached until exp)"""
+    payload = auth_cache.get_token_payload(token)
+    if payload is not None:
+        return payload
     try:
         payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
-        return payload
     except JWTError:
         return None
+    auth_cache.store_token_payload(token, payload)
+    return payload
 
 
 def get_user_by_email(session: Session, email: str) -> Optional[User]:
@@ -87,55 +110,42 @@ def authenticate_user(session: Session, email: str, password: str) -> Optional[U
     return user
 
 
-def check_rate_limit(ip_address: str) -> bool:
+def _load_user_for_login(session: Session, email: str) -> Optional[User]:
+    """Look up a user and hand the connection back to the pool before the slow bcrypt check"""
+    user = get_user_by_email(session, email)
+    session.close()  # attributes stay loaded; the instance is re-attached by session.add() later
+    return user
+
+
+async def authenticate_user_async(session: Session, email: str, password: str) -> Optional[User]:
+    """authenticate_user() without blocking the event loop"""
+    user = await run_in_threadpool(_load_user_for_login, session, email)
+    if not user:
+        return None
+    if not await verify_password_async(password, user.password_hash):
+        return None
+    return user
+
+
+def check_rate_limit(ip_address: str, account: Optional[str] = None) -> bool:
     """
-    Simple rate limiting for login attempts
+    Check if IP address (and account, when given) is within the login rate limit
     Returns True if allowed, False if rate limited
     """
-    # For development: very lenient rate limiting
-    # Set to False to disable rate limiting completely during development
+    # For development: set DISABLE_RATE_LIMIT=true to disable rate limiting completely
     DISABLE_RATE_LIMIT = os.getenv("DISABLE_RATE_LIMIT", "false").lower() == "true"
     
     if DISABLE_RATE_LIMIT:
         return True  # Always allow (development only!)
     
-    max_attempts = 50  # Very high limit for development
-    window_minutes = 2  # Very short window (2 minutes)
-    
-    now = datetime.utcnow()
-    key = f"{ip_address}"
-    
-    if key not in login_attempts:
-        login_attempts[key] = []
-    
-    # Remove old attempts outside the window
-    login_attempts[key] = [
-        attempt_time for attempt_time in login_attempts[key]
-        if (now - attempt_time).total_seconds() < window_minutes * 60
-    ]
-    
-    # Check if limit exceeded
-    if len(login_attempts[key]) >= max_attempts:
-        return False
-    
-    # Record this attempt
-    login_attempts[key].append(now)
-    return True
+    return login_rate_limiter.hit(ip_address, account)
 
 
 def reset_rate_limit_for_ip(ip_address: str = None):
     """
-    Reset rate limit for a specific IP or all IPs
+    Reset rate limit for a specific IP or all IPs (and accounts)
     """
-    if ip_address:
-        if ip_address in login_attempts:
-            del login_attempts[ip_address]
-            return True
-        return False
-    else:
-        # Clear all
-        login_attempts.clear()
-        return True
+    return login_rate_limiter.reset(ip_address)
 
 
 def get_db():
@@ -144,12 +154,14 @@ def get_db():
         yield session
 
 
-async def get_current_user(
+def get_current_user(
     token: str = Depends(oauth2_scheme),
     session: Session = Depends(get_db)
 ) -> User:
     """
     Dependency to get current authenticated user from JWT token
+    Sync on purpose: FastAPI runs it in the threadpool, off the event loop
+    The user comes from auth_cache when possible; the session is only used on a miss
     """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -165,10 +177,15 @@ async def get_current_user(
     if email is None:
         raise credentials_exception
     
+    user = auth_cache.get_user(email)
+    if user is not None:
+        return user
+    
     user = get_user_by_email(session, email)
     if user is None:
         raise credentials_exception
     
+    auth_cache.store_user(user)
     return user
 
 
@@ -0,0 +1,137 @@
+"""
+In-process caches for bearer-token authentication
+Every authenticated request used to verify the JWT signature and load the user
+row. Verified token payloads and user snapshots are kept for a short TTL in
+bounded LRU maps, so dashboard polling costs neither. Snapshots are dropped
+whenever the profile, email, role or password of a user changes.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from sqlalchemy.orm import make_transient_to_detached
+
+from backend.models import User
+
+AUTH_CACHE_ENABLED = os.getenv("AUTH_CACHE_ENABLED", "true").lower() == "true"
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "60"))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "4096"))
+
+
+class TTLCache:
+    """Thread-safe LRU map whose entries also expire after a per-entry deadline"""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: str, value, ttl_seconds: Optional[float] = None):
+        ttl = self.ttl_seconds if ttl_seconds is None else min(ttl_seconds, self.ttl_seconds)
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+# token -> verified JWT payload; entries never outlive the token's exp claim
+token_cache = TTLCache(AUTH_CACHE_MAX_ENTRIES, AUTH_CACHE_TTL_SECONDS)
+# email (JWT sub) -> column values of the User row
+user_cache = TTLCache(AUTH_CACHE_MAX_ENTRIES, AUTH_CACHE_TTL_SECONDS)
+
+
+def get_token_payload(token: str) -> Optional[dict]:
+    if not AUTH_CACHE_ENABLED:
+        return None
+    return token_cache.get(token)
+
+
+def store_token_payload(token: str, payload: dict):
+    if not AUTH_CACHE_ENABLED:
+        return
+    exp = payload.get("exp")
+    token_cache.set(token, payload, ttl_seconds=exp - time.time() if exp is not None else None)
+
+
+def get_user(email: str) -> Optional[User]:
+    """
+    Fresh detached User built from the cached snapshot (never a shared instance,
+    so routes may modify it and session.add()/merge() it as before)
+    """
+    if not AUTH_CACHE_ENABLED:
+        return None
+    snapshot = user_cache.get(email)
+    if snapshot is None:
+        return None
+    user = User(**snapshot)
+    make_transient_to_detached(user)
+    return user
+
+
+def store_user(user: User):
+    if not AUTH_CACHE_ENABLED:
+        return
+    user_cache.set(user.email, {column.key: getattr(user, column.key) for column in User.__table__.columns})
+
+
+def invalidate_user(*emails: str):
+    """Drop cached snapshots after a profile, email, role or password change"""
+    for email in emails:
+        if email:
+            user_cache.pop(email)
+
+
+def clear():
+    token_cache.clear()
+    user_cache.clear()
+
+
+def stats() -> dict:
+    return {
+        "enabled": AUTH_CACHE_ENABLED,
+        "ttl_seconds": AUTH_CACHE_TTL_SECONDS,
+        "tokens": token_cache.stats(),
+        "users": user_cache.stats()
+    }
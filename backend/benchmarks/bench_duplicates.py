@@ -0,0 +1,180 @@
+"""
+Benchmark: GET /api/v1/duplicates listing
+Generates a file-backed SQLite database with N duplicate rows spread over
+originals with 1-9 duplicates each (a share of them merged or ignored), then
+times one page of the listing:
+  - the previous implementation (grouped query, then session.get + a sample
+    SELECT per group and json.loads on every payload)
+  - the current get_duplicates (3 queries), with and without payload decoding
+  - the current get_duplicates without the covering index
+Queries issued per page are counted with a cursor event.
+
+Usage:
+    python backend/benchmarks/bench_duplicates.py --rows 100000 --limit 100
+"""
+
+import sys
+import os
+import argparse
+import json
+import logging
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Add project root to path
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from sqlalchemy import event, text
+from sqlmodel import SQLModel, Session, create_engine, select, func
+
+from backend.models import Telemetry, TelemetryDuplicate
+from backend.routers.duplicates import get_duplicates
+
+START = datetime(2025, 1, 1)
+CHUNK = 50000
+
+
+def populate(engine, count: int):
+    """Insert originals and `count` duplicates with raw executemany (ORM inserts would dominate setup time)"""
+    rng = random.Random(42)
+    payload = json.dumps({"sensors": {"mq3": 420, "mq135": 180, "temp_c": 27.5, "humidity_pct": 61.0}, "gps": {"lat": 13.05, "lon": 80.25}})
+    telemetry_insert = Telemetry.__table__.insert()
+    duplicate_insert = TelemetryDuplicate.__table__.insert()
+    written, original_id = 0, 0
+    with engine.begin() as conn:
+        originals, duplicates = [], []
+        while written < count:
+            original_id += 1
+            ts = START + timedelta(seconds=original_id * 10)
+            device_id = f"esp32-{original_id % 50:02d}"
+            originals.append({
+                "id": original_id, "device_id": device_id, "ts": ts, "mq3": 420, "mq135": 180,
+                "temp_c": 27.5, "humidity_pct": 61.0, "received_at": ts
+            })
+            for _ in range(min(rng.randint(1, 9), count - written)):
+                roll = rng.random()
+                duplicates.append({
+                    "original_telemetry_id": original_id, "device_id": device_id, "timestamp": ts,
+                    "payload_json": payload, "received_at": ts,
+                    "is_merged": roll < 0.2, "is_ignored": 0.2 <= roll < 0.3
+                })
+                written += 1
+            if len(duplicates) >= CHUNK:
+                conn.execute(telemetry_insert, originals)
+                conn.execute(duplicate_insert, duplicates)
+                originals, duplicates = [], []
+        if duplicates:
+            conn.execute(telemetry_insert, originals)
+            conn.execute(duplicate_insert, duplicates)
+        conn.execute(text("ANALYZE"))
+    return original_id
+
+
+def legacy_listing(session: Session, limit: int, offset: int) -> list:
+    """Previous implementation: one grouped query, then two queries per group"""
+    statement = select(
+        TelemetryDuplicate.original_telemetry_id,
+        TelemetryDuplicate.device_id,
+        TelemetryDuplicate.timestamp,
+        func.count(TelemetryDuplicate.id).label("duplicate_count")
+    ).where(
+        TelemetryDuplicate.is_merged == False,
+        TelemetryDuplicate.is_ignored == False
+    ).group_by(
+        TelemetryDuplicate.original_telemetry_id,
+        TelemetryDuplicate.device_id,
+        TelemetryDuplicate.timestamp
+    ).order_by(TelemetryDuplicate.timestamp.desc())
+    session.exec(select(func.count()).select_from(statement.subquery())).one()
+
+    listing = []
+    for row in session.exec(statement.limit(limit).offset(offset)).all():
+        original = session.get(Telemetry, row.original_telemetry_id)
+        if not original:
+            continue
+        samples = session.exec(select(TelemetryDuplicate).where(
+            TelemetryDuplicate.original_telemetry_id == row.original_telemetry_id,
+            TelemetryDuplicate.device_id == row.device_id,
+            TelemetryDuplicate.timestamp == row.timestamp,
+            TelemetryDuplicate.is_merged == False,
+            TelemetryDuplicate.is_ignored == False
+        ).limit(5)).all()
+        listing.append({
+            "original_telemetry": {"id": original.id, "ts": original.ts.isoformat()},
+            "duplicate_count": row.duplicate_count,
+            "sample_duplicates": [{"id": dup.id, "payload_json": json.loads(dup.payload_json)} for dup in samples]
+        })
+    return listing
+
+
+def current_listing(session: Session, limit: int, offset: int, decode: bool) -> list:
+    return get_duplicates(
+        device_id=None, from_ts=None, to_ts=None, limit=limit, offset=offset,
+        decode_payloads=decode, session=session, current_user=None
+    )["duplicates"]
+
+
+def summary(listing: list) -> list:
+    return [
+        (group["original_telemetry"]["id"], group["duplicate_count"], [dup["id"] for dup in group["sample_duplicates"]])
+        for group in listing
+    ]
+
+
+def measure(name, engine, fn, repeat: int):
+    queries = []
+    listener = lambda *args: queries.append(args[2])
+    event.listen(engine, "before_cursor_execute", listener)
+    timings = []
+    try:
+        for _ in range(repeat):
+            queries.clear()
+            with Session(engine) as session:
+                start = time.perf_counter()
+                result = fn(session)
+                timings.append(time.perf_counter() - start)
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    print(f"{name:<34} median {statistics.median(timings) * 1000:8.1f} ms   {len(queries):4d} queries   {len(result)} groups")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the duplicates listing")
+    parser.add_argument("--rows", type=int, default=100000, help="Duplicate rows to generate")
+    parser.add_argument("--limit", type=int, default=100, help="Groups per page (the endpoint allows up to 100)")
+    parser.add_argument("--offset", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    logging.getLogger("sqlalchemy").setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench_duplicates.db')}")
+        SQLModel.metadata.create_all(engine)
+
+        print(f"Generating {args.rows} duplicate rows...")
+        start = time.perf_counter()
+        originals = populate(engine, args.rows)
+        print(f"  {originals} originals, done in {time.perf_counter() - start:.1f}s")
+        print("=" * 76)
+
+        page = lambda decode: lambda session: current_listing(session, args.limit, args.offset, decode)
+        legacy = measure("legacy (N+1)", engine, lambda session: legacy_listing(session, args.limit, args.offset), args.repeat)
+        current = measure("windowed samples", engine, page(True), args.repeat)
+        measure("windowed samples, raw payloads", engine, page(False), args.repeat)
+        print(f"results match legacy: {summary(legacy) == summary(current)}")
+
+        with engine.begin() as conn:
+            conn.execute(text("DROP INDEX ix_telemetry_duplicates_pending"))
+        measure("windowed samples, no covering idx", engine, page(True), args.repeat)
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
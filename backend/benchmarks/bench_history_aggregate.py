@@ -0,0 +1,160 @@
+"""
+Benchmark: alert history aggregation (aggregate=true)
+Generates a file-backed SQLite database with N alerts spread over 7 days and
+compares the previous approach (load every Alert row, bucket in Python) with
+the SQL GROUP BY over raw alerts and with the minute/hour/day rollup tables.
+Reports latency and peak Python memory (tracemalloc) for each.
+
+Usage:
+    python backend/benchmarks/bench_history_aggregate.py --alerts 1000000 --bucket-minutes 60
+"""
+
+import sys
+import os
+import argparse
+import logging
+import random
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Add project root to path
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from sqlmodel import SQLModel, Session, create_engine, select, and_
+
+from backend import rollups
+from backend.models import Alert
+from backend.routers.alerts_history import AggregationBucket, aggregate_alert_buckets
+
+START = datetime(2025, 1, 1)
+RANGE = timedelta(days=7)
+
+
+def populate(engine, count: int):
+    """Insert `count` alerts with raw executemany (ORM inserts would dominate setup time; rollups rebuilt after)"""
+    rng = random.Random(42)
+    step = RANGE.total_seconds() / count
+    insert = Alert.__table__.insert()
+    with engine.begin() as conn:
+        for chunk_start in range(0, count, 50000):
+            rows = []
+            for i in range(chunk_start, min(count, chunk_start + 50000)):
+                rows.append({
+                    "device_id": f"esp32-{i % 50:02d}",
+                    "ts": START + timedelta(seconds=i * step),
+                    "severity": "HIGH" if rng.random() < 0.3 else "WARNING",
+                    "short_message": "Alert",
+                    "explanation": "Benchmark alert",
+                    "recommended_action": "None",
+                    "confidence": "low",
+                    "mq3": rng.randint(350, 900),
+                    "mq135": rng.randint(100, 500),
+                    "lat": 13.0 + rng.random() * 0.2,
+                    "lon": 80.2 + rng.random() * 0.2,
+                    "notified": False,
+                    "created_at": START
+                })
+            conn.execute(insert, rows)
+
+
+def legacy_aggregate(session: Session, from_dt: datetime, to_dt: datetime, bucket_seconds: int):
+    """Previous implementation: every Alert ORM object is loaded and bucketed in Python"""
+    alerts = session.exec(
+        select(Alert).where(
+            and_(
+                Alert.ts >= from_dt,
+                Alert.ts <= to_dt,
+                Alert.lat.isnot(None),
+                Alert.lon.isnot(None),
+                Alert.lat != 0.0,
+                Alert.lon != 0.0
+            )
+        ).order_by(Alert.ts.asc())
+    ).all()
+
+    buckets = {}
+    for alert in alerts:
+        bucket_start_seconds = int((alert.ts - from_dt).total_seconds() // bucket_seconds) * bucket_seconds
+        bucket_key = (from_dt + timedelta(seconds=bucket_start_seconds)).isoformat() + 'Z'
+        if bucket_key not in buckets:
+            buckets[bucket_key] = {
+                "bucket_start": bucket_key,
+                "counts": {"SAFE": 0, "WARNING": 0, "HIGH": 0},
+                "repr_lat": alert.lat, "repr_lon": alert.lon,
+                "total_count": 0, "lat_sum": 0.0, "lon_sum": 0.0, "lat_count": 0
+            }
+        bucket = buckets[bucket_key]
+        bucket["counts"][alert.severity] = bucket["counts"].get(alert.severity, 0) + 1
+        bucket["total_count"] += 1
+        if alert.lat and alert.lon:
+            bucket["lat_sum"] += alert.lat
+            bucket["lon_sum"] += alert.lon
+            bucket["lat_count"] += 1
+            bucket["repr_lat"] = bucket["lat_sum"] / bucket["lat_count"]
+            bucket["repr_lon"] = bucket["lon_sum"] / bucket["lat_count"]
+
+    return [
+        AggregationBucket(
+            bucket_start=b["bucket_start"], counts=b["counts"],
+            repr_lat=b["repr_lat"], repr_lon=b["repr_lon"], total_count=b["total_count"]
+        )
+        for _, b in sorted(buckets.items())
+    ]
+
+
+def measure(name, fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<22} {elapsed * 1000:10.1f} ms   peak {peak / 1024 / 1024:8.1f} MiB   {len(result)} buckets")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark alert history aggregation")
+    parser.add_argument("--alerts", type=int, default=1000000)
+    parser.add_argument("--bucket-minutes", type=int, default=60)
+    parser.add_argument("--skip-legacy", action="store_true", help="Only time the SQL aggregation")
+    args = parser.parse_args()
+
+    logging.getLogger("sqlalchemy").setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench_history.db')}")
+        SQLModel.metadata.create_all(engine)
+
+        print(f"Generating {args.alerts} alerts over {RANGE.days} days...")
+        start = time.perf_counter()
+        populate(engine, args.alerts)
+        with Session(engine) as session:
+            rollups.rebuild_rollups(session)
+            session.commit()
+        print(f"  done in {time.perf_counter() - start:.1f}s (incl. rollup backfill)")
+
+        from_dt, to_dt = START, START + RANGE
+        bucket_seconds = args.bucket_minutes * 60
+        print("=" * 60)
+        with Session(engine) as session:
+            from_rollups = measure("rollup tables", lambda: aggregate_alert_buckets(session, from_dt, to_dt, bucket_seconds))
+        rollups.ROLLUPS_ENABLED = False
+        with Session(engine) as session:
+            sql = measure("SQL GROUP BY (raw)", lambda: aggregate_alert_buckets(session, from_dt, to_dt, bucket_seconds))
+        print(f"rollups match raw: {[(b.bucket_start, b.counts) for b in from_rollups] == [(b.bucket_start, b.counts) for b in sql]}")
+        if not args.skip_legacy:
+            with Session(engine) as session:
+                legacy = measure("Python loop (legacy)", lambda: legacy_aggregate(session, from_dt, to_dt, bucket_seconds))
+            same = [(b.bucket_start, b.counts, b.total_count) for b in sql] == \
+                   [(b.bucket_start, b.counts, b.total_count) for b in legacy]
+            print(f"results identical: {same}")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
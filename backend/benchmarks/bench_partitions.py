@@ -0,0 +1,184 @@
+"""
+Benchmark: range queries and retention on monthly partitions
+Generates N telemetry readings spread evenly over --months months twice: once
+in a single `telemetry` table, once laid out the way PARTITIONING_ENABLED leaves
+it (hot months in the main table, older months in part_YYYY_MM.db files listed
+in storage_partitions). Then times:
+  - one-day range queries in an archived month and in the hot window
+  - a whole-month range query
+  - dropping the oldest month (DELETE on the single table vs. drop_partition)
+
+Usage:
+    python backend/benchmarks/bench_partitions.py --rows 100000000 --months 12
+"""
+
+import sys
+import os
+import argparse
+import logging
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Add project root to path
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from sqlmodel import SQLModel, Session, create_engine, delete, select
+
+from backend.models import StoragePartition, Telemetry
+from backend.partitions import PartitionManager, add_months, merge_rows
+
+START = datetime(2025, 1, 1)
+CHUNK = 50000
+
+
+def generate(count: int, months: int):
+    """Yield (month index, row) for `count` readings spread evenly over `months` months"""
+    rng = random.Random(42)
+    end = add_months(START, months)
+    step = (end - START).total_seconds() / count
+    month, month_end = 0, add_months(START, 1)
+    for i in range(count):
+        ts = START + timedelta(seconds=i * step)
+        while ts >= month_end:
+            month, month_end = month + 1, add_months(month_end, 1)
+        yield month, {
+            "device_id": f"esp32-{i % 50:02d}",
+            "ts": ts,
+            "mq3": rng.randint(100, 900),
+            "mq135": rng.randint(100, 500),
+            "received_at": ts
+        }
+
+
+def populate(single_engine, manager: PartitionManager, count: int, months: int, hot_months: int):
+    """Raw executemany into both layouts (the archiver itself is not what is being measured)"""
+    insert = Telemetry.__table__.insert()
+    first_hot = months - hot_months
+    buffers = {}
+
+    def write(engine, rows):
+        with engine.begin() as conn:
+            conn.execute(insert, rows)
+
+    for month, row in generate(count, months):
+        target = None if month >= first_hot else month
+        buffer = buffers.setdefault(target, [])
+        buffer.append(row)
+        if len(buffer) >= CHUNK:
+            write(single_engine, buffer)
+            write(manager.engine if target is None else manager.engine_for(manager._path_for(add_months(START, target))), buffer)
+            buffers[target] = []
+    for target, buffer in buffers.items():
+        if buffer:
+            write(single_engine, buffer)
+            write(manager.engine if target is None else manager.engine_for(manager._path_for(add_months(START, target))), buffer)
+
+    with Session(manager.engine) as session:
+        for month in range(first_hot):
+            start = add_months(START, month)
+            session.add(StoragePartition(
+                month=f"{start:%Y-%m}", path=manager._path_for(start),
+                range_start=start, range_end=add_months(start, 1), status="ready"
+            ))
+        session.commit()
+
+
+def range_statement(from_dt: datetime, to_dt: datetime, device_id: str = None, limit: int = 1000):
+    statement = select(Telemetry).where(Telemetry.ts >= from_dt, Telemetry.ts <= to_dt)
+    if device_id:
+        statement = statement.where(Telemetry.device_id == device_id)
+    return statement.order_by(Telemetry.ts.asc()).limit(limit)
+
+
+def query_single(engine, from_dt, to_dt, device_id, limit):
+    with Session(engine) as session:
+        return session.exec(range_statement(from_dt, to_dt, device_id, limit)).all()
+
+
+def query_partitioned(manager: PartitionManager, from_dt, to_dt, device_id, limit):
+    """Same query through the router: main table plus only the overlapping partitions"""
+    statement = range_statement(from_dt, to_dt, device_id, limit)
+    with Session(manager.engine) as session:
+        rows = session.exec(statement).all()
+        archived = manager.read_overlapping(session, statement, from_dt, to_dt)
+    return merge_rows([rows, *archived], key=lambda t: (t.ts, t.id), limit=limit)
+
+
+def timed(fn, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark monthly partitions")
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--months", type=int, default=12)
+    parser.add_argument("--hot-months", type=int, default=2)
+    parser.add_argument("--limit", type=int, default=1000, help="Rows per range query")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    logging.getLogger("sqlalchemy").setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        single = create_engine(f"sqlite:///{os.path.join(tmp, 'single.db')}")
+        main_engine = create_engine(f"sqlite:///{os.path.join(tmp, 'main.db')}")
+        SQLModel.metadata.create_all(single)
+        SQLModel.metadata.create_all(main_engine)
+        manager = PartitionManager(main_engine, enabled=True, directory=os.path.join(tmp, "partitions"), hot_months=args.hot_months)
+
+        print(f"Generating {args.rows} readings over {args.months} months ({args.hot_months} hot)...")
+        start = time.perf_counter()
+        populate(single, manager, args.rows, args.months, args.hot_months)
+        print(f"  done in {time.perf_counter() - start:.1f}s")
+
+        archived_day = add_months(START, 1) + timedelta(days=14)
+        hot_day = add_months(START, args.months - 1) + timedelta(days=14)
+        cases = [
+            ("1 day, archived month", archived_day, archived_day + timedelta(days=1), None),
+            ("1 day, archived, 1 device", archived_day, archived_day + timedelta(days=1), "esp32-07"),
+            ("1 day, hot month", hot_day, hot_day + timedelta(days=1), None),
+            ("whole archived month", add_months(START, 1), add_months(START, 2), "esp32-07"),
+        ]
+
+        print("=" * 60)
+        print(f"{'query':<28} {'single (ms)':>12} {'partitioned (ms)':>17}")
+        for name, from_dt, to_dt, device_id in cases:
+            single_ms, expected = timed(lambda: query_single(single, from_dt, to_dt, device_id, args.limit), args.repeat)
+            part_ms, result = timed(lambda: query_partitioned(manager, from_dt, to_dt, device_id, args.limit), args.repeat)
+            same = [r.ts for r in expected] == [r.ts for r in result]
+            print(f"{name:<28} {single_ms:12.2f} {part_ms:17.2f}   same rows: {same}")
+
+        print("=" * 60)
+        oldest = START
+        start = time.perf_counter()
+        with Session(single) as session:
+            removed = session.exec(
+                delete(Telemetry).where(Telemetry.ts >= oldest, Telemetry.ts < add_months(oldest, 1))
+            ).rowcount
+            session.commit()
+        delete_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        manager.drop_partition(f"{oldest:%Y-%m}")
+        drop_ms = (time.perf_counter() - start) * 1000
+        print(f"drop oldest month ({removed} rows): DELETE {delete_ms:.1f} ms, drop_partition {drop_ms:.1f} ms")
+
+        for path in list(manager._engines):
+            manager._dispose(path)
+        single.dispose()
+        main_engine.dispose()
+        os.chdir(project_root)
+
+
+if __name__ == "__main__":
+    main()
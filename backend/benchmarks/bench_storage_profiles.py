@@ -0,0 +1,138 @@
+"""
+Benchmark: SQLite storage profiles under concurrent ingest and history reads
+For each STORAGE_PROFILE, writer threads insert telemetry one committed row at a
+time (like POST /api/v1/telemetry) while reader threads run the history-style
+queries the dashboard issues. Reports writes/sec, reads/sec, read latency and
+"database is locked" errors.
+
+Usage:
+    python backend/benchmarks/bench_storage_profiles.py --writers 2 --readers 4 --seconds 10
+"""
+
+import sys
+import os
+import argparse
+import statistics
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Add project root to path
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from sqlalchemy.exc import OperationalError
+from sqlmodel import SQLModel, Session, select, func
+
+from backend.database import STORAGE_PROFILES, create_app_engine
+from backend.models import Telemetry
+
+START = datetime(2025, 1, 1)
+
+
+def seed(engine, rows: int):
+    """Pre-populate so reads have something to scan"""
+    with engine.begin() as conn:
+        conn.execute(Telemetry.__table__.insert(), [
+            {
+                "device_id": f"esp32-{i % 20:02d}",
+                "ts": START + timedelta(seconds=i),
+                "mq3": 200 + i % 300,
+                "mq135": 150,
+                "temp_c": 27.5,
+                "humidity_pct": 60.0,
+                "received_at": START
+            }
+            for i in range(rows)
+        ])
+
+
+def writer(engine, worker: int, stop: threading.Event, counters: dict):
+    i = 0
+    while not stop.is_set():
+        try:
+            with Session(engine) as session:
+                session.add(Telemetry(
+                    device_id=f"writer-{worker}",
+                    ts=START + timedelta(days=30, seconds=i),
+                    mq3=300, mq135=150, temp_c=27.5, humidity_pct=60.0
+                ))
+                session.commit()
+            counters["writes"] += 1
+        except OperationalError:
+            counters["write_errors"] += 1
+        i += 1
+
+
+def reader(engine, stop: threading.Event, counters: dict, latencies: list):
+    i = 0
+    while not stop.is_set():
+        device_id = f"esp32-{i % 20:02d}"
+        started = time.perf_counter()
+        try:
+            with Session(engine) as session:
+                # Recent history for a device + a per-device count (dashboard summary)
+                session.exec(
+                    select(Telemetry).where(Telemetry.device_id == device_id)
+                    .order_by(Telemetry.ts.desc()).limit(50)
+                ).all()
+                session.exec(select(Telemetry.device_id, func.count()).group_by(Telemetry.device_id)).all()
+            counters["reads"] += 1
+            latencies.append((time.perf_counter() - started) * 1000)
+        except OperationalError:
+            counters["read_errors"] += 1
+        i += 1
+
+
+def run_profile(profile: str, args) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_app_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}", profile=profile)
+        SQLModel.metadata.create_all(engine)
+        seed(engine, args.seed_rows)
+
+        counters = {"writes": 0, "write_errors": 0, "reads": 0, "read_errors": 0}
+        latencies = []
+        stop = threading.Event()
+        threads = [threading.Thread(target=writer, args=(engine, w, stop, counters)) for w in range(args.writers)]
+        threads += [threading.Thread(target=reader, args=(engine, stop, counters, latencies)) for _ in range(args.readers)]
+        for t in threads:
+            t.start()
+        time.sleep(args.seconds)
+        stop.set()
+        for t in threads:
+            t.join()
+        engine.dispose()
+
+    latencies.sort()
+    return {
+        "writes_per_sec": counters["writes"] / args.seconds,
+        "reads_per_sec": counters["reads"] / args.seconds,
+        "read_p50_ms": statistics.median(latencies) if latencies else 0.0,
+        "read_p99_ms": latencies[int(len(latencies) * 0.99)] if latencies else 0.0,
+        "errors": counters["write_errors"] + counters["read_errors"]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark SQLite storage profiles")
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--seed-rows", type=int, default=50000)
+    parser.add_argument("--profiles", nargs="+", default=list(STORAGE_PROFILES))
+    args = parser.parse_args()
+
+    print("=" * 78)
+    print(f"{args.writers} writers / {args.readers} readers for {args.seconds}s, {args.seed_rows} seeded rows")
+    print("=" * 78)
+    print(f"{'profile':<10} {'writes/s':>10} {'reads/s':>10} {'read p50 ms':>12} {'read p99 ms':>12} {'errors':>8}")
+    for profile in args.profiles:
+        r = run_profile(profile, args)
+        print(f"{profile:<10} {r['writes_per_sec']:>10.1f} {r['reads_per_sec']:>10.1f} "
+              f"{r['read_p50_ms']:>12.2f} {r['read_p99_ms']:>12.2f} {r['errors']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Benchmark: single-item vs batch telemetry ingestion
+Posts SAFE readings against a temporary file-backed SQLite database and
+reports rows/sec for POST /api/v1/telemetry and POST /api/v1/telemetry/batch
+
+Usage:
+    python backend/benchmarks/bench_telemetry_batch.py --rows 2000 --batch-size 100
+"""
+
+import sys
+import os
+import argparse
+import logging
+import tempfile
+import time
+from pathlib import Path
+
+# Add project root to path
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+os.chdir(project_root)
+
+from datetime import datetime, timedelta
+from fastapi.testclient import TestClient
+from sqlmodel import SQLModel, Session, create_engine
+
+from backend.app import app
+from backend.database import get_session
+
+API_KEY = "bench-device-key"
+
+
+def make_readings(count: int, device_id: str, start: datetime) -> list:
+    """Generate SAFE readings one second apart"""
+    return [
+        {
+            "device_id": device_id,
+            "timestamp": (start + timedelta(seconds=i)).isoformat() + "Z",
+            "sensors": {"mq3": 200 + (i % 300), "mq135": 150, "temp_c": 27.5, "humidity_pct": 60.0},
+            "gps": {"lat": 10.3624, "lon": 77.9702, "alt": 300.0}
+        }
+        for i in range(count)
+    ]
+
+
+def use_fresh_database(db_path: str):
+    """Point the app's session dependency at a new file-backed database"""
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    engine = create_engine(f"sqlite:///{db_path}", connect_args={"check_same_thread": False})
+    SQLModel.metadata.create_all(engine)
+
+    def get_session_override():
+        with Session(engine) as session:
+            yield session
+
+    app.dependency_overrides[get_session] = get_session_override
+    return engine
+
+
+def bench_single(client: TestClient, readings: list) -> float:
+    start = time.perf_counter()
+    for payload in readings:
+        response = client.post("/api/v1/telemetry", json=payload, headers={"x-api-key": API_KEY})
+        assert response.status_code == 200, response.text
+    return time.perf_counter() - start
+
+
+def bench_batch(client: TestClient, readings: list, batch_size: int) -> float:
+    start = time.perf_counter()
+    for offset in range(0, len(readings), batch_size):
+        response = client.post(
+            "/api/v1/telemetry/batch",
+            json=readings[offset:offset + batch_size],
+            headers={"x-api-key": API_KEY}
+        )
+        assert response.status_code == 200, response.text
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark single vs batch telemetry ingestion")
+    parser.add_argument("--rows", type=int, default=2000, help="Readings to ingest per mode")
+    parser.add_argument("--batch-size", type=int, default=100, help="Readings per batch request")
+    args = parser.parse_args()
+
+    os.environ["DEVICE_API_KEY"] = API_KEY
+    # Per-request INFO logging would dominate the measurement
+    logging.disable(logging.INFO)
+    client = TestClient(app)
+    start = datetime(2025, 1, 1, 0, 0, 0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+
+        use_fresh_database(db_path)
+        single_seconds = bench_single(client, make_readings(args.rows, "bench-single", start))
+
+        use_fresh_database(db_path)
+        batch_seconds = bench_batch(client, make_readings(args.rows, "bench-batch", start), args.batch_size)
+
+    app.dependency_overrides.clear()
+
+    single_rate = args.rows / single_seconds
+    batch_rate = args.rows / batch_seconds
+    print("=" * 60)
+    print(f"Telemetry ingestion benchmark ({args.rows} SAFE readings)")
+    print("=" * 60)
+    print(f"single-item : {single_seconds:8.2f}s  {single_rate:10.1f} rows/sec")
+    print(f"batch ({args.batch_size:>4}) : {batch_seconds:8.2f}s  {batch_rate:10.1f} rows/sec")
+    print(f"speedup     : {batch_rate / single_rate:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Benchmark: WebSocket broadcast latency with many local clients
+Compares the previous sequential broadcast (await send_json per socket) with
+the queued ConnectionManager. Simulated clients record when each message
+arrives; a few of them are slow to show head-of-line blocking.
+
+Usage:
+    python backend/benchmarks/bench_ws_broadcast.py --clients 1000 --slow 10 --messages 10
+"""
+
+import sys
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from pathlib import Path
+
+# Add project root to path
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from backend.websocket_manager import ConnectionManager
+
+
+class SimulatedClient:
+    """In-process socket: optional per-send delay, records delivery times"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.delivered_at = []
+        self.client = None
+
+    async def accept(self):
+        pass
+
+    async def _deliver(self):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        else:
+            await asyncio.sleep(0)
+        self.delivered_at.append(time.perf_counter())
+
+    async def send_text(self, text: str):
+        await self._deliver()
+
+    async def send_json(self, message: dict):
+        json.dumps(message)
+        await self._deliver()
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+class LegacyConnectionManager:
+    """Previous implementation: sequential awaits, re-serializes per client"""
+
+    def __init__(self):
+        self.active_connections = []
+
+    async def connect(self, websocket):
+        await websocket.accept()
+        self.active_connections.append(websocket)
+
+    async def broadcast(self, message: dict):
+        for connection in self.active_connections:
+            try:
+                await connection.send_json(message)
+            except:
+                pass
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def run(manager, clients_count: int, slow_count: int, slow_delay: float, messages: int, queue_wait: float):
+    clients = [SimulatedClient(slow_delay if i < slow_count else 0.0) for i in range(clients_count)]
+    for client in clients:
+        await manager.connect(client)
+
+    fast = clients[slow_count:]
+    call_ms = []
+    sent_at = []
+    message = {"type": "new_alert", "data": {"id": 1, "device_id": "bench", "severity": "HIGH", "mq3": 1200}}
+    for _ in range(messages):
+        start = time.perf_counter()
+        await manager.broadcast(message)
+        call_ms.append((time.perf_counter() - start) * 1000)
+        sent_at.append(start)
+        await asyncio.sleep(0.01)
+
+    # Give queued senders time to drain
+    deadline = time.perf_counter() + queue_wait
+    while time.perf_counter() < deadline and any(len(c.delivered_at) < messages for c in fast):
+        await asyncio.sleep(0.01)
+
+    latencies = [
+        (client.delivered_at[i] - sent_at[i]) * 1000
+        for client in fast
+        for i in range(min(messages, len(client.delivered_at)))
+    ]
+    for client in clients:
+        if hasattr(manager, "disconnect"):
+            manager.disconnect(client)
+    return call_ms, latencies
+
+
+def report(name, call_ms, latencies):
+    print(f"{name}")
+    print(f"  broadcast() call : p50 {statistics.median(call_ms):9.2f} ms   max {max(call_ms):9.2f} ms")
+    print(f"  fast-client lag  : p50 {percentile(latencies, 50):9.2f} ms   p99 {percentile(latencies, 99):9.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark WebSocket broadcast fan-out")
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--slow", type=int, default=10, help="Clients with slow sends")
+    parser.add_argument("--slow-delay-ms", type=float, default=5.0)
+    parser.add_argument("--messages", type=int, default=10)
+    args = parser.parse_args()
+    slow_delay = args.slow_delay_ms / 1000
+
+    print("=" * 60)
+    print(f"WebSocket broadcast: {args.clients} clients ({args.slow} slow @ {args.slow_delay_ms} ms), "
+          f"{args.messages} messages")
+    print("=" * 60)
+
+    legacy = asyncio.run(run(LegacyConnectionManager(), args.clients, args.slow, slow_delay, args.messages, 30))
+    report("sequential (legacy)", *legacy)
+
+    queued = asyncio.run(run(ConnectionManager(queue_size=args.messages * 2), args.clients, args.slow,
+                             slow_delay, args.messages, 30))
+    report("per-client queues", *queued)
+
+
+if __name__ == "__main__":
+    main()
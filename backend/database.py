@@ -1,10 +1,141 @@
 from sqlmodel import SQLModel, create_engine, Session
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from fastapi import Depends
+from fastapi.concurrency import run_in_threadpool
+import logging
 import os
 
+logger = logging.getLogger(__name__)
+
 # SQLite database
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./database.db")
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+# Storage profile applied to every new SQLite connection:
+#   "wal"     - WAL journal + synchronous=NORMAL: readers never block on the ingest writer,
+#               commits append to the WAL without an fsync each (default)
+#   "durable" - WAL + synchronous=FULL: fsync on every commit
+#   "legacy"  - SQLite defaults (rollback journal, no tuning)
+STORAGE_PROFILE = os.getenv("STORAGE_PROFILE", "wal")
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))  # bytes
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))  # page cache per connection
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+# Connection pool (file databases only)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))  # seconds to wait for a free connection
+
+# Optional async engine for the hot routes (needs aiosqlite for SQLite, asyncpg for PostgreSQL)
+ASYNC_DB_ENABLED = os.getenv("ASYNC_DB_ENABLED", "false").lower() == "true"
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", "")  # derived from DATABASE_URL when empty
+
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+}
+
+STORAGE_PROFILES = {
+    "legacy": [],
+    "wal": [
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA temp_store=MEMORY",
+        f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}",
+        f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}",
+        f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}",
+    ],
+    "durable": [
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=FULL",
+        "PRAGMA temp_store=MEMORY",
+        f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}",
+        f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}",
+        f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}",
+    ],
+}
+
+
+def apply_storage_profile(engine: Engine, profile: str = STORAGE_PROFILE) -> Engine:
+    """Run the profile's PRAGMAs on every new DBAPI connection of a SQLite engine"""
+    if profile not in STORAGE_PROFILES:
+        raise ValueError(f"Unknown STORAGE_PROFILE '{profile}' (expected one of {', '.join(STORAGE_PROFILES)})")
+    pragmas = STORAGE_PROFILES[profile]
+    if engine.dialect.name != "sqlite" or not pragmas:
+        return engine
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+    return engine
+
+
+def _is_file_database(url: str) -> bool:
+    return url.startswith("sqlite") and ":memory:" not in url and not url.rstrip("/").endswith(":")
+
+
+def create_app_engine(url: str = DATABASE_URL, profile: str = STORAGE_PROFILE) -> Engine:
+    """Engine with the storage profile and pool settings used by the app"""
+    kwargs = {"connect_args": {"check_same_thread": False}}
+    if _is_file_database(url):
+        kwargs.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
+    return apply_storage_profile(create_engine(url, **kwargs), profile)
+
+
+def to_async_url(url: str) -> str:
+    """
+    Rewrite a sync database URL for its async driver:
+    sqlite:// -> sqlite+aiosqlite://, postgresql[+psycopg2]:// -> postgresql+asyncpg://
+    (asyncpg spells libpq's sslmode as ssl)
+    """
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver known for '{parsed.drivername}' URLs")
+    parsed = parsed.set(drivername=ASYNC_DRIVERS[backend])
+    if parsed.drivername == "postgresql+asyncpg" and "sslmode" in parsed.query:
+        query = dict(parsed.query)
+        query["ssl"] = query.pop("sslmode")
+        parsed = parsed.set(query=query)
+    return parsed.render_as_string(hide_password=False)
+
+
+def create_async_app_engine(url: str = "", profile: str = STORAGE_PROFILE):
+    """
+    AsyncEngine with the same storage profile and pool settings as create_app_engine().
+    Raises ImportError when the async driver is not installed.
+    """
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    async_url = to_async_url(url or ASYNC_DATABASE_URL or DATABASE_URL)
+    kwargs = {}
+    if async_url.startswith("sqlite"):
+        kwargs["connect_args"] = {"check_same_thread": False}
+    if _is_file_database(async_url) or not async_url.startswith("sqlite"):
+        kwargs.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
+    async_engine = create_async_engine(async_url, **kwargs)
+    # PRAGMAs run through the sync facade's connect event, same as the sync engine
+    apply_storage_profile(async_engine.sync_engine, profile)
+    return async_engine
+
+
+def _init_async_engine():
+    if not ASYNC_DB_ENABLED:
+        return None
+    try:
+        return create_async_app_engine()
+    except ImportError as e:
+        logger.warning(f"ASYNC_DB_ENABLED is set but the async driver is unavailable ({e}); using the sync engine")
+        return None
+
+
+engine = create_app_engine()
+async_engine = _init_async_engine()
 
 
 def create_db_and_tables():
@@ -16,3 +147,65 @@ def get_session():
     """Get database session"""
     with Session(engine) as session:
         yield session
+
+
+async def get_async_session():
+    """Get an AsyncSession on the async engine (only valid when ASYNC_DB_ENABLED took effect)"""
+    from sqlmodel.ext.asyncio.session import AsyncSession
+
+    if async_engine is None:
+        raise RuntimeError("Async engine is not configured (set ASYNC_DB_ENABLED=true and install the async driver)")
+    async with AsyncSession(async_engine) as session:
+        yield session
+
+
+class DatabaseRunner:
+    """
+    Runs sync ORM code from async routes.
+    With an async engine the function runs through AsyncSession.run_sync(), so its
+    queries are awaited on the event loop; without one it runs on the request's
+    sync session in the threadpool. Either way fn(session, ...) gets a sync Session,
+    and one session is used for the lifetime of the runner.
+    """
+
+    def __init__(self, session: Session, async_engine=None):
+        self.session = session
+        self.async_engine = async_engine
+        self._async_session = None
+
+    @property
+    def is_async(self) -> bool:
+        return self.async_engine is not None
+
+    async def run(self, fn, *args, **kwargs):
+        if self.async_engine is None:
+            return await run_in_threadpool(fn, self.session, *args, **kwargs)
+        if self._async_session is None:
+            from sqlmodel.ext.asyncio.session import AsyncSession
+            self._async_session = AsyncSession(self.async_engine)
+        return await self._async_session.run_sync(fn, *args, **kwargs)
+
+    async def all(self, statement):
+        """session.exec(statement).all()"""
+        return await self.run(_exec_all, statement)
+
+    async def close(self):
+        if self._async_session is not None:
+            await self._async_session.close()
+            self._async_session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+def _exec_all(session: Session, statement):
+    return session.exec(statement).all()
+
+
+async def get_db_runner(session: Session = Depends(get_session)):
+    """DatabaseRunner on the async engine when configured, else on get_session()'s session"""
+    async with DatabaseRunner(session, async_engine) as runner:
+        yield runner
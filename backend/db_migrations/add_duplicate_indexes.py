@@ -0,0 +1,58 @@
+"""
+Migration script to add the covering index used by GET /api/v1/duplicates
+- Composite index on telemetry_duplicates(is_merged, is_ignored, timestamp, original_telemetry_id, device_id)
+  New databases get it from the model; this adds it to existing ones
+"""
+
+import sqlite3
+import os
+
+# Database path
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./database.db")
+# Extract path from SQLite URL
+db_path = DATABASE_URL.replace("sqlite:///", "")
+
+INDEX_NAME = "ix_telemetry_duplicates_pending"
+
+
+def add_indexes():
+    """Add the pending-duplicates index to telemetry_duplicates"""
+    if not os.path.exists(db_path):
+        print(f"Database not found at {db_path}. Creating tables first...")
+        return
+    
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute("""
+            SELECT name FROM sqlite_master 
+            WHERE type='index' AND name=?
+        """, (INDEX_NAME,))
+        index_exists = cursor.fetchone() is not None
+        
+        if not index_exists:
+            print("Adding composite index on telemetry_duplicates(is_merged, is_ignored, timestamp, ...)...")
+            cursor.execute(f"""
+                CREATE INDEX {INDEX_NAME} ON telemetry_duplicates
+                (is_merged, is_ignored, timestamp, original_telemetry_id, device_id)
+            """)
+            cursor.execute("ANALYZE telemetry_duplicates")
+            print(f"✓ Index {INDEX_NAME} created")
+        else:
+            print(f"✓ Index {INDEX_NAME} already exists")
+        
+        conn.commit()
+        print("\n✅ Migration completed successfully!")
+        
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Error during migration: {e}")
+        raise
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    print("Running duplicate indexes migration...")
+    add_indexes()
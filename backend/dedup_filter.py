@@ -0,0 +1,270 @@
+"""
+Probabilistic pre-filter for telemetry duplicate checks
+Most readings are new, so the (device_id, ts) lookup on unique_device_timestamp
+usually finds nothing. TelemetryFilter remembers stored keys in two structures:
+  - a per-device set of the last DEDUP_RECENT_PER_DEVICE timestamps (exact;
+    device retransmits land here)
+  - a rolling Bloom filter of two generations of DEDUP_FILTER_CAPACITY keys
+    each; when the current generation fills up the older one is dropped
+A key the filter has never seen is definitely not in the database and the
+lookup is skipped. A possible hit still goes to the database.
+
+Keys forgotten with a dropped generation (and keys older than what the startup
+rebuild loaded) are tracked as a per-device horizon: timestamps at or below it
+are always checked in the database. The filter only answers for the engine it
+was rebuilt from and only knows rows written through this process, so it is
+enabled by default only with the single-worker SHARED_STATE_BACKEND=memory.
+"""
+
+import hashlib
+import logging
+import math
+import os
+import sys
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlmodel import Session, select
+
+from backend.history_buffer import _to_micros
+from backend.models import Telemetry
+from backend.shared_state import SHARED_STATE_BACKEND
+
+logger = logging.getLogger(__name__)
+
+DEDUP_FILTER_ENABLED = os.getenv(
+    "DEDUP_FILTER_ENABLED", "true" if SHARED_STATE_BACKEND == "memory" else "false"
+).lower() == "true"
+DEDUP_FILTER_CAPACITY = int(os.getenv("DEDUP_FILTER_CAPACITY", "100000"))  # keys per Bloom generation
+DEDUP_FILTER_FP_RATE = float(os.getenv("DEDUP_FILTER_FP_RATE", "0.01"))  # target false-positive rate
+DEDUP_RECENT_PER_DEVICE = int(os.getenv("DEDUP_RECENT_PER_DEVICE", "64"))
+DEDUP_FILTER_MAX_DEVICES = int(os.getenv("DEDUP_FILTER_MAX_DEVICES", "10000"))
+
+# lookup() answers
+SEEN = "seen"  # stored recently by this process
+NEW = "new"  # definitely not stored: skip the database
+MAYBE = "maybe"  # Bloom filter hit: ask the database
+UNKNOWN = "unknown"  # not covered (other database, past the horizon, not built): ask the database
+
+
+def bloom_parameters(capacity: int, fp_rate: float) -> Tuple[int, int]:
+    """(bits, hash count) for a Bloom filter holding capacity keys at fp_rate"""
+    bits = max(8, math.ceil(-capacity * math.log(fp_rate) / (math.log(2) ** 2)))
+    hashes = max(1, round(bits / capacity * math.log(2)))
+    return bits, hashes
+
+
+class BloomGeneration:
+    """One fixed-size Bloom filter plus the newest timestamp it holds per device"""
+    __slots__ = ("bits", "size", "hashes", "count", "max_ts")
+
+    def __init__(self, size: int, hashes: int):
+        self.bits = bytearray((size + 7) // 8)
+        self.size = size
+        self.hashes = hashes
+        self.count = 0
+        self.max_ts: Dict[str, int] = {}
+
+    def _positions(self, key: bytes):
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key: bytes, device_id: str, ts: int):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+        if ts > self.max_ts.get(device_id, ts - 1):
+            self.max_ts[device_id] = ts
+
+    def __contains__(self, key: bytes) -> bool:
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(key))
+
+    def estimated_fp_rate(self) -> float:
+        return (1 - math.exp(-self.hashes * self.count / self.size)) ** self.hashes
+
+
+def _key(device_id: str, ts: int) -> bytes:
+    return f"{device_id}\x00{ts}".encode()
+
+
+class TelemetryFilter:
+    """Seen-set for (device_id, ts) keys of one database"""
+
+    def __init__(
+        self,
+        capacity: int = DEDUP_FILTER_CAPACITY,
+        fp_rate: float = DEDUP_FILTER_FP_RATE,
+        recent_per_device: int = DEDUP_RECENT_PER_DEVICE,
+        max_devices: int = DEDUP_FILTER_MAX_DEVICES,
+        enabled: bool = DEDUP_FILTER_ENABLED
+    ):
+        self.capacity = capacity
+        self.fp_rate = fp_rate
+        self.recent_per_device = recent_per_device
+        self.max_devices = max_devices
+        self.enabled = enabled
+        self.size, self.hashes = bloom_parameters(capacity, fp_rate)
+        self._lock = threading.Lock()
+        self._reset_counters()
+        self.clear()
+
+    def _reset_counters(self):
+        self.lookups = 0
+        self.skipped = 0  # NEW answers: database lookups avoided
+        self.recent_hits = 0
+        self.possible_hits = 0
+        self.false_positives = 0
+        self.uncovered = 0
+        self.rotations = 0
+        self.rebuilds = 0
+
+    def clear(self):
+        """Forget everything and stop answering until the next rebuild()"""
+        with self._lock:
+            self._engine = None
+            self._loading_engine = None
+            self._current = BloomGeneration(self.size, self.hashes)
+            self._previous: Optional[BloomGeneration] = None
+            self._recent: "OrderedDict[str, Tuple[deque, set]]" = OrderedDict()
+            self._floor: Optional[int] = None  # keys at or below it were not loaded by rebuild()
+            self._horizon: Dict[str, int] = {}  # per device: keys at or below it were forgotten
+
+    def rebuild(self, engine) -> int:
+        """Load the newest `capacity` keys from the database and start answering for that engine"""
+        if not self.enabled:
+            return 0
+        self.clear()
+        with self._lock:
+            # Keys committed while the snapshot loads are recorded directly, so none are lost
+            self._loading_engine = engine
+        with Session(engine) as session:
+            rows = session.exec(
+                select(Telemetry.device_id, Telemetry.ts).order_by(Telemetry.ts.desc()).limit(self.capacity)
+            ).all()
+        with self._lock:
+            for device_id, ts in reversed(rows):
+                self._add(device_id, _to_micros(ts))
+            if len(rows) == self.capacity:
+                # Older rows may exist; ties at the boundary may be missing too
+                self._floor = _to_micros(rows[-1].ts)
+            self._engine = engine
+            self._loading_engine = None
+            self.rebuilds += 1
+        logger.info(f"Telemetry dedup filter rebuilt from {len(rows)} rows")
+        return len(rows)
+
+    def covers(self, session: Session) -> bool:
+        return self._engine is not None and session.get_bind() is self._engine
+
+    def lookup(self, session: Session, device_id: str, ts: datetime) -> str:
+        """SEEN, NEW, MAYBE or UNKNOWN for a key (see module docstring)"""
+        if not self.covers(session):
+            return UNKNOWN
+        micros = _to_micros(ts)
+        with self._lock:
+            self.lookups += 1
+            recent = self._recent.get(device_id)
+            if recent is not None and micros in recent[1]:
+                self.recent_hits += 1
+                return SEEN
+            if (self._floor is not None and micros <= self._floor) or micros <= self._horizon.get(device_id, -1):
+                self.uncovered += 1
+                return UNKNOWN
+            key = _key(device_id, micros)
+            if key in self._current or (self._previous is not None and key in self._previous):
+                self.possible_hits += 1
+                return MAYBE
+            self.skipped += 1
+            return NEW
+
+    def confirm(self, found: bool):
+        """Report the database result for a MAYBE answer"""
+        if not found:
+            with self._lock:
+                self.false_positives += 1
+
+    def record(self, session: Session, keys: Iterable[Tuple[str, datetime]]):
+        """Remember keys committed through `session` (ignored for other databases)"""
+        bind = session.get_bind()
+        if bind is not self._engine and bind is not self._loading_engine:
+            return
+        with self._lock:
+            for device_id, ts in keys:
+                self._add(device_id, _to_micros(ts))
+
+    def _add(self, device_id: str, micros: int):
+        recent = self._recent.get(device_id)
+        if recent is None:
+            recent = self._recent[device_id] = (deque(), set())
+            while len(self._recent) > self.max_devices:
+                self._recent.popitem(last=False)
+        else:
+            self._recent.move_to_end(device_id)
+        order, members = recent
+        if micros in members:
+            return
+        order.append(micros)
+        members.add(micros)
+        if len(order) > self.recent_per_device:
+            members.discard(order.popleft())
+
+        if self._current.count >= self.capacity:
+            self._rotate()
+        self._current.add(_key(device_id, micros), device_id, micros)
+
+    def _rotate(self):
+        """Drop the older generation; its keys fall behind the per-device horizon"""
+        if self._previous is not None:
+            for device_id, max_ts in self._previous.max_ts.items():
+                if max_ts > self._horizon.get(device_id, -1):
+                    self._horizon[device_id] = max_ts
+        self._previous = self._current
+        self._current = BloomGeneration(self.size, self.hashes)
+        self.rotations += 1
+
+    def memory_bytes(self) -> int:
+        """Approximate memory held by the filter"""
+        with self._lock:
+            generations = [g for g in (self._current, self._previous) if g is not None]
+            total = sum(len(g.bits) + sys.getsizeof(g.max_ts) for g in generations)
+            total += sys.getsizeof(self._recent) + sys.getsizeof(self._horizon)
+            for order, members in self._recent.values():
+                total += sys.getsizeof(order) + sys.getsizeof(members) + 2 * 32 * len(order)
+            return total
+
+    def stats(self) -> dict:
+        with self._lock:
+            estimated = self._current.estimated_fp_rate()
+            if self._previous is not None:
+                estimated = 1 - (1 - estimated) * (1 - self._previous.estimated_fp_rate())
+            absent = self.skipped + self.false_positives
+            counters = {
+                "enabled": self.enabled,
+                "ready": self._engine is not None,
+                "capacity": self.capacity,
+                "bits": self.size,
+                "hashes": self.hashes,
+                "current_generation_keys": self._current.count,
+                "rotations": self.rotations,
+                "rebuilds": self.rebuilds,
+                "devices": len(self._recent),
+                "lookups": self.lookups,
+                "skipped_lookups": self.skipped,
+                "recent_hits": self.recent_hits,
+                "possible_hits": self.possible_hits,
+                "uncovered": self.uncovered,
+                "false_positives": self.false_positives,
+                "target_fp_rate": self.fp_rate,
+                "estimated_fp_rate": round(estimated, 6),
+                # Share of keys absent from the database that the filter could not rule out
+                "observed_fp_rate": round(self.false_positives / absent, 6) if absent else 0.0
+            }
+        counters["memory_bytes"] = self.memory_bytes()
+        return counters
+
+
+telemetry_filter = TelemetryFilter()
@@ -0,0 +1,199 @@
+"""
+Background alert enrichment
+Alerts are stored immediately with fallback text; a bounded pool of asyncio
+workers asks OpenAI for short_message/explanation/recommended_action afterwards,
+updates the alert row and broadcasts an "alert_updated" WebSocket message.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from sqlmodel import Session
+
+from backend import openai_client
+from backend.database import engine as default_engine
+from backend.models import Alert
+from backend.utils import build_alert_message
+
+logger = logging.getLogger(__name__)
+
+# Queue configuration
+ENRICHMENT_QUEUE_DEPTH = int(os.getenv("ENRICHMENT_QUEUE_DEPTH", "100"))
+ENRICHMENT_CONCURRENCY = int(os.getenv("ENRICHMENT_CONCURRENCY", "2"))
+ENRICHMENT_TIMEOUT_SECONDS = float(os.getenv("ENRICHMENT_TIMEOUT_SECONDS", "30"))
+# What to do when the queue is full:
+# - drop_newest: reject the incoming alert (it keeps its fallback text)
+# - drop_oldest: discard the longest-waiting job to make room
+ENRICHMENT_DROP_POLICY = os.getenv("ENRICHMENT_DROP_POLICY", "drop_newest")
+DROP_POLICIES = ("drop_newest", "drop_oldest")
+
+# Alert fields the model output is allowed to overwrite
+ENRICHED_FIELDS = ("short_message", "explanation", "recommended_action", "confidence")
+
+
+@dataclass
+class EnrichmentJob:
+    """One alert waiting for OpenAI text"""
+    alert_id: int
+    prompt: Dict[str, Any]  # keyword arguments for call_openai
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+class AlertEnrichmentQueue:
+    """Bounded asyncio work queue that enriches alerts off the request path"""
+
+    def __init__(
+        self,
+        engine=None,
+        enrich_fn: Optional[Callable[..., Optional[Dict[str, Any]]]] = None,
+        queue_depth: int = ENRICHMENT_QUEUE_DEPTH,
+        concurrency: int = ENRICHMENT_CONCURRENCY,
+        drop_policy: str = ENRICHMENT_DROP_POLICY,
+        timeout_seconds: float = ENRICHMENT_TIMEOUT_SECONDS
+    ):
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"drop_policy must be one of {DROP_POLICIES}, got {drop_policy!r}")
+        self.engine = engine if engine is not None else default_engine
+        # None means "call_openai via the configured client", resolved at call time
+        self.enrich_fn = enrich_fn
+        self.queue_depth = queue_depth
+        self.concurrency = max(1, concurrency)
+        self.drop_policy = drop_policy
+        self.timeout_seconds = timeout_seconds
+
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_depth)
+        self._workers: List[asyncio.Task] = []
+        self._broadcast: Optional[Callable[[dict], Awaitable[None]]] = None
+
+        self.submitted = 0
+        self.dropped = 0
+        self.completed = 0
+        self.failed = 0
+        self.in_flight = 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers)
+
+    @property
+    def enabled(self) -> bool:
+        """Jobs are only accepted while workers run and a model is reachable"""
+        return self.running and (self.enrich_fn is not None or openai_client.is_configured())
+
+    def start(self, broadcast: Optional[Callable[[dict], Awaitable[None]]] = None):
+        """Start worker tasks (call from the running event loop, e.g. lifespan)"""
+        if self.running:
+            return
+        self._broadcast = broadcast
+        # A fresh queue per start: asyncio queues bind to the loop that first waits on them
+        self._queue = asyncio.Queue(maxsize=self.queue_depth)
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"alert-enrichment-{i}")
+            for i in range(self.concurrency)
+        ]
+
+    async def stop(self):
+        """Cancel worker tasks; queued jobs are discarded (alerts keep fallback text)"""
+        workers, self._workers = self._workers, []
+        for task in workers:
+            task.cancel()
+        for task in workers:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    def submit(self, alert_id: int, prompt: Dict[str, Any]) -> bool:
+        """
+        Enqueue an alert for enrichment without waiting.
+        Returns False if enrichment is disabled or the job was dropped.
+        """
+        if not self.enabled:
+            return False
+
+        job = EnrichmentJob(alert_id=alert_id, prompt=prompt)
+        if self._queue.full():
+            self.dropped += 1
+            if self.drop_policy == "drop_newest":
+                logger.warning(f"Enrichment queue full, alert {alert_id} keeps fallback text")
+                return False
+            stale = self._queue.get_nowait()
+            logger.warning(f"Enrichment queue full, dropped oldest job for alert {stale.alert_id}")
+
+        self._queue.put_nowait(job)
+        self.submitted += 1
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "queued": self._queue.qsize(),
+            "queue_depth": self.queue_depth,
+            "concurrency": self.concurrency,
+            "drop_policy": self.drop_policy,
+            "in_flight": self.in_flight,
+            "submitted": self.submitted,
+            "dropped": self.dropped,
+            "completed": self.completed,
+            "failed": self.failed
+        }
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            self.in_flight += 1
+            try:
+                await self._process(job)
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Enrichment failed for alert {job.alert_id}: {e}")
+            finally:
+                self.in_flight -= 1
+                self._queue.task_done()
+
+    async def _process(self, job: EnrichmentJob):
+        # The OpenAI client is synchronous, so run it off the event loop
+        result = await asyncio.wait_for(
+            asyncio.to_thread(self._call_model, job.prompt),
+            timeout=self.timeout_seconds
+        )
+        if not result:
+            self.failed += 1
+            return
+
+        message = await asyncio.to_thread(self._apply, job.alert_id, result)
+        self.completed += 1
+        if message and self._broadcast:
+            await self._broadcast(message)
+
+    def _call_model(self, prompt: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        enrich_fn = self.enrich_fn or openai_client.call_openai
+        return enrich_fn(**prompt)
+
+    def _apply(self, alert_id: int, result: Dict[str, Any]) -> Optional[dict]:
+        """Write model text onto the stored alert and build the update message"""
+        with Session(self.engine) as session:
+            alert = session.get(Alert, alert_id)
+            if not alert:
+                return None
+
+            # Severity stays as decided by MQ3 logic; only the text is replaced
+            for name in ENRICHED_FIELDS:
+                value = result.get(name)
+                if value:
+                    setattr(alert, name, str(value))
+            session.add(alert)
+            session.commit()
+            session.refresh(alert)
+
+            message = build_alert_message(alert, event_type="alert_updated")
+            message["data"].update({
+                "explanation": alert.explanation,
+                "recommended_action": alert.recommended_action,
+                "confidence": alert.confidence
+            })
+            return message
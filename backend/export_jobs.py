@@ -0,0 +1,341 @@
+"""
+Background export jobs
+POST /api/v1/exports records a job in `export_jobs` and hands it to a small
+thread pool (EXPORT_WORKERS). The worker pages through the table with the
+same keyset reader as the streaming exports and writes the file to
+EXPORT_DIR; rows written and a heartbeat are saved every
+EXPORT_PROGRESS_INTERVAL_SECONDS. The finished file is served with HTTP Range
+support, so interrupted downloads can resume.
+
+Jobs must not get in the way of ingest on SQLite: every page is read in its
+own short transaction (EXPORT_JOB_BATCH_SIZE rows), the worker pauses
+EXPORT_JOB_PAUSE_MS between pages, and progress is the only thing it writes.
+
+Any worker process picks up queued jobs at startup; a running job whose
+heartbeat is older than EXPORT_STALE_SECONDS (its worker died) is queued
+again. Claiming is a conditional UPDATE, so each job runs once. Requeueing
+stale jobs and purging jobs past EXPORT_RETENTION_HOURS (with their files)
+also run every EXPORT_MAINTENANCE_INTERVAL_SECONDS while the server is up.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, update
+from sqlmodel import Session, select
+
+from backend import exports
+from backend.database import engine as default_engine
+from backend.models import ExportJob
+from backend.partitions import PARTITIONED, storage_partitions
+from backend.utils import parse_device_timestamp
+
+logger = logging.getLogger(__name__)
+
+EXPORT_DIR = os.getenv("EXPORT_DIR", "./exports")
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", "1"))  # SQLite has one writer; more workers rarely help
+EXPORT_JOB_BATCH_SIZE = int(os.getenv("EXPORT_JOB_BATCH_SIZE", "2000"))  # rows per read transaction
+EXPORT_JOB_PAUSE_MS = int(os.getenv("EXPORT_JOB_PAUSE_MS", "20"))  # pause between pages
+EXPORT_PROGRESS_INTERVAL_SECONDS = float(os.getenv("EXPORT_PROGRESS_INTERVAL_SECONDS", "1"))
+EXPORT_STALE_SECONDS = int(os.getenv("EXPORT_STALE_SECONDS", "300"))
+EXPORT_RETENTION_HOURS = float(os.getenv("EXPORT_RETENTION_HOURS", "24"))  # finished jobs and files; 0 keeps them
+EXPORT_MAINTENANCE_INTERVAL_SECONDS = float(os.getenv("EXPORT_MAINTENANCE_INTERVAL_SECONDS", "300"))
+
+
+class ExportCancelled(Exception):
+    """Raised inside a job when the runner shuts down"""
+
+
+def job_filename(job: ExportJob) -> str:
+    _, extension = exports.FORMATS[job.format]
+    gz = ".gz" if job.format == "csv" and json.loads(job.params_json).get("gzip") else ""
+    return f"{job.kind}_{job.created_at:%Y-%m-%d}_{job.id[:8]}.{extension}{gz}"
+
+
+class ExportJobRunner:
+    """Queue of export jobs run on a thread pool"""
+
+    def __init__(
+        self,
+        engine=None,
+        directory: str = EXPORT_DIR,
+        workers: int = EXPORT_WORKERS,
+        batch_size: int = EXPORT_JOB_BATCH_SIZE,
+        pause_ms: int = EXPORT_JOB_PAUSE_MS,
+        progress_seconds: float = EXPORT_PROGRESS_INTERVAL_SECONDS,
+        stale_seconds: int = EXPORT_STALE_SECONDS,
+        retention_hours: float = EXPORT_RETENTION_HOURS,
+        maintenance_seconds: float = EXPORT_MAINTENANCE_INTERVAL_SECONDS
+    ):
+        self.engine = engine if engine is not None else default_engine
+        self.directory = directory
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.pause_seconds = pause_ms / 1000
+        self.progress_seconds = progress_seconds
+        self.stale_seconds = stale_seconds
+        self.retention_hours = retention_hours
+        self.maintenance_seconds = maintenance_seconds
+        self._maintenance_task: Optional[asyncio.Task] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        self._stopping = threading.Event()
+
+        self.submitted = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rows_exported = 0
+        self.requeued = 0
+        self.purged = 0
+
+    # --- queue ------------------------------------------------------------
+
+    def create(self, session: Session, kind: str, fmt: str, params: dict, user_id: Optional[int] = None) -> ExportJob:
+        """
+        Validate and queue a job. Raises ValueError for bad columns/timestamps and
+        RuntimeError when the format needs pyarrow and it is missing.
+        """
+        if fmt != "csv" and exports.pa is None:
+            raise RuntimeError(f"{fmt} export requires the pyarrow package")
+        model, _, default = exports.EXPORTABLE[kind]
+        columns = params.get("columns")
+        exports.resolve_columns(model, ",".join(columns) if columns else None, default)
+        for key in ("from_time", "to_time"):
+            if params.get(key):
+                parse_device_timestamp(params[key])
+
+        job = ExportJob(id=uuid.uuid4().hex, kind=kind, format=fmt, params_json=json.dumps(params), created_by=user_id)
+        session.add(job)
+        session.commit()
+        session.refresh(job)
+        self.submit(job.id)
+        return job
+
+    def submit(self, job_id: str):
+        with self._executor_lock:
+            if self._executor is None:
+                self._stopping.clear()
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="export-job")
+            self._executor.submit(self.run, job_id)
+            self.submitted += 1
+
+    def start(self):
+        """Purge expired jobs, requeue jobs of dead workers and submit everything queued"""
+        self.purge_expired()
+        self.requeue_stale()
+        with Session(self.engine) as session:
+            queued = session.exec(select(ExportJob.id).where(ExportJob.status == "queued")).all()
+        for job_id in queued:
+            self.submit(job_id)
+        if queued:
+            logger.info(f"Export jobs: {len(queued)} queued job(s) resumed")
+
+    def requeue_stale(self) -> List[str]:
+        """Queue running jobs whose heartbeat is older than stale_seconds (their worker died); returns their ids"""
+        stale = datetime.utcnow() - timedelta(seconds=self.stale_seconds)
+        with Session(self.engine) as session:
+            ids = session.exec(
+                select(ExportJob.id).where(ExportJob.status == "running", ExportJob.updated_at < stale)
+            ).all()
+            if ids:
+                session.execute(
+                    update(ExportJob)
+                    .where(ExportJob.id.in_(ids), ExportJob.status == "running", ExportJob.updated_at < stale)
+                    .values(status="queued", rows_written=0, bytes_written=0)
+                )
+                session.commit()
+        self.requeued += len(ids)
+        return list(ids)
+
+    def maintain(self):
+        """Periodic pass: purge expired jobs and files, requeue and resubmit jobs of dead workers"""
+        self.purge_expired()
+        requeued = self.requeue_stale()
+        for job_id in requeued:
+            self.submit(job_id)
+        if requeued:
+            logger.info(f"Export jobs: {len(requeued)} stale job(s) queued again")
+
+    def start_maintenance(self):
+        """Start the periodic maintenance task (call from the running event loop, e.g. lifespan)"""
+        if self._maintenance_task is not None or self.maintenance_seconds <= 0:
+            return
+        self._maintenance_task = asyncio.create_task(self._maintenance_loop(), name="export-jobs-maintenance")
+
+    async def _maintenance_loop(self):
+        while True:
+            await asyncio.sleep(self.maintenance_seconds)
+            try:
+                await run_in_threadpool(self.maintain)
+            except Exception as e:
+                logger.error(f"Export job maintenance failed: {e}")
+
+    async def stop_maintenance(self):
+        task, self._maintenance_task = self._maintenance_task, None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    def stop(self):
+        """Interrupt running jobs (they are queued again for the next start) and stop the pool"""
+        self._stopping.set()
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    # --- running ------------------------------------------------------------
+
+    def _claim(self, job_id: str) -> bool:
+        with Session(self.engine) as session:
+            claimed = session.execute(
+                update(ExportJob)
+                .where(ExportJob.id == job_id, ExportJob.status == "queued")
+                .values(status="running", updated_at=datetime.utcnow())
+            ).rowcount
+            session.commit()
+        return claimed == 1
+
+    def _update(self, job_id: str, **values):
+        with Session(self.engine) as session:
+            session.execute(update(ExportJob).where(ExportJob.id == job_id).values(updated_at=datetime.utcnow(), **values))
+            session.commit()
+
+    def run(self, job_id: str) -> bool:
+        """Run one queued job to completion; False if another worker has it or it failed"""
+        if self._stopping.is_set() or not self._claim(job_id):
+            return False
+        with Session(self.engine) as session:
+            job = session.get(ExportJob, job_id)
+        self.running += 1
+        try:
+            self._export(job)
+            return True
+        except ExportCancelled:
+            self._update(job_id, status="queued", rows_written=0, bytes_written=0)
+            logger.info(f"Export job {job_id} interrupted by shutdown; queued again")
+        except Exception as e:
+            self.failed += 1
+            self._update(job_id, status="failed", error=str(e), finished_at=datetime.utcnow())
+            logger.error(f"Export job {job_id} failed: {e}")
+        finally:
+            self.running -= 1
+        return False
+
+    def _export(self, job: ExportJob):
+        params = json.loads(job.params_json)
+        model, _, default = exports.EXPORTABLE[job.kind]
+        columns = params.get("columns")
+        names = exports.resolve_columns(model, ",".join(columns) if columns else None, default)
+        from_dt = parse_device_timestamp(params["from_time"]) if params.get("from_time") else None
+        to_dt = parse_device_timestamp(params["to_time"]) if params.get("to_time") else None
+        filters = exports.export_filters(
+            model, from_dt, to_dt, params.get("device_id"),
+            severity=params.get("severity"), lat_only=params.get("lat_only", False)
+        )
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, job_filename(job))
+        partial = path + ".part"
+        with Session(self.engine) as session:
+            total = self._count(session, model, filters, from_dt, to_dt)
+            limit = params.get("limit")
+            self._update(job.id, total_rows=min(total, limit) if limit else total)
+            pages = exports.iter_pages(
+                session, model, names, filters, from_dt, to_dt,
+                batch_size=self.batch_size, limit=limit, descending=params.get("order") == "desc"
+            )
+            progress = {"rows": 0, "bytes": 0, "saved": time.monotonic()}
+            try:
+                with open(partial, "wb") as out:
+                    for chunk in exports.encode(self._paced(session, pages, job.id, progress), model, names,
+                                                job.format, compress=bool(params.get("gzip"))):
+                        out.write(chunk)
+                        progress["bytes"] += len(chunk)
+            except BaseException:
+                os.remove(partial)
+                raise
+        os.replace(partial, path)
+        self._update(
+            job.id, status="done", path=path, rows_written=progress["rows"],
+            bytes_written=progress["bytes"], finished_at=datetime.utcnow()
+        )
+        self.completed += 1
+        self.rows_exported += progress["rows"]
+        logger.info(f"Export job {job.id}: {progress['rows']} {job.kind} rows, {progress['bytes']} bytes")
+
+    def _paced(self, session: Session, pages, job_id: str, progress: dict):
+        """Pass pages through, ending the read transaction and pausing after each one"""
+        try:
+            for page in pages:
+                # Release the read snapshot (and SQLite's shared lock outside WAL) before encoding
+                session.rollback()
+                yield page
+                progress["rows"] += len(page)
+                if self._stopping.is_set():
+                    raise ExportCancelled()
+                if time.monotonic() - progress["saved"] >= self.progress_seconds:
+                    self._update(job_id, rows_written=progress["rows"], bytes_written=progress["bytes"])
+                    progress["saved"] = time.monotonic()
+                if self.pause_seconds:
+                    time.sleep(self.pause_seconds)
+        finally:
+            pages.close()
+
+    def _count(self, session: Session, model, filters: list, from_dt, to_dt) -> int:
+        statement = select(func.count()).select_from(model).where(*filters)
+        total = session.exec(statement).one()
+        if any(model is partitioned for partitioned, _ in PARTITIONED):
+            for counts in storage_partitions.read_overlapping(session, statement, from_dt, to_dt):
+                total += counts[0]
+        session.rollback()
+        return total
+
+    def purge_expired(self) -> int:
+        """Delete finished jobs older than EXPORT_RETENTION_HOURS and their files"""
+        if self.retention_hours <= 0:
+            return 0
+        cutoff = datetime.utcnow() - timedelta(hours=self.retention_hours)
+        with Session(self.engine) as session:
+            expired = session.exec(
+                select(ExportJob).where(ExportJob.status.in_(["done", "failed"]), ExportJob.finished_at < cutoff)
+            ).all()
+            for job in expired:
+                if job.path:
+                    try:
+                        os.remove(job.path)
+                    except FileNotFoundError:
+                        pass
+                session.delete(job)
+            session.commit()
+        self.purged += len(expired)
+        return len(expired)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "submitted": self.submitted,
+            "running": self.running,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rows_exported": self.rows_exported,
+            "requeued": self.requeued,
+            "purged": self.purged
+        }
+
+
+export_jobs = ExportJobRunner()
@@ -0,0 +1,293 @@
+"""
+Streaming exports of alerts and telemetry
+Rows are read in keyset pages of EXPORT_BATCH_SIZE ordered by (ts, id) and
+encoded page by page, so memory stays bounded by one page whatever the range.
+Archived partitions overlapping the range are read first (oldest first), then
+the main table.
+
+  - "csv": written page by page, optionally as one continuous gzip stream
+Columnar formats need the optional pyarrow package:
+  - "parquet": one row group per page
+  - "arrow": Arrow IPC stream, one record batch per page
+"""
+
+import csv
+import io
+import os
+import zlib
+from datetime import datetime
+from typing import Iterator, List, Optional, Sequence
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Boolean, DateTime, Float, Integer, and_, tuple_
+from sqlmodel import Session, select
+
+from backend.models import Alert, Telemetry, TelemetryDuplicate
+from backend.partitions import PARTITIONED, storage_partitions
+from backend.utils import parse_device_timestamp
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "10000"))  # rows per page / row group
+
+# Exportable tables: name -> (model, time column, default columns)
+EXPORTABLE = {
+    "alerts": (Alert, "ts", ["id", "device_id", "ts", "severity", "mq3", "mq135", "lat", "lon", "short_message"]),
+    "telemetry": (Telemetry, "ts", ["id", "device_id", "ts", "mq3", "mq135", "temp_c", "humidity_pct", "lat", "lon", "alt", "received_at"]),
+    "duplicates": (TelemetryDuplicate, "timestamp", ["id", "original_telemetry_id", "device_id", "timestamp", "received_at", "is_merged", "is_ignored", "payload_json"]),
+}
+
+# CSV header names that differ from the column name
+CSV_HEADERS = {"ts": "timestamp"}
+
+# format -> (media type, file extension)
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrow"),
+}
+
+
+def resolve_columns(model, columns: Optional[str], default: Sequence[str]) -> List[str]:
+    """Comma-separated column projection; raises ValueError on unknown columns"""
+    if not columns:
+        return list(default)
+    names = [name.strip() for name in columns.split(",") if name.strip()]
+    unknown = [name for name in names if name not in model.__table__.c]
+    if unknown or not names:
+        raise ValueError(f"Unknown columns: {', '.join(unknown) or columns!r}")
+    return names
+
+
+def parse_range(from_time: Optional[str], to_time: Optional[str]):
+    """(from_dt, to_dt) as naive UTC; HTTP 400 on a malformed timestamp"""
+    try:
+        return (
+            parse_device_timestamp(from_time) if from_time else None,
+            parse_device_timestamp(to_time) if to_time else None
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid timestamp format: {e}")
+
+
+def _time_column(model) -> str:
+    return next(time_column for exported, time_column, _ in EXPORTABLE.values() if exported is model)
+
+
+def export_filters(model, from_dt: Optional[datetime] = None, to_dt: Optional[datetime] = None,
+                   device_id: Optional[str] = None, severity: Optional[str] = None, lat_only: bool = False) -> list:
+    """WHERE clauses for the time-range / device filters (severity and lat_only apply to alerts)"""
+    table = model.__table__.c
+    ts = table[_time_column(model)]
+    filters = []
+    if from_dt is not None:
+        filters.append(ts >= from_dt)
+    if to_dt is not None:
+        filters.append(ts <= to_dt)
+    if device_id:
+        filters.append(table.device_id == device_id)
+    if severity:
+        filters.append(table.severity == severity)
+    if lat_only:
+        filters.append(and_(table.lat.isnot(None), table.lon.isnot(None), table.lat != 0.0, table.lon != 0.0))
+    return filters
+
+
+def _page_source(session: Session, model, columns: List[str], filters: list, batch_size: int,
+                 descending: bool) -> Iterator[list]:
+    table = model.__table__.c
+    time_column = _time_column(model)
+    # Keyset columns are only added when not already projected
+    extra = [name for name in (time_column, "id") if name not in columns]
+    selected = list(columns) + extra
+    ts_index, id_index = selected.index(time_column), selected.index("id")
+    statement = select(*(table[name] for name in selected)).where(*filters)
+    ts = table[time_column]
+    order = (ts.desc(), table.id.desc()) if descending else (ts, table.id)
+    position = None
+    while True:
+        page = statement
+        if position is not None:
+            key = tuple_(ts, table.id)
+            after = tuple_(*position, types=[ts.type, table.id.type])
+            page = page.where(key < after if descending else key > after)
+        rows = session.execute(page.order_by(*order).limit(batch_size)).all()
+        if not rows:
+            return
+        position = (rows[-1][ts_index], rows[-1][id_index])
+        yield [row[:len(columns)] for row in rows] if extra else rows
+        if len(rows) < batch_size:
+            return
+
+
+def _sources(session: Session, model, columns: List[str], filters: list, from_dt: Optional[datetime],
+             to_dt: Optional[datetime], batch_size: int, descending: bool) -> Iterator[list]:
+    partitioned = any(model is partitioned for partitioned, _ in PARTITIONED)
+    partitions = storage_partitions.overlapping(session, from_dt, to_dt) if partitioned else []  # newest first
+    if descending:
+        yield from _page_source(session, model, columns, filters, batch_size, descending)
+    for partition in (partitions if descending else reversed(partitions)):
+        with Session(storage_partitions.engine_for(partition.path)) as part:
+            yield from _page_source(part, model, columns, filters, batch_size, descending)
+    if not descending:
+        yield from _page_source(session, model, columns, filters, batch_size, descending)
+
+
+def iter_pages(session: Session, model, columns: List[str], filters: list,
+               from_dt: Optional[datetime] = None, to_dt: Optional[datetime] = None,
+               batch_size: Optional[int] = None, limit: Optional[int] = None,
+               descending: bool = False) -> Iterator[list]:
+    """
+    Pages of projected row tuples ordered by (time, id), oldest first unless `descending`
+    Archived partitions come before the main table (after it when descending). Stops after `limit` rows.
+    """
+    batch_size = batch_size or EXPORT_BATCH_SIZE
+    if limit is not None:
+        batch_size = min(batch_size, limit)
+    remaining = limit
+    for page in _sources(session, model, columns, filters, from_dt, to_dt, batch_size, descending):
+        if remaining is not None:
+            page = page[:remaining]
+            remaining -= len(page)
+        yield page
+        if remaining == 0:
+            return
+
+
+def encode_csv(pages: Iterator[list], model, columns: List[str], compress: bool = False) -> Iterator[bytes]:
+    """Encode pages as CSV (header first), yielding one chunk per page; gzip-compressed if `compress`"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None  # wbits 31: gzip container
+    table = model.__table__.c
+    # csv writes None as an empty field; only timestamps need converting (to ISO 8601)
+    timestamps = [i for i, name in enumerate(columns) if isinstance(table[name].type, DateTime)]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def take() -> bytes:
+        data = buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+        return compressor.compress(data) if compressor else data
+
+    writer.writerow([CSV_HEADERS.get(name, name) for name in columns])
+    chunk = take()
+    for page in pages:
+        if timestamps:
+            page = [list(row) for row in page]
+            for row in page:
+                for i in timestamps:
+                    if row[i] is not None:
+                        row[i] = row[i].isoformat()
+        writer.writerows(page)
+        chunk += take()
+        if chunk:
+            yield chunk
+            chunk = b""
+    if compressor:
+        chunk += compressor.flush()
+    if chunk:
+        yield chunk
+
+
+def _arrow_type(column):
+    if isinstance(column.type, Boolean):
+        return pa.bool_()
+    if isinstance(column.type, Integer):
+        return pa.int64()
+    if isinstance(column.type, Float):
+        return pa.float64()
+    if isinstance(column.type, DateTime):
+        return pa.timestamp("us")
+    return pa.string()
+
+
+def arrow_schema(model, columns: List[str]):
+    table = model.__table__.c
+    return pa.schema([pa.field(name, _arrow_type(table[name]), nullable=table[name].nullable) for name in columns])
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that hands written bytes back to the caller"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def encode_arrow(pages: Iterator[list], model, columns: List[str], fmt: str) -> Iterator[bytes]:
+    """Encode pages as Parquet row groups or Arrow IPC record batches, yielding bytes as they are produced"""
+    if pa is None:
+        raise RuntimeError("pyarrow is not installed")
+    schema = arrow_schema(model, columns)
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema) if fmt == "parquet" else pa.ipc.new_stream(sink, schema)
+    try:
+        for page in pages:
+            batch = pa.RecordBatch.from_arrays(
+                [pa.array([row[i] for row in page], type=field.type) for i, field in enumerate(schema)],
+                schema=schema
+            )
+            if fmt == "parquet":
+                writer.write_table(pa.Table.from_batches([batch]))
+            else:
+                writer.write_batch(batch)
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def encode(pages: Iterator[list], model, columns: List[str], fmt: str, compress: bool = False) -> Iterator[bytes]:
+    """Bytes of an export in `fmt` (compress only applies to CSV; Parquet/Arrow are compressed already)"""
+    if fmt == "csv":
+        return encode_csv(pages, model, columns, compress=compress)
+    return encode_arrow(pages, model, columns, fmt)
+
+
+def export_response(session: Session, name: str, fmt: str, columns: Optional[str], filters: list,
+                    from_dt: Optional[datetime], to_dt: Optional[datetime], limit: Optional[int] = None,
+                    descending: bool = False, compress: bool = False,
+                    filename_prefix: Optional[str] = None) -> StreamingResponse:
+    """
+    StreamingResponse with a CSV / Parquet / Arrow export of EXPORTABLE[name]
+    compress=True gzips CSV with Content-Encoding: gzip (columnar formats are already compressed)
+    """
+    if fmt != "csv" and pa is None:
+        raise HTTPException(status_code=501, detail=f"{fmt} export requires the pyarrow package")
+    model, _, default = EXPORTABLE[name]
+    try:
+        names = resolve_columns(model, columns, default)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    pages = iter_pages(session, model, names, filters, from_dt, to_dt, limit=limit, descending=descending)
+    media_type, extension = FORMATS[fmt]
+    filename = f"{filename_prefix or name}_{datetime.utcnow().strftime('%Y-%m-%d')}.{extension}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    if fmt == "csv" and compress:
+        headers["Content-Encoding"] = "gzip"
+    # Sync generator: Starlette iterates it in the threadpool, off the event loop
+    return StreamingResponse(encode(pages, model, names, fmt, compress), media_type=media_type, headers=headers)
@@ -0,0 +1,284 @@
+"""
+Per-device ring buffer of recent telemetry
+Keeps the last HISTORY_BUFFER_SIZE readings of each device in compact typed
+arrays (one per sensor channel) so LLM context and trend logic cost no
+database I/O. A device is warmed from the database on first access and
+appended to after every successful telemetry insert; readings appended while
+a device is warming are held and merged into the loaded ring.
+
+The rings are process-local: with a shared state backend (several workers)
+each worker would only see its own inserts, so the buffer is off by default
+there and every read goes to the database.
+"""
+
+import os
+import math
+import threading
+from array import array
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlmodel import Session, select
+
+from backend.models import Telemetry
+from backend.shared_state import SHARED_STATE_BACKEND
+
+HISTORY_BUFFER_ENABLED = os.getenv(
+    "HISTORY_BUFFER_ENABLED", "true" if SHARED_STATE_BACKEND == "memory" else "false"
+).lower() == "true"
+HISTORY_BUFFER_SIZE = int(os.getenv("HISTORY_BUFFER_SIZE", "32"))  # readings kept per device
+HISTORY_BUFFER_MAX_DEVICES = int(os.getenv("HISTORY_BUFFER_MAX_DEVICES", "10000"))
+
+_EPOCH = datetime(1970, 1, 1)
+_NAN = float("nan")
+
+
+def _to_micros(ts: datetime) -> int:
+    delta = ts - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def _from_micros(value: int) -> datetime:
+    return _EPOCH + timedelta(microseconds=value)
+
+
+def _opt(value: Optional[float]) -> float:
+    return _NAN if value is None else float(value)
+
+
+def _unopt(value: float) -> Optional[float]:
+    return None if math.isnan(value) else value
+
+
+def load_recent_rows(session: Session, device_id: str, limit: int) -> List[Telemetry]:
+    """Last N telemetry rows for a device from the database (ordered oldest→newest)"""
+    statement = (
+        select(Telemetry)
+        .where(Telemetry.device_id == device_id)
+        .order_by(Telemetry.ts.desc())
+        .limit(limit)
+    )
+    return list(reversed(session.exec(statement).all()))
+
+
+class DeviceRing:
+    """Fixed-size ring for one device, ordered by reading timestamp"""
+    __slots__ = ("capacity", "count", "head", "ts", "mq3", "mq135", "temp_c", "humidity_pct", "lat", "lon")
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.count = 0
+        self.head = 0  # next slot to write
+        self.ts = array("q", [0] * capacity)  # microseconds since epoch (UTC)
+        self.mq3 = array("i", [0] * capacity)
+        self.mq135 = array("i", [0] * capacity)
+        # Optional channels use NaN for "missing"
+        self.temp_c = array("d", [_NAN] * capacity)
+        self.humidity_pct = array("d", [_NAN] * capacity)
+        self.lat = array("d", [_NAN] * capacity)
+        self.lon = array("d", [_NAN] * capacity)
+
+    def _slot(self, position: int) -> int:
+        """Physical index of the position-th oldest reading"""
+        return (self.head - self.count + position) % self.capacity
+
+    def newest_ts(self) -> Optional[int]:
+        return self.ts[self._slot(self.count - 1)] if self.count else None
+
+    def append(self, ts: int, mq3: int, mq135: int, temp_c: float, humidity_pct: float, lat: float, lon: float):
+        newest = self.newest_ts()
+        if newest is not None and ts <= newest:
+            # Late reading (device clock skew, gateway replay): keep timestamp order
+            self._insert_ordered((ts, mq3, mq135, temp_c, humidity_pct, lat, lon))
+            return
+        self._write(self.head, (ts, mq3, mq135, temp_c, humidity_pct, lat, lon))
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def _write(self, slot: int, values: tuple):
+        (self.ts[slot], self.mq3[slot], self.mq135[slot], self.temp_c[slot],
+         self.humidity_pct[slot], self.lat[slot], self.lon[slot]) = values
+
+    def _read(self, slot: int) -> tuple:
+        return (self.ts[slot], self.mq3[slot], self.mq135[slot], self.temp_c[slot],
+                self.humidity_pct[slot], self.lat[slot], self.lon[slot])
+
+    def _insert_ordered(self, values: tuple):
+        readings = [self._read(self._slot(i)) for i in range(self.count)]
+        if any(r[0] == values[0] for r in readings):
+            return  # Same (device_id, ts) is already buffered
+        if self.count == self.capacity and values[0] < readings[0][0]:
+            return  # Older than everything we keep
+        readings.append(values)
+        readings.sort(key=lambda r: r[0])
+        readings = readings[-self.capacity:]
+        for i, reading in enumerate(readings):
+            self._write(i, reading)
+        self.count = len(readings)
+        self.head = self.count % self.capacity
+
+    def rows(self, device_id: str, limit: int) -> List[dict]:
+        """Last `limit` readings, oldest→newest, in get_recent_history() format"""
+        result = []
+        for position in range(max(0, self.count - limit), self.count):
+            slot = self._slot(position)
+            result.append({
+                "device_id": device_id,
+                "timestamp": _from_micros(self.ts[slot]).isoformat(),
+                "mq3": self.mq3[slot],
+                "mq135": self.mq135[slot],
+                "temp_c": _unopt(self.temp_c[slot]),
+                "humidity_pct": _unopt(self.humidity_pct[slot]),
+                "lat": _unopt(self.lat[slot]),
+                "lon": _unopt(self.lon[slot])
+            })
+        return result
+
+    def nbytes(self) -> int:
+        return sum(
+            channel.buffer_info()[1] * channel.itemsize
+            for channel in (self.ts, self.mq3, self.mq135, self.temp_c, self.humidity_pct, self.lat, self.lon)
+        )
+
+
+class DeviceHistoryBuffer:
+    """Process-local map of device_id → DeviceRing with LRU eviction of idle devices"""
+
+    def __init__(
+        self,
+        capacity: int = HISTORY_BUFFER_SIZE,
+        max_devices: int = HISTORY_BUFFER_MAX_DEVICES,
+        enabled: bool = HISTORY_BUFFER_ENABLED
+    ):
+        self.enabled = enabled
+        self.capacity = capacity
+        self.max_devices = max_devices
+        self._rings: "OrderedDict[str, DeviceRing]" = OrderedDict()
+        # device_id -> readings appended by writers while a recent() call loads that device
+        self._warming: Dict[str, List[List[tuple]]] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.warm_loads = 0
+        self.db_fallbacks = 0
+        self.evictions = 0
+
+    def append(
+        self,
+        device_id: str,
+        ts: datetime,
+        mq3: int,
+        mq135: int,
+        temp_c: Optional[float] = None,
+        humidity_pct: Optional[float] = None,
+        lat: Optional[float] = None,
+        lon: Optional[float] = None
+    ):
+        """
+        Record a committed reading. Devices that were never read are skipped:
+        their first recent() call warms from the database, which already has the row.
+        A device being warmed keeps the reading for the loader, whose snapshot may predate it.
+        """
+        if not self.enabled:
+            return
+        values = (_to_micros(ts), mq3, mq135, _opt(temp_c), _opt(humidity_pct), _opt(lat), _opt(lon))
+        with self._lock:
+            ring = self._rings.get(device_id)
+            if ring is not None:
+                ring.append(*values)
+                return
+            for pending in self._warming.get(device_id, ()):
+                pending.append(values)
+
+    def append_row(self, row: Telemetry):
+        self.append(row.device_id, row.ts, row.mq3, row.mq135, row.temp_c, row.humidity_pct, row.lat, row.lon)
+
+    def recent(self, session: Session, device_id: str, limit: int = 10) -> List[dict]:
+        """Last N readings for a device (oldest→newest), warming from the database if needed"""
+        if not self.enabled or limit > self.capacity:
+            # Buffer off (other workers insert too) or deeper than the ring holds: answer from the database
+            self.db_fallbacks += 1
+            return [_row_to_dict(t) for t in load_recent_rows(session, device_id, limit)]
+
+        with self._lock:
+            ring = self._rings.get(device_id)
+            if ring is not None:
+                self._rings.move_to_end(device_id)
+                self.hits += 1
+                return ring.rows(device_id, limit)
+
+            pending: List[tuple] = []
+            self._warming.setdefault(device_id, []).append(pending)
+
+        try:
+            rows = load_recent_rows(session, device_id, self.capacity)
+        except Exception:
+            with self._lock:
+                self._stop_warming(device_id, pending)
+            raise
+        ring = DeviceRing(self.capacity)
+        for t in rows:
+            ring.append(_to_micros(t.ts), t.mq3, t.mq135, _opt(t.temp_c), _opt(t.humidity_pct), _opt(t.lat), _opt(t.lon))
+
+        with self._lock:
+            self._stop_warming(device_id, pending)
+            # Readings committed after the snapshot; ones it already has are skipped by timestamp
+            for values in pending:
+                ring.append(*values)
+            # Another caller may have warmed the device meanwhile; keep theirs
+            ring = self._rings.setdefault(device_id, ring)
+            self._rings.move_to_end(device_id)
+            self.warm_loads += 1
+            while len(self._rings) > self.max_devices:
+                self._rings.popitem(last=False)
+                self.evictions += 1
+            return ring.rows(device_id, limit)
+
+    def _stop_warming(self, device_id: str, pending: List[tuple]):
+        """Unregister one loader's pending list (caller holds the lock)"""
+        loaders = self._warming[device_id]
+        # By identity: two loaders' lists may be equal
+        loaders[:] = [loader for loader in loaders if loader is not pending]
+        if not loaders:
+            del self._warming[device_id]
+
+    def discard(self, device_id: str):
+        """Forget a device so its next access re-reads the database"""
+        with self._lock:
+            self._rings.pop(device_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._rings.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "devices": len(self._rings),
+                "max_devices": self.max_devices,
+                "capacity_per_device": self.capacity,
+                "readings": sum(ring.count for ring in self._rings.values()),
+                "memory_bytes": sum(ring.nbytes() for ring in self._rings.values()),
+                "hits": self.hits,
+                "warm_loads": self.warm_loads,
+                "db_fallbacks": self.db_fallbacks,
+                "evictions": self.evictions
+            }
+
+
+def _row_to_dict(t: Telemetry) -> dict:
+    return {
+        "device_id": t.device_id,
+        "timestamp": t.ts.isoformat(),
+        "mq3": t.mq3,
+        "mq135": t.mq135,
+        "temp_c": t.temp_c,
+        "humidity_pct": t.humidity_pct,
+        "lat": t.lat,
+        "lon": t.lon
+    }
+
+
+history_buffer = DeviceHistoryBuffer()
@@ -1,4 +1,5 @@
 from sqlmodel import SQLModel, Field, UniqueConstraint
+from sqlalchemy import Index
 from datetime import datetime
 from typing import Optional
 from enum import Enum
@@ -78,6 +79,10 @@ class DeviceSettings(SQLModel, table=True):
 class TelemetryDuplicate(SQLModel, table=True):
     """Duplicate telemetry entries detected by backend"""
     __tablename__ = "telemetry_duplicates"
+    # Covers the pending-duplicates listing: filter on the flags + time range, group without touching the table
+    __table_args__ = (
+        Index("ix_telemetry_duplicates_pending", "is_merged", "is_ignored", "timestamp", "original_telemetry_id", "device_id"),
+    )
     
     id: Optional[int] = Field(default=None, primary_key=True)
     original_telemetry_id: int = Field(foreign_key="telemetry.id", index=True)
@@ -99,4 +104,128 @@ class UserPreferences(SQLModel, table=True):
     show_clusters: bool = Field(default=True)
     notify_on_warning: bool = Field(default=True)
     prefer_offline_map: bool = Field(default=False)  # Prefer offline map tiles even when online
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
\ No newline at end of file
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class LLMExplanationCache(SQLModel, table=True):
+    """Persisted OpenAI alert explanations keyed by quantized sensor state"""
+    __tablename__ = "llm_explanation_cache"
+    
+    cache_key: str = Field(primary_key=True)  # sha256 of severity/bands/trend/model
+    response_json: str  # TEXT field storing the parsed model response
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+
+
+class AlertRollupBase(SQLModel):
+    """Alert counters for one (bucket, device, severity); maintained at alert insert"""
+    bucket_start: datetime = Field(primary_key=True)  # UTC start of the minute/hour/day
+    device_id: str = Field(primary_key=True)
+    severity: str = Field(primary_key=True)
+    count: int = 0  # All alerts
+    gps_count: int = 0  # Alerts with a non-zero GPS fix (what history/replay counts)
+    lat_sum: float = 0.0  # Over gps_count alerts, for centroids
+    lon_sum: float = 0.0
+    mq3_min: int = 0
+    mq3_max: int = 0
+    mq3_sum: int = 0  # mq3 average = mq3_sum / count
+
+
+class AlertRollupMinute(AlertRollupBase, table=True):
+    __tablename__ = "alert_rollup_minute"
+
+
+class AlertRollupHour(AlertRollupBase, table=True):
+    __tablename__ = "alert_rollup_hour"
+
+
+class AlertRollupDay(AlertRollupBase, table=True):
+    __tablename__ = "alert_rollup_day"
+
+
+class LoginRateLimit(SQLModel, table=True):
+    """Sliding-window login counters shared by all workers (RATE_LIMIT_STORE=sqlite)"""
+    __tablename__ = "login_rate_limits"
+    
+    key: str = Field(primary_key=True)  # "ip:<address>" or "account:<email>"
+    window_start: int  # Epoch second the current fixed window began
+    count: int = 0  # Attempts in the current window
+    prev_count: int = 0  # Attempts in the previous window (weighted by overlap)
+    last_seen: float = Field(default=0.0, index=True)  # For LRU pruning
+
+
+class TelemetryAggregateBase(SQLModel):
+    """Downsampled telemetry for one (bucket, device); written when raw readings are pruned"""
+    bucket_start: datetime = Field(primary_key=True)  # UTC start of the minute/hour
+    device_id: str = Field(primary_key=True)
+    count: int = 0  # Raw readings folded in
+    mq3_min: int = 0
+    mq3_max: int = 0
+    mq3_sum: int = 0  # mq3 average = mq3_sum / count
+    mq135_min: int = 0
+    mq135_max: int = 0
+    mq135_sum: int = 0
+    temp_count: int = 0  # Readings with temp_c; temp average = temp_c_sum / temp_count
+    temp_c_min: Optional[float] = None
+    temp_c_max: Optional[float] = None
+    temp_c_sum: float = 0.0
+    humidity_count: int = 0
+    humidity_pct_min: Optional[float] = None
+    humidity_pct_max: Optional[float] = None
+    humidity_pct_sum: float = 0.0
+    last_ts: Optional[datetime] = None  # Newest reading in the bucket
+    gps_ts: Optional[datetime] = None  # Newest reading with a GPS fix, and that fix
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+
+
+class TelemetryAggregateMinute(TelemetryAggregateBase, table=True):
+    __tablename__ = "telemetry_agg_minute"
+
+
+class TelemetryAggregateHour(TelemetryAggregateBase, table=True):
+    __tablename__ = "telemetry_agg_hour"
+
+
+class TelemetryDeadLetter(SQLModel, table=True):
+    """Write-behind reading the database rejected on its own (see backend/write_behind.py)"""
+    __tablename__ = "telemetry_dead_letters"
+    
+    id: Optional[int] = Field(default=None, primary_key=True)
+    device_id: Optional[str] = Field(default=None, index=True)
+    record_json: str  # Journal line: column values + duplicate payload, for inspection or manual replay
+    error: str
+    attempts: int = 1  # Failed flushes before the reading was isolated
+    failed_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+
+
+class StoragePartition(SQLModel, table=True):
+    """One month of telemetry and alerts moved out of the main tables into its own SQLite file"""
+    __tablename__ = "storage_partitions"
+    
+    month: str = Field(primary_key=True)  # "YYYY-MM"
+    path: str  # SQLite file holding the month's telemetry and alerts tables
+    range_start: datetime = Field(index=True)  # First instant of the month (UTC)
+    range_end: datetime = Field(index=True)  # First instant of the next month
+    status: str = Field(default="archiving")  # "archiving" while rows move, then "ready" (read by queries)
+    telemetry_rows: int = 0
+    alert_rows: int = 0
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class ExportJob(SQLModel, table=True):
+    """Background export written to a local file (see backend/export_jobs.py)"""
+    __tablename__ = "export_jobs"
+    
+    id: str = Field(primary_key=True)  # uuid4 hex
+    kind: str  # "alerts", "telemetry" or "duplicates"
+    format: str  # "csv", "parquet" or "arrow"
+    params_json: str = "{}"  # Filters, columns, order, limit, gzip
+    status: str = Field(default="queued", index=True)  # "queued", "running", "done", "failed"
+    rows_written: int = 0
+    total_rows: Optional[int] = None  # Counted when the job starts
+    bytes_written: int = 0
+    path: Optional[str] = None  # Finished file
+    error: Optional[str] = None
+    created_by: Optional[int] = Field(default=None, foreign_key="users.id")
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)  # Progress heartbeat while running
+    finished_at: Optional[datetime] = None
@@ -1,12 +1,242 @@
 import os
 import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from types import SimpleNamespace
 from openai import OpenAI
-from typing import Dict, Any, List, Optional
-from datetime import datetime
+from typing import Dict, Any, List, Optional, Callable
+from datetime import datetime, timezone
+from sqlmodel import Session
+
+from backend.database import engine as default_engine
+from backend.models import LLMExplanationCache
+from backend.utils import determine_severity_mq3_only
 
-# Initialize OpenAI clientfu;;image.pngimage.png
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY", ""))
 MODEL = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+# "openai" (default) or "stub" for a local client that never leaves the process
+OPENAI_CLIENT = os.getenv("OPENAI_CLIENT", "openai").lower()
+OPENAI_STUB_LATENCY_MS = int(os.getenv("OPENAI_STUB_LATENCY_MS", "0"))
+
+# Explanation cache: near-identical readings reuse one model response
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "512"))
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", "900"))
+LLM_CACHE_MQ3_BAND = int(os.getenv("LLM_CACHE_MQ3_BAND", "50"))  # raw ADC units per band
+LLM_CACHE_MQ135_BAND = int(os.getenv("LLM_CACHE_MQ135_BAND", "50"))
+LLM_CACHE_PERSIST = os.getenv("LLM_CACHE_PERSIST", "false").lower() == "true"
+
+
+class LocalStubClient:
+    """
+    Drop-in stand-in for the OpenAI client (chat.completions.create only).
+    Returns deterministic JSON after an optional artificial latency, so the
+    enrichment pipeline can be exercised and load-tested without an API key.
+    """
+    api_key = "local-stub"
+
+    def __init__(self, latency_ms: int = 0, response: Optional[Dict[str, Any]] = None):
+        self.latency_ms = latency_ms
+        self.response = response
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, model: str, messages: List[Dict[str, str]], **kwargs):
+        self.calls += 1
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        response = self.response or {
+            "severity": "WARNING",
+            "short_message": "Stub analysis: elevated vapor levels detected.",
+            "explanation": "Generated by the local stub client.",
+            "recommended_action": "Verify sensor readings on site.",
+            "confidence": "medium"
+        }
+        message = SimpleNamespace(content=json.dumps(response))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def _create_client():
+    """Create the configured client; None when no OpenAI API key is set"""
+    if OPENAI_CLIENT == "stub":
+        return LocalStubClient(latency_ms=OPENAI_STUB_LATENCY_MS)
+    api_key = os.getenv("OPENAI_API_KEY", "")
+    if not api_key:
+        return None
+    return OpenAI(api_key=api_key)
+
+
+# Initialize OpenAI client
+client = _create_client()
+
+
+def set_client(new_client):
+    """Replace the client used by call_openai (e.g. LocalStubClient in tests)"""
+    global client
+    client = new_client
+
+
+def is_configured() -> bool:
+    """True if call_openai can reach a client"""
+    return client is not None and bool(getattr(client, "api_key", None))
+
+
+def classify_trend(recent_history: List[Dict[str, Any]], band: int = LLM_CACHE_MQ3_BAND) -> str:
+    """
+    Reduce recent MQ3 history to a coarse shape for cache keys.
+    Returns "none", "stable", "rising", "falling" or "spike" (last reading jumps
+    above an otherwise flat history, the case the prompt marks as low confidence).
+    """
+    values = [h["mq3"] for h in recent_history if h.get("mq3") is not None]
+    if len(values) < 2:
+        return "none"
+
+    previous = sorted(values[:-1])
+    median = previous[len(previous) // 2]
+    if values[-1] - median > 2 * band and max(previous) - min(previous) <= band:
+        return "spike"
+
+    change = values[-1] - values[0]
+    if change > band:
+        return "rising"
+    if change < -band:
+        return "falling"
+    return "stable"
+
+
+def explanation_cache_key(mq3: int, mq135: int, recent_history: List[Dict[str, Any]]) -> str:
+    """Content address for a prompt: severity, quantized sensor bands, trend shape and model"""
+    parts = "|".join([
+        determine_severity_mq3_only(mq3),
+        f"mq3:{mq3 // LLM_CACHE_MQ3_BAND}",
+        f"mq135:{mq135 // LLM_CACHE_MQ135_BAND}",
+        f"trend:{classify_trend(recent_history)}",
+        f"model:{MODEL}"
+    ])
+    return hashlib.sha256(parts.encode("utf-8")).hexdigest()
+
+
+class ExplanationCache:
+    """
+    LRU + TTL cache of parsed model responses.
+    Optionally persisted to the llm_explanation_cache table so entries survive restarts.
+    Thread-safe: call_openai runs on enrichment worker threads.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = LLM_CACHE_MAX_ENTRIES,
+        ttl_seconds: int = LLM_CACHE_TTL_SECONDS,
+        persist: bool = LLM_CACHE_PERSIST,
+        engine=None,
+        clock: Callable[[], float] = time.time
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.persist = persist
+        self.engine = engine if engine is not None else default_engine
+        self.clock = clock
+        self._entries: "OrderedDict[str, tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                if now - stored_at < self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return dict(value)
+                del self._entries[key]
+                self.expirations += 1
+
+        if self.persist:
+            value, stored_at = self._load(key, now)
+            if value is not None:
+                with self._lock:
+                    self._store(key, value, stored_at)
+                    self.persistent_hits += 1
+                return dict(value)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, value: Dict[str, Any]):
+        now = self.clock()
+        with self._lock:
+            self._store(key, dict(value), now)
+        if self.persist:
+            self._save(key, value, now)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.persistent_hits + self.misses
+            return {
+                "enabled": LLM_CACHE_ENABLED,
+                "persist": self.persist,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "persistent_hits": self.persistent_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_ratio": round((self.hits + self.persistent_hits) / lookups, 4) if lookups else 0.0
+            }
+
+    def _store(self, key: str, value: Dict[str, Any], stored_at: float):
+        # Caller holds the lock
+        self._entries[key] = (stored_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _load(self, key: str, now: float):
+        try:
+            with Session(self.engine) as session:
+                row = session.get(LLMExplanationCache, key)
+                if row is None:
+                    return None, None
+                stored_at = row.created_at.replace(tzinfo=timezone.utc).timestamp()
+                if now - stored_at >= self.ttl_seconds:
+                    session.delete(row)
+                    session.commit()
+                    return None, None
+                return json.loads(row.response_json), stored_at
+        except Exception as e:
+            print(f"Explanation cache load error: {e}")
+            return None, None
+
+    def _save(self, key: str, value: Dict[str, Any], now: float):
+        try:
+            with Session(self.engine) as session:
+                session.merge(LLMExplanationCache(
+                    cache_key=key,
+                    response_json=json.dumps(value),
+                    created_at=datetime.utcfromtimestamp(now)
+                ))
+                session.commit()
+        except Exception as e:
+            print(f"Explanation cache save error: {e}")
+
+
+explanation_cache = ExplanationCache()
 
 
 def build_openai_prompt(
@@ -71,9 +301,17 @@ def call_openai(
     Call OpenAI API with deterministic settings.
     Returns parsed JSON response or None on error.
     """
-    if not client.api_key:
+    if not is_configured():
         return None
     
+    # Sustained events produce near-identical prompts; reuse the earlier answer
+    cache_key = None
+    if LLM_CACHE_ENABLED:
+        cache_key = explanation_cache_key(mq3, mq135, recent_history)
+        cached = explanation_cache.get(cache_key)
+        if cached is not None:
+            return cached
+    
     try:
         system_prompt, user_prompt = build_openai_prompt(
             device_id, timestamp, mq3, mq135, temp_c, humidity_pct, lat, lon, recent_history
@@ -98,7 +336,10 @@ def call_openai(
             content = "\n".join(lines[1:-1]) if len(lines) > 2 else content
         
         # Parse JSON
-        return json.loads(content)
+        parsed = json.loads(content)
+        if cache_key and isinstance(parsed, dict):
+            explanation_cache.put(cache_key, parsed)
+        return parsed
         
     except json.JSONDecodeError as e:
         print(f"OpenAI response JSON parse error: {e}")
@@ -0,0 +1,351 @@
+"""
+Monthly storage partitions for telemetry and alerts
+With PARTITIONING_ENABLED, a background task moves every month older than the
+PARTITION_HOT_MONTHS newest ones out of the main `telemetry` / `alerts` tables
+into its own SQLite file (PARTITION_DIR/part_YYYY_MM.db, same schema). The
+`storage_partitions` catalog in the main database records each month's file.
+
+New readings, alerts and rollups always go to the main database, so ingest and
+the rollup-backed history aggregation are unchanged. Range queries (telemetry
+list, alert history, history stream) run on the main tables plus only the
+partitions overlapping the requested range, and merge the results. Dropping a
+month past PARTITION_RETENTION_MONTHS deletes its file: O(1) however many rows
+it holds.
+
+Archived readings take their pending telemetry_duplicates rows with them: like
+retention, those are deleted, so no duplicate points at a reading the main
+database no longer has (or at an id SQLite later hands to a new reading).
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import Session, SQLModel, delete, select
+
+from backend.database import create_app_engine, engine as default_engine
+from backend.models import Alert, StoragePartition, Telemetry, TelemetryDuplicate
+
+logger = logging.getLogger(__name__)
+
+PARTITIONING_ENABLED = os.getenv("PARTITIONING_ENABLED", "false").lower() == "true"
+PARTITION_DIR = os.getenv("PARTITION_DIR", "./partitions")
+PARTITION_HOT_MONTHS = int(os.getenv("PARTITION_HOT_MONTHS", "2"))  # newest months kept in the main tables
+PARTITION_RETENTION_MONTHS = int(os.getenv("PARTITION_RETENTION_MONTHS", "0"))  # 0 keeps every partition
+PARTITION_INTERVAL_SECONDS = int(os.getenv("PARTITION_INTERVAL_SECONDS", "3600"))
+PARTITION_MOVE_BATCH_SIZE = int(os.getenv("PARTITION_MOVE_BATCH_SIZE", "5000"))
+
+# Partitioned models and the column that decides their month
+PARTITIONED = ((Telemetry, "telemetry_rows"), (Alert, "alert_rows"))
+
+
+def month_start(ts: datetime) -> datetime:
+    return datetime(ts.year, ts.month, 1)
+
+
+def add_months(start: datetime, months: int) -> datetime:
+    index = start.year * 12 + start.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def merge_rows(results: Iterable[list], key: Callable, limit: Optional[int] = None, reverse: bool = False) -> list:
+    """
+    Merge per-partition results into one ordered list. Rows with an id are
+    deduplicated (a month being re-archived is briefly in both places). The
+    key includes device_id and ts: ids are plain rowids, so SQLite reuses an
+    archived row's id once the main table no longer holds anything above it.
+    """
+    merged = []
+    seen = set()
+    for rows in results:
+        for row in rows:
+            row_id = getattr(row, "id", None)
+            if row_id is not None:
+                identity = (row_id, getattr(row, "device_id", None), getattr(row, "ts", None))
+                if identity in seen:
+                    continue
+                seen.add(identity)
+            merged.append(row)
+    merged.sort(key=key, reverse=reverse)
+    return merged[:limit] if limit is not None else merged
+
+
+class PartitionManager:
+    """Moves old months into partition files, routes range reads, drops expired months"""
+
+    def __init__(
+        self,
+        engine=None,
+        enabled: bool = PARTITIONING_ENABLED,
+        directory: str = PARTITION_DIR,
+        hot_months: int = PARTITION_HOT_MONTHS,
+        retention_months: int = PARTITION_RETENTION_MONTHS,
+        interval_seconds: int = PARTITION_INTERVAL_SECONDS,
+        batch_size: int = PARTITION_MOVE_BATCH_SIZE
+    ):
+        self.engine = engine if engine is not None else default_engine
+        self.enabled = enabled
+        self.directory = directory
+        self.hot_months = max(1, hot_months)
+        self.retention_months = retention_months
+        self.interval_seconds = interval_seconds
+        self.batch_size = max(1, batch_size)
+        self._engines: Dict[str, object] = {}
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+        self.runs = 0
+        self.rows_moved = 0
+        self.duplicates_removed = 0
+        self.rows_conflicting = 0
+        self.partitions_dropped = 0
+        self.routed_queries = 0
+        self.partitions_read = 0
+        self.last_run: Optional[dict] = None
+
+    # --- partition files -------------------------------------------------
+
+    def _path_for(self, start: datetime) -> str:
+        return os.path.join(self.directory, f"part_{start:%Y_%m}.db")
+
+    def engine_for(self, path: str):
+        """Cached engine for a partition file (tables created on first use)"""
+        with self._lock:
+            engine = self._engines.get(path)
+            if engine is None:
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                engine = self._engines[path] = create_app_engine(f"sqlite:///{path}")
+                SQLModel.metadata.create_all(engine, tables=[model.__table__ for model, _ in PARTITIONED])
+            return engine
+
+    def _dispose(self, path: str):
+        with self._lock:
+            engine = self._engines.pop(path, None)
+        if engine is not None:
+            engine.dispose()
+
+    # --- routing ----------------------------------------------------------
+
+    def overlapping(self, session: Session, from_dt: Optional[datetime], to_dt: Optional[datetime]) -> List[StoragePartition]:
+        """Ready partitions whose month overlaps from_dt..to_dt (either bound may be open), newest first"""
+        if not self.enabled:
+            return []
+        statement = select(StoragePartition).where(StoragePartition.status == "ready")
+        if from_dt is not None:
+            statement = statement.where(StoragePartition.range_end > from_dt)
+        if to_dt is not None:
+            statement = statement.where(StoragePartition.range_start <= to_dt)
+        return list(session.exec(statement.order_by(StoragePartition.range_start.desc())).all())
+
+    def read(self, partitions: List[StoragePartition], statement) -> List[list]:
+        """Run statement on each partition file; one result list per partition"""
+        results = []
+        for partition in partitions:
+            with Session(self.engine_for(partition.path)) as session:
+                results.append(session.exec(statement).all())
+        if partitions:
+            self.routed_queries += 1
+            self.partitions_read += len(partitions)
+        return results
+
+    def read_overlapping(self, session: Session, statement, from_dt: Optional[datetime], to_dt: Optional[datetime]) -> List[list]:
+        """read() on the partitions overlapping the range (sync routes)"""
+        return self.read(self.overlapping(session, from_dt, to_dt), statement)
+
+    async def read_archived(self, db, statement, from_dt: Optional[datetime], to_dt: Optional[datetime]) -> List[list]:
+        """read_overlapping() for async routes: catalog through the DatabaseRunner, files in the threadpool"""
+        if not self.enabled:
+            return []
+        partitions = await db.run(self.overlapping, from_dt, to_dt)
+        if not partitions:
+            return []
+        return await run_in_threadpool(self.read, partitions, statement)
+
+    # --- maintenance ------------------------------------------------------
+
+    def archive_month(self, start: datetime) -> Dict[str, int]:
+        """Move one month of telemetry and alerts into its partition file; safe to re-run"""
+        end = add_months(start, 1)
+        month = f"{start:%Y-%m}"
+        with Session(self.engine) as session:
+            partition = session.get(StoragePartition, month)
+            if partition is None:
+                partition = StoragePartition(month=month, path=self._path_for(start), range_start=start, range_end=end)
+                session.add(partition)
+                session.commit()
+                session.refresh(partition)
+            path = partition.path
+
+        moved = {}
+        for model, counter in PARTITIONED:
+            moved[counter] = self._move_rows(model, path, start, end)
+
+        with Session(self.engine) as session:
+            partition = session.get(StoragePartition, month)
+            partition.telemetry_rows += moved["telemetry_rows"]
+            partition.alert_rows += moved["alert_rows"]
+            partition.status = "ready"
+            session.add(partition)
+            session.commit()
+        return moved
+
+    def _move_rows(self, model, path: str, start: datetime, end: datetime) -> int:
+        """
+        Copy rows of [start, end) into the partition, then delete them from the main table, a batch at a time.
+        Only rows the partition holds unchanged are deleted: a reused rowid whose id is already taken there
+        by another row stays in the main table (counted in rows_conflicting).
+        """
+        table = model.__table__
+        target = self.engine_for(path)
+        moved = 0
+        conflicting: List[int] = []
+        while True:
+            with Session(self.engine) as session:
+                statement = table.select().where(table.c.ts >= start, table.c.ts < end)
+                if conflicting:
+                    statement = statement.where(table.c.id.notin_(conflicting))
+                rows = session.execute(statement.order_by(table.c.id).limit(self.batch_size)).mappings().all()
+                if not rows:
+                    break
+                ids = [r["id"] for r in rows]
+                with Session(target) as part:
+                    # Ids are kept, so a batch copied before a crash is skipped on the next run
+                    part.execute(sqlite_insert(table).on_conflict_do_nothing(index_elements=["id"]), [dict(r) for r in rows])
+                    part.commit()
+                    stored = {
+                        r.id: (r.device_id, r.ts)
+                        for r in part.execute(select(table.c.id, table.c.device_id, table.c.ts).where(table.c.id.in_(ids)))
+                    }
+                archived = [r["id"] for r in rows if stored.get(r["id"]) == (r["device_id"], r["ts"])]
+                conflicting.extend(r["id"] for r in rows if stored.get(r["id"]) != (r["device_id"], r["ts"]))
+                if model is Telemetry:
+                    # Same as retention: duplicates of a reading leave the main database with it
+                    self.duplicates_removed += session.exec(
+                        delete(TelemetryDuplicate).where(TelemetryDuplicate.original_telemetry_id.in_(archived))
+                    ).rowcount
+                session.execute(table.delete().where(table.c.id.in_(archived)))
+                session.commit()
+            moved += len(archived)
+            self.rows_moved += len(archived)
+        if conflicting:
+            self.rows_conflicting += len(conflicting)
+            logger.error(
+                f"Partitions: {len(conflicting)} {table.name} row(s) of {start:%Y-%m} kept in the main table, "
+                f"their ids are taken by other rows in {path}: {conflicting[:10]}"
+            )
+        return moved
+
+    def drop_partition(self, month: str) -> bool:
+        """Forget a month and delete its file"""
+        with Session(self.engine) as session:
+            partition = session.get(StoragePartition, month)
+            if partition is None:
+                return False
+            path = partition.path
+            session.delete(partition)
+            session.commit()
+        self._dispose(path)
+        for suffix in ("", "-wal", "-shm"):
+            try:
+                os.remove(path + suffix)
+            except FileNotFoundError:
+                pass
+        self.partitions_dropped += 1
+        return True
+
+    def _oldest_month(self) -> Optional[datetime]:
+        with Session(self.engine) as session:
+            oldest = [session.exec(select(model.ts).order_by(model.ts).limit(1)).first() for model, _ in PARTITIONED]
+        oldest = [ts for ts in oldest if ts is not None]
+        return month_start(min(oldest)) if oldest else None
+
+    def _has_rows(self, start: datetime, end: datetime) -> bool:
+        with Session(self.engine) as session:
+            return any(
+                session.exec(select(model.id).where(model.ts >= start, model.ts < end).limit(1)).first() is not None
+                for model, _ in PARTITIONED
+            )
+
+    def run_once(self, now: Optional[datetime] = None) -> dict:
+        """Archive every month older than the hot window, then drop expired partitions"""
+        started = time.monotonic()
+        hot_start = add_months(month_start(now or datetime.utcnow()), -(self.hot_months - 1))
+        report = {"archived": [], "dropped": [], "rows_moved": 0}
+
+        month = self._oldest_month()
+        while month is not None and month < hot_start:
+            if self._has_rows(month, add_months(month, 1)):
+                moved = self.archive_month(month)
+                report["archived"].append(f"{month:%Y-%m}")
+                report["rows_moved"] += sum(moved.values())
+            month = add_months(month, 1)
+
+        if self.retention_months > 0:
+            expire_before = add_months(hot_start, -self.retention_months)
+            with Session(self.engine) as session:
+                expired = session.exec(
+                    select(StoragePartition.month).where(StoragePartition.range_end <= expire_before)
+                ).all()
+            for name in expired:
+                if self.drop_partition(name):
+                    report["dropped"].append(name)
+
+        report["seconds"] = round(time.monotonic() - started, 3)
+        self.runs += 1
+        self.last_run = report
+        if report["archived"] or report["dropped"]:
+            logger.info(
+                f"Partitions: archived {report['archived']} ({report['rows_moved']} rows), "
+                f"dropped {report['dropped']} in {report['seconds']}s"
+            )
+        return report
+
+    def start(self):
+        """Start the periodic maintenance task (call from the running event loop, e.g. lifespan)"""
+        if not self.enabled or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run(), name="storage-partitions")
+
+    async def _run(self):
+        while True:
+            try:
+                await run_in_threadpool(self.run_once)
+            except Exception as e:
+                logger.error(f"Partition maintenance failed: {e}")
+            await asyncio.sleep(self.interval_seconds)
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    def stats(self) -> dict:
+        counters = {
+            "enabled": self.enabled,
+            "runs": self.runs,
+            "rows_moved": self.rows_moved,
+            "duplicates_removed": self.duplicates_removed,
+            "rows_conflicting": self.rows_conflicting,
+            "partitions_dropped": self.partitions_dropped,
+            "routed_queries": self.routed_queries,
+            "partitions_read": self.partitions_read,
+            "last_run": self.last_run
+        }
+        if self.enabled:
+            with Session(self.engine) as session:
+                counters["partitions"] = len(session.exec(select(StoragePartition.month)).all())
+        return counters
+
+
+storage_partitions = PartitionManager()
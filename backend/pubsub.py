@@ -0,0 +1,384 @@
+"""
+Cross-worker pub/sub bus for WebSocket broadcast
+Every published message is wrapped in an envelope carrying the publishing
+worker and a per-worker, per-channel sequence number. Subscribers track the last
+sequence seen from each publisher, so lost messages show up as gaps and
+replays are dropped.
+
+Backends (PUBSUB_BACKEND):
+  - "inprocess"    - local subscribers only (single worker, the default)
+  - "shared_state" - the shared state event log (SHARED_STATE_BACKEND=sqlite),
+                     polled every SHARED_STATE_POLL_MS (default when that backend is sqlite)
+  - "resp"         - a Redis-protocol server at PUBSUB_URL (redis://host:port or
+                     unix:///path.sock): Redis itself, or RespBroker from this
+                     module (python backend/scripts/pubsub_broker.py) as a local stand-in
+"""
+
+import asyncio
+import json
+import logging
+import os
+from collections import defaultdict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from fastapi.concurrency import run_in_threadpool
+
+from backend.shared_state import SHARED_STATE_BACKEND, WORKER_ID, EventRelay, shared_state
+
+logger = logging.getLogger(__name__)
+
+PUBSUB_BACKEND = os.getenv("PUBSUB_BACKEND", "shared_state" if SHARED_STATE_BACKEND == "sqlite" else "inprocess")
+PUBSUB_URL = os.getenv("PUBSUB_URL", "redis://127.0.0.1:6379")
+PUBSUB_CHANNEL_PREFIX = os.getenv("PUBSUB_CHANNEL_PREFIX", "sdd:")  # namespaces channels on a shared Redis
+PUBSUB_RECONNECT_SECONDS = float(os.getenv("PUBSUB_RECONNECT_SECONDS", "1.0"))
+PUBSUB_SEND_TIMEOUT_SECONDS = float(os.getenv("PUBSUB_SEND_TIMEOUT_SECONDS", "0.5"))  # connect + PUBLISH round trip
+
+Handler = Callable[[dict], Awaitable[None]]
+
+
+class PubSubBus:
+    """
+    Base bus: local fan-out, envelopes and gap detection.
+    publish() always delivers to this worker's subscribers directly; subclasses
+    add the transport to other workers via _send() and feed received envelopes
+    to _receive().
+    """
+
+    name = "inprocess"
+
+    def __init__(self, worker_id: str = WORKER_ID):
+        self.worker_id = worker_id
+        self._handlers: Dict[str, List[Handler]] = defaultdict(list)
+        self._next_seq: Dict[str, int] = defaultdict(int)
+        self._last_seen: Dict[Tuple[str, str], int] = {}
+        self.published = 0
+        self.received = 0
+        self.gaps = 0
+        self.duplicates = 0
+        self.send_errors = 0
+
+    def subscribe(self, channel: str, handler: Handler):
+        self._handlers[channel].append(handler)
+
+    async def publish(self, channel: str, message: dict) -> int:
+        """Deliver locally, then to the other workers; returns the envelope's sequence number"""
+        self._next_seq[channel] += 1
+        seq = self._next_seq[channel]
+        self.published += 1
+        await self._deliver(channel, message)
+        try:
+            await self._send(channel, {"origin": self.worker_id, "seq": seq, "message": message})
+        except Exception as e:
+            self.send_errors += 1
+            logger.error(f"Pub/sub publish on '{channel}' failed: {e}")
+        return seq
+
+    async def _send(self, channel: str, envelope: dict):
+        """Transport to other workers (none for the in-process bus)"""
+
+    async def _receive(self, channel: str, envelope: dict):
+        """Envelope from the transport: drop own/replayed messages, count gaps, deliver"""
+        origin, seq = envelope["origin"], envelope["seq"]
+        if origin == self.worker_id:
+            return
+        key = (channel, origin)
+        last = self._last_seen.get(key)
+        if last is not None:
+            if seq <= last:
+                self.duplicates += 1
+                return
+            if seq > last + 1:
+                self.gaps += seq - last - 1
+                logger.warning(f"Pub/sub gap on '{channel}' from {origin}: missed {seq - last - 1} message(s)")
+        self._last_seen[key] = seq
+        self.received += 1
+        await self._deliver(channel, envelope["message"])
+
+    async def _deliver(self, channel: str, message: dict):
+        for handler in self._handlers.get(channel, []):
+            try:
+                await handler(message)
+            except Exception as e:
+                logger.error(f"Pub/sub handler on '{channel}' failed: {e}")
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.name,
+            "worker_id": self.worker_id,
+            "published": self.published,
+            "received": self.received,
+            "gaps": self.gaps,
+            "duplicates": self.duplicates,
+            "send_errors": self.send_errors
+        }
+
+
+class InProcessBus(PubSubBus):
+    """Local subscribers only"""
+
+
+class SharedStateBus(PubSubBus):
+    """Envelopes go through the shared state event log; one EventRelay per subscribed channel"""
+
+    name = "shared_state"
+
+    def __init__(self, state=shared_state):
+        super().__init__(state.worker_id)
+        self.state = state
+        self._relays: Dict[str, EventRelay] = {}
+
+    async def _send(self, channel: str, envelope: dict):
+        await run_in_threadpool(self.state.publish, channel, envelope)
+
+    async def start(self):
+        for channel in self._handlers:
+            relay = self._relays[channel] = EventRelay(self.state, channel)
+            relay.start(lambda envelope, channel=channel: self._receive(channel, envelope))
+
+    async def stop(self):
+        for relay in self._relays.values():
+            await relay.stop()
+        self._relays.clear()
+
+
+# --- Redis serialization protocol (RESP2), just enough for PUBLISH/SUBSCRIBE ---
+
+def encode_command(*parts) -> bytes:
+    out = [b"*%d\r\n" % len(parts)]
+    for part in parts:
+        data = part if isinstance(part, bytes) else str(part).encode()
+        out.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(out)
+
+
+async def read_reply(reader: asyncio.StreamReader):
+    """One RESP2 value; errors come back as RespError instances"""
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("connection closed")
+    kind, body = line[:1], line[1:-2]
+    if kind == b"+":
+        return body.decode()
+    if kind == b"-":
+        return RespError(body.decode())
+    if kind == b":":
+        return int(body)
+    if kind == b"$":
+        length = int(body)
+        if length < 0:
+            return None
+        data = await reader.readexactly(length + 2)
+        return data[:-2]
+    if kind == b"*":
+        length = int(body)
+        return None if length < 0 else [await read_reply(reader) for _ in range(length)]
+    raise ConnectionError(f"unexpected RESP type {kind!r}")
+
+
+class RespError(Exception):
+    pass
+
+
+def _subscription_reply(kind: bytes, channel: bytes, count: int) -> bytes:
+    """[kind, channel, subscribed channel count], as Redis answers SUBSCRIBE/UNSUBSCRIBE"""
+    return b"*3\r\n$%d\r\n%s\r\n$%d\r\n%s\r\n:%d\r\n" % (len(kind), kind, len(channel), channel, count)
+
+
+async def open_resp_connection(url: str):
+    parsed = urlparse(url)
+    if parsed.scheme == "unix":
+        return await asyncio.open_unix_connection(parsed.path)
+    if parsed.scheme in ("redis", "tcp"):
+        return await asyncio.open_connection(parsed.hostname or "127.0.0.1", parsed.port or 6379)
+    raise ValueError(f"Unsupported PUBSUB_URL scheme '{parsed.scheme}' (expected redis://, tcp:// or unix://)")
+
+
+class RespBus(PubSubBus):
+    """
+    Bus over a Redis-protocol server: one connection for PUBLISH, one for SUBSCRIBE.
+    The subscriber reconnects after PUBSUB_RECONNECT_SECONDS; messages published
+    meanwhile are counted as gaps once the next one arrives.
+    PUBLISH is awaited by alert ingest, so it is bounded by PUBSUB_SEND_TIMEOUT_SECONDS
+    (including the wait for the publish connection); after a failure, sends are
+    skipped for PUBSUB_RECONNECT_SECONDS instead of each paying the timeout.
+    """
+
+    name = "resp"
+
+    def __init__(self, url: str = PUBSUB_URL, prefix: str = PUBSUB_CHANNEL_PREFIX, worker_id: str = WORKER_ID,
+                 send_timeout: float = PUBSUB_SEND_TIMEOUT_SECONDS, retry_seconds: float = PUBSUB_RECONNECT_SECONDS):
+        super().__init__(worker_id)
+        self.url = url
+        self.prefix = prefix
+        self.send_timeout = send_timeout
+        self.retry_seconds = retry_seconds
+        self._publisher: Optional[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = None
+        self._publish_lock = asyncio.Lock()
+        self._send_suspended_until = 0.0
+        self.sends_skipped = 0
+        self._subscriber_task: Optional[asyncio.Task] = None
+        self.subscribed = asyncio.Event()
+        self.reconnects = 0
+
+    async def _send(self, channel: str, envelope: dict):
+        loop = asyncio.get_running_loop()
+        if loop.time() < self._send_suspended_until:
+            self.sends_skipped += 1
+            return
+        try:
+            await asyncio.wait_for(self._publish(channel, envelope), self.send_timeout)
+        except (ConnectionError, OSError, asyncio.TimeoutError):
+            self._send_suspended_until = loop.time() + self.retry_seconds
+            raise
+
+    async def _publish(self, channel: str, envelope: dict):
+        async with self._publish_lock:
+            try:
+                if self._publisher is None:
+                    self._publisher = await open_resp_connection(self.url)
+                reader, writer = self._publisher
+                writer.write(encode_command("PUBLISH", self.prefix + channel, json.dumps(envelope)))
+                await writer.drain()
+                reply = await read_reply(reader)
+            except (ConnectionError, OSError, asyncio.CancelledError):
+                # Cancelled by the timeout mid-command: the connection's state is unknown
+                self._close_publisher()
+                raise
+            if isinstance(reply, RespError):
+                raise reply
+
+    def _close_publisher(self):
+        if self._publisher is not None:
+            self._publisher[1].close()
+            self._publisher = None
+
+    async def start(self):
+        if self._handlers:
+            self._subscriber_task = asyncio.create_task(self._subscribe_loop())
+
+    async def _subscribe_loop(self):
+        channels = [self.prefix + channel for channel in self._handlers]
+        while True:
+            writer = None
+            try:
+                reader, writer = await open_resp_connection(self.url)
+                writer.write(encode_command("SUBSCRIBE", *channels))
+                await writer.drain()
+                while True:
+                    reply = await read_reply(reader)
+                    if not isinstance(reply, list) or not reply:
+                        continue
+                    kind = reply[0]
+                    if kind == b"subscribe" and reply[2] == len(channels):
+                        self.subscribed.set()
+                    elif kind == b"message":
+                        channel = reply[1].decode()[len(self.prefix):]
+                        await self._receive(channel, json.loads(reply[2]))
+            except asyncio.CancelledError:
+                if writer is not None:
+                    writer.close()
+                raise
+            except Exception as e:
+                self.subscribed.clear()
+                self.reconnects += 1
+                logger.warning(f"Pub/sub subscriber disconnected from {self.url}: {e}; retrying")
+                if writer is not None:
+                    writer.close()
+                await asyncio.sleep(PUBSUB_RECONNECT_SECONDS)
+
+    async def stop(self):
+        if self._subscriber_task is not None:
+            self._subscriber_task.cancel()
+            try:
+                await self._subscriber_task
+            except asyncio.CancelledError:
+                pass
+            self._subscriber_task = None
+        self._close_publisher()
+
+    def stats(self) -> dict:
+        return {
+            **super().stats(), "url": self.url, "subscribed": self.subscribed.is_set(),
+            "reconnects": self.reconnects, "sends_skipped": self.sends_skipped
+        }
+
+
+class RespBroker:
+    """
+    Minimal Redis-compatible pub/sub server (PING, PUBLISH, SUBSCRIBE, UNSUBSCRIBE)
+    for single-box deployments without Redis, and for tests
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[bytes, set] = defaultdict(set)
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self, url: str):
+        parsed = urlparse(url)
+        if parsed.scheme == "unix":
+            self._server = await asyncio.start_unix_server(self._handle, parsed.path)
+        else:
+            self._server = await asyncio.start_server(self._handle, parsed.hostname or "127.0.0.1", parsed.port or 6379)
+        return self._server
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        channels = set()
+        try:
+            while True:
+                command = await read_reply(reader)
+                if not isinstance(command, list) or not command:
+                    continue
+                name = command[0].upper()
+                if name == b"PING":
+                    writer.write(b"+PONG\r\n")
+                elif name == b"PUBLISH":
+                    _, channel, payload = command
+                    receivers = list(self._subscribers.get(channel, ()))
+                    frame = encode_command("message", channel, payload)
+                    for subscriber in receivers:
+                        subscriber.write(frame)
+                    writer.write(b":%d\r\n" % len(receivers))
+                elif name in (b"SUBSCRIBE", b"UNSUBSCRIBE"):
+                    for channel in command[1:]:
+                        if name == b"SUBSCRIBE":
+                            channels.add(channel)
+                            self._subscribers[channel].add(writer)
+                        else:
+                            channels.discard(channel)
+                            self._subscribers[channel].discard(writer)
+                        writer.write(_subscription_reply(name.lower(), channel, len(channels)))
+                else:
+                    writer.write(b"-ERR unknown command '%s'\r\n" % name)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for channel in channels:
+                self._subscribers[channel].discard(writer)
+            writer.close()
+
+
+def create_bus(backend: str = PUBSUB_BACKEND) -> PubSubBus:
+    if backend == "inprocess":
+        return InProcessBus()
+    if backend == "shared_state":
+        if not shared_state.is_shared:
+            logger.warning("PUBSUB_BACKEND=shared_state needs SHARED_STATE_BACKEND=sqlite; using the in-process bus")
+            return InProcessBus()
+        return SharedStateBus()
+    if backend == "resp":
+        return RespBus()
+    raise ValueError(f"Unknown PUBSUB_BACKEND '{backend}' (expected 'inprocess', 'shared_state' or 'resp')")
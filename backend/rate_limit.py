@@ -0,0 +1,215 @@
+"""
+Login rate limiting
+Sliding-window counters (current fixed window plus the previous one, weighted by
+how much of it still overlaps the sliding window) keyed per client IP and per
+account. Each attempt is O(1) and memory is fixed: the in-process store keeps at
+most RATE_LIMIT_MAX_KEYS keys and evicts the least recently seen.
+RATE_LIMIT_STORE=sqlite keeps the counters in the app database instead, so every
+uvicorn worker enforces the same limits.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlmodel import Session
+
+from backend.database import engine as default_engine
+from backend.models import LoginRateLimit  # noqa: F401  (table must be registered for create_all)
+from backend.shared_state import SHARED_STATE_BACKEND
+
+# "memory" or "sqlite"; follows SHARED_STATE_BACKEND so multi-worker setups share limits by default
+RATE_LIMIT_STORE = os.getenv("RATE_LIMIT_STORE", "sqlite" if SHARED_STATE_BACKEND == "sqlite" else "memory")
+LOGIN_RATE_LIMIT_WINDOW_SECONDS = int(os.getenv("LOGIN_RATE_LIMIT_WINDOW_SECONDS", "120"))
+LOGIN_RATE_LIMIT_PER_IP = int(os.getenv("LOGIN_RATE_LIMIT_PER_IP", "50"))  # attempts per window
+LOGIN_RATE_LIMIT_PER_ACCOUNT = int(os.getenv("LOGIN_RATE_LIMIT_PER_ACCOUNT", "50"))
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "10000"))
+
+
+def sliding_window_estimate(window_start: int, count: int, prev_count: int, now: float, window_seconds: int) -> float:
+    """Attempts in the last window_seconds, assuming the previous window's attempts were spread evenly"""
+    overlap = 1.0 - (now - window_start) / window_seconds
+    return prev_count * max(0.0, overlap) + count
+
+
+class MemoryRateLimitStore:
+    """Per-process counters in an LRU-bounded map"""
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._counters: "OrderedDict[str, list]" = OrderedDict()  # key -> [window_start, count, prev_count]
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def hit(self, key: str, window_start: int, window_seconds: int, now: float) -> Tuple[int, int]:
+        """Record one attempt; returns (count, prev_count) after it"""
+        with self._lock:
+            entry = self._counters.get(key)
+            if entry is None:
+                entry = self._counters[key] = [window_start, 0, 0]
+                while len(self._counters) > self.max_keys:
+                    self._counters.popitem(last=False)
+                    self.evictions += 1
+            else:
+                self._counters.move_to_end(key)
+                if entry[0] != window_start:
+                    entry[2] = entry[1] if entry[0] == window_start - window_seconds else 0
+                    entry[1] = 0
+                    entry[0] = window_start
+            entry[1] += 1
+            return entry[1], entry[2]
+
+    def reset(self, key: Optional[str] = None) -> bool:
+        with self._lock:
+            if key is None:
+                self._counters.clear()
+                return True
+            return self._counters.pop(key, None) is not None
+
+    def size(self) -> int:
+        return len(self._counters)
+
+
+class SQLiteRateLimitStore:
+    """Counters in the login_rate_limits table; one atomic upsert per attempt"""
+
+    PRUNE_EVERY = 256  # attempts between idle-key cleanups
+
+    _HIT = text("""
+        INSERT INTO login_rate_limits (key, window_start, count, prev_count, last_seen)
+        VALUES (:key, :window_start, 1, 0, :now)
+        ON CONFLICT(key) DO UPDATE SET
+            prev_count = CASE
+                WHEN window_start = :window_start THEN prev_count
+                WHEN window_start = :window_start - :window_seconds THEN count
+                ELSE 0
+            END,
+            count = CASE WHEN window_start = :window_start THEN count + 1 ELSE 1 END,
+            window_start = :window_start,
+            last_seen = :now
+        RETURNING count, prev_count
+    """)
+
+    def __init__(self, engine=None, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.engine = engine if engine is not None else default_engine
+        self.max_keys = max_keys
+        self._hits = 0
+        self.evictions = 0
+        LoginRateLimit.__table__.create(self.engine, checkfirst=True)
+
+    def hit(self, key: str, window_start: int, window_seconds: int, now: float) -> Tuple[int, int]:
+        with Session(self.engine) as session:
+            count, prev_count = session.execute(self._HIT, {
+                "key": key, "window_start": window_start, "window_seconds": window_seconds, "now": now
+            }).one()
+            self._hits += 1
+            if self._hits % self.PRUNE_EVERY == 0:
+                self._prune(session, window_start - window_seconds)
+            session.commit()
+        return count, prev_count
+
+    def _prune(self, session: Session, stale_before: int):
+        """Drop keys idle for a full window (their estimate is 0), then the least recently seen over budget"""
+        removed = session.execute(
+            text("DELETE FROM login_rate_limits WHERE window_start < :stale_before"),
+            {"stale_before": stale_before}
+        ).rowcount
+        removed += session.execute(text("""
+            DELETE FROM login_rate_limits WHERE key IN (
+                SELECT key FROM login_rate_limits ORDER BY last_seen DESC LIMIT -1 OFFSET :max_keys
+            )
+        """), {"max_keys": self.max_keys}).rowcount
+        self.evictions += removed
+
+    def reset(self, key: Optional[str] = None) -> bool:
+        with Session(self.engine) as session:
+            if key is None:
+                session.execute(text("DELETE FROM login_rate_limits"))
+                removed = True
+            else:
+                removed = session.execute(
+                    text("DELETE FROM login_rate_limits WHERE key = :key"), {"key": key}
+                ).rowcount > 0
+            session.commit()
+        return removed
+
+    def size(self) -> int:
+        with Session(self.engine) as session:
+            return session.execute(text("SELECT COUNT(*) FROM login_rate_limits")).scalar_one()
+
+
+class LoginRateLimiter:
+    """Per-IP and per-account sliding-window limits on login attempts"""
+
+    def __init__(
+        self,
+        store,
+        per_ip: int = LOGIN_RATE_LIMIT_PER_IP,
+        per_account: int = LOGIN_RATE_LIMIT_PER_ACCOUNT,
+        window_seconds: int = LOGIN_RATE_LIMIT_WINDOW_SECONDS
+    ):
+        self.store = store
+        self.per_ip = per_ip
+        self.per_account = per_account
+        self.window_seconds = window_seconds
+        self.allowed = 0
+        self.limited = 0
+
+    @staticmethod
+    def _keys(ip_address: Optional[str], account: Optional[str]) -> List[str]:
+        keys = []
+        if ip_address:
+            keys.append(f"ip:{ip_address}")
+        if account:
+            keys.append(f"account:{account.strip().lower()}")
+        return keys
+
+    def hit(self, ip_address: Optional[str], account: Optional[str] = None) -> bool:
+        """
+        Record a login attempt; False if the IP or the account is over its limit.
+        Rejected attempts count too, so a client that keeps retrying stays blocked.
+        """
+        now = time.time()
+        window_start = int(now // self.window_seconds) * self.window_seconds
+        allowed = True
+        for key in self._keys(ip_address, account):
+            limit = self.per_ip if key.startswith("ip:") else self.per_account
+            count, prev_count = self.store.hit(key, window_start, self.window_seconds, now)
+            if sliding_window_estimate(window_start, count, prev_count, now, self.window_seconds) > limit:
+                allowed = False
+        if allowed:
+            self.allowed += 1
+        else:
+            self.limited += 1
+        return allowed
+
+    def reset(self, ip_address: Optional[str] = None, account: Optional[str] = None) -> bool:
+        """Clear the given IP and/or account, or every key when neither is given"""
+        keys = self._keys(ip_address, account)
+        if not keys:
+            return self.store.reset()
+        return any([self.store.reset(key) for key in keys])
+
+    def stats(self) -> dict:
+        return {
+            "store": type(self.store).__name__,
+            "keys": self.store.size(),
+            "max_keys": self.store.max_keys,
+            "evictions": self.store.evictions,
+            "allowed": self.allowed,
+            "limited": self.limited
+        }
+
+
+def create_login_rate_limiter(store_name: str = RATE_LIMIT_STORE) -> LoginRateLimiter:
+    if store_name == "memory":
+        return LoginRateLimiter(MemoryRateLimitStore())
+    if store_name == "sqlite":
+        return LoginRateLimiter(SQLiteRateLimitStore())
+    raise ValueError(f"Unknown RATE_LIMIT_STORE '{store_name}' (expected 'memory' or 'sqlite')")
+
+
+login_rate_limiter = create_login_rate_limiter()
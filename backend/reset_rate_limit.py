@@ -1,6 +1,8 @@
 """
 Reset rate limiting for login attempts
 Run this if you're locked out due to too many login attempts
+(only reaches other processes with RATE_LIMIT_STORE=sqlite; the memory store
+lives inside the server process, use POST /api/v1/admin/reset-rate-limit there)
 """
 
 import sys
@@ -9,11 +11,11 @@ import os
 # Add parent directory to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from backend.auth import login_attempts
+from backend.rate_limit import login_rate_limiter
 
 def reset_rate_limit():
     """Clear all rate limit entries"""
-    login_attempts.clear()
+    login_rate_limiter.reset()
     print("=" * 60)
     print("Rate limit cleared successfully!")
     print("=" * 60)
@@ -0,0 +1,280 @@
+"""
+Telemetry retention and downsampling
+Raw readings are kept for TELEMETRY_RAW_RETENTION_DAYS. Older readings are
+folded into per-device minute and hour aggregates (min/max/avg of each sensor,
+newest GPS fix) and deleted, TELEMETRY_RETENTION_BATCH_SIZE rows per
+transaction with a short pause in between so ingest never waits long for the
+write lock. Minute aggregates are dropped after TELEMETRY_MINUTE_RETENTION_DAYS;
+hour aggregates are kept unless TELEMETRY_HOUR_RETENTION_DAYS is set.
+
+Each batch deletes with RETURNING and aggregates exactly the rows it deleted,
+so overlapping runs (several workers) never count a reading twice.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import and_, case, func, or_
+from sqlmodel import Session, delete, select
+
+from backend.database import engine as default_engine
+from backend.models import Telemetry, TelemetryAggregateHour, TelemetryAggregateMinute, TelemetryDuplicate
+from backend.rollups import floor_to, has_gps
+from backend.utils import _conflict_insert
+
+logger = logging.getLogger(__name__)
+
+TELEMETRY_RETENTION_ENABLED = os.getenv("TELEMETRY_RETENTION_ENABLED", "false").lower() == "true"
+TELEMETRY_RAW_RETENTION_DAYS = float(os.getenv("TELEMETRY_RAW_RETENTION_DAYS", "7"))
+TELEMETRY_MINUTE_RETENTION_DAYS = float(os.getenv("TELEMETRY_MINUTE_RETENTION_DAYS", "90"))  # 0 keeps them forever
+TELEMETRY_HOUR_RETENTION_DAYS = float(os.getenv("TELEMETRY_HOUR_RETENTION_DAYS", "0"))  # 0 keeps them forever
+TELEMETRY_RETENTION_INTERVAL_SECONDS = int(os.getenv("TELEMETRY_RETENTION_INTERVAL_SECONDS", "3600"))
+TELEMETRY_RETENTION_BATCH_SIZE = int(os.getenv("TELEMETRY_RETENTION_BATCH_SIZE", "1000"))
+TELEMETRY_RETENTION_BATCH_PAUSE_MS = int(os.getenv("TELEMETRY_RETENTION_BATCH_PAUSE_MS", "50"))
+
+AGGREGATES = (
+    (60, TelemetryAggregateMinute),
+    (3600, TelemetryAggregateHour),
+)
+
+# Sensor channels as (column, aggregate count column); None count means the channel is never null
+CHANNELS = (("mq3", None), ("mq135", None), ("temp_c", "temp_count"), ("humidity_pct", "humidity_count"))
+
+
+def downsample(rows: Iterable, seconds: int) -> List[dict]:
+    """Aggregate rows for each (bucket, device) in the `seconds`-wide buckets"""
+    buckets: Dict[Tuple[datetime, str], dict] = {}
+    for row in rows:
+        key = (floor_to(row.ts, seconds), row.device_id)
+        agg = buckets.get(key)
+        if agg is None:
+            agg = buckets[key] = {
+                "bucket_start": key[0], "device_id": key[1], "count": 0,
+                "mq3_min": row.mq3, "mq3_max": row.mq3, "mq3_sum": 0,
+                "mq135_min": row.mq135, "mq135_max": row.mq135, "mq135_sum": 0,
+                "temp_count": 0, "temp_c_min": None, "temp_c_max": None, "temp_c_sum": 0.0,
+                "humidity_count": 0, "humidity_pct_min": None, "humidity_pct_max": None, "humidity_pct_sum": 0.0,
+                "last_ts": row.ts, "gps_ts": None, "lat": None, "lon": None
+            }
+        agg["count"] += 1
+        for column, count_column in CHANNELS:
+            value = getattr(row, column)
+            if value is None:
+                continue
+            if count_column:
+                agg[count_column] += 1
+            agg[f"{column}_sum"] += value
+            if agg[f"{column}_min"] is None or value < agg[f"{column}_min"]:
+                agg[f"{column}_min"] = value
+            if agg[f"{column}_max"] is None or value > agg[f"{column}_max"]:
+                agg[f"{column}_max"] = value
+        if row.ts > agg["last_ts"]:
+            agg["last_ts"] = row.ts
+        if has_gps(row.lat, row.lon) and (agg["gps_ts"] is None or row.ts >= agg["gps_ts"]):
+            agg["gps_ts"], agg["lat"], agg["lon"] = row.ts, row.lat, row.lon
+    return list(buckets.values())
+
+
+def _merge_statement(session: Session, model):
+    """INSERT ... ON CONFLICT DO UPDATE that folds a new aggregate into an existing one"""
+    postgres = session.get_bind().dialect.name == "postgresql"
+    least = func.least if postgres else func.min
+    greatest = func.greatest if postgres else func.max
+    statement = _conflict_insert(session, model.__table__)
+    table = model.__table__.c
+    new = statement.excluded
+
+    def lower(column):
+        # Optional channels may be NULL on either side
+        return least(func.coalesce(table[column], new[column]), func.coalesce(new[column], table[column]))
+
+    def higher(column):
+        return greatest(func.coalesce(table[column], new[column]), func.coalesce(new[column], table[column]))
+
+    newer_gps = and_(new.gps_ts.isnot(None), or_(table.gps_ts.is_(None), new.gps_ts >= table.gps_ts))
+    set_ = {"count": table.count + new.count, "last_ts": higher("last_ts")}
+    for column, count_column in CHANNELS:
+        set_[f"{column}_min"] = lower(f"{column}_min")
+        set_[f"{column}_max"] = higher(f"{column}_max")
+        set_[f"{column}_sum"] = table[f"{column}_sum"] + new[f"{column}_sum"]
+        if count_column:
+            set_[count_column] = table[count_column] + new[count_column]
+    for column in ("gps_ts", "lat", "lon"):
+        set_[column] = case((newer_gps, new[column]), else_=table[column])
+    return statement.on_conflict_do_update(index_elements=["bucket_start", "device_id"], set_=set_)
+
+
+class TelemetryRetention:
+    """Scheduled pruning of raw telemetry into minute/hour aggregates"""
+
+    def __init__(
+        self,
+        engine=None,
+        enabled: bool = TELEMETRY_RETENTION_ENABLED,
+        raw_days: float = TELEMETRY_RAW_RETENTION_DAYS,
+        minute_days: float = TELEMETRY_MINUTE_RETENTION_DAYS,
+        hour_days: float = TELEMETRY_HOUR_RETENTION_DAYS,
+        interval_seconds: int = TELEMETRY_RETENTION_INTERVAL_SECONDS,
+        batch_size: int = TELEMETRY_RETENTION_BATCH_SIZE,
+        batch_pause_ms: int = TELEMETRY_RETENTION_BATCH_PAUSE_MS
+    ):
+        self.engine = engine if engine is not None else default_engine
+        self.enabled = enabled
+        self.raw_days = raw_days
+        self.minute_days = minute_days
+        self.hour_days = hour_days
+        self.interval_seconds = interval_seconds
+        self.batch_size = max(1, batch_size)
+        self.batch_pause_seconds = batch_pause_ms / 1000
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = threading.Event()
+
+        self.runs = 0
+        self.failed_runs = 0
+        self.raw_pruned = 0
+        self.seconds_spent = 0.0
+        self.last_run: Optional[dict] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def start(self):
+        """Start the periodic task (call from the running event loop, e.g. lifespan)"""
+        if not self.enabled or self._task is not None:
+            return
+        self._stopping.clear()
+        self._task = asyncio.create_task(self._run(), name="telemetry-retention")
+
+    async def _run(self):
+        while True:
+            try:
+                await run_in_threadpool(self.run_once)
+            except Exception as e:
+                self.failed_runs += 1
+                logger.error(f"Telemetry retention run failed: {e}")
+            await asyncio.sleep(self.interval_seconds)
+
+    async def stop(self):
+        """Stop after the current batch"""
+        task, self._task = self._task, None
+        if task is None:
+            return
+        self._stopping.set()
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    def run_once(self, now: Optional[datetime] = None) -> dict:
+        """Prune everything past its retention window; returns the per-run report"""
+        started = time.monotonic()
+        now = now or datetime.utcnow()
+        report = {
+            "started_at": now.isoformat(),
+            "raw_pruned": 0,
+            "duplicates_pruned": 0,
+            "minute_aggregates_pruned": 0,
+            "hour_aggregates_pruned": 0,
+            "batches": 0
+        }
+
+        cutoff = now - timedelta(days=self.raw_days)
+        while not self._stopping.is_set():
+            pruned, duplicates = self._prune_raw_batch(cutoff)
+            report["raw_pruned"] += pruned
+            report["duplicates_pruned"] += duplicates
+            report["batches"] += 1 if pruned else 0
+            if pruned < self.batch_size:
+                break
+            time.sleep(self.batch_pause_seconds)
+
+        for days, model, name in (
+            (self.minute_days, TelemetryAggregateMinute, "minute_aggregates_pruned"),
+            (self.hour_days, TelemetryAggregateHour, "hour_aggregates_pruned")
+        ):
+            if days > 0:
+                report[name] = self._prune_aggregates(model, now - timedelta(days=days))
+
+        report["seconds"] = round(time.monotonic() - started, 3)
+        self.runs += 1
+        self.raw_pruned += report["raw_pruned"]
+        self.seconds_spent += report["seconds"]
+        self.last_run = report
+        logger.info(
+            f"Telemetry retention: pruned {report['raw_pruned']} raw readings in {report['batches']} batches, "
+            f"{report['minute_aggregates_pruned']} minute / {report['hour_aggregates_pruned']} hour aggregates "
+            f"({report['seconds']}s)"
+        )
+        return report
+
+    def _prune_raw_batch(self, cutoff: datetime) -> Tuple[int, int]:
+        """Delete the oldest batch of raw readings before cutoff and fold them into the aggregates"""
+        telemetry = Telemetry.__table__
+        with Session(self.engine) as session:
+            ids = session.exec(
+                select(Telemetry.id).where(Telemetry.ts < cutoff).order_by(Telemetry.ts).limit(self.batch_size)
+            ).all()
+            if not ids:
+                return 0, 0
+            duplicates = session.exec(
+                delete(TelemetryDuplicate).where(TelemetryDuplicate.original_telemetry_id.in_(ids))
+            ).rowcount
+            rows = session.execute(
+                telemetry.delete().where(telemetry.c.id.in_(ids)).returning(
+                    telemetry.c.device_id, telemetry.c.ts, telemetry.c.mq3, telemetry.c.mq135,
+                    telemetry.c.temp_c, telemetry.c.humidity_pct, telemetry.c.lat, telemetry.c.lon
+                )
+            ).all()
+            for seconds, model in AGGREGATES:
+                aggregates = downsample(rows, seconds)
+                if aggregates:
+                    session.execute(_merge_statement(session, model), aggregates)
+            session.commit()
+            return len(ids), duplicates
+
+    def _prune_aggregates(self, model, cutoff: datetime) -> int:
+        """Delete aggregates before cutoff, about a batch of buckets per transaction"""
+        removed = 0
+        while not self._stopping.is_set():
+            with Session(self.engine) as session:
+                # Up to the batch_size-th oldest bucket (all devices of that bucket go together)
+                boundary = session.exec(
+                    select(model.bucket_start)
+                    .where(model.bucket_start < cutoff)
+                    .order_by(model.bucket_start)
+                    .offset(self.batch_size - 1)
+                    .limit(1)
+                ).first()
+                upper = cutoff if boundary is None else boundary
+                deleted = session.exec(
+                    delete(model).where(model.bucket_start < cutoff, model.bucket_start <= upper)
+                ).rowcount
+                session.commit()
+            removed += deleted
+            if boundary is None:
+                break
+            time.sleep(self.batch_pause_seconds)
+        return removed
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "running": self.running,
+            "raw_retention_days": self.raw_days,
+            "runs": self.runs,
+            "failed_runs": self.failed_runs,
+            "raw_pruned": self.raw_pruned,
+            "seconds_spent": round(self.seconds_spent, 3),
+            "last_run": self.last_run
+        }
+
+
+telemetry_retention = TelemetryRetention()
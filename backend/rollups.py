@@ -0,0 +1,209 @@
+"""
+Pre-aggregated alert rollups (minute / hour / day)
+Each inserted Alert bumps one row per granularity, keyed by
+(bucket_start, device_id, severity), inside the same transaction as the alert
+itself. History aggregation reads these rows instead of scanning raw alerts
+whenever the requested buckets line up with a rollup granularity.
+"""
+
+import calendar
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from sqlalchemy import DateTime, Integer, bindparam, cast, event, func, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session, select, delete
+
+from backend.models import Alert, AlertRollupMinute, AlertRollupHour, AlertRollupDay
+
+logger = logging.getLogger(__name__)
+
+ROLLUPS_ENABLED = os.getenv("ROLLUPS_ENABLED", "true").lower() == "true"  # serve history from rollups
+ROLLUP_AUTO_BACKFILL = os.getenv("ROLLUP_AUTO_BACKFILL", "true").lower() == "true"
+ROLLUP_MAX_RANGE_HOURS = int(os.getenv("ROLLUP_MAX_RANGE_HOURS", str(366 * 24)))  # aggregate range cap with rollups
+
+# Coarsest first; every granularity divides the ones before it
+GRANULARITIES = (
+    (86400, AlertRollupDay),
+    (3600, AlertRollupHour),
+    (60, AlertRollupMinute),
+)
+
+# Same text layout SQLAlchemy uses for DateTime on SQLite, so ORM and SQL-built keys compare equal
+_SQL_BUCKET_FORMATS = {
+    86400: "%Y-%m-%d 00:00:00.000000",
+    3600: "%Y-%m-%d %H:00:00.000000",
+    60: "%Y-%m-%d %H:%M:00.000000",
+}
+# date_trunc units for the same buckets on PostgreSQL
+_PG_BUCKET_UNITS = {86400: "day", 3600: "hour", 60: "minute"}
+
+
+def epoch_seconds(ts: datetime) -> int:
+    return calendar.timegm(ts.timetuple())
+
+
+def floor_to(ts: datetime, seconds: int) -> datetime:
+    """Start of the `seconds`-wide UTC bucket containing ts"""
+    return datetime(1970, 1, 1) + timedelta(seconds=epoch_seconds(ts) // seconds * seconds)
+
+
+def has_gps(lat: Optional[float], lon: Optional[float]) -> bool:
+    """Same rule as the history endpoints: both coordinates present and non-zero"""
+    return lat is not None and lon is not None and lat != 0.0 and lon != 0.0
+
+
+def sql_epoch_seconds(column, dialect_name: str):
+    """SQL expression for the whole UTC epoch seconds of a naive DateTime column"""
+    if dialect_name == "postgresql":
+        return cast(func.floor(func.extract("epoch", column)), Integer)
+    return cast(func.strftime('%s', column), Integer)
+
+
+def _upsert_statement(model, dialect_name: str):
+    """INSERT ... ON CONFLICT DO UPDATE for one rollup table; values come as execute() parameters"""
+    backend = postgresql if dialect_name == "postgresql" else sqlite
+    # Scalar min/max are aggregates on PostgreSQL
+    least = func.least if dialect_name == "postgresql" else func.min
+    greatest = func.greatest if dialect_name == "postgresql" else func.max
+    statement = backend.insert(model).values({column.name: bindparam(column.name) for column in model.__table__.c})
+    excluded = statement.excluded
+    table = model.__table__.c
+    statement = statement.on_conflict_do_update(
+        index_elements=["bucket_start", "device_id", "severity"],
+        set_={
+            "count": table.count + excluded.count,
+            "gps_count": table.gps_count + excluded.gps_count,
+            "lat_sum": table.lat_sum + excluded.lat_sum,
+            "lon_sum": table.lon_sum + excluded.lon_sum,
+            "mq3_min": least(table.mq3_min, excluded.mq3_min),
+            "mq3_max": greatest(table.mq3_max, excluded.mq3_max),
+            "mq3_sum": table.mq3_sum + excluded.mq3_sum
+        }
+    )
+    # ON CONFLICT statements are not in SQLAlchemy's compiled cache; compile once to text
+    sql = str(statement.compile(dialect=backend.dialect(paramstyle="named")))
+    return text(sql).bindparams(bindparam("bucket_start", type_=DateTime))
+
+
+# dialect name -> [(seconds, upsert)], built on first use per dialect
+_UPSERTS = {}
+
+
+def _upserts(dialect_name: str):
+    if dialect_name not in _UPSERTS:
+        _UPSERTS[dialect_name] = [(seconds, _upsert_statement(model, dialect_name)) for seconds, model in GRANULARITIES]
+    return _UPSERTS[dialect_name]
+
+
+@event.listens_for(Alert, "after_insert")
+def _record_alert(mapper, connection, alert: Alert):
+    """Runs on the inserting connection, so rollups commit or roll back with the alert"""
+    gps = has_gps(alert.lat, alert.lon)
+    values = {
+        "device_id": alert.device_id,
+        "severity": alert.severity,
+        "count": 1,
+        "gps_count": 1 if gps else 0,
+        "lat_sum": alert.lat if gps else 0.0,
+        "lon_sum": alert.lon if gps else 0.0,
+        "mq3_min": alert.mq3,
+        "mq3_max": alert.mq3,
+        "mq3_sum": alert.mq3
+    }
+    for seconds, statement in _upserts(connection.dialect.name):
+        connection.execute(statement, {**values, "bucket_start": floor_to(alert.ts, seconds)})
+
+
+def rebuild_rollups(session: Session) -> int:
+    """
+    Recompute every rollup table from the alerts table (backfill / repair).
+    Returns the number of alerts aggregated. Caller commits.
+    """
+    gps = "(lat IS NOT NULL AND lon IS NOT NULL AND lat != 0 AND lon != 0)"
+    postgres = session.get_bind().dialect.name == "postgresql"
+    for seconds, model in GRANULARITIES:
+        session.exec(delete(model))
+        if postgres:
+            bucket_start = f"date_trunc('{_PG_BUCKET_UNITS[seconds]}', ts)"
+        else:
+            bucket_start = f"strftime('{_SQL_BUCKET_FORMATS[seconds]}', ts)"
+        session.exec(text(
+            f"INSERT INTO {model.__tablename__} "
+            "(bucket_start, device_id, severity, count, gps_count, lat_sum, lon_sum, mq3_min, mq3_max, mq3_sum) "
+            f"SELECT {bucket_start}, device_id, severity, COUNT(*), "
+            f"SUM(CASE WHEN {gps} THEN 1 ELSE 0 END), "
+            f"COALESCE(SUM(CASE WHEN {gps} THEN lat END), 0.0), "
+            f"COALESCE(SUM(CASE WHEN {gps} THEN lon END), 0.0), "
+            "MIN(mq3), MAX(mq3), SUM(mq3) "
+            "FROM alerts GROUP BY 1, device_id, severity"
+        ))
+    return session.exec(select(func.count()).select_from(Alert)).one()
+
+
+def ensure_rollups(session: Session):
+    """Backfill once when alerts exist but the rollup tables were never populated"""
+    if not ROLLUP_AUTO_BACKFILL:
+        return
+    if session.exec(select(AlertRollupDay.bucket_start).limit(1)).first() is not None:
+        return
+    if session.exec(select(Alert.id).limit(1)).first() is None:
+        return
+    count = rebuild_rollups(session)
+    session.commit()
+    logger.info(f"Backfilled alert rollups from {count} existing alerts")
+
+
+def rollup_granularity(from_dt: datetime, bucket_seconds: int) -> Optional[int]:
+    """Coarsest rollup whose buckets tile the requested ones, or None to scan raw alerts"""
+    if not ROLLUPS_ENABLED or from_dt.microsecond:
+        return None
+    for seconds, _ in GRANULARITIES:
+        if bucket_seconds % seconds == 0 and epoch_seconds(from_dt) % seconds == 0:
+            return seconds
+    return None
+
+
+def rollup_bucket_rows(
+    session: Session,
+    from_dt: datetime,
+    to_dt: datetime,
+    bucket_seconds: int,
+    granularity: int,
+    device_id: Optional[str] = None
+) -> Tuple[List[tuple], datetime]:
+    """
+    (bucket index, severity, count, lat_sum, lon_sum) rows for GPS alerts, read
+    from the coarsest rollup first and finer ones for the partial buckets at
+    the end of the range. Returns the rows and the point from which raw alerts
+    still need to be scanned (always less than a minute before to_dt).
+    """
+    from_epoch = epoch_seconds(from_dt)
+    dialect_name = session.get_bind().dialect.name
+    rows = []
+    start = from_dt
+    for seconds, model in GRANULARITIES:
+        if seconds > granularity:
+            continue
+        end = floor_to(to_dt, seconds)
+        if end <= start:
+            continue
+        index = ((sql_epoch_seconds(model.bucket_start, dialect_name) - from_epoch) // bucket_seconds).label("bucket")
+        statement = (
+            select(
+                index,
+                model.severity,
+                func.sum(model.gps_count),
+                func.sum(model.lat_sum),
+                func.sum(model.lon_sum)
+            )
+            .where(model.bucket_start >= start, model.bucket_start < end, model.gps_count > 0)
+            .group_by(index, model.severity)
+        )
+        if device_id:
+            statement = statement.where(model.device_id == device_id)
+        rows.extend(session.exec(statement).all())
+        start = end
+    return rows, start
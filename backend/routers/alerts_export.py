@@ -4,19 +4,19 @@ Handles alert retrieval with lat/lon filtering and CSV export functionality
 """
 
 from fastapi import APIRouter, Depends, Query, HTTPException
-from fastapi.responses import Response
 from sqlmodel import Session, select, and_
 from typing import List, Optional
-import csv
-import io
-from datetime import datetime
 
 from backend.models import Alert, User
 from backend.schemas import AlertResponse
 from backend.auth import get_current_user, get_current_admin, get_db
+from backend.database import DatabaseRunner, async_engine
+from backend.exports import export_filters, export_response, parse_range
 
 router = APIRouter(prefix="/api/v1/alerts", tags=["alerts"])
 
+DEFAULT_EXPORT_LIMIT = 1000  # newest alerts exported when no limit is given (limit=0 exports every row)
+
 
 @router.get("", response_model=List[AlertResponse])
 async def get_alerts(
@@ -52,72 +52,35 @@ async def get_alerts(
     # Order by newest first and limit
     statement = statement.order_by(Alert.created_at.desc()).limit(limit)
     
-    alerts = session.exec(statement).all()
-    return alerts
+    async with DatabaseRunner(session, async_engine) as db:
+        return await db.all(statement)
 
 
 @router.get("/export")
-async def export_alerts_csv(
+def export_alerts(
     lat_only: bool = Query(True, description="Export only alerts with GPS coordinates"),
-    limit: int = Query(1000, ge=1, le=10000, description="Maximum number of alerts to export"),
+    limit: int = Query(DEFAULT_EXPORT_LIMIT, ge=0, description="Maximum number of alerts to export (0: all)"),
+    export_format: str = Query("csv", alias="format", pattern="^(csv|parquet|arrow)$", description="csv, parquet or arrow"),
+    columns: Optional[str] = Query(None, description="Comma-separated columns, e.g. ts,mq3,lat,lon"),
+    from_time: Optional[str] = Query(None, description="Start time (ISO8601)"),
+    to_time: Optional[str] = Query(None, description="End time (ISO8601)"),
+    device_id: Optional[str] = Query(None, description="Filter by device ID"),
+    severity: Optional[str] = Query(None, pattern="^(SAFE|WARNING|HIGH)$", description="Filter by severity"),
+    order: str = Query("desc", pattern="^(asc|desc)$", description="desc (newest first) or asc (oldest first)"),
+    gzip: bool = Query(False, description="gzip the CSV stream (Content-Encoding: gzip)"),
     session: Session = Depends(get_db),
     current_user: User = Depends(get_current_admin)  # Admin only for export
 ):
     """
-    Export alerts to CSV format
-    Returns CSV file with alerts data
+    Export alerts to CSV, Parquet or Arrow IPC format
+    Newest 1000 by default, as before streaming; limit=0 / order=asc for the whole range oldest first.
+    Streamed in keyset pages, so any range exports in constant memory
     Admin only - requires authentication
     """
-    statement = select(Alert)
-    
-    # Apply GPS filter if requested
-    if lat_only:
-        statement = statement.where(
-            and_(
-                Alert.lat.isnot(None),
-                Alert.lon.isnot(None),
-                Alert.lat != 0.0,
-                Alert.lon != 0.0
-            )
-        )
-    
-    # Order by newest first and limit
-    statement = statement.order_by(Alert.created_at.desc()).limit(limit)
-    
-    alerts = session.exec(statement).all()
-    
-    # Create CSV in memory
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Write header
-    writer.writerow([
-        "id", "device_id", "timestamp", "severity", "mq3", "mq135",
-        "lat", "lon", "short_message"
-    ])
-    
-    # Write data rows
-    for alert in alerts:
-        writer.writerow([
-            alert.id,
-            alert.device_id,
-            alert.ts.isoformat() if alert.ts else "",
-            alert.severity,
-            alert.mq3,
-            alert.mq135,
-            alert.lat if alert.lat else "",
-            alert.lon if alert.lon else "",
-            alert.short_message
-        ])
-    
-    # Generate filename with current date
-    filename = f"alerts_gps_{datetime.utcnow().strftime('%Y-%m-%d')}.csv"
+    from_dt, to_dt = parse_range(from_time, to_time)
+    filters = export_filters(Alert, from_dt, to_dt, device_id, severity=severity, lat_only=lat_only)
     
-    # Return CSV as downloadable file
-    return Response(
-        content=output.getvalue(),
-        media_type="text/csv",
-        headers={
-            "Content-Disposition": f'attachment; filename="{filename}"'
-        }
+    return export_response(
+        session, "alerts", export_format, columns, filters, from_dt, to_dt,
+        limit=limit or None, descending=order == "desc", compress=gzip, filename_prefix="alerts_gps"
     )
@@ -3,19 +3,23 @@ Alert history endpoint for replay functionality
 Supports raw alert retrieval and time-bucketed aggregation for performance
 """
 
-from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi import APIRouter, Depends, Header, Query, HTTPException
 from fastapi.responses import StreamingResponse
 from sqlmodel import Session, select, and_, func, case
+from sqlalchemy import Integer, cast, tuple_
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime, timedelta, timezone
+import calendar
 import json
 import logging
 
 from backend.models import Alert, User
 from backend.schemas import AlertResponse
 from backend.auth import get_current_user, get_current_admin
-from backend.database import get_session
+from backend.database import DatabaseRunner, get_db_runner
+from backend import rollups
+from backend.partitions import merge_rows, storage_partitions
 
 router = APIRouter(prefix="/api/v1/alerts", tags=["alerts"])
 
@@ -26,6 +30,7 @@ MAX_LIMIT_RAW = 50000
 MAX_LIMIT_AGGREGATE = 100000
 DEFAULT_MAX_RANGE_HOURS = 48  # Default max range for non-admin users
 ADMIN_MAX_RANGE_HOURS = 168  # 7 days for admin
+MAX_AGGREGATE_BUCKETS = 10080  # 7 days of 1-minute buckets
 
 
 class AlertHistoryItem(AlertResponse):
@@ -45,6 +50,111 @@ class AggregationBucket(BaseModel):
         from_attributes = True
 
 
+def _bucket_index(from_dt: datetime, bucket_seconds: int, dialect_name: str = "sqlite"):
+    """
+    SQL expression for floor((ts - from_dt) / bucket_seconds).
+    SQLite: whole epoch seconds (exact integer math, no julianday float rounding at
+    bucket edges), borrowing one second when ts' microseconds fall below from_dt's.
+    PostgreSQL: the exact interval ts - from_dt in seconds.
+    """
+    if dialect_name == "postgresql":
+        return cast(func.floor(func.extract("epoch", Alert.ts - from_dt) / bucket_seconds), Integer)
+    from_epoch = calendar.timegm(from_dt.timetuple())
+    elapsed = rollups.sql_epoch_seconds(Alert.ts, dialect_name) - from_epoch
+    if from_dt.microsecond:
+        micros = cast(func.substr(Alert.ts, 21, 6), Integer)
+        elapsed = elapsed - case((micros < from_dt.microsecond, 1), else_=0)
+    # SQLite integer division truncates toward zero; ts >= from_dt keeps elapsed >= 0
+    return elapsed // bucket_seconds
+
+
+def _raw_bucket_rows(
+    session: Session,
+    from_dt: datetime,
+    to_dt: datetime,
+    bucket_seconds: int,
+    device_id: Optional[str] = None,
+    since: Optional[datetime] = None
+) -> list:
+    """(bucket index, severity, count, lat_sum, lon_sum) from the alerts table, GROUP BY in SQL"""
+    bucket = _bucket_index(from_dt, bucket_seconds, session.get_bind().dialect.name).label("bucket")
+    statement = (
+        select(
+            bucket,
+            Alert.severity,
+            func.count().label("n"),
+            func.sum(Alert.lat).label("lat_sum"),
+            func.sum(Alert.lon).label("lon_sum")
+        )
+        .where(
+            and_(
+                Alert.ts >= (since or from_dt),
+                Alert.ts <= to_dt,
+                Alert.lat.isnot(None),
+                Alert.lon.isnot(None),
+                Alert.lat != 0.0,
+                Alert.lon != 0.0
+            )
+        )
+        .group_by(bucket, Alert.severity)
+    )
+    if device_id:
+        statement = statement.where(Alert.device_id == device_id)
+    rows = session.exec(statement).all()
+    # Archived months overlapping the range; bucket sums simply add up across partitions
+    for archived in storage_partitions.read_overlapping(session, statement, since or from_dt, to_dt):
+        rows += archived
+    return rows
+
+
+def aggregate_alert_buckets(
+    session: Session,
+    from_dt: datetime,
+    to_dt: datetime,
+    bucket_seconds: int,
+    device_id: Optional[str] = None
+) -> List[AggregationBucket]:
+    """
+    Time-bucketed severity counts with a GPS centroid per bucket.
+    Reads the minute/hour/day rollups when the buckets line up with one of them
+    (only the last partial minute comes from raw alerts); otherwise groups the
+    raw alerts in SQL. Either way only bucket rows reach Python.
+    """
+    granularity = rollups.rollup_granularity(from_dt, bucket_seconds)
+    if granularity:
+        rows, raw_since = rollups.rollup_bucket_rows(session, from_dt, to_dt, bucket_seconds, granularity, device_id)
+        rows += _raw_bucket_rows(session, from_dt, to_dt, bucket_seconds, device_id, since=raw_since)
+    else:
+        rows = _raw_bucket_rows(session, from_dt, to_dt, bucket_seconds, device_id)
+
+    buckets = {}
+    for index, severity, n, lat_sum, lon_sum in rows:
+        entry = buckets.get(index)
+        if entry is None:
+            entry = buckets[index] = {
+                "counts": {"SAFE": 0, "WARNING": 0, "HIGH": 0},
+                "total_count": 0,
+                "lat_sum": 0.0,
+                "lon_sum": 0.0
+            }
+        entry["counts"][severity] = entry["counts"].get(severity, 0) + n
+        entry["total_count"] += n
+        entry["lat_sum"] += lat_sum
+        entry["lon_sum"] += lon_sum
+
+    # Every aggregated row has a GPS fix (filtered above), so the centroid is sum / count
+    return [
+        AggregationBucket(
+            bucket_start=(from_dt + timedelta(seconds=index * bucket_seconds)).isoformat() + 'Z',
+            counts=entry["counts"],
+            repr_lat=entry["lat_sum"] / entry["total_count"],
+            repr_lon=entry["lon_sum"] / entry["total_count"],
+            total_count=entry["total_count"]
+        )
+        for index, entry in sorted(buckets.items())
+    ]
+
+
 @router.get("/history")
 async def get_alert_history(
     from_time: str = Query(..., description="Start time (ISO8601)"),
@@ -53,7 +163,7 @@ async def get_alert_history(
     limit: int = Query(10000, ge=1, le=MAX_LIMIT_RAW, description="Maximum alerts to return"),
     aggregate: bool = Query(False, description="Return aggregated buckets instead of raw alerts"),
     bucket_minutes: Optional[int] = Query(None, ge=1, le=1440, description="Bucket size in minutes (required if aggregate=true)"),
-    session: Session = Depends(get_session),
+    db: DatabaseRunner = Depends(get_db_runner),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -64,6 +174,9 @@ async def get_alert_history(
     
     Performance notes:
     - For ranges > 48 hours (non-admin) or > 7 days (admin), use aggregation mode
+    - Aggregation aligned to whole minutes/hours/days reads the rollup tables; for admins
+      it allows ranges up to ROLLUP_MAX_RANGE_HOURS (default 366 days)
+    - Aggregation returns at most MAX_AGGREGATE_BUCKETS buckets
     - Default limit is 10k alerts; max 50k for raw mode
     - Aggregation mode supports up to 100k alerts
     """
@@ -86,7 +199,11 @@ async def get_alert_history(
     
     # Enforce range limits based on user role
     range_hours = (to_dt - from_dt).total_seconds() / 3600
-    max_range = ADMIN_MAX_RANGE_HOURS if current_user.role == "admin" else DEFAULT_MAX_RANGE_HOURS
+    is_admin = current_user.role == "admin"
+    max_range = ADMIN_MAX_RANGE_HOURS if is_admin else DEFAULT_MAX_RANGE_HOURS
+    if is_admin and aggregate and bucket_minutes and rollups.rollup_granularity(from_dt, bucket_minutes * 60):
+        # Answered from pre-aggregated rollups: cost no longer grows with raw alert volume
+        max_range = max(max_range, rollups.ROLLUP_MAX_RANGE_HOURS)
     
     if range_hours > max_range:
         raise HTTPException(
@@ -94,6 +211,12 @@ async def get_alert_history(
             detail=f"Time range exceeds maximum ({max_range}h). Use aggregation mode for large ranges."
         )
     
+    if aggregate and bucket_minutes and range_hours * 60 / bucket_minutes > MAX_AGGREGATE_BUCKETS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many buckets (maximum {MAX_AGGREGATE_BUCKETS}). Use a larger bucket_minutes."
+        )
+    
     # Build base query
     statement = select(Alert).where(
         and_(
@@ -118,66 +241,15 @@ async def get_alert_history(
                 detail="bucket_minutes is required when aggregate=true"
             )
         
-        # Calculate bucket size in seconds
-        bucket_seconds = bucket_minutes * 60
-        
-        # SQL aggregation query
-        # Group by time bucket and severity, calculate counts and representative coordinates
-        # Note: This is a simplified aggregation; for production, consider using database-specific functions
-        alerts = session.exec(
-            statement.order_by(Alert.ts.asc())
-        ).all()
-        
-        # Manual aggregation (for SQLite compatibility)
-        buckets = {}
-        for alert in alerts:
-            # Calculate bucket start time
-            bucket_start_seconds = int((alert.ts - from_dt).total_seconds() // bucket_seconds) * bucket_seconds
-            bucket_start = from_dt + timedelta(seconds=bucket_start_seconds)
-            bucket_key = bucket_start.isoformat() + 'Z'
-            
-            if bucket_key not in buckets:
-                buckets[bucket_key] = {
-                    "bucket_start": bucket_key,
-                    "counts": {"SAFE": 0, "WARNING": 0, "HIGH": 0},
-                    "repr_lat": alert.lat,
-                    "repr_lon": alert.lon,
-                    "total_count": 0,
-                    "lat_sum": 0.0,
-                    "lon_sum": 0.0,
-                    "lat_count": 0
-                }
-            
-            bucket = buckets[bucket_key]
-            bucket["counts"][alert.severity] = bucket["counts"].get(alert.severity, 0) + 1
-            bucket["total_count"] += 1
-            
-            # Update representative coordinates (centroid)
-            if alert.lat and alert.lon:
-                bucket["lat_sum"] += alert.lat
-                bucket["lon_sum"] += alert.lon
-                bucket["lat_count"] += 1
-                bucket["repr_lat"] = bucket["lat_sum"] / bucket["lat_count"]
-                bucket["repr_lon"] = bucket["lon_sum"] / bucket["lat_count"]
-        
-        # Convert to response format
-        result = []
-        for bucket_key in sorted(buckets.keys()):
-            bucket = buckets[bucket_key]
-            result.append(AggregationBucket(
-                bucket_start=bucket["bucket_start"],
-                counts=bucket["counts"],
-                repr_lat=bucket["repr_lat"],
-                repr_lon=bucket["repr_lon"],
-                total_count=bucket["total_count"]
-            ))
-        
-        return result
+        return await db.run(aggregate_alert_buckets, from_dt, to_dt, bucket_minutes * 60, device_id)
     
     else:
         # Raw mode - return individual alerts
         statement = statement.order_by(Alert.ts.asc()).limit(limit)
-        alerts = session.exec(statement).all()
+        alerts = await db.all(statement)
+        archived = await storage_partitions.read_archived(db, statement, from_dt, to_dt)
+        if archived:
+            alerts = merge_rows([alerts, *archived], key=lambda a: (a.ts, a.id), limit=limit)
         
         # Check if we're approaching the limit
         if len(alerts) >= limit:
@@ -189,21 +261,46 @@ async def get_alert_history(
         return alerts
 
 
+# Columns emitted by the SSE stream (no ORM hydration)
+STREAM_COLUMNS = (
+    Alert.id, Alert.device_id, Alert.ts, Alert.severity, Alert.short_message,
+    Alert.mq3, Alert.mq135, Alert.lat, Alert.lon
+)
+
+
+def format_stream_cursor(ts: datetime, alert_id: int) -> str:
+    """SSE event id for the last alert of a batch: <ISO ts>|<alert id>"""
+    return f"{ts.isoformat()}|{alert_id}"
+
+
+def parse_stream_cursor(cursor: str):
+    """Inverse of format_stream_cursor(); raises ValueError on malformed input"""
+    ts_part, _, id_part = cursor.rpartition("|")
+    return datetime.fromisoformat(ts_part), int(id_part)
+
+
 @router.get("/history/stream")
 async def stream_alert_history(
     from_time: str = Query(..., description="Start time (ISO8601)"),
     to_time: str = Query(..., description="End time (ISO8601)"),
     device_id: Optional[str] = Query(None, description="Filter by device ID"),
     batch_size: int = Query(500, ge=1, le=5000, description="Alerts per batch"),
-    session: Session = Depends(get_session),
+    last_event_id: Optional[str] = Query(None, description="Resume after this cursor (same as the Last-Event-ID header)"),
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+    db: DatabaseRunner = Depends(get_db_runner),
     current_user: User = Depends(get_current_user)
 ):
     """
     Stream alert history as Server-Sent Events (SSE)
     Useful for large datasets where loading all at once would be too slow
     
+    Batches walk the (ts, id) index with a keyset cursor, so every batch costs
+    the same regardless of how far into the range the replay is. Each event
+    carries the cursor as its SSE id; a reconnecting client sends it back in
+    Last-Event-ID (EventSource does this automatically) to resume.
+    
     Returns: JSON array chunks in chronological order
-    Format: data: [{"id": 1, ...}, {"id": 2, ...}]\n\n
+    Format: id: <cursor>\ndata: [{"id": 1, ...}, {"id": 2, ...}]\n\n
     """
     try:
         from_dt = datetime.fromisoformat(from_time.replace('Z', '+00:00'))
@@ -219,8 +316,16 @@ async def stream_alert_history(
     if from_dt >= to_dt:
         raise HTTPException(status_code=400, detail="from_time must be before to_time")
     
+    cursor = None
+    resume_from = last_event_id or last_event_id_header
+    if resume_from:
+        try:
+            cursor = parse_stream_cursor(resume_from)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid Last-Event-ID cursor")
+    
     # Build query
-    statement = select(Alert).where(
+    statement = select(*STREAM_COLUMNS).where(
         and_(
             Alert.ts >= from_dt,
             Alert.ts <= to_dt,
@@ -234,14 +339,23 @@ async def stream_alert_history(
     if device_id:
         statement = statement.where(Alert.device_id == device_id)
     
-    statement = statement.order_by(Alert.ts.asc())
+    statement = statement.order_by(Alert.ts.asc(), Alert.id.asc()).limit(batch_size)
     
     async def generate():
-        """Generator function for SSE streaming"""
-        offset = 0
+        """Async generator for SSE streaming; each batch query goes through the DatabaseRunner"""
+        position = cursor
         while True:
-            batch_statement = statement.offset(offset).limit(batch_size)
-            batch = session.exec(batch_statement).all()
+            batch_statement = statement
+            if position is not None:
+                batch_statement = batch_statement.where(
+                    tuple_(Alert.ts, Alert.id) > tuple_(*position, types=[Alert.ts.type, Alert.id.type])
+                )
+            batch = await db.all(batch_statement)
+            archived = await storage_partitions.read_archived(
+                db, batch_statement, position[0] if position else from_dt, to_dt
+            )
+            if archived:
+                batch = merge_rows([batch, *archived], key=lambda r: (r.ts, r.id), limit=batch_size)
             
             if not batch:
                 break
@@ -249,23 +363,24 @@ async def stream_alert_history(
             # Convert to dict format
             batch_data = [
                 {
-                    "id": alert.id,
-                    "device_id": alert.device_id,
-                    "ts": alert.ts.isoformat() + 'Z',
-                    "severity": alert.severity,
-                    "short_message": alert.short_message,
-                    "mq3": alert.mq3,
-                    "mq135": alert.mq135,
-                    "lat": alert.lat,
-                    "lon": alert.lon
+                    "id": alert_id,
+                    "device_id": alert_device_id,
+                    "ts": ts.isoformat() + 'Z',
+                    "severity": severity,
+                    "short_message": short_message,
+                    "mq3": mq3,
+                    "mq135": mq135,
+                    "lat": lat,
+                    "lon": lon
                 }
-                for alert in batch
+                for alert_id, alert_device_id, ts, severity, short_message, mq3, mq135, lat, lon in batch
             ]
             
-            # SSE format: data: <json>\n\n
-            yield f"data: {json.dumps(batch_data)}\n\n"
+            last = batch[-1]
+            position = (last.ts, last.id)
             
-            offset += batch_size
+            # SSE format: id: <cursor>\ndata: <json>\n\n
+            yield f"id: {format_stream_cursor(*position)}\ndata: {json.dumps(batch_data)}\n\n"
             
             if len(batch) < batch_size:
                 break
@@ -279,4 +394,3 @@ async def stream_alert_history(
             "X-Accel-Buffering": "no"  # Disable nginx buffering
         }
     )
-
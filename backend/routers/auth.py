@@ -4,19 +4,28 @@ Handles user registration, login, and authentication
 """
 
 from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi.concurrency import run_in_threadpool
 from sqlmodel import Session
 from datetime import datetime
 
 from backend.models import User, UserRole
 from backend.schemas import UserCreate, UserLogin, Token, UserResponse, UserPublic
+from backend import auth_cache
 from backend.auth import (
-    get_password_hash, authenticate_user, create_access_token,
+    get_password_hash_async, authenticate_user_async, create_access_token,
     get_current_user, get_db, check_rate_limit
 )
 
 router = APIRouter(prefix="/api/v1/auth", tags=["authentication"])
 
 
+def _save_user(session: Session, user: User):
+    session.add(user)
+    session.commit()
+    session.refresh(user)
+    auth_cache.invalidate_user(user.email)
+
+
 @router.post("/signup", response_model=UserPublic, status_code=status.HTTP_201_CREATED)
 async def signup(
     user_data: UserCreate,
@@ -27,16 +36,16 @@ async def signup(
     Creates a user with role "user" (admin users must be created via seed script)
     """
     # Check if user already exists
-    from backend.auth import get_user_by_email
-    existing_user = get_user_by_email(session, user_data.email)
+    from backend.auth import _load_user_for_login
+    existing_user = await run_in_threadpool(_load_user_for_login, session, user_data.email)
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
     
-    # Create new user
-    hashed_password = get_password_hash(user_data.password)
+    # Create new user (bcrypt on its own pool, DB work in the threadpool)
+    hashed_password = await get_password_hash_async(user_data.password)
     new_user = User(
         email=user_data.email,
         full_name=user_data.full_name,
@@ -44,9 +53,7 @@ async def signup(
         role=UserRole.USER
     )
     
-    session.add(new_user)
-    session.commit()
-    session.refresh(new_user)
+    await run_in_threadpool(_save_user, session, new_user)
     
     return new_user
 
@@ -65,14 +72,14 @@ async def login_json(
     client_ip = request.client.host if request else "unknown"
     
     # Check rate limit
-    if not check_rate_limit(client_ip):
+    if not await run_in_threadpool(check_rate_limit, client_ip, login_data.email):
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
             detail="Too many login attempts. Please try again later."
         )
     
     # Authenticate user
-    user = authenticate_user(session, login_data.email, login_data.password)
+    user = await authenticate_user_async(session, login_data.email, login_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -82,8 +89,7 @@ async def login_json(
     
     # Update last login
     user.last_login = datetime.utcnow()
-    session.add(user)
-    session.commit()
+    await run_in_threadpool(_save_user, session, user)
     
     # Create access token
     access_token = create_access_token(data={"sub": user.email})
@@ -101,7 +107,7 @@ async def login_json(
 
 
 @router.get("/me", response_model=UserResponse)
-async def get_current_user_info(
+def get_current_user_info(
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -112,7 +118,7 @@ async def get_current_user_info(
 
 
 @router.post("/logout")
-async def logout(
+def logout(
     current_user: User = Depends(get_current_user)
 ):
     """
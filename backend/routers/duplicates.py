@@ -15,42 +15,48 @@ from backend.auth import get_current_user, get_current_admin, get_db
 
 router = APIRouter(prefix="/api/v1/duplicates", tags=["duplicates"])
 
+SAMPLE_SIZE = 5  # sample duplicates returned per group
+
+
+def _payload(payload_json: Optional[str], decode: bool):
+    """Stored payload, parsed unless the caller asked for the raw JSON text"""
+    if not payload_json:
+        return {} if decode else "{}"
+    return json.loads(payload_json) if decode else payload_json
+
 
 @router.get("", response_model=dict)
-async def get_duplicates(
+def get_duplicates(
     device_id: Optional[str] = Query(None, description="Filter by device ID"),
     from_ts: Optional[str] = Query(None, description="Start timestamp (ISO8601)"),
     to_ts: Optional[str] = Query(None, description="End timestamp (ISO8601)"),
     limit: int = Query(50, ge=1, le=100),
     offset: int = Query(0, ge=0),
+    decode_payloads: bool = Query(True, description="Parse sample payloads; false returns the raw JSON text"),
     session: Session = Depends(get_db),
     current_user = Depends(get_current_user)
 ):
     """
     Get duplicate telemetry entries grouped by (device_id, timestamp)
     Returns original telemetry + duplicate count + sample duplicates
+    Three queries whatever the page size: group count, groups joined with their
+    originals, and the first SAMPLE_SIZE duplicates of every group on the page
     """
-    # Build base query
-    statement = select(
-        TelemetryDuplicate.original_telemetry_id,
-        TelemetryDuplicate.device_id,
-        TelemetryDuplicate.timestamp,
-        func.count(TelemetryDuplicate.id).label("duplicate_count")
-    ).where(
+    pending = [
         TelemetryDuplicate.is_merged == False,
         TelemetryDuplicate.is_ignored == False
-    )
+    ]
     
     # Apply filters
     if device_id:
-        statement = statement.where(TelemetryDuplicate.device_id == device_id)
+        pending.append(TelemetryDuplicate.device_id == device_id)
     
     if from_ts:
         try:
             from_dt = datetime.fromisoformat(from_ts.replace('Z', '+00:00'))
             if from_dt.tzinfo:
                 from_dt = from_dt.astimezone().replace(tzinfo=None)
-            statement = statement.where(TelemetryDuplicate.timestamp >= from_dt)
+            pending.append(TelemetryDuplicate.timestamp >= from_dt)
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid from_ts format")
     
@@ -59,51 +65,66 @@ async def get_duplicates(
             to_dt = datetime.fromisoformat(to_ts.replace('Z', '+00:00'))
             if to_dt.tzinfo:
                 to_dt = to_dt.astimezone().replace(tzinfo=None)
-            statement = statement.where(TelemetryDuplicate.timestamp <= to_dt)
+            pending.append(TelemetryDuplicate.timestamp <= to_dt)
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid to_ts format")
     
-    # Group by and order
-    statement = statement.group_by(
+    # One row per (original, device, timestamp) group
+    groups = select(
+        TelemetryDuplicate.original_telemetry_id,
+        TelemetryDuplicate.device_id,
+        TelemetryDuplicate.timestamp,
+        func.count(TelemetryDuplicate.id).label("duplicate_count")
+    ).where(*pending).group_by(
         TelemetryDuplicate.original_telemetry_id,
         TelemetryDuplicate.device_id,
         TelemetryDuplicate.timestamp
-    ).order_by(TelemetryDuplicate.timestamp.desc())
+    ).subquery()
     
     # Get total count
-    count_statement = select(func.count()).select_from(statement.subquery())
-    total = session.exec(count_statement).one()
+    total = session.exec(select(func.count()).select_from(groups)).one()
     
-    # Apply pagination
-    statement = statement.limit(limit).offset(offset)
+    # Page of groups with their original telemetry (groups whose original is gone are skipped)
+    statement = select(
+        Telemetry,
+        groups.c.device_id,
+        groups.c.timestamp,
+        groups.c.duplicate_count
+    ).join(groups, groups.c.original_telemetry_id == Telemetry.id).order_by(
+        groups.c.timestamp.desc(),
+        groups.c.original_telemetry_id.desc()
+    ).limit(limit).offset(offset)
+    page = session.exec(statement).all()
     
-    # Execute
-    results = session.exec(statement).all()
+    # First SAMPLE_SIZE duplicates of every group on the page, in one windowed query
+    samples = {}
+    if page:
+        rank = func.row_number().over(
+            partition_by=(
+                TelemetryDuplicate.original_telemetry_id,
+                TelemetryDuplicate.device_id,
+                TelemetryDuplicate.timestamp
+            ),
+            order_by=TelemetryDuplicate.id
+        ).label("rank")
+        ranked = select(
+            TelemetryDuplicate.id,
+            TelemetryDuplicate.original_telemetry_id,
+            TelemetryDuplicate.device_id,
+            TelemetryDuplicate.timestamp,
+            TelemetryDuplicate.payload_json,
+            TelemetryDuplicate.received_at,
+            rank
+        ).where(
+            *pending,
+            TelemetryDuplicate.original_telemetry_id.in_({original.id for original, *_ in page})
+        ).subquery()
+        sample_statement = select(ranked).where(ranked.c.rank <= SAMPLE_SIZE).order_by(ranked.c.id)
+        for dup in session.execute(sample_statement).all():
+            samples.setdefault((dup.original_telemetry_id, dup.device_id, dup.timestamp), []).append(dup)
     
-    # Build response with original telemetry and sample duplicates
     duplicates_list = []
-    for row in results:
-        original_id = row.original_telemetry_id
-        device_id_val = row.device_id
-        ts = row.timestamp
-        dup_count = row.duplicate_count
-        
-        # Get original telemetry
-        original = session.get(Telemetry, original_id)
-        if not original:
-            continue
-        
-        # Get sample duplicates (up to 5)
-        dup_statement = select(TelemetryDuplicate).where(
-            TelemetryDuplicate.original_telemetry_id == original_id,
-            TelemetryDuplicate.device_id == device_id_val,
-            TelemetryDuplicate.timestamp == ts,
-            TelemetryDuplicate.is_merged == False,
-            TelemetryDuplicate.is_ignored == False
-        ).limit(5)
-        
-        sample_duplicates = session.exec(dup_statement).all()
-        
+    for original, device_id_val, ts, dup_count in page:
         duplicates_list.append({
             "original_telemetry": {
                 "id": original.id,
@@ -121,10 +142,10 @@ async def get_duplicates(
             "sample_duplicates": [
                 {
                     "id": dup.id,
-                    "payload_json": json.loads(dup.payload_json) if dup.payload_json else {},
+                    "payload_json": _payload(dup.payload_json, decode_payloads),
                     "received_at": dup.received_at.isoformat()
                 }
-                for dup in sample_duplicates
+                for dup in samples.get((original.id, device_id_val, ts), [])
             ]
         })
     
@@ -137,7 +158,7 @@ async def get_duplicates(
 
 
 @router.get("/{duplicate_id}", response_model=dict)
-async def get_duplicate_detail(
+def get_duplicate_detail(
     duplicate_id: int,
     session: Session = Depends(get_db),
     current_user = Depends(get_current_user)
@@ -171,7 +192,7 @@ async def get_duplicate_detail(
 
 
 @router.post("/merge")
-async def merge_duplicates(
+def merge_duplicates(
     merge_data: dict,
     session: Session = Depends(get_db),
     current_user = Depends(get_current_admin)  # Admin only
@@ -222,7 +243,7 @@ async def merge_duplicates(
 
 
 @router.post("/ignore")
-async def ignore_duplicates(
+def ignore_duplicates(
     ignore_data: dict,
     session: Session = Depends(get_db),
     current_user = Depends(get_current_admin)  # Admin only
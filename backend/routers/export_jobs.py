@@ -0,0 +1,162 @@
+"""
+Background export job routes
+Create a job, poll its progress, download the finished file (HTTP Range supported)
+"""
+
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from fastapi.responses import StreamingResponse
+from sqlmodel import Session
+from typing import Optional, Tuple
+import os
+
+from backend.models import ExportJob, User
+from backend.schemas import ExportJobCreate, ExportJobResponse
+from backend.auth import get_current_admin, get_db
+from backend.export_jobs import export_jobs
+from backend.exports import FORMATS
+
+router = APIRouter(prefix="/api/v1/exports", tags=["exports"])
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+
+def _job_response(job: ExportJob) -> ExportJobResponse:
+    progress = None
+    if job.total_rows is not None:
+        progress = 1.0 if job.status == "done" or not job.total_rows else round(min(job.rows_written / job.total_rows, 1.0), 4)
+    return ExportJobResponse(
+        id=job.id,
+        kind=job.kind,
+        format=job.format,
+        status=job.status,
+        rows_written=job.rows_written,
+        total_rows=job.total_rows,
+        progress=progress,
+        bytes_written=job.bytes_written,
+        error=job.error,
+        created_at=job.created_at,
+        finished_at=job.finished_at,
+        download_url=f"/api/v1/exports/{job.id}/download" if job.status == "done" else None
+    )
+
+
+def _get_job(session: Session, job_id: str) -> ExportJob:
+    job = session.get(ExportJob, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    return job
+
+
+def parse_byte_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Inclusive (start, end) for a single "bytes=" range, None when the header should be ignored
+    (other units, several ranges, malformed). Raises HTTP 416 when the range is unsatisfiable.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    try:
+        if not first:
+            # Suffix range: the last N bytes
+            length = int(last)
+            start, end = max(0, size - length), size - 1
+            if length <= 0:
+                raise ValueError(spec)
+        else:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, end
+
+
+def _file_chunks(path: str, start: int, length: int):
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            data = f.read(min(DOWNLOAD_CHUNK_SIZE, length))
+            if not data:
+                return
+            length -= len(data)
+            yield data
+
+
+@router.post("", response_model=ExportJobResponse, status_code=status.HTTP_202_ACCEPTED)
+def create_export_job(
+    export_request: ExportJobCreate,
+    session: Session = Depends(get_db),
+    current_user: User = Depends(get_current_admin)  # Admin only for export
+):
+    """
+    Queue an alerts / telemetry / duplicates export
+    Poll GET /api/v1/exports/{id} for progress; download_url is set once it is done
+    """
+    params = export_request.dict(exclude={"kind", "format"}, exclude_none=True)
+    try:
+        job = export_jobs.create(session, export_request.kind, export_request.format, params, user_id=current_user.id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    return _job_response(job)
+
+
+@router.get("/{job_id}", response_model=ExportJobResponse)
+def get_export_job(
+    job_id: str,
+    session: Session = Depends(get_db),
+    current_user: User = Depends(get_current_admin)
+):
+    """Export job status and progress"""
+    return _job_response(_get_job(session, job_id))
+
+
+@router.get("/{job_id}/download")
+def download_export(
+    job_id: str,
+    range_header: Optional[str] = Header(None, alias="Range"),
+    if_range: Optional[str] = Header(None),
+    session: Session = Depends(get_db),
+    current_user: User = Depends(get_current_admin)
+):
+    """
+    Download a finished export
+    Supports a single "Range: bytes=..." (206 Partial Content) so interrupted downloads can resume;
+    If-Range with a stale ETag returns the whole file
+    """
+    job = _get_job(session, job_id)
+    if job.status != "done" or not job.path or not os.path.exists(job.path):
+        raise HTTPException(status_code=409, detail=f"Export is not ready (status: {job.status})")
+
+    size = os.path.getsize(job.path)
+    etag = f'"{job.id}-{size}"'
+    media_type = "application/gzip" if job.path.endswith(".gz") else FORMATS[job.format][0]
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Content-Disposition": f'attachment; filename="{os.path.basename(job.path)}"'
+    }
+
+    byte_range = None
+    if range_header and (if_range is None or if_range == etag):
+        byte_range = parse_byte_range(range_header, size)
+    if byte_range is None:
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(_file_chunks(job.path, 0, size), media_type=media_type, headers=headers)
+
+    start, end = byte_range
+    headers["Content-Length"] = str(end - start + 1)
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return StreamingResponse(
+        _file_chunks(job.path, start, end - start + 1),
+        status_code=status.HTTP_206_PARTIAL_CONTENT,
+        media_type=media_type,
+        headers=headers
+    )
@@ -1,13 +1,17 @@
 """
 Health check routes
-Provides server status, WebSocket client count, and last telemetry time
+Provides server status, WebSocket client count, last telemetry time and runtime metrics
 """
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
+from fastapi.concurrency import run_in_threadpool
 from datetime import datetime
-from typing import Optional
+from typing import Optional, Callable, Dict
 
-from backend.schemas import HealthResponse
+from backend.auth import get_current_admin
+from backend.models import User
+from backend.schemas import HealthResponse, HealthMetricsResponse
+from backend.shared_state import shared_state
 
 router = APIRouter(prefix="/api/v1/health", tags=["health"])
 
@@ -15,6 +19,9 @@ router = APIRouter(prefix="/api/v1/health", tags=["health"])
 manager = None
 last_telemetry_received_at: Optional[datetime] = None
 
+# Named metric providers registered by app.py (e.g. caches, queues)
+metrics_providers: Dict[str, Callable[[], dict]] = {}
+
 
 def set_manager(mgr):
     """Set the WebSocket connection manager (called from app.py)"""
@@ -22,29 +29,86 @@ def set_manager(mgr):
     manager = mgr
 
 
-def set_last_telemetry_time(time: datetime):
-    """Update last telemetry received time (called from app.py)"""
+def register_metrics(name: str, provider: Callable[[], dict]):
+    """Register a callable returning a metrics dict (called from app.py)"""
+    metrics_providers[name] = provider
+
+
+def _record_telemetry_time(time: datetime) -> bool:
+    """Keep the time locally; True when it is due in the shared state"""
     global last_telemetry_received_at
+    previous = last_telemetry_received_at
     last_telemetry_received_at = time
+    # Shared with the other workers at most once a second per worker
+    return previous is None or (time - previous).total_seconds() >= 1 or not shared_state.is_shared
+
+
+def set_last_telemetry_time(time: datetime):
+    """Update last telemetry received time (called from app.py, sync code)"""
+    if _record_telemetry_time(time):
+        shared_state.set("last_telemetry_received_at", time.isoformat())
+
+
+async def set_last_telemetry_time_async(time: datetime):
+    """set_last_telemetry_time() for async routes: a shared backend (SQLite/Redis) is written off the event loop"""
+    if not _record_telemetry_time(time):
+        return
+    if shared_state.is_shared:
+        await run_in_threadpool(shared_state.set, "last_telemetry_received_at", time.isoformat())
+    else:
+        shared_state.set("last_telemetry_received_at", time.isoformat())
+
+
+def publish_ws_client_count():
+    """Record this worker's WebSocket client count in the shared state (also a liveness heartbeat)"""
+    if manager:
+        shared_state.set_worker_value("ws_clients", len(manager.active_connections))
 
 
 @router.get("/connected", response_model=HealthResponse)
-async def get_health_status():
+def get_health_status():
     """
     Get server health and connection status
     No auth required - used for connection indicator
     Returns: { server_time, ws_clients, last_telemetry_received_at }
+    Client count and telemetry time cover every worker sharing the state backend
     """
-    ws_client_count = 0
-    if manager:
-        ws_client_count = len(manager.active_connections)
+    publish_ws_client_count()
+    ws_client_count = shared_state.sum_worker_values("ws_clients")
     
     last_telemetry_str = None
-    if last_telemetry_received_at:
-        last_telemetry_str = last_telemetry_received_at.isoformat() + "Z"
+    last_telemetry = shared_state.get("last_telemetry_received_at")
+    if last_telemetry:
+        last_telemetry_str = last_telemetry + "Z"
     
     return HealthResponse(
         server_time=datetime.utcnow().isoformat() + "Z",
         ws_clients=ws_client_count,
         last_telemetry_received_at=last_telemetry_str
     )
+
+
+@router.get("/metrics", response_model=HealthMetricsResponse)
+def get_runtime_metrics():
+    """
+    Get runtime metrics from registered components (cache hit ratios, queue depths)
+    No auth required - counters only, no user data
+    Plain def: some providers query SQLite, so this runs in the threadpool
+    """
+    return HealthMetricsResponse(
+        server_time=datetime.utcnow().isoformat() + "Z",
+        metrics={name: provider() for name, provider in metrics_providers.items()}
+    )
+
+
+@router.get("/ws-clients")
+def get_ws_clients(current_user: User = Depends(get_current_admin)):
+    """
+    Per-client WebSocket detail: address, subscription, queue depth and lag
+    Admin only - kept out of /metrics because it shows who monitors which devices
+    """
+    clients = manager.client_stats() if manager else []
+    return {
+        "server_time": datetime.utcnow().isoformat() + "Z",
+        "clients": clients
+    }
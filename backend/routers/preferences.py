@@ -26,7 +26,7 @@ router = APIRouter(prefix="/api/v1/preferences", tags=["preferences"])
 
 
 @router.get("", response_model=PreferencesResponse)
-async def get_preferences(
+def get_preferences(
     current_user: User = Depends(get_current_user),
     session: Session = Depends(get_session)
 ):
@@ -61,7 +61,7 @@ async def get_preferences(
 
 
 @router.put("", response_model=PreferencesResponse)
-async def update_preferences(
+def update_preferences(
     prefs_update: PreferencesUpdate,
     current_user: User = Depends(get_current_user),
     session: Session = Depends(get_session)
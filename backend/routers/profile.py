@@ -11,12 +11,13 @@ from backend.models import User, UserPreferences
 from backend.schemas import ProfileResponse, ProfileUpdate, PasswordChange
 from backend.auth import get_current_user, get_password_hash, verify_password
 from backend.database import get_session
+from backend import auth_cache
 
 router = APIRouter(prefix="/api/v1", tags=["profile"])
 
 
 @router.get("/profile", response_model=ProfileResponse)
-async def get_profile(
+def get_profile(
     current_user: User = Depends(get_current_user),
     session: Session = Depends(get_session)
 ):
@@ -48,7 +49,7 @@ async def get_profile(
 
 
 @router.put("/profile", response_model=ProfileResponse)
-async def update_profile(
+def update_profile(
     profile_update: ProfileUpdate,
     current_user: User = Depends(get_current_user),
     session: Session = Depends(get_session)
@@ -57,6 +58,8 @@ async def update_profile(
     Update user profile (full_name and/or email)
     Email change allowed but must be unique
     """
+    previous_email = current_user.email
+    
     # Handle empty strings as None (frontend may send empty strings)
     # Empty strings mean "don't change this field", so we preserve current value
     if profile_update.full_name is not None:
@@ -87,6 +90,7 @@ async def update_profile(
     current_user = session.merge(current_user)
     session.commit()
     session.refresh(current_user)
+    auth_cache.invalidate_user(previous_email, current_user.email)
     
     # Get preferences for response
     prefs = session.get(UserPreferences, current_user.id)
@@ -112,7 +116,7 @@ async def update_profile(
 
 
 @router.post("/profile/change-password")
-async def change_password(
+def change_password(
     password_change: PasswordChange,
     current_user: User = Depends(get_current_user),
     session: Session = Depends(get_session)
@@ -137,7 +141,8 @@ async def change_password(
     
     # Update password
     current_user.password_hash = get_password_hash(password_change.new_password)
-    session.add(current_user)
+    current_user = session.merge(current_user)
     session.commit()
+    auth_cache.invalidate_user(current_user.email)
     
     return {"message": "Password changed successfully"}
@@ -0,0 +1,38 @@
+"""
+Telemetry export (CSV, Parquet, Arrow IPC)
+"""
+
+from fastapi import APIRouter, Depends, Query
+from sqlmodel import Session
+from typing import Optional
+
+from backend.models import Telemetry, User
+from backend.auth import get_current_admin, get_db
+from backend.exports import export_filters, export_response, parse_range
+
+router = APIRouter(prefix="/api/v1/telemetry", tags=["telemetry"])
+
+
+@router.get("/export")
+def export_telemetry(
+    export_format: str = Query("csv", alias="format", pattern="^(csv|parquet|arrow)$", description="csv, parquet or arrow"),
+    columns: Optional[str] = Query(None, description="Comma-separated columns, e.g. ts,mq3,lat,lon"),
+    from_time: Optional[str] = Query(None, description="Start time (ISO8601)"),
+    to_time: Optional[str] = Query(None, description="End time (ISO8601)"),
+    device_id: Optional[str] = Query(None, description="Filter by device ID"),
+    limit: Optional[int] = Query(None, ge=1, description="Maximum number of readings to export (default: all)"),
+    order: str = Query("asc", pattern="^(asc|desc)$", description="asc (oldest first) or desc (newest first)"),
+    gzip: bool = Query(False, description="gzip the CSV stream (Content-Encoding: gzip)"),
+    session: Session = Depends(get_db),
+    current_user: User = Depends(get_current_admin)  # Admin only for export
+):
+    """
+    Export telemetry readings, streamed in keyset pages (no row limit by default)
+    Admin only - requires authentication
+    """
+    from_dt, to_dt = parse_range(from_time, to_time)
+    filters = export_filters(Telemetry, from_dt, to_dt, device_id)
+    return export_response(
+        session, "telemetry", export_format, columns, filters, from_dt, to_dt,
+        limit=limit, descending=order == "desc", compress=gzip
+    )
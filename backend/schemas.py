@@ -224,4 +224,42 @@ class HealthResponse(BaseModel):
     """Health check response"""
     server_time: str
     ws_clients: int
-    last_telemetry_received_at: Optional[str] = None
\ No newline at end of file
+    last_telemetry_received_at: Optional[str] = None
+
+
+class HealthMetricsResponse(BaseModel):
+    """Runtime metrics grouped by component"""
+    server_time: str
+    metrics: Dict[str, Dict[str, Any]]
+
+
+# Export Job Schemas
+class ExportJobCreate(BaseModel):
+    """Background export request"""
+    kind: str = Field(..., pattern="^(alerts|telemetry|duplicates)$")
+    format: str = Field("csv", pattern="^(csv|parquet|arrow)$")
+    columns: Optional[List[str]] = None  # Column projection (default: the kind's default columns)
+    from_time: Optional[str] = None  # ISO8601
+    to_time: Optional[str] = None
+    device_id: Optional[str] = None
+    severity: Optional[str] = Field(None, pattern="^(SAFE|WARNING|HIGH)$")  # alerts only
+    lat_only: bool = False  # alerts only
+    order: str = Field("asc", pattern="^(asc|desc)$")
+    limit: Optional[int] = Field(None, ge=1)
+    gzip: bool = False  # CSV only: file is written as .csv.gz
+
+
+class ExportJobResponse(BaseModel):
+    """Export job status"""
+    id: str
+    kind: str
+    format: str
+    status: str
+    rows_written: int
+    total_rows: Optional[int]
+    progress: Optional[float]  # 0..1 once total_rows is known
+    bytes_written: int
+    error: Optional[str]
+    created_at: datetime
+    finished_at: Optional[datetime]
+    download_url: Optional[str]  # Set when status is "done"
@@ -0,0 +1,40 @@
+"""
+Script to rebuild the minute/hour/day alert rollup tables from the alerts table
+Run after bulk imports that bypass the ORM, or to repair rollups
+"""
+
+import sys
+import time
+from pathlib import Path
+
+# Add project root to path
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from sqlmodel import Session, select, func
+from backend.database import engine, create_db_and_tables
+from backend.rollups import GRANULARITIES, rebuild_rollups
+
+
+def backfill_rollups():
+    """Rebuild all rollup tables in one transaction"""
+    print("=" * 60)
+    print("Rebuilding Alert Rollups")
+    print("=" * 60)
+    
+    create_db_and_tables()
+    start = time.perf_counter()
+    with Session(engine) as session:
+        alerts_count = rebuild_rollups(session)
+        session.commit()
+        
+        print(f"Aggregated {alerts_count} alerts in {time.perf_counter() - start:.1f}s")
+        for seconds, model in GRANULARITIES:
+            rows = session.exec(select(func.count()).select_from(model)).one()
+            print(f"[OK] {model.__tablename__}: {rows} rows")
+    
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    backfill_rollups()
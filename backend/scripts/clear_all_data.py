@@ -12,6 +12,7 @@ sys.path.insert(0, str(project_root))
 from sqlmodel import Session, select, delete
 from backend.database import engine
 from backend.models import Telemetry, Alert
+from backend.rollups import GRANULARITIES
 
 def clear_all_data():
     """Clear all telemetry and alert data"""
@@ -32,6 +33,11 @@ def clear_all_data():
         session.exec(delete(Alert))
         print(f"[OK] Deleted {alerts_count} alerts")
         
+        # Delete alert rollups (minute/hour/day)
+        for _, model in GRANULARITIES:
+            session.exec(delete(model))
+        print("[OK] Deleted alert rollups")
+        
         # Delete all telemetry
         session.exec(delete(Telemetry))
         print(f"[OK] Deleted {telemetry_count} telemetry records")
@@ -15,6 +15,7 @@ from datetime import datetime, timedelta, timezone
 from sqlmodel import Session, select
 from backend.database import engine
 from backend.models import Telemetry, Alert, DeviceSettings
+import backend.rollups  # noqa: F401 - keeps alert rollups updated for generated alerts
 import random
 
 # College location coordinates - PSNA College of Engineering, Dindigul
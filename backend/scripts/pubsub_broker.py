@@ -0,0 +1,45 @@
+"""
+Script to run the local Redis-protocol pub/sub broker
+Stand-in for Redis when several uvicorn workers on one box use PUBSUB_BACKEND=resp
+
+Usage:
+    python backend/scripts/pubsub_broker.py --url unix:///tmp/sdd-pubsub.sock
+    PUBSUB_BACKEND=resp PUBSUB_URL=unix:///tmp/sdd-pubsub.sock uvicorn backend.app:app --workers 4
+"""
+
+import sys
+import argparse
+import asyncio
+from pathlib import Path
+
+# Add project root to path
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from backend.pubsub import PUBSUB_URL, RespBroker
+
+
+async def run_broker(url: str):
+    broker = RespBroker()
+    await broker.start(url)
+    print("=" * 60)
+    print(f"Pub/sub broker listening on {url}")
+    print("=" * 60)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await broker.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the local Redis-protocol pub/sub broker")
+    parser.add_argument("--url", default=PUBSUB_URL, help="redis://host:port or unix:///path.sock")
+    args = parser.parse_args()
+    try:
+        asyncio.run(run_broker(args.url))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""
+Script to run one telemetry retention pass now
+Prunes raw readings older than TELEMETRY_RAW_RETENTION_DAYS into the minute/hour
+aggregates, the same work the scheduled task does when TELEMETRY_RETENTION_ENABLED
+"""
+
+import sys
+from pathlib import Path
+
+# Add project root to path
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from backend.database import create_db_and_tables
+from backend.retention import TelemetryRetention
+
+
+def run_retention():
+    """One retention run, whatever TELEMETRY_RETENTION_ENABLED says"""
+    print("=" * 60)
+    print("Telemetry Retention")
+    print("=" * 60)
+    
+    create_db_and_tables()
+    retention = TelemetryRetention(enabled=True)
+    report = retention.run_once()
+    
+    print(f"Raw readings older than {retention.raw_days} days pruned: {report['raw_pruned']} "
+          f"({report['batches']} batches)")
+    print(f"Duplicates pruned: {report['duplicates_pruned']}")
+    print(f"Minute aggregates pruned: {report['minute_aggregates_pruned']}")
+    print(f"Hour aggregates pruned: {report['hour_aggregates_pruned']}")
+    print(f"[OK] Done in {report['seconds']}s")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    run_retention()
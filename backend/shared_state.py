@@ -0,0 +1,263 @@
+"""
+Process-shared state for running several uvicorn workers on one box
+Module globals (last telemetry time, WebSocket client counts, broadcast) only
+describe the worker that owns them. A shared state backend gives every worker
+the same view:
+  - values: small JSON values such as the last telemetry time
+  - worker values: one number per live worker (e.g. its WebSocket clients), summed on read
+  - events: an append-only log with increasing sequence numbers; EventRelay
+    replays other workers' events (alert broadcasts) into this worker
+
+SHARED_STATE_BACKEND=memory (default) keeps everything in-process, which is the
+single-worker behaviour. SHARED_STATE_BACKEND=sqlite stores it in a small SQLite
+file that every worker opens; point SHARED_STATE_PATH at /dev/shm for a
+shared-memory file.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+SHARED_STATE_BACKEND = os.getenv("SHARED_STATE_BACKEND", "memory")  # "memory" or "sqlite"
+SHARED_STATE_PATH = os.getenv("SHARED_STATE_PATH", "./shared_state.db")
+SHARED_STATE_POLL_MS = int(os.getenv("SHARED_STATE_POLL_MS", "100"))  # event relay poll interval
+SHARED_STATE_EVENT_RETENTION_SECONDS = int(os.getenv("SHARED_STATE_EVENT_RETENTION_SECONDS", "300"))
+SHARED_STATE_WORKER_STALE_SECONDS = int(os.getenv("SHARED_STATE_WORKER_STALE_SECONDS", "45"))
+
+# Identifies this process in worker values and as the origin of published events
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class MemorySharedState:
+    """In-process backend: the view of a single worker"""
+
+    name = "memory"
+    is_shared = False
+    MAX_EVENTS = 1000
+
+    def __init__(self, worker_id: str = WORKER_ID):
+        self.worker_id = worker_id
+        self._values = {}
+        self._worker_values = {}  # name -> {worker_id: (value, updated_at)}
+        self._events = deque(maxlen=self.MAX_EVENTS)  # (seq, channel, origin, payload)
+        self._seq = 0
+        self._lock = threading.Lock()
+        self.published = 0
+
+    def set(self, key: str, value: Any):
+        self._values[key] = value
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self._values.get(key, default)
+
+    def set_worker_value(self, name: str, value: int):
+        self._worker_values.setdefault(name, {})[self.worker_id] = (value, time.time())
+
+    def sum_worker_values(self, name: str) -> int:
+        cutoff = time.time() - SHARED_STATE_WORKER_STALE_SECONDS
+        return sum(value for value, updated_at in self._worker_values.get(name, {}).values() if updated_at >= cutoff)
+
+    def live_workers(self) -> int:
+        return 1
+
+    def remove_worker(self):
+        for values in self._worker_values.values():
+            values.pop(self.worker_id, None)
+
+    def publish(self, channel: str, payload: dict) -> int:
+        with self._lock:
+            self._seq += 1
+            self._events.append((self._seq, channel, self.worker_id, payload))
+            self.published += 1
+            return self._seq
+
+    def latest_seq(self, channel: str) -> int:
+        return self._seq
+
+    def read_events(self, channel: str, after_seq: int, limit: int = 500) -> List[Tuple[int, str, dict]]:
+        """Events after after_seq as (seq, origin, payload)"""
+        with self._lock:
+            return [
+                (seq, origin, payload) for seq, ch, origin, payload in self._events
+                if seq > after_seq and ch == channel
+            ][:limit]
+
+    def stats(self) -> dict:
+        return {"backend": self.name, "worker_id": self.worker_id, "workers": self.live_workers(), "published": self.published}
+
+
+class SQLiteSharedState:
+    """Backend in a SQLite file opened by every worker (one connection per thread)"""
+
+    name = "sqlite"
+    is_shared = True
+    TRIM_EVERY = 200  # publishes between event log trims
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS shared_values (
+            key TEXT PRIMARY KEY, value TEXT NOT NULL, updated_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS shared_worker_values (
+            name TEXT NOT NULL, worker_id TEXT NOT NULL, value INTEGER NOT NULL, updated_at REAL NOT NULL,
+            PRIMARY KEY (name, worker_id)
+        );
+        CREATE TABLE IF NOT EXISTS shared_events (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT, channel TEXT NOT NULL, origin TEXT NOT NULL,
+            payload TEXT NOT NULL, created_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS ix_shared_events_channel_seq ON shared_events (channel, seq);
+    """
+
+    def __init__(self, path: str = SHARED_STATE_PATH, worker_id: str = WORKER_ID):
+        self.path = path
+        self.worker_id = worker_id
+        self._local = threading.local()
+        self.published = 0
+        self._conn().executescript(self._SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit; state is ephemeral, so commits skip the fsync
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn = conn
+        return conn
+
+    def set(self, key: str, value: Any):
+        self._conn().execute(
+            "INSERT INTO shared_values (key, value, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at",
+            (key, json.dumps(value), time.time())
+        )
+
+    def get(self, key: str, default: Any = None) -> Any:
+        row = self._conn().execute("SELECT value FROM shared_values WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_worker_value(self, name: str, value: int):
+        self._conn().execute(
+            "INSERT INTO shared_worker_values (name, worker_id, value, updated_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(name, worker_id) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at",
+            (name, self.worker_id, value, time.time())
+        )
+
+    def sum_worker_values(self, name: str) -> int:
+        cutoff = time.time() - SHARED_STATE_WORKER_STALE_SECONDS
+        row = self._conn().execute(
+            "SELECT COALESCE(SUM(value), 0) FROM shared_worker_values WHERE name = ? AND updated_at >= ?",
+            (name, cutoff)
+        ).fetchone()
+        return row[0]
+
+    def live_workers(self) -> int:
+        cutoff = time.time() - SHARED_STATE_WORKER_STALE_SECONDS
+        row = self._conn().execute(
+            "SELECT COUNT(DISTINCT worker_id) FROM shared_worker_values WHERE updated_at >= ?", (cutoff,)
+        ).fetchone()
+        return row[0]
+
+    def remove_worker(self):
+        self._conn().execute("DELETE FROM shared_worker_values WHERE worker_id = ?", (self.worker_id,))
+
+    def publish(self, channel: str, payload: dict) -> int:
+        now = time.time()
+        conn = self._conn()
+        seq = conn.execute(
+            "INSERT INTO shared_events (channel, origin, payload, created_at) VALUES (?, ?, ?, ?)",
+            (channel, self.worker_id, json.dumps(payload), now)
+        ).lastrowid
+        self.published += 1
+        if self.published % self.TRIM_EVERY == 0:
+            conn.execute(
+                "DELETE FROM shared_events WHERE created_at < ?", (now - SHARED_STATE_EVENT_RETENTION_SECONDS,)
+            )
+        return seq
+
+    def latest_seq(self, channel: str) -> int:
+        row = self._conn().execute("SELECT MAX(seq) FROM shared_events WHERE channel = ?", (channel,)).fetchone()
+        return row[0] or 0
+
+    def read_events(self, channel: str, after_seq: int, limit: int = 500) -> List[Tuple[int, str, dict]]:
+        rows = self._conn().execute(
+            "SELECT seq, origin, payload FROM shared_events WHERE channel = ? AND seq > ? ORDER BY seq LIMIT ?",
+            (channel, after_seq, limit)
+        ).fetchall()
+        return [(seq, origin, json.loads(payload)) for seq, origin, payload in rows]
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.name,
+            "worker_id": self.worker_id,
+            "workers": self.live_workers(),
+            "published": self.published,
+            "path": self.path
+        }
+
+
+class EventRelay:
+    """Replays events that other workers published on a channel into a local async callback"""
+
+    def __init__(self, state, channel: str, poll_ms: int = SHARED_STATE_POLL_MS):
+        self.state = state
+        self.channel = channel
+        self.poll_seconds = poll_ms / 1000
+        self.last_seq = 0
+        self.relayed = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, deliver: Callable[[dict], Awaitable[None]]):
+        """Start relaying events published from now on"""
+        self.last_seq = self.state.latest_seq(self.channel)
+        self._task = asyncio.create_task(self._run(deliver))
+
+    async def _run(self, deliver: Callable[[dict], Awaitable[None]]):
+        while True:
+            try:
+                events = await run_in_threadpool(self.state.read_events, self.channel, self.last_seq)
+                for seq, origin, payload in events:
+                    self.last_seq = seq
+                    if origin != self.state.worker_id:  # own events were delivered locally
+                        await deliver(payload)
+                        self.relayed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Shared state relay for '{self.channel}' failed: {e}")
+            await asyncio.sleep(self.poll_seconds)
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def stats(self) -> dict:
+        return {"channel": self.channel, "running": self._task is not None, "last_seq": self.last_seq, "relayed": self.relayed}
+
+
+def create_shared_state(backend: str = SHARED_STATE_BACKEND):
+    if backend == "memory":
+        return MemorySharedState()
+    if backend == "sqlite":
+        return SQLiteSharedState()
+    raise ValueError(f"Unknown SHARED_STATE_BACKEND '{backend}' (expected 'memory' or 'sqlite')")
+
+
+shared_state = create_shared_state()
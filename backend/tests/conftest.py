@@ -0,0 +1,27 @@
+"""
+Shared fixtures
+Process-local caches outlive a single test, so reset them around every test
+"""
+
+import pytest
+
+from backend import auth_cache
+from backend.dedup_filter import telemetry_filter
+from backend.history_buffer import history_buffer
+from backend.openai_client import explanation_cache
+from backend.rate_limit import login_rate_limiter
+
+
+@pytest.fixture(autouse=True)
+def reset_process_caches():
+    explanation_cache.clear()
+    history_buffer.clear()
+    auth_cache.clear()
+    login_rate_limiter.reset()
+    telemetry_filter.clear()
+    yield
+    explanation_cache.clear()
+    history_buffer.clear()
+    auth_cache.clear()
+    login_rate_limiter.reset()
+    telemetry_filter.clear()
@@ -0,0 +1,107 @@
+"""
+Tests for the optional async engine and the DatabaseRunner used by the hot routes
+"""
+
+import asyncio
+import pytest
+from datetime import datetime
+from fastapi.testclient import TestClient
+from sqlmodel import Session, SQLModel, select
+
+from backend.app import app
+from backend.auth import create_access_token, get_db
+from backend.database import DatabaseRunner, create_app_engine, get_db_runner, to_async_url
+from backend.models import Alert, Telemetry, User
+from backend.routers import health
+
+DEVICE_API_KEY = "test-device-key"
+
+
+def test_to_async_url():
+    assert to_async_url("sqlite:///./database.db") == "sqlite+aiosqlite:///./database.db"
+    assert to_async_url("sqlite://") == "sqlite+aiosqlite://"
+    assert to_async_url("postgresql://u:p@db/app") == "postgresql+asyncpg://u:p@db/app"
+    assert to_async_url("postgresql+psycopg2://u:p@db/app?sslmode=require") == \
+        "postgresql+asyncpg://u:p@db/app?ssl=require"
+    with pytest.raises(ValueError):
+        to_async_url("mysql://u:p@db/app")
+
+
+def test_runner_without_async_engine_uses_sync_session(tmp_path):
+    engine = create_app_engine(f"sqlite:///{tmp_path / 'sync.db'}")
+    SQLModel.metadata.create_all(engine)
+
+    async def scenario():
+        with Session(engine) as session:
+            async with DatabaseRunner(session) as db:
+                assert not db.is_async
+                return await db.run(lambda s: s is session)
+
+    assert asyncio.run(scenario())
+    engine.dispose()
+
+
+@pytest.fixture
+def async_db(tmp_path, monkeypatch):
+    """Hot routes on an aiosqlite engine; auth keeps using a sync engine on the same file"""
+    pytest.importorskip("aiosqlite")
+    from backend.database import create_async_app_engine
+
+    url = f"sqlite:///{tmp_path / 'async.db'}"
+    sync_engine = create_app_engine(url)
+    SQLModel.metadata.create_all(sync_engine)
+    async_engine = create_async_app_engine(url)
+
+    async def runner_override():
+        with Session(sync_engine) as session:
+            async with DatabaseRunner(session, async_engine) as runner:
+                assert runner.is_async
+                yield runner
+
+    def db_override():
+        with Session(sync_engine) as session:
+            yield session
+
+    app.dependency_overrides[get_db_runner] = runner_override
+    app.dependency_overrides[get_db] = db_override
+    monkeypatch.setenv("DEVICE_API_KEY", DEVICE_API_KEY)
+    yield sync_engine
+    app.dependency_overrides.clear()
+    asyncio.run(async_engine.dispose())
+    sync_engine.dispose()
+
+
+def test_ingest_and_history_on_async_engine(async_db, monkeypatch):
+    # _ingest_telemetry runs on the event loop here: no synchronous shared-state write allowed
+    monkeypatch.setattr(health, "set_last_telemetry_time", lambda time: pytest.fail("sync shared-state write"))
+    with Session(async_db) as session:
+        session.add(User(email="viewer@example.com", full_name="Viewer", password_hash="x", role="user"))
+        session.commit()
+
+    client = TestClient(app)
+    reading = {
+        "device_id": "async-dev",
+        "timestamp": "2025-01-01T10:00:00Z",
+        "sensors": {"mq3": 900, "mq135": 150},
+        "gps": {"lat": 13.08, "lon": 80.27}
+    }
+    response = client.post("/api/v1/telemetry", json=reading, headers={"x-api-key": DEVICE_API_KEY})
+    assert response.status_code == 200
+    assert response.json()["status"] == "alert_created"
+
+    duplicate = client.post("/api/v1/telemetry", json=reading, headers={"x-api-key": DEVICE_API_KEY})
+    assert duplicate.json()["status"] == "duplicate"
+
+    with Session(async_db) as session:
+        assert len(session.exec(select(Telemetry)).all()) == 1
+        assert session.exec(select(Alert)).one().ts == datetime(2025, 1, 1, 10, 0)
+
+    headers = {"Authorization": f"Bearer {create_access_token(data={'sub': 'viewer@example.com'})}"}
+    params = {"from_time": "2025-01-01T00:00:00Z", "to_time": "2025-01-01T23:00:00Z"}
+    history = client.get("/api/v1/alerts/history", headers=headers, params=params)
+    assert history.status_code == 200
+    assert [a["device_id"] for a in history.json()] == ["async-dev"]
+
+    stream = client.get("/api/v1/alerts/history/stream", headers=headers, params=params)
+    assert stream.status_code == 200
+    assert '"device_id": "async-dev"' in stream.text
@@ -0,0 +1,109 @@
+"""
+Tests for the token/user cache behind get_current_user
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlmodel import Session, SQLModel
+
+from backend import auth_cache
+from backend.app import app
+from backend.auth import create_access_token, get_db
+from backend.auth_cache import TTLCache
+from backend.database import create_app_engine, get_session
+from backend.models import User, UserRole
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_app_engine(f"sqlite:///{tmp_path / 'auth_cache.db'}")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(User(email="cached@example.com", full_name="Cached", password_hash="x", role=UserRole.USER))
+        session.commit()
+
+    def override():
+        with Session(engine) as session:
+            yield session
+
+    app.dependency_overrides[get_session] = override
+    app.dependency_overrides[get_db] = override
+    yield engine
+    app.dependency_overrides.clear()
+    engine.dispose()
+
+
+def count_user_queries(engine):
+    queries = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if "FROM users" in statement:
+            queries.append(statement)
+
+    return queries
+
+
+def test_ttl_cache_evicts_least_recently_used_and_expired():
+    cache = TTLCache(max_entries=2, ttl_seconds=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)  # evicts "b", the least recently used
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+
+    cache.set("short", 4, ttl_seconds=-1)  # already expired tokens are never stored
+    assert cache.get("short") is None
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["hits"] == 3 and stats["misses"] == 2
+
+
+def test_repeated_requests_skip_user_query(engine):
+    client = TestClient(app)
+    headers = {"Authorization": f"Bearer {create_access_token(data={'sub': 'cached@example.com'})}"}
+    queries = count_user_queries(engine)
+    before = auth_cache.stats()
+
+    for _ in range(5):
+        response = client.get("/api/v1/auth/me", headers=headers)
+        assert response.status_code == 200
+        assert response.json()["email"] == "cached@example.com"
+
+    assert len(queries) == 1
+    stats = client.get("/api/v1/health/metrics").json()["metrics"]["auth_cache"]
+    assert stats["users"]["hits"] - before["users"]["hits"] == 4
+    assert stats["tokens"]["hits"] - before["tokens"]["hits"] == 4
+
+
+def test_profile_update_invalidates_cached_user(engine):
+    client = TestClient(app)
+    headers = {"Authorization": f"Bearer {create_access_token(data={'sub': 'cached@example.com'})}"}
+    assert client.get("/api/v1/auth/me", headers=headers).json()["full_name"] == "Cached"
+
+    response = client.put("/api/v1/profile", headers=headers, json={"full_name": "Renamed"})
+    assert response.status_code == 200
+    assert client.get("/api/v1/auth/me", headers=headers).json()["full_name"] == "Renamed"
+
+    # After an email change the old token's subject no longer resolves
+    response = client.put("/api/v1/profile", headers=headers, json={"email": "moved@example.com"})
+    assert response.status_code == 200
+    assert client.get("/api/v1/auth/me", headers=headers).status_code == 401
+    new_headers = {"Authorization": f"Bearer {create_access_token(data={'sub': 'moved@example.com'})}"}
+    assert client.get("/api/v1/auth/me", headers=new_headers).json()["full_name"] == "Renamed"
+
+
+def test_cached_user_can_be_saved(engine):
+    """Snapshots are detached copies, so routes that merge/add the user still write an UPDATE"""
+    auth_cache.store_user(User(id=1, email="cached@example.com", full_name="Cached", password_hash="x", role=UserRole.USER))
+    user = auth_cache.get_user("cached@example.com")
+    assert auth_cache.get_user("cached@example.com") is not user
+
+    user.full_name = "Updated"
+    with Session(engine) as session:
+        session.add(user)
+        session.commit()
+    with Session(engine) as session:
+        assert session.get(User, 1).full_name == "Updated"
@@ -0,0 +1,96 @@
+"""
+Execution model: a login storm must not stall telemetry ingest
+bcrypt runs on a bounded executor and DB work in the threadpool, so the event
+loop keeps serving other requests while passwords are being checked.
+"""
+
+import asyncio
+import statistics
+import time
+
+import bcrypt
+import httpx
+import pytest
+from sqlmodel import Session, SQLModel
+
+from backend.app import app
+from backend.auth import get_db, reset_rate_limit_for_ip
+from backend.database import create_app_engine, get_session
+from backend.models import User
+
+DEVICE_API_KEY = "test-device-key"
+LOGINS = 50
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    engine = create_app_engine(f"sqlite:///{tmp_path / 'concurrency.db'}", profile="wal")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        # Cost 10 keeps the test short while each check still takes tens of milliseconds
+        session.add(User(
+            email="storm@example.com",
+            full_name="Storm",
+            password_hash=bcrypt.hashpw(b"correct-horse", bcrypt.gensalt(10)).decode(),
+            role="user"
+        ))
+        session.commit()
+
+    def override():
+        with Session(engine) as session:
+            yield session
+
+    app.dependency_overrides[get_session] = override
+    app.dependency_overrides[get_db] = override
+    monkeypatch.setenv("DEVICE_API_KEY", DEVICE_API_KEY)
+    reset_rate_limit_for_ip()
+    yield engine
+    app.dependency_overrides.clear()
+    reset_rate_limit_for_ip()
+    engine.dispose()
+
+
+async def ingest(client, count, start_second):
+    latencies = []
+    for i in range(count):
+        second = start_second + i
+        started = time.perf_counter()
+        response = await client.post(
+            "/api/v1/telemetry",
+            json={
+                "device_id": "storm-dev",
+                "timestamp": f"2025-01-01T10:{second // 60:02d}:{second % 60:02d}Z",
+                "sensors": {"mq3": 200, "mq135": 150}
+            },
+            headers={"x-api-key": DEVICE_API_KEY}
+        )
+        latencies.append(time.perf_counter() - started)
+        assert response.status_code == 200
+    return latencies
+
+
+def test_ingest_latency_stays_flat_during_login_storm(engine):
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            baseline = await ingest(client, 20, 0)
+
+            async def login():
+                response = await client.post(
+                    "/api/v1/auth/login-json",
+                    json={"email": "storm@example.com", "password": "correct-horse"}
+                )
+                return response.status_code
+
+            storm_started = time.perf_counter()
+            storm = asyncio.gather(*(login() for _ in range(LOGINS)))
+            await asyncio.sleep(0.05)  # let the storm get going
+            during = await ingest(client, 20, 100)
+            statuses = await storm
+            return baseline, during, statuses, time.perf_counter() - storm_started
+
+    baseline, during, statuses, storm_seconds = asyncio.run(scenario())
+
+    assert statuses == [200] * LOGINS
+    # Ingest finished while the storm was still running and was not queued behind it
+    assert sum(during) < storm_seconds / 2
+    assert statistics.median(during) < max(10 * statistics.median(baseline), 0.05)
@@ -0,0 +1,146 @@
+"""
+Tests for the telemetry duplicate pre-filter
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlmodel import Session, SQLModel, create_engine
+from sqlmodel.pool import StaticPool
+
+from backend import dedup_filter
+from backend.app import app
+from backend.database import get_session
+from backend.dedup_filter import TelemetryFilter, bloom_parameters, telemetry_filter
+from backend.models import Telemetry
+from backend.utils import check_duplicate, find_existing_telemetry_ids
+
+DEVICE_API_KEY = "test-device-key"
+BASE = datetime(2025, 1, 1, 10, 0, 0)
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    SQLModel.metadata.drop_all(engine)
+
+
+def add_rows(engine, device_id, count, start=0):
+    with Session(engine) as session:
+        for i in range(start, start + count):
+            session.add(Telemetry(device_id=device_id, ts=BASE + timedelta(seconds=i), mq3=100, mq135=100))
+        session.commit()
+
+
+def count_queries(engine):
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    return statements
+
+
+def test_bloom_parameters():
+    bits, hashes = bloom_parameters(1000, 0.01)
+    assert 9000 < bits < 10000
+    assert hashes == 7
+
+
+def test_check_duplicate_skips_lookup_for_unseen_keys(engine):
+    add_rows(engine, "dev-1", 3)
+    telemetry_filter.rebuild(engine)
+    before = telemetry_filter.stats()
+    queries = count_queries(engine)
+
+    with Session(engine) as session:
+        assert check_duplicate(session, "dev-1", BASE + timedelta(seconds=1)) is True  # recent set
+        assert check_duplicate(session, "dev-1", BASE + timedelta(seconds=99)) is False
+        assert check_duplicate(session, "dev-2", BASE) is False
+    assert queries == []
+
+    stats = telemetry_filter.stats()
+    assert stats["skipped_lookups"] - before["skipped_lookups"] == 2
+    assert stats["recent_hits"] - before["recent_hits"] == 1
+    assert stats["memory_bytes"] > 0
+
+
+def test_filter_does_not_answer_for_other_databases(engine):
+    telemetry_filter.rebuild(engine)
+    other = create_engine("sqlite:///:memory:")
+    SQLModel.metadata.create_all(other)
+    add_rows(other, "dev-1", 1)
+    with Session(other) as session:
+        assert telemetry_filter.lookup(session, "dev-1", BASE) == dedup_filter.UNKNOWN
+        assert check_duplicate(session, "dev-1", BASE) is True
+
+
+def test_false_positive_rate_stays_near_target(engine):
+    bloom = TelemetryFilter(capacity=2000, fp_rate=0.01, recent_per_device=1, enabled=True)
+    bloom.rebuild(engine)
+    with Session(engine) as session:
+        bloom.record(session, [(f"dev-{i % 50}", BASE + timedelta(seconds=i)) for i in range(2000)])
+        answers = [
+            bloom.lookup(session, f"dev-{i % 50}", BASE + timedelta(seconds=i)) for i in range(2000, 22000)
+        ]
+    rate = answers.count(dedup_filter.MAYBE) / len(answers)
+    assert rate < 0.02
+    assert bloom.stats()["estimated_fp_rate"] < 0.02
+
+
+def test_rotation_never_answers_new_for_forgotten_keys(engine):
+    bloom = TelemetryFilter(capacity=10, fp_rate=0.01, recent_per_device=2, enabled=True)
+    bloom.rebuild(engine)
+    with Session(engine) as session:
+        bloom.record(session, [("dev-1", BASE + timedelta(seconds=i)) for i in range(25)])
+        # The first generation (seconds 0-9) was dropped
+        assert bloom.stats()["rotations"] == 2
+        for i in range(25):
+            assert bloom.lookup(session, "dev-1", BASE + timedelta(seconds=i)) != dedup_filter.NEW
+        assert bloom.lookup(session, "dev-2", BASE) == dedup_filter.NEW
+
+
+def test_rebuild_past_capacity_checks_older_keys_in_database(engine):
+    add_rows(engine, "dev-1", 30)
+    bloom = TelemetryFilter(capacity=10, fp_rate=0.01, recent_per_device=2, enabled=True)
+    assert bloom.rebuild(engine) == 10
+    with Session(engine) as session:
+        assert bloom.lookup(session, "dev-1", BASE + timedelta(seconds=5)) == dedup_filter.UNKNOWN
+        assert bloom.lookup(session, "dev-1", BASE + timedelta(seconds=25)) == dedup_filter.MAYBE
+        assert bloom.lookup(session, "dev-1", BASE + timedelta(seconds=45)) == dedup_filter.NEW
+
+
+def test_batch_lookup_only_queries_possible_hits(engine):
+    add_rows(engine, "dev-1", 5)
+    telemetry_filter.rebuild(engine)
+    keys = [("dev-1", BASE + timedelta(seconds=i)) for i in (2, 50, 51)]
+    skipped = telemetry_filter.stats()["skipped_lookups"]
+    with Session(engine) as session:
+        existing = find_existing_telemetry_ids(session, keys)
+    assert list(existing) == [keys[0]]
+    assert telemetry_filter.stats()["skipped_lookups"] - skipped == 2
+
+
+def test_batch_recovers_when_filter_misses_a_row(engine, monkeypatch):
+    def get_session_override():
+        with Session(engine) as session:
+            yield session
+
+    app.dependency_overrides[get_session] = get_session_override
+    monkeypatch.setenv("DEVICE_API_KEY", DEVICE_API_KEY)
+    telemetry_filter.rebuild(engine)
+    rebuilds = telemetry_filter.stats()["rebuilds"]
+    # Written behind the filter's back (another process, a seeding script)
+    add_rows(engine, "dev-1", 1)
+    try:
+        response = TestClient(app).post(
+            "/api/v1/telemetry/batch",
+            json=[{"device_id": "dev-1", "timestamp": "2025-01-01T10:00:00Z", "sensors": {"mq3": 100, "mq135": 100}}],
+            headers={"x-api-key": DEVICE_API_KEY}
+        )
+    finally:
+        app.dependency_overrides.clear()
+    assert response.status_code == 200
+    assert response.json()["results"][0]["status"] == "duplicate"
+    assert telemetry_filter.stats()["rebuilds"] - rebuilds == 1
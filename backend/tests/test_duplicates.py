@@ -241,3 +241,96 @@ def test_ignore_duplicates_endpoint(client, admin_token):
         dup_check = session.get(TelemetryDuplicate, dup.id)
         assert dup_check.is_ignored == True
 
+
+
+def test_insert_telemetry_or_duplicate_is_conflict_aware():
+    """One INSERT ... ON CONFLICT returns the new id, or records the duplicate against the original"""
+    from datetime import datetime
+    from sqlmodel import select
+    from backend.utils import insert_telemetry_or_duplicate
+
+    upsert_engine = create_engine("sqlite:///:memory:")
+    SQLModel.metadata.create_all(upsert_engine)
+    values = {
+        "device_id": "upsert-device", "ts": datetime(2025, 1, 1, 10, 0, 0),
+        "mq3": 100, "mq135": 120, "temp_c": None, "humidity_pct": None,
+        "lat": None, "lon": None, "alt": None, "received_at": datetime.utcnow()
+    }
+    with Session(upsert_engine) as session:
+        telemetry_id, original_id, duplicate_id = insert_telemetry_or_duplicate(session, values, '{"a": 1}')
+        session.commit()
+        assert telemetry_id is not None and original_id is None and duplicate_id is None
+
+        for _ in range(2):
+            new_id, original_id, duplicate_id = insert_telemetry_or_duplicate(session, values, '{"a": 2}')
+            session.commit()
+            assert new_id is None
+            assert original_id == telemetry_id
+
+        duplicates = session.exec(select(TelemetryDuplicate)).all()
+        assert len(duplicates) == 2
+        assert duplicates[-1].id == duplicate_id
+        assert all(d.payload_json == '{"a": 2}' and not d.is_merged for d in duplicates)
+        assert len(session.exec(select(Telemetry)).all()) == 1
+
+
+def test_get_duplicates_uses_constant_queries_with_windowed_samples():
+    """Groups, originals and samples come from a fixed number of queries whatever the page size"""
+    from datetime import datetime, timedelta
+    from sqlalchemy import event
+    from sqlmodel.pool import StaticPool
+    from backend.auth import get_db
+    from backend.database import get_session
+
+    list_engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(list_engine)
+    base = datetime(2025, 1, 1, 10, 0, 0)
+    with Session(list_engine) as session:
+        session.add(User(email="dups@test.com", full_name="Dups", password_hash="x", role=UserRole.ADMIN))
+        originals = [Telemetry(device_id=f"dup-{i % 3}", ts=base + timedelta(minutes=i), mq3=300 + i, mq135=200) for i in range(12)]
+        session.add_all(originals)
+        session.commit()
+        for i, original in enumerate(originals):
+            for n in range(i + 1):
+                session.add(TelemetryDuplicate(
+                    original_telemetry_id=original.id, device_id=original.device_id, timestamp=original.ts,
+                    payload_json=f'{{"n": {n}}}', is_merged=(n == 0 and i == 11)
+                ))
+        session.commit()
+
+    statements = []
+    event.listen(list_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    def override():
+        with Session(list_engine) as session:
+            yield session
+
+    app.dependency_overrides[get_db] = override
+    app.dependency_overrides[get_session] = override
+    try:
+        client = TestClient(app)
+        client.headers["Authorization"] = f"Bearer {create_access_token(data={'sub': 'dups@test.com'})}"
+
+        statements.clear()
+        data = client.get("/api/v1/duplicates", params={"limit": 10}).json()
+        listing = [s for s in statements if "telemetry_duplicates" in s]
+        assert len(listing) == 3  # count, groups + originals, samples
+
+        assert data["total"] == 12
+        groups = data["duplicates"]
+        assert len(groups) == 10
+        newest = groups[0]
+        assert newest["timestamp"] == (base + timedelta(minutes=11)).isoformat()
+        assert newest["original_telemetry"]["mq3"] == 311
+        assert newest["duplicate_count"] == 11  # one of the twelve is merged
+        assert [s["payload_json"] for s in newest["sample_duplicates"]] == [{"n": n} for n in range(1, 6)]
+        assert [len(g["sample_duplicates"]) for g in groups] == [5] * 8 + [4, 3]
+
+        raw = client.get("/api/v1/duplicates", params={"device_id": "dup-0", "decode_payloads": "false"}).json()
+        assert raw["total"] == 4
+        assert raw["duplicates"][-1]["sample_duplicates"] == [
+            {"id": 1, "payload_json": '{"n": 0}', "received_at": raw["duplicates"][-1]["sample_duplicates"][0]["received_at"]}
+        ]
+    finally:
+        app.dependency_overrides.clear()
+        list_engine.dispose()
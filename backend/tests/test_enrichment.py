@@ -0,0 +1,159 @@
+"""
+Tests for background alert enrichment (worker queue + local stub client)
+"""
+
+import asyncio
+import time
+import pytest
+from datetime import datetime
+from sqlmodel import Session, create_engine, SQLModel
+from sqlmodel.pool import StaticPool
+
+from backend import openai_client
+from backend.enrichment import AlertEnrichmentQueue
+from backend.models import Alert
+from backend.openai_client import LocalStubClient
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    SQLModel.metadata.drop_all(engine)
+
+
+@pytest.fixture
+def stub_client():
+    previous = openai_client.client
+    stub = LocalStubClient(response={
+        "severity": "SAFE",  # must never override MQ3 severity
+        "short_message": "Model says: ethanol plume near entrance",
+        "explanation": "Sustained rise across the last readings.",
+        "recommended_action": "Inspect the entrance area",
+        "confidence": "high"
+    })
+    openai_client.set_client(stub)
+    yield stub
+    openai_client.set_client(previous)
+
+
+def make_alert(engine, device_id="dev-1", mq3=1200) -> int:
+    with Session(engine) as session:
+        alert = Alert(
+            device_id=device_id,
+            ts=datetime(2025, 1, 1, 10, 0, mq3 % 60),
+            severity="HIGH",
+            short_message="fallback",
+            explanation="fallback explanation",
+            recommended_action="fallback action",
+            confidence="medium",
+            mq3=mq3,
+            mq135=300
+        )
+        session.add(alert)
+        session.commit()
+        session.refresh(alert)
+        return alert.id
+
+
+def prompt(device_id="dev-1", mq3=1200):
+    return {
+        "device_id": device_id,
+        "timestamp": "2025-01-01T10:00:00Z",
+        "mq3": mq3,
+        "mq135": 300,
+        "temp_c": None,
+        "humidity_pct": None,
+        "lat": None,
+        "lon": None,
+        "recent_history": []
+    }
+
+
+def test_worker_enriches_alert_and_broadcasts_update(engine, stub_client):
+    alert_id = make_alert(engine)
+    messages = []
+
+    async def broadcast(message):
+        messages.append(message)
+
+    async def scenario():
+        queue = AlertEnrichmentQueue(engine=engine, concurrency=1)
+        queue.start(broadcast=broadcast)
+        assert queue.submit(alert_id, prompt())
+        await asyncio.wait_for(queue._queue.join(), timeout=5)
+        await queue.stop()
+        return queue.stats()
+
+    stats = asyncio.run(scenario())
+
+    assert stats["completed"] == 1
+    assert stub_client.calls == 1
+    with Session(engine) as session:
+        alert = session.get(Alert, alert_id)
+        assert alert.short_message == "Model says: ethanol plume near entrance"
+        assert alert.recommended_action == "Inspect the entrance area"
+        assert alert.severity == "HIGH"
+
+    assert len(messages) == 1
+    assert messages[0]["type"] == "alert_updated"
+    assert messages[0]["data"]["id"] == alert_id
+    assert messages[0]["data"]["explanation"] == "Sustained rise across the last readings."
+
+
+def test_submit_does_not_wait_for_slow_model(engine, stub_client):
+    alert_id = make_alert(engine)
+    stub_client.latency_ms = 300
+
+    async def scenario():
+        queue = AlertEnrichmentQueue(engine=engine)
+        queue.start()
+        started = time.perf_counter()
+        queue.submit(alert_id, prompt())
+        elapsed = time.perf_counter() - started
+        await asyncio.wait_for(queue._queue.join(), timeout=5)
+        await queue.stop()
+        return elapsed
+
+    assert asyncio.run(scenario()) < 0.05
+    assert stub_client.calls == 1
+
+
+@pytest.mark.parametrize("policy,expected_ids", [
+    ("drop_newest", [1, 2]),
+    ("drop_oldest", [2, 3]),
+])
+def test_drop_policy_when_queue_full(engine, policy, expected_ids):
+    async def scenario():
+        queue = AlertEnrichmentQueue(
+            engine=engine,
+            enrich_fn=lambda **kwargs: None,
+            queue_depth=2,
+            drop_policy=policy
+        )
+        # Mark as running without consuming so the queue fills up
+        queue._workers = [asyncio.get_running_loop().create_future()]
+        for alert_id in (1, 2, 3):
+            queue.submit(alert_id, prompt())
+        queued = [queue._queue.get_nowait().alert_id for _ in range(queue._queue.qsize())]
+        queue._workers = []
+        return queued, queue.stats()
+
+    queued, stats = asyncio.run(scenario())
+    assert queued == expected_ids
+    assert stats["dropped"] == 1
+
+
+def test_submit_rejected_when_not_running(engine):
+    queue = AlertEnrichmentQueue(engine=engine, enrich_fn=lambda **kwargs: None)
+    assert queue.submit(1, prompt()) is False
+
+
+def test_invalid_drop_policy(engine):
+    with pytest.raises(ValueError):
+        AlertEnrichmentQueue(engine=engine, drop_policy="block")
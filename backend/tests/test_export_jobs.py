@@ -0,0 +1,199 @@
+"""
+Tests for background export jobs and resumable downloads
+"""
+
+import asyncio
+import csv
+import gzip
+import io
+import json
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, SQLModel, create_engine
+
+from backend.app import app
+from backend.auth import create_access_token, get_db
+from backend.database import get_session
+from backend.export_jobs import ExportJobRunner, export_jobs
+from backend.models import ExportJob, Telemetry, TelemetryDuplicate, User
+
+BASE = datetime(2025, 3, 1)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    # File-backed: the job runs on its own thread and connection
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}", connect_args={"check_same_thread": False})
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        for i in range(50):
+            session.add(Telemetry(device_id=f"job-{i % 2}", ts=BASE + timedelta(minutes=i), mq3=100 + i, mq135=50))
+        session.commit()
+        session.add(TelemetryDuplicate(original_telemetry_id=1, device_id="job-0", timestamp=BASE, payload_json="{}"))
+        session.commit()
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def runner(engine, tmp_path):
+    runner = ExportJobRunner(engine, directory=str(tmp_path / "exports"), batch_size=7, pause_ms=0, progress_seconds=0)
+    yield runner
+    runner.stop()
+
+
+def queue_job(engine, kind="telemetry", fmt="csv", **params) -> str:
+    with Session(engine) as session:
+        job = ExportJob(id=f"job{time.monotonic_ns()}", kind=kind, format=fmt, params_json=json.dumps(params))
+        session.add(job)
+        session.commit()
+        return job.id
+
+
+def load(engine, job_id) -> ExportJob:
+    with Session(engine) as session:
+        return session.get(ExportJob, job_id)
+
+
+def test_run_writes_file_and_records_progress(engine, runner):
+    job_id = queue_job(engine, device_id="job-1", columns=["ts", "mq3"], gzip=True)
+    assert runner.run(job_id)
+    job = load(engine, job_id)
+    assert (job.status, job.rows_written, job.total_rows) == ("done", 25, 25)
+    assert job.path.endswith(".csv.gz")
+    with open(job.path, "rb") as f:
+        data = f.read()
+    assert job.bytes_written == len(data)
+    rows = list(csv.reader(io.StringIO(gzip.decompress(data).decode())))
+    assert rows[0] == ["timestamp", "mq3"]
+    assert [int(r[1]) for r in rows[1:]] == list(range(101, 150, 2))
+
+    # Already claimed: a second worker does nothing
+    assert not runner.run(job_id)
+
+
+def test_duplicates_export_uses_timestamp_keyset(engine, runner):
+    job_id = queue_job(engine, kind="duplicates")
+    assert runner.run(job_id)
+    job = load(engine, job_id)
+    assert job.rows_written == 1
+    with open(job.path) as f:
+        assert f.readline().startswith("id,original_telemetry_id,device_id,timestamp")
+
+
+def test_shutdown_requeues_and_removes_partial_file(engine, runner, tmp_path):
+    job_id = queue_job(engine)
+    update = runner._update
+
+    def stop_after_first_page(job, **values):
+        update(job, **values)
+        if "rows_written" in values:
+            runner._stopping.set()
+
+    runner._update = stop_after_first_page
+    assert not runner.run(job_id)
+    job = load(engine, job_id)
+    assert (job.status, job.rows_written) == ("queued", 0)
+    assert list((tmp_path / "exports").iterdir()) == []
+
+
+def test_start_requeues_stale_running_jobs(engine, runner):
+    job_id = queue_job(engine)
+    with Session(engine) as session:
+        job = session.get(ExportJob, job_id)
+        job.status, job.updated_at = "running", datetime.utcnow() - timedelta(hours=1)
+        session.add(job)
+        session.commit()
+    runner.start()
+    for _ in range(200):
+        if load(engine, job_id).status == "done":
+            break
+        time.sleep(0.01)
+    assert load(engine, job_id).status == "done"
+
+
+def test_maintenance_purges_and_requeues_periodically(engine, runner, tmp_path):
+    old = tmp_path / "old.csv"
+    old.write_text("ts\n")
+    expired = queue_job(engine)
+    stale = queue_job(engine)
+    with Session(engine) as session:
+        job = session.get(ExportJob, expired)
+        job.status, job.path, job.finished_at = "done", str(old), datetime.utcnow() - timedelta(hours=48)
+        session.add(job)
+        job = session.get(ExportJob, stale)
+        job.status, job.updated_at = "running", datetime.utcnow() - timedelta(hours=1)
+        session.add(job)
+        session.commit()
+
+    async def scenario():
+        runner.maintenance_seconds = 0.01
+        runner.start_maintenance()
+        for _ in range(200):
+            if load(engine, stale).status == "done":
+                break
+            await asyncio.sleep(0.01)
+        await runner.stop_maintenance()
+
+    asyncio.run(scenario())
+    assert load(engine, expired) is None and not old.exists()
+    assert load(engine, stale).status == "done"
+    assert runner.stats()["purged"] == 1 and runner.stats()["requeued"] == 1
+
+
+def test_export_job_api_with_resumable_download(engine, tmp_path, monkeypatch):
+    monkeypatch.setattr(export_jobs, "engine", engine)
+    monkeypatch.setattr(export_jobs, "directory", str(tmp_path / "api-exports"))
+    monkeypatch.setattr(export_jobs, "pause_seconds", 0)
+    with Session(engine) as session:
+        admin = User(email="jobs@example.com", full_name="Jobs Admin", password_hash="x", role="admin")
+        session.add(admin)
+        session.commit()
+
+    def override():
+        with Session(engine) as session:
+            yield session
+
+    app.dependency_overrides[get_session] = override
+    app.dependency_overrides[get_db] = override
+    try:
+        client = TestClient(app)
+        client.headers["Authorization"] = f"Bearer {create_access_token(data={'sub': 'jobs@example.com'})}"
+
+        assert client.post("/api/v1/exports", json={"kind": "telemetry", "columns": ["ts", "nope"]}).status_code == 400
+
+        created = client.post("/api/v1/exports", json={"kind": "telemetry", "device_id": "job-0"})
+        assert created.status_code == 202
+        job_id = created.json()["id"]
+        for _ in range(200):
+            status = client.get(f"/api/v1/exports/{job_id}").json()
+            if status["status"] == "done":
+                break
+            time.sleep(0.01)
+        assert status["status"] == "done"
+        assert (status["rows_written"], status["total_rows"], status["progress"]) == (25, 25, 1.0)
+
+        url = status["download_url"]
+        full = client.get(url)
+        assert full.status_code == 200
+        assert full.headers["accept-ranges"] == "bytes"
+        body = full.content
+        assert body.count(b"\n") == 26
+
+        # Resume after the first 100 bytes
+        partial = client.get(url, headers={"Range": "bytes=100-"})
+        assert partial.status_code == 206
+        assert partial.headers["content-range"] == f"bytes 100-{len(body) - 1}/{len(body)}"
+        assert body[:100] + partial.content == body
+
+        assert client.get(url, headers={"Range": "bytes=-10"}).content == body[-10:]
+        assert client.get(url, headers={"Range": f"bytes={len(body)}-"}).status_code == 416
+        # The file changed since the first part was fetched: whole file again
+        stale = client.get(url, headers={"Range": "bytes=100-", "If-Range": '"other"'})
+        assert stale.status_code == 200 and stale.content == body
+    finally:
+        app.dependency_overrides.clear()
+        export_jobs.stop()
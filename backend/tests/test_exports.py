@@ -0,0 +1,185 @@
+"""
+Tests for streaming alert / telemetry exports
+"""
+
+import csv
+import io
+import os
+import sqlite3
+import zlib
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, SQLModel, create_engine
+from sqlmodel.pool import StaticPool
+
+from backend import exports
+from backend.app import app
+from backend.auth import create_access_token, get_db
+from backend.database import get_session
+from backend.models import Alert, Telemetry, User
+
+BASE = datetime(2025, 3, 1)
+
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+
+
+@pytest.fixture
+def client(session, monkeypatch):
+    admin = User(email="exporter@example.com", full_name="Exporter", password_hash="x", role="admin")
+    session.add(admin)
+    for i in range(25):
+        # Two devices per timestamp: pages must break ties on id
+        for device in ("exp-a", "exp-b"):
+            session.add(Alert(
+                device_id=device, ts=BASE + timedelta(minutes=i), severity="HIGH" if i % 5 == 0 else "WARNING",
+                short_message="m",
+                explanation="e", recommended_action="r", confidence="low", mq3=400 + i, mq135=200,
+                lat=13.0, lon=80.0
+            ))
+            session.add(Telemetry(device_id=device, ts=BASE + timedelta(minutes=i), mq3=100 + i, mq135=50, temp_c=25.0))
+    session.commit()
+    monkeypatch.setattr(exports, "EXPORT_BATCH_SIZE", 7)
+
+    def override():
+        yield session
+
+    app.dependency_overrides[get_session] = override
+    app.dependency_overrides[get_db] = override
+    client = TestClient(app)
+    client.headers["Authorization"] = f"Bearer {create_access_token(data={'sub': admin.email})}"
+    yield client
+    app.dependency_overrides.clear()
+
+
+def test_iter_pages_keyset_covers_ties_once(session):
+    session.add_all(
+        Telemetry(device_id=f"tie-{i}", ts=BASE, mq3=i, mq135=0) for i in range(10)
+    )
+    session.commit()
+    pages = list(exports.iter_pages(session, Telemetry, ["device_id", "mq3"], [], batch_size=3))
+    assert [len(page) for page in pages] == [3, 3, 3, 1]
+    assert sorted(row[1] for page in pages for row in page) == list(range(10))
+
+
+def test_resolve_columns_rejects_unknown():
+    assert exports.resolve_columns(Alert, " ts, mq3 ", []) == ["ts", "mq3"]
+    with pytest.raises(ValueError):
+        exports.resolve_columns(Alert, "ts,password", [])
+
+
+def test_alert_parquet_export_with_projection_and_range(client):
+    pq = pytest.importorskip("pyarrow.parquet")
+    response = client.get("/api/v1/alerts/export", params={
+        "format": "parquet", "columns": "ts,mq3,lat,lon", "order": "asc",
+        "from_time": "2025-03-01T00:05:00Z", "to_time": "2025-03-01T00:14:00Z"
+    })
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/vnd.apache.parquet"
+
+    parquet = pq.ParquetFile(io.BytesIO(response.content))
+    table = parquet.read()
+    assert table.column_names == ["ts", "mq3", "lat", "lon"]
+    assert table.num_rows == 20
+    assert parquet.num_row_groups == 3  # pages of 7 rows
+    assert table.column("ts")[0].as_py() == BASE + timedelta(minutes=5)
+
+
+def test_telemetry_arrow_export_by_device(client):
+    pa = pytest.importorskip("pyarrow")
+    response = client.get("/api/v1/telemetry/export", params={"format": "arrow", "device_id": "exp-b"})
+    assert response.status_code == 200
+
+    table = pa.ipc.open_stream(response.content).read_all()
+    assert table.num_rows == 25
+    assert set(table.column("device_id").to_pylist()) == {"exp-b"}
+    assert table.column("mq3").to_pylist() == [100 + i for i in range(25)]
+    assert str(table.schema.field("temp_c").type) == "double"
+
+
+def test_telemetry_export_defaults_to_csv(client):
+    response = client.get("/api/v1/telemetry/export", params={"columns": "ts,mq3"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    rows = list(csv.reader(io.StringIO(response.text)))
+    assert rows[0] == ["timestamp", "mq3"] and len(rows) == 51
+
+
+def test_export_rejects_unknown_columns(client):
+    response = client.get("/api/v1/telemetry/export", params={"columns": "ts,secret"})
+    assert response.status_code == 400
+    assert "secret" in response.json()["detail"]
+
+
+def test_alert_csv_export_streams_gzip_with_filters(client):
+    response = client.get("/api/v1/alerts/export", params={"severity": "HIGH", "device_id": "exp-a", "gzip": "true", "order": "asc"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"  # decoded transparently by the client
+    rows = list(csv.reader(io.StringIO(response.text)))
+    assert rows[0] == ["id", "device_id", "timestamp", "severity", "mq3", "mq135", "lat", "lon", "short_message"]
+    assert [row[2] for row in rows[1:]] == [(BASE + timedelta(minutes=i)).isoformat() for i in (0, 5, 10, 15, 20)]
+    assert {row[3] for row in rows[1:]} == {"HIGH"}
+
+
+def test_alert_csv_export_newest_first_with_limit(client):
+    response = client.get("/api/v1/alerts/export", params={"limit": 3, "order": "desc", "columns": "ts,device_id"})
+    rows = list(csv.reader(io.StringIO(response.text)))
+    assert rows == [
+        ["timestamp", "device_id"],
+        [(BASE + timedelta(minutes=24)).isoformat(), "exp-b"],
+        [(BASE + timedelta(minutes=24)).isoformat(), "exp-a"],
+        [(BASE + timedelta(minutes=23)).isoformat(), "exp-b"],
+    ]
+
+
+def test_alert_export_defaults_to_newest_thousand(client):
+    parameters = {p["name"]: p for p in app.openapi()["paths"]["/api/v1/alerts/export"]["get"]["parameters"]}
+    assert (parameters["limit"]["schema"]["default"], parameters["order"]["schema"]["default"]) == (1000, "desc")
+
+    rows = list(csv.reader(io.StringIO(client.get("/api/v1/alerts/export", params={"columns": "ts"}).text)))
+    assert len(rows) == 51 and rows[1][0] == (BASE + timedelta(minutes=24)).isoformat()
+
+    everything = client.get("/api/v1/alerts/export", params={"columns": "ts", "limit": 0, "order": "asc"})
+    rows = list(csv.reader(io.StringIO(everything.text)))
+    assert len(rows) == 51 and rows[1][0] == BASE.isoformat()
+
+
+def current_rss_mb() -> float:
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/statm"), reason="needs /proc to sample RSS")
+def test_csv_export_of_a_million_rows_in_constant_memory(tmp_path):
+    rows = 1_000_000
+    budget_mb = 64
+    path = tmp_path / "export.db"
+    engine = create_engine(f"sqlite:///{path}")
+    SQLModel.metadata.create_all(engine, tables=[Alert.__table__])
+    with sqlite3.connect(path) as conn:
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.executemany(
+            "INSERT INTO alerts (device_id, ts, severity, short_message, explanation, recommended_action, confidence, "
+            "mq3, mq135, lat, lon, notified, created_at) VALUES (?, ?, 'HIGH', 'm', 'e', 'r', 'low', ?, 200, 13.0, 80.0, 0, ?)",
+            ((f"dev-{i % 20}", str(BASE + timedelta(seconds=i)), 400 + i % 500, str(BASE)) for i in range(rows))
+        )
+
+    baseline = peak = current_rss_mb()
+    decompressor = zlib.decompressobj(31)
+    lines = 0
+    with Session(engine) as session:
+        columns = exports.EXPORTABLE["alerts"][2]
+        for chunk in exports.encode_csv(exports.iter_pages(session, Alert, columns, []), Alert, columns, compress=True):
+            lines += decompressor.decompress(chunk).count(b"\n")
+            peak = max(peak, current_rss_mb())
+    engine.dispose()
+
+    assert lines == rows + 1  # header + every row
+    assert peak - baseline < budget_mb, f"export grew RSS by {peak - baseline:.1f} MiB"
@@ -0,0 +1,156 @@
+"""
+Tests for the per-device recent-history ring buffer
+"""
+
+import pytest
+from datetime import datetime, timedelta
+from sqlmodel import Session, create_engine, SQLModel
+from sqlmodel.pool import StaticPool
+from sqlalchemy import event
+
+from backend import history_buffer
+from backend.history_buffer import DeviceHistoryBuffer, load_recent_rows
+from backend.models import Telemetry
+
+BASE = datetime(2025, 1, 1, 10, 0, 0, 123456)
+
+
+@pytest.fixture
+def session():
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.info["queries"] = 0
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def count(*args):
+            session.info["queries"] += 1
+
+        yield session
+
+
+def add_reading(session, buffer, seconds, mq3=300, device_id="dev-1", lat=13.08):
+    row = Telemetry(
+        device_id=device_id,
+        ts=BASE + timedelta(seconds=seconds),
+        mq3=mq3,
+        mq135=200,
+        temp_c=None if seconds % 2 else 25.5,
+        humidity_pct=50.0,
+        lat=lat,
+        lon=80.27 if lat is not None else None
+    )
+    session.add(row)
+    session.commit()
+    session.refresh(row)
+    buffer.append_row(row)
+    return row
+
+
+def db_history(session, device_id, limit):
+    return [
+        {
+            "device_id": t.device_id,
+            "timestamp": t.ts.isoformat(),
+            "mq3": t.mq3,
+            "mq135": t.mq135,
+            "temp_c": t.temp_c,
+            "humidity_pct": t.humidity_pct,
+            "lat": t.lat,
+            "lon": t.lon
+        }
+        for t in load_recent_rows(session, device_id, limit)
+    ]
+
+
+def test_warms_lazily_then_serves_without_queries(session):
+    buffer = DeviceHistoryBuffer(capacity=16)
+    for i in range(5):
+        add_reading(session, buffer, i, mq3=300 + i)
+
+    # First access loads from the database
+    assert buffer.recent(session, "dev-1", limit=3) == db_history(session, "dev-1", 3)
+    assert buffer.stats()["warm_loads"] == 1
+
+    add_reading(session, buffer, 10, mq3=900, lat=None)
+    before = session.info["queries"]
+    history = buffer.recent(session, "dev-1", limit=10)
+    assert session.info["queries"] == before
+    assert history == db_history(session, "dev-1", 10)
+    assert history[-1]["mq3"] == 900
+    assert history[-1]["lat"] is None
+
+
+def test_ring_keeps_only_capacity_and_matches_database(session):
+    buffer = DeviceHistoryBuffer(capacity=4)
+    buffer.recent(session, "dev-1", limit=4)  # warm (empty)
+    for i in range(10):
+        add_reading(session, buffer, i, mq3=400 + i)
+
+    assert buffer.recent(session, "dev-1", limit=4) == db_history(session, "dev-1", 4)
+    assert buffer.stats()["readings"] == 4
+
+
+def test_out_of_order_and_repeated_readings(session):
+    buffer = DeviceHistoryBuffer(capacity=4)
+    buffer.recent(session, "dev-1", limit=4)
+    for seconds in (0, 10, 20):
+        add_reading(session, buffer, seconds)
+    add_reading(session, buffer, 5, mq3=555)  # late reading
+
+    # Re-appending a stored reading (e.g. the duplicate path) must not change history
+    buffer.append("dev-1", BASE + timedelta(seconds=5), 999, 999)
+
+    assert buffer.recent(session, "dev-1", limit=4) == db_history(session, "dev-1", 4)
+
+
+def test_reading_committed_during_warm_load_is_kept(session, monkeypatch):
+    buffer = DeviceHistoryBuffer(capacity=4)
+    add_reading(session, buffer, 0)
+    load = history_buffer.load_recent_rows
+
+    def load_then_ingest(load_session, device_id, limit):
+        rows = load(load_session, device_id, limit)
+        # Another request commits and appends after the snapshot, before the ring is installed
+        add_reading(session, buffer, 1, mq3=777)
+        return rows
+
+    monkeypatch.setattr(history_buffer, "load_recent_rows", load_then_ingest)
+    assert [r["mq3"] for r in buffer.recent(session, "dev-1", limit=4)] == [300, 777]
+    monkeypatch.setattr(history_buffer, "load_recent_rows", load)
+    assert buffer.recent(session, "dev-1", limit=4) == db_history(session, "dev-1", 4)
+    assert buffer._warming == {}
+
+
+def test_limit_larger_than_capacity_falls_back_to_database(session):
+    buffer = DeviceHistoryBuffer(capacity=2)
+    for i in range(5):
+        add_reading(session, buffer, i)
+    assert len(buffer.recent(session, "dev-1", limit=5)) == 5
+    assert buffer.stats()["db_fallbacks"] == 1
+
+
+def test_device_eviction_and_memory_metric(session):
+    buffer = DeviceHistoryBuffer(capacity=4, max_devices=2)
+    for device_id in ("a", "b", "c"):
+        buffer.recent(session, device_id, limit=1)
+
+    stats = buffer.stats()
+    assert stats["devices"] == 2
+    assert stats["evictions"] == 1
+    assert stats["memory_bytes"] > 0
+
+
+def test_disabled_buffer_reads_other_workers_inserts_from_database(session):
+    buffer = DeviceHistoryBuffer(capacity=4, enabled=False)
+    other_worker = DeviceHistoryBuffer(capacity=4)
+    add_reading(session, buffer, 0)
+    assert len(buffer.recent(session, "dev-1", limit=4)) == 1
+    add_reading(session, other_worker, 1)  # ingested elsewhere: never appended here
+    assert buffer.recent(session, "dev-1", limit=4) == db_history(session, "dev-1", 4)
+    stats = buffer.stats()
+    assert (stats["enabled"], stats["devices"], stats["db_fallbacks"]) == (False, 0, 2)
@@ -4,6 +4,7 @@ Tests raw list fetching, aggregation, and parameter validation
 """
 
 import pytest
+import json
 from datetime import datetime, timedelta, timezone
 from fastapi.testclient import TestClient
 from sqlmodel import Session, create_engine, SQLModel
@@ -249,3 +250,97 @@ def test_time_range_limits(client, auth_token):
     assert response.status_code == 400
     assert "exceeds maximum" in response.json()["detail"].lower()
 
+
+
+def legacy_buckets(alerts, from_dt, bucket_seconds):
+    """Reference: the previous in-Python bucketing loop"""
+    buckets = {}
+    for alert in sorted(alerts, key=lambda a: a.ts):
+        start = from_dt + timedelta(seconds=int((alert.ts - from_dt).total_seconds() // bucket_seconds) * bucket_seconds)
+        bucket = buckets.setdefault(start.isoformat() + 'Z', {"counts": {"SAFE": 0, "WARNING": 0, "HIGH": 0}, "lat": [], "lon": []})
+        bucket["counts"][alert.severity] += 1
+        bucket["lat"].append(alert.lat)
+        bucket["lon"].append(alert.lon)
+    return [
+        (key, b["counts"], sum(b["lat"]) / len(b["lat"]), sum(b["lon"]) / len(b["lon"]), len(b["lat"]))
+        for key, b in sorted(buckets.items())
+    ]
+
+
+@pytest.mark.parametrize("from_offset", [timedelta(0), timedelta(microseconds=500000)])
+def test_sql_aggregation_matches_python_bucketing(session, from_offset):
+    from backend.routers.alerts_history import aggregate_alert_buckets
+
+    base = datetime(2025, 3, 1, 12, 0, 0)
+    offsets = [0, 1, 299, 300, 300.25, 301, 599.75, 600, 1234.5, 3599]  # seconds, incl. bucket edges
+    alerts = []
+    for i, seconds in enumerate(offsets):
+        alert = Alert(
+            device_id="dev-a" if i % 3 else "dev-b",
+            ts=base + timedelta(seconds=seconds),
+            severity=["WARNING", "HIGH"][i % 2],
+            short_message="m", explanation="e", recommended_action="r", confidence="low",
+            mq3=400, mq135=200,
+            lat=13.0 + i * 0.01, lon=80.0 + i * 0.01
+        )
+        alerts.append(alert)
+        session.add(alert)
+    # Excluded: no GPS fix
+    session.add(Alert(device_id="dev-a", ts=base + timedelta(seconds=5), severity="HIGH", short_message="m",
+                      explanation="e", recommended_action="r", confidence="low", mq3=400, mq135=200))
+    session.commit()
+
+    from_dt = base + from_offset
+    to_dt = base + timedelta(hours=1)
+    expected = legacy_buckets([a for a in alerts if from_dt <= a.ts <= to_dt], from_dt, 300)
+    result = aggregate_alert_buckets(session, from_dt, to_dt, 300)
+
+    assert [(b.bucket_start, b.counts, b.total_count) for b in result] == [(e[0], e[1], e[4]) for e in expected]
+    for bucket, (_, _, lat, lon, _) in zip(result, expected):
+        assert bucket.repr_lat == pytest.approx(lat)
+        assert bucket.repr_lon == pytest.approx(lon)
+
+    by_device = aggregate_alert_buckets(session, from_dt, to_dt, 300, device_id="dev-b")
+    assert sum(b.total_count for b in by_device) == sum(1 for a in alerts if a.device_id == "dev-b" and a.ts >= from_dt)
+
+
+def parse_sse(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["id"], json.loads(fields["data"])))
+    return events
+
+
+def test_stream_keyset_batches_and_resume(client, auth_token, session):
+    from backend.auth import get_db
+
+    def get_db_override():
+        yield session
+
+    app.dependency_overrides[get_db] = get_db_override  # cleared by the client fixture
+    base = datetime(2025, 3, 1, 12, 0, 0)
+    for i in range(7):
+        # Pairs of alerts share a timestamp so the id tiebreaker matters
+        session.add(Alert(device_id=f"dev-{i}", ts=base + timedelta(seconds=i // 2), severity="HIGH",
+                          short_message=f"a{i}", explanation="e", recommended_action="r", confidence="low",
+                          mq3=400, mq135=200, lat=13.0, lon=80.0))
+    session.commit()
+    all_ids = [a.id for a in session.exec(select(Alert).order_by(Alert.ts, Alert.id)).all()]
+
+    params = {"from_time": "2025-03-01T11:00:00Z", "to_time": "2025-03-01T13:00:00Z", "batch_size": 3}
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    response = client.get("/api/v1/alerts/history/stream", params=params, headers=headers)
+    assert response.status_code == 200
+    events = parse_sse(response.text)
+    assert [len(batch) for _, batch in events] == [3, 3, 1]
+    assert [a["id"] for _, batch in events for a in batch] == all_ids
+    assert set(events[0][1][0]) == {"id", "device_id", "ts", "severity", "short_message", "mq3", "mq135", "lat", "lon"}
+
+    # Reconnect after the first batch
+    resumed = client.get("/api/v1/alerts/history/stream", params=params,
+                         headers={**headers, "Last-Event-ID": events[0][0]})
+    assert [a["id"] for _, batch in parse_sse(resumed.text) for a in batch] == all_ids[3:]
+
+    bad = client.get("/api/v1/alerts/history/stream", params={**params, "last_event_id": "nope"}, headers=headers)
+    assert bad.status_code == 400
@@ -0,0 +1,112 @@
+"""
+Tests for the LLM explanation cache (quantized keys, LRU/TTL, persistence, metrics)
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import create_engine, SQLModel
+from sqlmodel.pool import StaticPool
+
+from backend import openai_client
+from backend.app import app
+from backend.openai_client import (
+    ExplanationCache, LocalStubClient, classify_trend, explanation_cache_key
+)
+
+
+def history(*values):
+    return [{"mq3": v, "mq135": 200} for v in values]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_key_quantizes_nearby_readings():
+    recent = history(900, 905, 910)
+    assert explanation_cache_key(912, 301, recent) == explanation_cache_key(915, 320, recent)
+    # Different MQ3 band
+    assert explanation_cache_key(912, 301, recent) != explanation_cache_key(960, 301, recent)
+    # Different severity (WARNING vs HIGH) even inside one band width
+    assert explanation_cache_key(990, 301, recent) != explanation_cache_key(1010, 301, recent)
+
+
+def test_trend_shapes():
+    assert classify_trend([]) == "none"
+    assert classify_trend(history(700, 705, 702)) == "stable"
+    assert classify_trend(history(700, 800, 900)) == "rising"
+    assert classify_trend(history(900, 800, 700)) == "falling"
+    assert classify_trend(history(700, 702, 701, 1100)) == "spike"
+
+
+def test_lru_eviction_and_ttl():
+    clock = FakeClock()
+    cache = ExplanationCache(max_entries=2, ttl_seconds=60, clock=clock)
+    cache.put("a", {"short_message": "a"})
+    cache.put("b", {"short_message": "b"})
+    assert cache.get("a") == {"short_message": "a"}  # a is now most recent
+    cache.put("c", {"short_message": "c"})  # evicts b
+
+    assert cache.get("b") is None
+    assert cache.get("c") is not None
+
+    clock.now += 61
+    assert cache.get("a") is None
+
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["expirations"] == 1
+    assert stats["hits"] == 2
+    assert stats["misses"] == 2
+
+
+def test_persistence_survives_new_cache_instance():
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    SQLModel.metadata.create_all(engine)
+    clock = FakeClock()
+
+    first = ExplanationCache(persist=True, engine=engine, clock=clock)
+    first.put("key", {"short_message": "persisted"})
+
+    restarted = ExplanationCache(persist=True, engine=engine, clock=clock)
+    assert restarted.get("key") == {"short_message": "persisted"}
+    assert restarted.stats()["persistent_hits"] == 1
+
+    clock.now += restarted.ttl_seconds + 1
+    expired = ExplanationCache(persist=True, engine=engine, clock=clock)
+    assert expired.get("key") is None
+
+
+def test_call_openai_reuses_cached_response(monkeypatch):
+    stub = LocalStubClient()
+    monkeypatch.setattr(openai_client, "client", stub)
+    monkeypatch.setattr(openai_client, "explanation_cache", ExplanationCache())
+    monkeypatch.setattr(openai_client, "LLM_CACHE_ENABLED", True)
+
+    kwargs = dict(
+        device_id="dev-1", timestamp="2025-01-01T10:00:00Z", mq135=300,
+        temp_c=None, humidity_pct=None, lat=None, lon=None,
+        recent_history=history(905, 910, 915)
+    )
+    first = openai_client.call_openai(mq3=1210, **kwargs)
+    second = openai_client.call_openai(mq3=1220, **{**kwargs, "device_id": "dev-2"})
+
+    assert first == second
+    assert stub.calls == 1
+    assert openai_client.explanation_cache.stats()["hits"] == 1
+
+
+def test_health_metrics_reports_cache_counters():
+    response = TestClient(app).get("/api/v1/health/metrics")
+    assert response.status_code == 200
+    metrics = response.json()["metrics"]
+    assert "hit_ratio" in metrics["llm_cache"]
+    assert "queued" in metrics["enrichment"]
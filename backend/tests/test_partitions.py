@@ -0,0 +1,220 @@
+"""
+Tests for monthly storage partitions
+"""
+
+import os
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, SQLModel, create_engine, select
+from sqlmodel.pool import StaticPool
+
+from backend.app import app
+from backend.auth import create_access_token, get_db
+from backend.database import get_session
+from backend.models import Alert, StoragePartition, Telemetry, TelemetryDuplicate, User
+from backend.partitions import PartitionManager, add_months, merge_rows, storage_partitions
+
+NOW = datetime(2025, 6, 15, 12, 0, 0)  # hot window (2 months): May and June
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    SQLModel.metadata.drop_all(engine)
+
+
+@pytest.fixture
+def manager(engine, tmp_path):
+    manager = PartitionManager(engine, enabled=True, directory=str(tmp_path), hot_months=2, batch_size=2)
+    yield manager
+    for path in list(manager._engines):
+        manager._dispose(path)
+
+
+def reading(ts, device_id="part-dev", mq3=100):
+    return Telemetry(device_id=device_id, ts=ts, mq3=mq3, mq135=mq3 + 10)
+
+
+def alert(ts, device_id="part-dev"):
+    return Alert(
+        device_id=device_id, ts=ts, severity="HIGH", short_message="High reading",
+        explanation="", recommended_action="", confidence="high", mq3=400, mq135=300,
+        lat=13.08, lon=80.27
+    )
+
+
+def seed(engine, months=(1, 2, 3, 5, 6)):
+    with Session(engine) as session:
+        for month in months:
+            for day in (1, 10, 20):
+                session.add(reading(datetime(2025, month, day, 8, 0, 0)))
+            session.add(alert(datetime(2025, month, 5, 9, 0, 0)))
+        session.commit()
+
+
+def test_add_months_crosses_years():
+    assert add_months(datetime(2025, 11, 1), 3) == datetime(2026, 2, 1)
+    assert add_months(datetime(2025, 1, 1), -1) == datetime(2024, 12, 1)
+
+
+def test_run_moves_old_months_into_partition_files(engine, manager, tmp_path):
+    seed(engine)
+    report = manager.run_once(NOW)
+    assert report["archived"] == ["2025-01", "2025-02", "2025-03"]
+    assert report["rows_moved"] == 3 * 4
+
+    with Session(engine) as session:
+        remaining = session.exec(select(Telemetry.ts)).all()
+        assert {ts.month for ts in remaining} == {5, 6}
+        assert len(session.exec(select(Alert)).all()) == 2
+        partitions = session.exec(select(StoragePartition).order_by(StoragePartition.month)).all()
+    assert [(p.status, p.telemetry_rows, p.alert_rows) for p in partitions] == [("ready", 3, 1)] * 3
+    assert os.path.exists(tmp_path / "part_2025_02.db")
+
+    # Nothing left to move on the next run
+    assert manager.run_once(NOW)["archived"] == []
+
+
+def test_router_reads_only_overlapping_partitions(engine, manager):
+    seed(engine)
+    manager.run_once(NOW)
+    statement = select(Telemetry).where(Telemetry.ts >= datetime(2025, 2, 5), Telemetry.ts <= datetime(2025, 3, 2))
+
+    with Session(engine) as session:
+        partitions = manager.overlapping(session, datetime(2025, 2, 5), datetime(2025, 3, 2))
+        assert [p.month for p in partitions] == ["2025-03", "2025-02"]
+        read_before = manager.partitions_read
+        results = manager.read_overlapping(session, statement, datetime(2025, 2, 5), datetime(2025, 3, 2))
+    assert manager.partitions_read - read_before == 2
+    assert sorted(r.ts for rows in results for r in rows) == [
+        datetime(2025, 2, 10, 8), datetime(2025, 2, 20, 8), datetime(2025, 3, 1, 8)
+    ]
+
+
+def test_late_rows_are_rearchived_without_duplicates(engine, manager):
+    seed(engine)
+    manager.run_once(NOW)
+    with Session(engine) as session:
+        session.add(reading(datetime(2025, 2, 28, 23, 0, 0)))
+        session.commit()
+    assert manager.run_once(NOW)["archived"] == ["2025-02"]
+
+    with Session(engine) as session:
+        partition = session.get(StoragePartition, "2025-02")
+        assert partition.telemetry_rows == 4
+        results = manager.read_overlapping(session, select(Telemetry), datetime(2025, 2, 1), datetime(2025, 2, 28, 23, 59))
+    assert len(merge_rows(results, key=lambda t: t.ts)) == 4
+
+
+def test_drop_partition_past_retention_deletes_the_file(engine, manager, tmp_path):
+    seed(engine)
+    manager.run_once(NOW)
+    manager.retention_months = 2  # keep partitions ending after 2025-03-01
+    report = manager.run_once(NOW)
+    assert report["dropped"] == ["2025-01", "2025-02"]
+    assert not os.path.exists(tmp_path / "part_2025_01.db")
+    assert os.path.exists(tmp_path / "part_2025_03.db")
+    with Session(engine) as session:
+        assert session.exec(select(StoragePartition.month)).all() == ["2025-03"]
+
+
+def test_merge_rows_dedupes_by_id_and_orders():
+    class Row:
+        def __init__(self, id, ts):
+            self.id, self.ts = id, ts
+
+    merged = merge_rows([[Row(1, 3), Row(2, 1)], [Row(2, 1), Row(3, 2)]], key=lambda r: r.ts, limit=2, reverse=True)
+    assert [r.id for r in merged] == [1, 3]
+
+
+def test_archived_ids_reused_by_the_main_table_are_kept_apart(engine, manager):
+    with Session(engine) as session:
+        session.add(reading(datetime(2025, 1, 1, 8, 0, 0)))
+        session.add(reading(datetime(2025, 1, 2, 8, 0, 0)))
+        session.commit()
+        session.add(TelemetryDuplicate(original_telemetry_id=1, device_id="part-dev", timestamp=datetime(2025, 1, 1, 8, 0, 0), payload_json="{}"))
+        session.commit()
+    manager.run_once(NOW)
+
+    with Session(engine) as session:
+        # The archived readings' duplicates went with them
+        assert session.exec(select(TelemetryDuplicate)).all() == []
+        fresh = reading(datetime(2025, 5, 1, 8, 0, 0))
+        session.add(fresh)
+        session.commit()
+        assert fresh.id == 1  # rowid reused: the main table is empty below it
+        main = session.exec(select(Telemetry)).all()
+        archived = manager.read_overlapping(session, select(Telemetry), None, None)
+    merged = merge_rows([main, *archived], key=lambda t: t.ts)
+    assert [(t.id, t.ts.month) for t in merged] == [(1, 1), (2, 1), (1, 5)]
+    assert manager.stats()["duplicates_removed"] == 1
+
+
+def test_reused_id_taken_in_the_partition_stays_in_main(engine, manager):
+    with Session(engine) as session:
+        session.add_all([reading(datetime(2025, 1, 1, 8, 0, 0)), reading(datetime(2025, 1, 2, 8, 0, 0))])
+        session.commit()
+    manager.run_once(NOW)
+
+    with Session(engine) as session:
+        # Late January readings get the reused ids 1 and 2 (taken in the partition) and a free id 3
+        session.add_all([reading(datetime(2025, 1, day, 8, 0, 0), mq3=day) for day in (15, 16, 17)])
+        session.commit()
+    manager.run_once(NOW)
+
+    with Session(engine) as session:
+        kept = session.exec(select(Telemetry).order_by(Telemetry.id)).all()
+        archived = manager.read_overlapping(session, select(Telemetry), None, None)
+    assert [(t.id, t.mq3) for t in kept] == [(1, 15), (2, 16)]
+    merged = merge_rows([kept, *archived], key=lambda t: t.ts)
+    assert [t.ts.day for t in merged] == [1, 2, 15, 16, 17]
+    assert manager.stats()["rows_conflicting"] == 2
+
+
+def test_history_and_telemetry_endpoints_merge_partitions(engine, manager, monkeypatch):
+    seed(engine)
+    manager.run_once(NOW)
+    for name in ("engine", "enabled", "directory", "_engines"):
+        monkeypatch.setattr(storage_partitions, name, getattr(manager, name))
+
+    with Session(engine) as session:
+        user = User(email="partitions@example.com", full_name="Partition User", password_hash="x", role="user")
+        session.add(user)
+        session.commit()
+
+        def get_session_override():
+            yield session
+
+        app.dependency_overrides[get_session] = get_session_override
+        app.dependency_overrides[get_db] = get_session_override
+        try:
+            client = TestClient(app)
+            headers = {"Authorization": f"Bearer {create_access_token(data={'sub': user.email})}"}
+
+            # A late March alert still in the hot table is merged with the archived one
+            session.add(alert(datetime(2025, 3, 5, 10, 0, 0)))
+            session.commit()
+            response = client.get(
+                "/api/v1/alerts/history?from_time=2025-03-04T12:00:00Z&to_time=2025-03-06T00:00:00Z", headers=headers
+            )
+            assert response.status_code == 200
+            assert [a["ts"][:13] for a in response.json()] == ["2025-03-05T09", "2025-03-05T10"]
+
+            response = client.get(
+                "/api/v1/telemetry?device_id=part-dev&from_time=2025-03-01T00:00:00Z&to_time=2025-05-15T00:00:00Z",
+                headers=headers
+            )
+            assert response.status_code == 200
+            assert len(response.json()) == 5  # 3 archived in March, 2 hot in May
+
+            # Without a range the newest rows come from the hot tables, no partition is needed
+            read_before = storage_partitions.partitions_read
+            response = client.get("/api/v1/telemetry?limit=4", headers=headers)
+            assert len(response.json()) == 4
+            assert storage_partitions.partitions_read == read_before
+        finally:
+            app.dependency_overrides.clear()
@@ -0,0 +1,160 @@
+"""
+Tests for the cross-worker pub/sub bus
+Two bus instances with different worker ids stand in for two uvicorn workers.
+"""
+
+import asyncio
+
+import pytest
+
+from backend.pubsub import InProcessBus, RespBroker, RespBus, SharedStateBus
+from backend.shared_state import SQLiteSharedState
+
+
+def collector():
+    received = []
+
+    async def handler(message):
+        received.append(message)
+
+    return received, handler
+
+
+async def wait_for(condition, timeout=2.0):
+    for _ in range(int(timeout / 0.01)):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("condition not met in time")
+
+
+def test_inprocess_bus_delivers_locally_with_sequence_numbers():
+    async def scenario():
+        bus = InProcessBus(worker_id="w1")
+        received, handler = collector()
+        bus.subscribe("alerts", handler)
+        seqs = [await bus.publish("alerts", {"n": i}) for i in range(3)]
+        await bus.publish("other", {"n": 99})
+        return seqs, received
+
+    seqs, received = asyncio.run(scenario())
+    assert seqs == [1, 2, 3]
+    assert received == [{"n": 0}, {"n": 1}, {"n": 2}]
+
+
+def test_receive_counts_gaps_and_drops_replays():
+    async def scenario():
+        bus = InProcessBus(worker_id="w1")
+        received, handler = collector()
+        bus.subscribe("alerts", handler)
+        for seq in (1, 2, 5, 5, 3, 6):
+            await bus._receive("alerts", {"origin": "w2", "seq": seq, "message": {"seq": seq}})
+        await bus._receive("alerts", {"origin": "w1", "seq": 7, "message": {"seq": 7}})  # own echo
+        return bus, received
+
+    bus, received = asyncio.run(scenario())
+    assert [m["seq"] for m in received] == [1, 2, 5, 6]
+    assert bus.gaps == 2
+    assert bus.duplicates == 2
+
+
+def test_shared_state_bus_crosses_workers(tmp_path):
+    path = str(tmp_path / "shared.db")
+
+    async def scenario():
+        a = SharedStateBus(SQLiteSharedState(path, worker_id="worker-a"))
+        b = SharedStateBus(SQLiteSharedState(path, worker_id="worker-b"))
+        received_a, handler_a = collector()
+        received_b, handler_b = collector()
+        a.subscribe("alerts", handler_a)
+        b.subscribe("alerts", handler_b)
+        await a.start()
+        await b.start()
+        await a.publish("alerts", {"type": "new_alert", "id": 1})
+        await wait_for(lambda: received_b)
+        await a.stop()
+        await b.stop()
+        return received_a, received_b, b.stats()
+
+    received_a, received_b, stats = asyncio.run(scenario())
+    assert received_a == [{"type": "new_alert", "id": 1}]
+    assert received_b == [{"type": "new_alert", "id": 1}]
+    assert stats["received"] == 1 and stats["gaps"] == 0
+
+
+@pytest.mark.parametrize("transport", ["unix", "tcp"])
+def test_resp_bus_through_local_broker(tmp_path, transport):
+    async def scenario():
+        broker = RespBroker()
+        if transport == "unix":
+            url = f"unix://{tmp_path / 'pubsub.sock'}"
+            await broker.start(url)
+        else:
+            server = await broker.start("redis://127.0.0.1:0")
+            url = f"redis://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+
+        workers = [RespBus(url, worker_id=f"worker-{i}") for i in range(3)]
+        inboxes = []
+        for bus in workers:
+            received, handler = collector()
+            bus.subscribe("alerts", handler)
+            inboxes.append(received)
+            await bus.start()
+        for bus in workers:
+            await asyncio.wait_for(bus.subscribed.wait(), 2)
+
+        for i in range(5):
+            await workers[i % 2].publish("alerts", {"n": i})
+        await wait_for(lambda: all(len(inbox) == 5 for inbox in inboxes))
+
+        stats = [bus.stats() for bus in workers]
+        for bus in workers:
+            await bus.stop()
+        await broker.stop()
+        return inboxes, stats
+
+    inboxes, stats = asyncio.run(scenario())
+    for inbox in inboxes:
+        assert sorted(m["n"] for m in inbox) == [0, 1, 2, 3, 4]
+    assert stats[2]["received"] == 5
+    assert all(s["gaps"] == 0 and s["send_errors"] == 0 for s in stats)
+
+
+def test_resp_bus_publish_without_broker_still_delivers_locally(tmp_path):
+    async def scenario():
+        bus = RespBus(f"unix://{tmp_path / 'missing.sock'}", worker_id="w1")
+        received, handler = collector()
+        bus.subscribe("alerts", handler)
+        await bus.publish("alerts", {"n": 1})
+        return received, bus.stats()
+
+    received, stats = asyncio.run(scenario())
+    assert received == [{"n": 1}]
+    assert stats["send_errors"] == 1
+
+
+def test_resp_bus_publish_to_unresponsive_broker_is_bounded(tmp_path):
+    path = tmp_path / "silent.sock"
+
+    async def scenario():
+        held = []
+
+        async def silent(reader, writer):
+            held.append(writer)  # accept, read nothing, never reply
+
+        server = await asyncio.start_unix_server(silent, str(path))
+        bus = RespBus(f"unix://{path}", worker_id="w1", send_timeout=0.1, retry_seconds=60)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await bus.publish("alerts", {"n": 1})
+        first = loop.time() - started
+        started = loop.time()
+        await bus.publish("alerts", {"n": 2})  # skipped while the broker is suspect
+        second = loop.time() - started
+        await bus.stop()
+        server.close()
+        return first, second, bus.stats()
+
+    first, second, stats = asyncio.run(scenario())
+    assert first < 1.0 and second < 0.05
+    assert (stats["send_errors"], stats["sends_skipped"], stats["published"]) == (1, 1, 2)
@@ -0,0 +1,82 @@
+"""
+Tests for the sliding-window login rate limiter
+"""
+
+import pytest
+from sqlmodel import SQLModel
+
+from backend.database import create_app_engine
+from backend.rate_limit import (
+    LoginRateLimiter, MemoryRateLimitStore, SQLiteRateLimitStore, sliding_window_estimate
+)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        yield MemoryRateLimitStore(max_keys=100)
+    else:
+        engine = create_app_engine(f"sqlite:///{tmp_path / 'rate_limit.db'}")
+        SQLModel.metadata.create_all(engine)
+        yield SQLiteRateLimitStore(engine, max_keys=100)
+        engine.dispose()
+
+
+def test_sliding_window_weights_previous_window():
+    # 30s into a 120s window, 75% of the previous window still overlaps
+    assert sliding_window_estimate(1200, 2, 40, 1230, 120) == pytest.approx(32)
+    assert sliding_window_estimate(1200, 2, 40, 1319.9, 120) == pytest.approx(2.033, abs=1e-3)
+
+
+def test_store_rolls_windows(store):
+    assert store.hit("ip:a", 1200, 120, 1201) == (1, 0)
+    assert store.hit("ip:a", 1200, 120, 1202) == (2, 0)
+    # Next window: the old count becomes prev_count
+    assert store.hit("ip:a", 1320, 120, 1321) == (1, 2)
+    # A gap of more than one window forgets everything
+    assert store.hit("ip:a", 1680, 120, 1681) == (1, 0)
+    assert store.reset("ip:a") is True
+    assert store.reset("ip:a") is False
+
+
+def test_limits_per_ip_and_per_account(store):
+    limiter = LoginRateLimiter(store, per_ip=5, per_account=3, window_seconds=120)
+
+    assert all(limiter.hit("10.0.0.1", "victim@example.com") for _ in range(3))
+    # Same account from another IP is still limited
+    assert not limiter.hit("10.0.0.2", "Victim@Example.com")
+    # Other accounts from the first IP are fine until the IP limit
+    assert limiter.hit("10.0.0.1", "other@example.com")
+    assert limiter.hit("10.0.0.1", "other@example.com")
+    assert not limiter.hit("10.0.0.1", "third@example.com")
+
+    assert limiter.reset(account="victim@example.com")
+    assert limiter.hit("10.0.0.3", "victim@example.com")
+    assert limiter.stats()["limited"] == 2
+
+
+def test_memory_store_evicts_least_recently_seen():
+    store = MemoryRateLimitStore(max_keys=3)
+    for key in ("ip:a", "ip:b", "ip:c"):
+        store.hit(key, 0, 120, 1)
+    store.hit("ip:a", 0, 120, 2)  # refresh "a"
+    store.hit("ip:d", 0, 120, 3)  # evicts "b"
+    assert store.size() == 3
+    assert store.evictions == 1
+    assert store.hit("ip:b", 0, 120, 4) == (1, 0)
+    assert store.hit("ip:a", 0, 120, 5) == (3, 0)
+
+
+def test_sqlite_store_prunes_idle_and_excess_keys(tmp_path):
+    engine = create_app_engine(f"sqlite:///{tmp_path / 'rate_limit.db'}")
+    store = SQLiteRateLimitStore(engine, max_keys=10)
+    store.PRUNE_EVERY = 20
+    for i in range(5):
+        store.hit(f"ip:idle-{i}", 0, 120, 1)
+    for i in range(15):
+        store.hit(f"ip:active-{i}", 1200, 120, 1201 + i)
+    # Idle keys went first, then the least recently seen active ones
+    assert store.size() == 10
+    assert store.evictions == 10
+    assert store.hit("ip:active-14", 1200, 120, 1300) == (2, 0)
+    engine.dispose()
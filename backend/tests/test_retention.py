@@ -0,0 +1,115 @@
+"""
+Tests for telemetry retention and downsampling
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlmodel import Session, SQLModel, create_engine, select
+from sqlmodel.pool import StaticPool
+
+from backend.models import Telemetry, TelemetryAggregateHour, TelemetryAggregateMinute, TelemetryDuplicate
+from backend.retention import TelemetryRetention, downsample
+
+NOW = datetime(2025, 3, 1, 12, 0, 0)
+OLD = NOW - timedelta(days=10)  # past the 7-day raw window
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    SQLModel.metadata.drop_all(engine)
+
+
+def reading(ts, device_id="ret-dev", mq3=100, temp_c=None, lat=None, lon=None):
+    return Telemetry(device_id=device_id, ts=ts, mq3=mq3, mq135=mq3 + 10, temp_c=temp_c, lat=lat, lon=lon)
+
+
+def retention(engine, **kwargs):
+    options = dict(enabled=True, raw_days=7, minute_days=90, hour_days=0, batch_size=3, batch_pause_ms=0)
+    options.update(kwargs)
+    return TelemetryRetention(engine, **options)
+
+
+def test_downsample_min_max_avg_and_last_gps():
+    rows = [
+        reading(OLD, mq3=100, temp_c=20.0, lat=13.0, lon=80.0),
+        reading(OLD + timedelta(seconds=20), mq3=300),
+        reading(OLD + timedelta(seconds=40), mq3=200, temp_c=24.0, lat=13.5, lon=80.5),
+        reading(OLD + timedelta(seconds=70), mq3=50),
+    ]
+    minute = sorted(downsample(rows, 60), key=lambda agg: agg["bucket_start"])
+    assert [agg["count"] for agg in minute] == [3, 1]
+    first = minute[0]
+    assert (first["mq3_min"], first["mq3_max"], first["mq3_sum"]) == (100, 300, 600)
+    assert (first["temp_count"], first["temp_c_min"], first["temp_c_max"], first["temp_c_sum"]) == (2, 20.0, 24.0, 44.0)
+    assert (first["lat"], first["lon"]) == (13.5, 80.5)
+    assert minute[1]["gps_ts"] is None and minute[1]["temp_c_min"] is None
+
+    hour = downsample(rows, 3600)
+    assert len(hour) == 1 and hour[0]["count"] == 4 and hour[0]["mq3_min"] == 50
+
+
+def test_run_prunes_old_rows_in_batches_and_keeps_recent(engine):
+    with Session(engine) as session:
+        for i in range(7):
+            session.add(reading(OLD + timedelta(seconds=10 * i), mq3=100 + i, temp_c=20.0 + i))
+        session.add(reading(NOW - timedelta(hours=1)))
+        session.commit()
+        original_id = session.exec(select(Telemetry.id).order_by(Telemetry.ts)).first()
+        session.add(TelemetryDuplicate(original_telemetry_id=original_id, device_id="ret-dev", timestamp=OLD, payload_json="{}"))
+        session.commit()
+
+    report = retention(engine).run_once(now=NOW)
+    assert report["raw_pruned"] == 7
+    assert report["batches"] == 3
+    assert report["duplicates_pruned"] == 1
+    assert report["seconds"] >= 0
+
+    with Session(engine) as session:
+        assert [row.ts for row in session.exec(select(Telemetry)).all()] == [NOW - timedelta(hours=1)]
+        minutes = session.exec(select(TelemetryAggregateMinute).order_by(TelemetryAggregateMinute.bucket_start)).all()
+        assert [m.count for m in minutes] == [6, 1]
+        # Batches of 3 were merged into the same minute bucket
+        assert (minutes[0].mq3_min, minutes[0].mq3_max, minutes[0].mq3_sum) == (100, 105, 615)
+        assert (minutes[0].temp_count, minutes[0].temp_c_min, minutes[0].temp_c_max) == (6, 20.0, 25.0)
+        hour = session.exec(select(TelemetryAggregateHour)).one()
+        assert hour.count == 7 and hour.mq3_max == 106 and hour.last_ts == OLD + timedelta(seconds=60)
+
+
+def test_merge_keeps_newest_gps_fix(engine):
+    with Session(engine) as session:
+        session.add(reading(OLD + timedelta(seconds=50), lat=14.0, lon=81.0))
+        session.add(reading(OLD, lat=13.0, lon=80.0))
+        session.add(reading(OLD + timedelta(seconds=10)))
+        session.commit()
+
+    retention(engine, batch_size=1).run_once(now=NOW)
+    with Session(engine) as session:
+        minute = session.exec(select(TelemetryAggregateMinute)).one()
+        assert minute.count == 3
+        assert (minute.lat, minute.lon, minute.gps_ts) == (14.0, 81.0, OLD + timedelta(seconds=50))
+
+
+def test_old_minute_aggregates_are_dropped(engine):
+    with Session(engine) as session:
+        session.add(reading(NOW - timedelta(days=100)))
+        session.add(reading(OLD))
+        session.commit()
+
+    report = retention(engine, batch_size=1).run_once(now=NOW)
+    assert report["raw_pruned"] == 2
+    assert report["minute_aggregates_pruned"] == 1
+    with Session(engine) as session:
+        assert len(session.exec(select(TelemetryAggregateMinute)).all()) == 1
+        assert len(session.exec(select(TelemetryAggregateHour)).all()) == 2
+
+
+def test_stats_report_last_run(engine):
+    job = retention(engine)
+    job.run_once(now=NOW)
+    stats = job.stats()
+    assert stats["runs"] == 1 and stats["raw_pruned"] == 0
+    assert stats["last_run"]["raw_pruned"] == 0 and "seconds" in stats["last_run"]
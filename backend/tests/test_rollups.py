@@ -0,0 +1,178 @@
+"""
+Tests for minute/hour/day alert rollups and rollup-backed history aggregation
+"""
+
+import random
+import pytest
+from datetime import datetime, timedelta
+from fastapi.testclient import TestClient
+from sqlmodel import Session, create_engine, SQLModel, select
+from sqlmodel.pool import StaticPool
+
+from backend import rollups
+from backend.app import app
+from backend.auth import create_access_token, get_db
+from backend.database import get_session
+from backend.models import Alert, AlertRollupMinute, AlertRollupHour, AlertRollupDay, User
+from backend.routers.alerts_history import aggregate_alert_buckets
+
+BASE = datetime(2025, 3, 1)
+
+
+@pytest.fixture
+def session():
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+
+
+def make_alert(ts, device_id="dev-1", severity="HIGH", mq3=500, lat=13.0, lon=80.0):
+    return Alert(
+        device_id=device_id, ts=ts, severity=severity, short_message="m", explanation="e",
+        recommended_action="r", confidence="low", mq3=mq3, mq135=200, lat=lat, lon=lon
+    )
+
+
+def add_random_alerts(session, count, days=3):
+    rng = random.Random(7)
+    for i in range(count):
+        gps = rng.random() > 0.1
+        session.add(make_alert(
+            BASE + timedelta(seconds=rng.randint(0, days * 86400)) + timedelta(microseconds=i),
+            device_id=rng.choice(["dev-1", "dev-2"]),
+            severity=rng.choice(["WARNING", "HIGH"]),
+            mq3=rng.randint(350, 900),
+            lat=13.0 + rng.random() if gps else None,
+            lon=80.0 + rng.random() if gps else None
+        ))
+    session.commit()
+
+
+def table_rows(session, model):
+    return sorted(
+        (r.bucket_start, r.device_id, r.severity, r.count, r.gps_count, round(r.lat_sum, 6),
+         round(r.lon_sum, 6), r.mq3_min, r.mq3_max, r.mq3_sum)
+        for r in session.exec(select(model)).all()
+    )
+
+
+def test_insert_updates_every_granularity(session):
+    session.add(make_alert(BASE + timedelta(minutes=1, seconds=5), mq3=400))
+    session.add(make_alert(BASE + timedelta(minutes=1, seconds=50), mq3=800, lat=None, lon=None))
+    session.add(make_alert(BASE + timedelta(minutes=2), mq3=600))
+    session.commit()
+
+    minute = session.get(AlertRollupMinute, (BASE + timedelta(minutes=1), "dev-1", "HIGH"))
+    assert (minute.count, minute.gps_count, minute.mq3_min, minute.mq3_max, minute.mq3_sum) == (2, 1, 400, 800, 1200)
+    assert minute.lat_sum == pytest.approx(13.0)
+
+    hour = session.get(AlertRollupHour, (BASE, "dev-1", "HIGH"))
+    day = session.get(AlertRollupDay, (BASE, "dev-1", "HIGH"))
+    for row in (hour, day):
+        assert (row.count, row.gps_count, row.mq3_min, row.mq3_max) == (3, 2, 400, 800)
+
+
+def test_rolled_back_alert_leaves_no_rollup(session):
+    session.add(make_alert(BASE))
+    session.commit()
+    session.add(make_alert(BASE))  # violates unique (device_id, ts)
+    with pytest.raises(Exception):
+        session.commit()
+    session.rollback()
+    assert session.get(AlertRollupDay, (BASE, "dev-1", "HIGH")).count == 1
+
+
+def test_rebuild_matches_incremental(session):
+    add_random_alerts(session, 300)
+    incremental = {model: table_rows(session, model) for _, model in rollups.GRANULARITIES}
+
+    rollups.rebuild_rollups(session)
+    session.commit()
+    session.expire_all()
+    for _, model in rollups.GRANULARITIES:
+        assert table_rows(session, model) == incremental[model]
+
+
+@pytest.mark.parametrize("bucket_minutes,to_offset", [
+    (1440, timedelta(days=3)),
+    (60, timedelta(days=2, hours=5, minutes=17, seconds=30)),
+    (15, timedelta(hours=30, seconds=1)),
+    (7, timedelta(hours=10)),
+])
+def test_rollup_aggregation_matches_raw_scan(session, monkeypatch, bucket_minutes, to_offset):
+    add_random_alerts(session, 400)
+    from_dt, to_dt = BASE, BASE + to_offset
+    assert rollups.rollup_granularity(from_dt, bucket_minutes * 60)
+
+    from_rollups = aggregate_alert_buckets(session, from_dt, to_dt, bucket_minutes * 60, device_id="dev-1")
+    monkeypatch.setattr(rollups, "ROLLUPS_ENABLED", False)
+    from_raw = aggregate_alert_buckets(session, from_dt, to_dt, bucket_minutes * 60, device_id="dev-1")
+
+    assert [(b.bucket_start, b.counts, b.total_count) for b in from_rollups] == \
+           [(b.bucket_start, b.counts, b.total_count) for b in from_raw]
+    for a, b in zip(from_rollups, from_raw):
+        assert a.repr_lat == pytest.approx(b.repr_lat)
+        assert a.repr_lon == pytest.approx(b.repr_lon)
+
+
+def test_unaligned_request_uses_raw_alerts():
+    assert rollups.rollup_granularity(BASE + timedelta(seconds=30), 3600) is None
+    assert rollups.rollup_granularity(BASE, 90) is None
+    assert rollups.rollup_granularity(BASE + timedelta(hours=1), 86400) == 3600
+
+
+def test_aligned_aggregate_allows_long_ranges_for_admins_only(session):
+    admin = User(email="admin@example.com", full_name="Admin", password_hash="x", role="admin")
+    user = User(email="viewer@example.com", full_name="Viewer", password_hash="x", role="user")
+    session.add_all([admin, user])
+    session.add(make_alert(BASE + timedelta(days=40)))
+    session.commit()
+
+    def override():
+        yield session
+
+    def get(who, **params):
+        headers = {"Authorization": f"Bearer {create_access_token(data={'sub': who.email})}"}
+        return client.get("/api/v1/alerts/history", headers=headers, params=params)
+
+    app.dependency_overrides[get_session] = override
+    app.dependency_overrides[get_db] = override
+    try:
+        client = TestClient(app)
+        quarter = {"from_time": "2025-03-01T00:00:00Z", "to_time": "2025-05-30T00:00:00Z"}
+        year = {"from_time": "2025-03-01T00:00:00Z", "to_time": "2026-03-02T00:00:00Z"}
+
+        aggregated = get(admin, **quarter, aggregate="true", bucket_minutes=1440)
+        assert aggregated.status_code == 200
+        assert [b["total_count"] for b in aggregated.json()] == [1]
+        assert get(admin, **quarter).status_code == 400  # raw mode keeps the 7-day cap
+
+        # Rollups do not lift the role caps, and the bucket count is bounded for everyone
+        assert get(user, **quarter, aggregate="true", bucket_minutes=1440).status_code == 400
+        assert get(user, **year, aggregate="true", bucket_minutes=1).status_code == 400
+        too_many = get(admin, **year, aggregate="true", bucket_minutes=1)
+        assert too_many.status_code == 400 and "too many buckets" in too_many.json()["detail"].lower()
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_postgresql_statements_avoid_sqlite_functions():
+    from sqlalchemy.dialects import postgresql
+    from backend.routers.alerts_history import _bucket_index
+
+    upsert = str(rollups._upsert_statement(AlertRollupHour, "postgresql"))
+    assert "least(" in upsert and "greatest(" in upsert
+    assert "min(" not in upsert and "max(" not in upsert
+
+    for expression in (
+        _bucket_index(BASE + timedelta(microseconds=5), 3600, "postgresql"),
+        rollups.sql_epoch_seconds(AlertRollupHour.bucket_start, "postgresql"),
+    ):
+        sql = str(expression.compile(dialect=postgresql.dialect()))
+        assert "EXTRACT(epoch FROM" in sql
+        assert "strftime" not in sql and "substr" not in sql
@@ -0,0 +1,117 @@
+"""
+Tests for the process-shared state backends
+Two SQLiteSharedState instances on one file stand in for two uvicorn workers.
+"""
+
+import asyncio
+import time
+
+from backend import shared_state as shared_state_module
+from backend.shared_state import EventRelay, MemorySharedState, SQLiteSharedState
+
+
+def two_workers(tmp_path):
+    path = str(tmp_path / "shared.db")
+    return SQLiteSharedState(path, worker_id="worker-a"), SQLiteSharedState(path, worker_id="worker-b")
+
+
+def test_values_and_worker_counts_are_shared(tmp_path):
+    a, b = two_workers(tmp_path)
+    a.set("last_telemetry_received_at", "2025-01-01T10:00:00")
+    assert b.get("last_telemetry_received_at") == "2025-01-01T10:00:00"
+    assert b.get("missing", "default") == "default"
+
+    a.set_worker_value("ws_clients", 3)
+    b.set_worker_value("ws_clients", 4)
+    assert a.sum_worker_values("ws_clients") == 7
+    assert a.live_workers() == 2
+
+    b.remove_worker()
+    assert a.sum_worker_values("ws_clients") == 3
+
+
+def test_stale_workers_are_ignored(tmp_path, monkeypatch):
+    a, b = two_workers(tmp_path)
+    a.set_worker_value("ws_clients", 3)
+    b.set_worker_value("ws_clients", 4)
+    monkeypatch.setattr(shared_state_module, "SHARED_STATE_WORKER_STALE_SECONDS", 0)
+    time.sleep(0.01)
+    assert a.sum_worker_values("ws_clients") == 0
+
+
+def test_events_have_increasing_sequence_numbers(tmp_path):
+    a, b = two_workers(tmp_path)
+    first = a.publish("alerts", {"type": "new_alert", "n": 1})
+    second = b.publish("alerts", {"type": "new_alert", "n": 2})
+    b.publish("other", {"n": 3})
+    assert second > first
+    assert [(origin, payload["n"]) for _, origin, payload in a.read_events("alerts", 0)] == \
+        [("worker-a", 1), ("worker-b", 2)]
+    assert a.read_events("alerts", second) == []
+    assert a.latest_seq("alerts") == second
+
+
+def test_relay_delivers_only_other_workers_events(tmp_path):
+    a, b = two_workers(tmp_path)
+    a.publish("alerts", {"n": 0})  # before the relay started: not replayed
+
+    async def scenario():
+        delivered = []
+
+        async def deliver(message):
+            delivered.append(message["n"])
+
+        relay = EventRelay(b, "alerts", poll_ms=10)
+        relay.start(deliver)
+        a.publish("alerts", {"n": 1})
+        b.publish("alerts", {"n": 2})  # worker b's own event, already delivered locally
+        a.publish("alerts", {"n": 3})
+        for _ in range(100):
+            if len(delivered) == 2:
+                break
+            await asyncio.sleep(0.01)
+        await relay.stop()
+        return delivered, relay.stats()
+
+    delivered, stats = asyncio.run(scenario())
+    assert delivered == [1, 3]
+    assert stats["relayed"] == 2
+
+
+def test_memory_backend_is_single_worker():
+    state = MemorySharedState(worker_id="only")
+    state.set("key", {"a": 1})
+    state.set_worker_value("ws_clients", 2)
+    assert state.get("key") == {"a": 1}
+    assert state.sum_worker_values("ws_clients") == 2
+    assert not state.is_shared
+    seq = state.publish("alerts", {"n": 1})
+    assert state.read_events("alerts", seq - 1) == [(seq, "only", {"n": 1})]
+
+
+def test_async_telemetry_time_writes_shared_state_off_the_loop(tmp_path, monkeypatch):
+    import threading
+    from datetime import datetime, timedelta
+    from backend.routers import health
+
+    a, b = two_workers(tmp_path)
+    writers = []
+    original_set = a.set
+
+    def recording_set(key, value):
+        writers.append(threading.get_ident())
+        original_set(key, value)
+
+    monkeypatch.setattr(a, "set", recording_set)
+    monkeypatch.setattr(health, "shared_state", a)
+    monkeypatch.setattr(health, "last_telemetry_received_at", None)
+    now = datetime(2025, 1, 1, 10, 0, 0)
+
+    async def scenario():
+        await health.set_last_telemetry_time_async(now)
+        await health.set_last_telemetry_time_async(now + timedelta(milliseconds=200))  # throttled
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(scenario())
+    assert len(writers) == 1 and writers[0] != loop_thread
+    assert b.get("last_telemetry_received_at") == now.isoformat()
@@ -0,0 +1,39 @@
+"""
+Tests for SQLite storage profiles (PRAGMAs applied on connect)
+"""
+
+import pytest
+from sqlalchemy import text
+
+from backend.database import create_app_engine, STORAGE_PROFILES
+
+
+def pragma(engine, name):
+    with engine.connect() as conn:
+        return conn.execute(text(f"PRAGMA {name}")).scalar()
+
+
+def test_wal_profile_applies_pragmas_on_every_connection(tmp_path):
+    engine = create_app_engine(f"sqlite:///{tmp_path / 'wal.db'}", profile="wal")
+    assert pragma(engine, "journal_mode") == "wal"
+    assert pragma(engine, "synchronous") == 1  # NORMAL
+    assert pragma(engine, "busy_timeout") > 0
+    assert pragma(engine, "cache_size") < 0  # sized in KiB
+    assert engine.pool.size() > 1
+    engine.dispose()
+
+
+def test_durable_and_legacy_profiles(tmp_path):
+    durable = create_app_engine(f"sqlite:///{tmp_path / 'durable.db'}", profile="durable")
+    assert (pragma(durable, "journal_mode"), pragma(durable, "synchronous")) == ("wal", 2)
+    durable.dispose()
+
+    legacy = create_app_engine(f"sqlite:///{tmp_path / 'legacy.db'}", profile="legacy")
+    assert pragma(legacy, "journal_mode") == "delete"
+    legacy.dispose()
+
+
+def test_unknown_profile_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        create_app_engine(f"sqlite:///{tmp_path / 'x.db'}", profile="turbo")
+    assert set(STORAGE_PROFILES) == {"legacy", "wal", "durable"}
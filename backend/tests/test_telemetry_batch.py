@@ -0,0 +1,149 @@
+"""
+Tests for batch telemetry ingestion
+"""
+
+import os
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, create_engine, SQLModel, select
+from sqlmodel.pool import StaticPool
+
+from backend import app as app_module
+from backend.app import app
+from backend.database import get_session
+from backend.models import Telemetry, TelemetryDuplicate, Alert
+
+DEVICE_API_KEY = "test-device-key"
+
+engine = create_engine(
+    "sqlite:///:memory:",
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool
+)
+
+
+@pytest.fixture
+def session():
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+    SQLModel.metadata.drop_all(engine)
+
+
+@pytest.fixture
+def client(session, monkeypatch):
+    def get_session_override():
+        yield session
+
+    app.dependency_overrides[get_session] = get_session_override
+    monkeypatch.setenv("DEVICE_API_KEY", DEVICE_API_KEY)
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+def reading(device_id="batch-dev-001", second=0, mq3=300):
+    return {
+        "device_id": device_id,
+        "timestamp": f"2025-01-01T10:00:{second:02d}Z",
+        "sensors": {"mq3": mq3, "mq135": 200, "temp_c": 25.0, "humidity_pct": 50.0},
+        "gps": {"lat": 13.08, "lon": 80.27}
+    }
+
+
+def post_batch(client, payload):
+    return client.post(
+        "/api/v1/telemetry/batch",
+        json=payload,
+        headers={"x-api-key": DEVICE_API_KEY}
+    )
+
+
+def test_batch_inserts_and_returns_per_item_status(client, session):
+    response = post_batch(client, [reading(second=0), reading(second=1), reading(second=2, mq3=1200)])
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["received"] == 3
+    assert data["inserted"] == 3
+    assert [r["status"] for r in data["results"]] == ["SAFE", "SAFE", "alert_created"]
+    assert data["results"][2]["severity"] == "HIGH"
+
+    assert len(session.exec(select(Telemetry)).all()) == 3
+    alerts = session.exec(select(Alert)).all()
+    assert len(alerts) == 1
+    assert alerts[0].mq3 == 1200
+
+
+def test_batch_resolves_existing_and_in_batch_duplicates(client, session):
+    first = post_batch(client, [reading(second=0)])
+    assert first.json()["results"][0]["status"] == "SAFE"
+
+    response = post_batch(client, [reading(second=0), reading(second=5), reading(second=5)])
+    data = response.json()
+    statuses = [r["status"] for r in data["results"]]
+    assert statuses == ["duplicate", "SAFE", "duplicate"]
+    assert data["inserted"] == 1
+    assert data["duplicates"] == 2
+
+    # In-batch duplicate must reference the row inserted earlier in the same batch
+    inserted = session.exec(select(Telemetry).order_by(Telemetry.id.desc())).first()
+    assert data["results"][2]["original_id"] == inserted.id
+    assert len(session.exec(select(TelemetryDuplicate)).all()) == 2
+
+
+def test_batch_retries_a_concurrent_insert_with_on_conflict(client, session, monkeypatch):
+    lookup = app_module.find_existing_telemetry_ids
+    raced_ts = app_module.parse_device_timestamp(reading()["timestamp"])
+    calls = []
+
+    def lookup_then_race(lookup_session, keys):
+        existing = lookup(lookup_session, keys)
+        if not calls:
+            # Another request commits second=0 between the lookup and the insert
+            with Session(engine) as other:
+                other.add(Telemetry(device_id="batch-dev-001", ts=raced_ts, mq3=1, mq135=1))
+                other.commit()
+        calls.append(keys)
+        return existing
+
+    monkeypatch.setattr(app_module, "find_existing_telemetry_ids", lookup_then_race)
+    assert not app_module.telemetry_filter.covers(session)  # no filter rebuild to fall back on
+
+    response = post_batch(client, [reading(second=0), reading(second=0), reading(second=1)])
+    assert response.status_code == 200
+    data = response.json()
+    assert [r["status"] for r in data["results"]] == ["duplicate", "duplicate", "SAFE"]
+    assert (data["inserted"], data["duplicates"]) == (1, 2)
+    original = session.exec(select(Telemetry).where(Telemetry.mq3 == 1)).one()
+    assert {r["original_id"] for r in data["results"][:2]} == {original.id}
+    assert len(session.exec(select(TelemetryDuplicate)).all()) == 2
+    assert len(calls) == 2
+
+
+def test_batch_matches_single_item_duplicate_response(client):
+    single = client.post(
+        "/api/v1/telemetry",
+        json=reading(second=9),
+        headers={"x-api-key": DEVICE_API_KEY}
+    )
+    assert single.json()["status"] == "SAFE"
+
+    data = post_batch(client, [reading(second=9)]).json()
+    result = data["results"][0]
+    assert result["status"] == "duplicate"
+    assert set(result) == {"status", "message", "original_id", "duplicate_id"}
+
+
+def test_batch_validation(client, monkeypatch):
+    assert post_batch(client, []).status_code == 400
+
+    monkeypatch.setattr(app_module, "MAX_TELEMETRY_BATCH", 2)
+    response = post_batch(client, [reading(second=i) for i in range(3)])
+    assert response.status_code == 413
+
+    response = client.post(
+        "/api/v1/telemetry/batch",
+        json=[reading()],
+        headers={"x-api-key": "wrong-key"}
+    )
+    assert response.status_code == 401
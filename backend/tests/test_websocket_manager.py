@@ -0,0 +1,198 @@
+"""
+Tests for WebSocket fan-out (per-client queues, eviction, lag reporting)
+"""
+
+import asyncio
+import json
+
+from fastapi.testclient import TestClient
+
+from backend.app import app
+from backend.websocket_manager import ConnectionManager
+
+
+class FakeWebSocket:
+    """Minimal stand-in for starlette's WebSocket"""
+
+    def __init__(self, delay: float = 0.0, fail: bool = False):
+        self.delay = delay
+        self.fail = fail
+        self.received = []
+        self.closed_with = None
+        self.client = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text: str):
+        if self.fail:
+            raise RuntimeError("socket gone")
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.received.append(text)
+
+    async def close(self, code: int = 1000):
+        self.closed_with = code
+
+
+async def drain():
+    # Let sender tasks run
+    for _ in range(20):
+        await asyncio.sleep(0)
+
+
+def test_broadcast_serializes_once_and_reaches_everyone():
+    async def scenario():
+        manager = ConnectionManager()
+        sockets = [FakeWebSocket() for _ in range(3)]
+        for ws in sockets:
+            await manager.connect(ws)
+        await manager.broadcast({"type": "new_alert", "data": {"id": 1}})
+        await drain()
+        return manager, sockets
+
+    manager, sockets = asyncio.run(scenario())
+    texts = [ws.received[0] for ws in sockets]
+    assert all(text is texts[0] for text in texts)  # same serialized string object
+    assert json.loads(texts[0])["data"]["id"] == 1
+    assert manager.stats()["clients"] == 3
+
+
+def test_slow_client_does_not_block_and_is_evicted_on_overflow():
+    async def scenario():
+        manager = ConnectionManager(queue_size=2)
+        fast, slow = FakeWebSocket(), FakeWebSocket(delay=10)
+        await manager.connect(fast)
+        await manager.connect(slow)
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        for i in range(5):
+            await manager.broadcast({"n": i})
+            await drain()
+        elapsed = loop.time() - started
+        await drain()
+        return manager, fast, slow, elapsed
+
+    manager, fast, slow, elapsed = asyncio.run(scenario())
+    assert elapsed < 1
+    assert len(fast.received) == 5
+    assert slow not in manager.active_connections
+    assert slow.closed_with == 1013
+    assert manager.stats()["evicted"] == 1
+
+
+def test_failed_send_evicts_client():
+    async def scenario():
+        manager = ConnectionManager()
+        broken, healthy = FakeWebSocket(fail=True), FakeWebSocket()
+        await manager.connect(broken)
+        await manager.connect(healthy)
+        await manager.broadcast_ping()
+        await drain()
+        return manager, healthy
+
+    manager, healthy = asyncio.run(scenario())
+    assert manager.active_connections == [healthy]
+    stats = manager.stats()
+    assert stats["evicted"] == 1
+    assert "per_client" not in stats and stats["queued"] == 0
+    details = manager.client_stats()
+    assert details[0]["sent"] == 1
+    assert details[0]["last_lag_ms"] >= 0
+
+
+def test_disconnect_stops_sender():
+    async def scenario():
+        manager = ConnectionManager()
+        ws = FakeWebSocket()
+        await manager.connect(ws)
+        task = manager.clients[ws].task
+        manager.disconnect(ws)
+        await drain()
+        return manager, task
+
+    manager, task = asyncio.run(scenario())
+    assert task.cancelled()
+    assert manager.active_connections == []
+
+
+def alert(device_id, severity="HIGH", lat=None, lon=None):
+    return {"type": "new_alert", "data": {"id": 1, "device_id": device_id, "severity": severity, "lat": lat, "lon": lon}}
+
+
+def test_subscriptions_filter_alerts_but_not_pings():
+    async def scenario():
+        manager = ConnectionManager()
+        everyone, one_device, high_only, boxed = (FakeWebSocket() for _ in range(4))
+        for ws in (everyone, one_device, high_only, boxed):
+            await manager.connect(ws)
+        manager.subscribe(one_device, device_ids=["dev-1"])
+        manager.subscribe(high_only, min_severity="HIGH")
+        manager.subscribe(boxed, bbox=[13.0, 80.0, 13.2, 80.4])
+
+        await manager.broadcast(alert("dev-1", "WARNING", 13.08, 80.27))
+        await manager.broadcast(alert("dev-2", "HIGH", 19.07, 72.87))
+        await manager.broadcast(alert("dev-3", "HIGH"))  # no GPS fix
+        await manager.broadcast_ping()
+        await drain()
+        return manager, everyone, one_device, high_only, boxed
+
+    manager, everyone, one_device, high_only, boxed = asyncio.run(scenario())
+
+    def devices(ws):
+        return [json.loads(t)["data"]["device_id"] for t in ws.received if json.loads(t)["type"] == "new_alert"]
+
+    assert devices(everyone) == ["dev-1", "dev-2", "dev-3"]
+    assert devices(one_device) == ["dev-1"]
+    assert devices(high_only) == ["dev-2", "dev-3"]
+    assert devices(boxed) == ["dev-1"]
+    assert all(json.loads(ws.received[-1])["type"] == "ping" for ws in (everyone, one_device, high_only, boxed))
+    assert manager.stats()["filtered"] == 5
+
+
+def test_unsubscribe_returns_to_wildcard_and_index_is_cleaned():
+    async def scenario():
+        manager = ConnectionManager()
+        ws = FakeWebSocket()
+        await manager.connect(ws)
+        manager.subscribe(ws, device_ids=["dev-1", "dev-2"])
+        partial = manager.unsubscribe(ws, device_ids=["dev-1"])
+        await manager.broadcast(alert("dev-1"))
+        await drain()
+        assert ws.received == []
+        full = manager.unsubscribe(ws, device_ids=["dev-2"])
+        await manager.broadcast(alert("dev-1"))
+        await drain()
+        manager.disconnect(ws)
+        return manager, ws, partial, full
+
+    manager, ws, partial, full = asyncio.run(scenario())
+    assert partial["device_ids"] == ["dev-2"]
+    assert full["device_ids"] == "*"
+    assert len(ws.received) == 1
+    assert manager.stats()["subscribed_devices"] == 0
+    assert manager.stats()["wildcard_clients"] == 0
+
+
+def test_subscribe_rejects_bad_filters():
+    async def scenario():
+        manager = ConnectionManager()
+        ws = FakeWebSocket()
+        await manager.connect(ws)
+        errors = []
+        for kwargs in ({"min_severity": "CRITICAL"}, {"bbox": [1, 2, 3]}, {"bbox": [50, 0, 10, 1]}):
+            try:
+                manager.subscribe(ws, **kwargs)
+            except ValueError as e:
+                errors.append(str(e))
+        return errors
+
+    assert len(asyncio.run(scenario())) == 3
+
+
+def test_client_detail_is_admin_only():
+    client = TestClient(app)
+    metrics = client.get("/api/v1/health/metrics").json()["metrics"]["websocket"]
+    assert "per_client" not in metrics
+    assert client.get("/api/v1/health/ws-clients").status_code == 401
@@ -0,0 +1,249 @@
+"""
+Tests for the SAFE reading write-behind buffer
+"""
+
+import asyncio
+import glob
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+from sqlmodel import Session, SQLModel, create_engine, select
+from sqlmodel.pool import StaticPool
+
+from backend import app as app_module
+from backend.app import app
+from backend.database import get_session
+from backend.models import Alert, Telemetry, TelemetryDuplicate
+from backend.write_behind import TelemetryWriteBehind
+
+DEVICE_API_KEY = "test-device-key"
+BASE = datetime(2025, 1, 1, 10, 0, 0)
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    SQLModel.metadata.drop_all(engine)
+
+
+def values(second, device_id="wb-dev"):
+    return {
+        "device_id": device_id, "ts": BASE + timedelta(seconds=second), "mq3": 100, "mq135": 120,
+        "temp_c": 25.0, "humidity_pct": 50.0, "lat": None, "lon": None, "alt": None,
+        "received_at": datetime.utcnow()
+    }
+
+
+def buffer(engine, tmp_path, **kwargs):
+    options = dict(enabled=True, flush_ms=60_000, max_rows=1000, journal="flush",
+                   journal_path=str(tmp_path / "journal"))
+    options.update(kwargs)
+    return TelemetryWriteBehind(engine, **options)
+
+
+def journal_files(tmp_path):
+    return glob.glob(str(tmp_path / "journal.*"))
+
+
+def test_flush_writes_queue_in_one_transaction(engine, tmp_path):
+    with Session(engine) as session:
+        session.add(Telemetry(**values(0)))
+        session.commit()
+    flushed = []
+
+    async def scenario():
+        wb = buffer(engine, tmp_path, on_flush=lambda session, rows: flushed.extend(rows))
+        assert wb.submit(values(1), "{}") is False  # not started
+        wb.start()
+        for second in (0, 1, 2):
+            assert wb.submit(values(second), '{"dup": true}')
+        assert wb.depth() == 3 and len(journal_files(tmp_path)) == 1
+        written = await asyncio.to_thread(wb.flush)
+        await wb.stop()
+        return wb, written
+
+    wb, written = asyncio.run(scenario())
+    assert written == 3
+    assert [row["ts"] for row in flushed] == [BASE + timedelta(seconds=1), BASE + timedelta(seconds=2)]
+    assert journal_files(tmp_path) == []
+    stats = wb.stats()
+    assert stats["depth"] == 0 and stats["flushes"] == 1 and stats["duplicates"] == 1
+    with Session(engine) as session:
+        assert len(session.exec(select(Telemetry)).all()) == 3
+        duplicate = session.exec(select(TelemetryDuplicate)).one()
+        assert duplicate.payload_json == '{"dup": true}'
+
+
+def test_full_batch_triggers_flush_and_stop_drains(engine, tmp_path):
+    async def scenario():
+        wb = buffer(engine, tmp_path, max_rows=2, max_queue=3)
+        wb.start()
+        wb.submit(values(0), "{}")
+        wb.submit(values(1), "{}")
+        for _ in range(200):
+            if wb.depth() == 0:
+                break
+            await asyncio.sleep(0.01)
+        early_flushes = wb.flushes
+        wb.submit(values(2), "{}")
+        await wb.stop()
+        return wb, early_flushes
+
+    wb, early_flushes = asyncio.run(scenario())
+    assert early_flushes == 1
+    assert wb.depth() == 0 and not wb.enabled
+    with Session(engine) as session:
+        assert len(session.exec(select(Telemetry)).all()) == 3
+
+
+def test_full_queue_is_rejected(engine, tmp_path):
+    async def scenario():
+        wb = buffer(engine, tmp_path, max_queue=2, journal="off")
+        wb.start()
+        results = [wb.submit(values(second), "{}") for second in range(3)]
+        await wb.stop()
+        return wb, results
+
+    wb, results = asyncio.run(scenario())
+    assert results == [True, True, False]
+    assert wb.stats()["rejected"] == 1
+    assert journal_files(tmp_path) == []
+
+
+def test_journal_is_replayed_after_a_crash(engine, tmp_path):
+    async def crash():
+        wb = buffer(engine, tmp_path)
+        wb.start()
+        for second in range(3):
+            wb.submit(values(second), "{}")
+        wb._task.cancel()
+        wb._segment.handle.close()  # process died: lock released, queue lost
+
+    asyncio.run(crash())
+    # One reading made it to the database before the crash
+    with Session(engine) as session:
+        session.add(Telemetry(**values(0)))
+        session.commit()
+
+    recovered = buffer(engine, tmp_path)
+    assert recovered.recover() == 3
+    assert recovered.recover() == 0
+    assert journal_files(tmp_path) == []
+    with Session(engine) as session:
+        assert len(session.exec(select(Telemetry)).all()) == 3
+        assert session.exec(select(TelemetryDuplicate)).all() == []
+
+
+def test_live_segments_are_not_replayed(engine, tmp_path):
+    async def scenario():
+        wb = buffer(engine, tmp_path)
+        wb.start()
+        wb.submit(values(0), "{}")
+        replayed = buffer(engine, tmp_path).recover()
+        await wb.stop()
+        return replayed
+
+    assert asyncio.run(scenario()) == 0
+    with Session(engine) as session:
+        assert len(session.exec(select(Telemetry)).all()) == 1
+
+
+def test_safe_readings_are_acknowledged_before_commit(engine, tmp_path, monkeypatch):
+    def override():
+        with Session(engine) as session:
+            yield session
+
+    app.dependency_overrides[get_session] = override
+    monkeypatch.setenv("DEVICE_API_KEY", DEVICE_API_KEY)
+
+    def reading(second, mq3):
+        return {
+            "device_id": "wb-api", "timestamp": f"2025-01-01T10:00:{second:02d}Z",
+            "sensors": {"mq3": mq3, "mq135": 200}
+        }
+
+    async def scenario():
+        wb = buffer(engine, tmp_path)
+        monkeypatch.setattr(app_module, "write_behind", wb)
+        wb.start()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            headers = {"x-api-key": DEVICE_API_KEY}
+            safe = await client.post("/api/v1/telemetry", json=reading(0, 100), headers=headers)
+            high = await client.post("/api/v1/telemetry", json=reading(1, 1200), headers=headers)
+        with Session(engine) as session:
+            before_flush = len(session.exec(select(Telemetry)).all())
+        await wb.stop()
+        return safe.json(), high.json(), before_flush
+
+    try:
+        safe, high, before_flush = asyncio.run(scenario())
+    finally:
+        app.dependency_overrides.clear()
+    assert safe == {"status": "SAFE", "mq3": 100}
+    assert high["status"] == "alert_created"
+    assert before_flush == 1  # only the HIGH reading committed inline
+    with Session(engine) as session:
+        assert len(session.exec(select(Telemetry)).all()) == 2
+        assert len(session.exec(select(Alert)).all()) == 1
+
+
+def test_bad_reading_is_dead_lettered_instead_of_blocking_the_queue(engine, tmp_path):
+    from backend.models import TelemetryDeadLetter
+
+    async def scenario():
+        wb = buffer(engine, tmp_path)
+        wb.start()
+        bad = {**values(2), "mq3": None}  # NOT NULL violation: no retry can fix it
+        for entry in (values(0), values(1), bad, values(3)):
+            assert wb.submit(entry, "{}")
+        written = await asyncio.to_thread(wb.flush)
+        await wb.stop()
+        return wb, written
+
+    wb, written = asyncio.run(scenario())
+    assert written == 3
+    stats = wb.stats()
+    assert (stats["depth"], stats["failed_flushes"], stats["dead_lettered"]) == (0, 1, 1)
+    assert journal_files(tmp_path) == []
+    with Session(engine) as session:
+        assert sorted(t.ts for t in session.exec(select(Telemetry)).all()) == [BASE + timedelta(seconds=s) for s in (0, 1, 3)]
+        dead = session.exec(select(TelemetryDeadLetter)).one()
+        assert dead.device_id == "wb-dev" and '"mq3": null' in dead.record_json and "NOT NULL" in dead.error
+
+
+def test_insert_chunks_stay_under_sqlite_parameter_limit():
+    from backend.write_behind import SQLITE_MAX_PARAMS, _chunks
+    rows = [values(i) for i in range(500)]
+    chunks = list(_chunks(rows))
+    assert sum(len(chunk) for chunk in chunks) == 500
+    assert all(len(chunk) * len(rows[0]) <= SQLITE_MAX_PARAMS for chunk in chunks)
+
+
+def test_transient_failures_retry_then_isolate_the_reading_that_keeps_failing(engine, tmp_path):
+    from sqlalchemy.exc import OperationalError
+    from backend.models import TelemetryDeadLetter
+
+    wb = buffer(engine, tmp_path, journal="off", max_attempts=2)
+    write = wb._write
+    down = {"db": True}
+
+    def flaky_write(batch, replay=False):
+        if down["db"] or any(v["ts"] == BASE + timedelta(seconds=1) for v, _ in batch):
+            raise OperationalError("INSERT", {}, Exception("database is locked"))
+        write(batch, replay=replay)
+
+    wb._write = flaky_write
+    wb.configured, wb._task = True, object()  # accept readings without a flush task
+    for second in range(3):
+        assert wb.submit(values(second), "{}")
+
+    assert wb.flush() == 0 and wb.depth() == 3  # transient: retried as a whole
+    assert wb.flush() == 0 and wb.depth() == 3  # attempts exhausted, but nothing can be written: keep
+    down["db"] = False
+    assert wb.flush() == 2 and wb.depth() == 0  # database back: only the reading that still fails is isolated
+    with Session(engine) as session:
+        assert session.exec(select(TelemetryDeadLetter)).one().attempts == 3
@@ -1,7 +1,28 @@
 import os
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Optional, Tuple
+from sqlalchemy import DateTime, false, literal
 from sqlmodel import Session, select
-from backend.models import Telemetry, Alert, DeviceSettings
+from backend.models import Telemetry, Alert, DeviceSettings, TelemetryDuplicate
+from backend import dedup_filter
+from backend.dedup_filter import telemetry_filter
+from backend.history_buffer import history_buffer
+
+# Max (device_id, ts) keys per IN (...) lookup, keeps us under SQLite's variable limit
+DUPLICATE_LOOKUP_CHUNK = 250
+
+
+def parse_device_timestamp(value: str) -> datetime:
+    """
+    Parse an ISO8601 device timestamp into a naive UTC datetime.
+    Raises ValueError if the timestamp cannot be parsed.
+    """
+    # Handle timezone-aware and naive timestamps
+    ts = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    # Convert to UTC naive datetime if timezone-aware
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
 
 
 def determine_severity_mq3_only(mq3: int) -> str:
@@ -23,44 +44,109 @@ def check_duplicate(session: Session, device_id: str, timestamp: datetime) -> bo
     """
     Check if telemetry with same (device_id, timestamp) already exists.
     Returns True if duplicate found.
+    The dedup filter answers keys it has (or has never) seen without a query.
     """
-    statement = select(Telemetry).where(
+    answer = telemetry_filter.lookup(session, device_id, timestamp)
+    if answer == dedup_filter.NEW:
+        return False
+    if answer == dedup_filter.SEEN:
+        return True
+    statement = select(Telemetry.id).where(
         Telemetry.device_id == device_id,
         Telemetry.ts == timestamp
     )
     existing = session.exec(statement).first()
+    if answer == dedup_filter.MAYBE:
+        telemetry_filter.confirm(existing is not None)
     return existing is not None
 
 
+def _conflict_insert(session: Session, table):
+    """INSERT construct with ON CONFLICT support for the session's dialect"""
+    if session.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
+
+
+def insert_telemetry_or_duplicate(
+    session: Session, values: dict, payload_json: str
+) -> Tuple[Optional[int], Optional[int], Optional[int]]:
+    """
+    Store a reading with one conflict-aware INSERT on unique_device_timestamp.
+    New reading: returns (telemetry_id, None, None).
+    Duplicate: a second INSERT ... SELECT copies the original's id into
+    telemetry_duplicates and returns (None, original_id, duplicate_id).
+    Does not commit.
+    """
+    telemetry = Telemetry.__table__
+    telemetry_id = session.execute(
+        _conflict_insert(session, telemetry)
+        .values(**values)
+        .on_conflict_do_nothing(index_elements=["device_id", "ts"])
+        .returning(telemetry.c.id)
+    ).scalar_one_or_none()
+    if telemetry_id is not None:
+        return telemetry_id, None, None
+
+    duplicates = TelemetryDuplicate.__table__
+    row = session.execute(
+        duplicates.insert()
+        .from_select(
+            ["original_telemetry_id", "device_id", "timestamp", "payload_json", "received_at", "is_merged", "is_ignored"],
+            select(
+                telemetry.c.id, telemetry.c.device_id, telemetry.c.ts, literal(payload_json),
+                literal(datetime.utcnow(), DateTime), false(), false()
+            ).where(telemetry.c.device_id == values["device_id"], telemetry.c.ts == values["ts"])
+        )
+        .returning(duplicates.c.original_telemetry_id, duplicates.c.id)
+    ).first()
+    if row is None:
+        # The original was deleted between the two statements (retention); nothing to link to
+        return None, None, None
+    return None, row.original_telemetry_id, row.id
+
+
+def find_existing_telemetry_ids(
+    session: Session, keys: Iterable[Tuple[str, datetime]]
+) -> Dict[Tuple[str, datetime], int]:
+    """
+    Set-based duplicate lookup for a batch of (device_id, timestamp) keys.
+    Returns {(device_id, ts): telemetry_id} for the keys that already exist.
+    Keys the dedup filter has never seen are not queried.
+    """
+    keys = set(keys)
+    answers = {key: telemetry_filter.lookup(session, *key) for key in keys}
+    keys = [key for key, answer in answers.items() if answer != dedup_filter.NEW]
+    existing = {}
+    for start in range(0, len(keys), DUPLICATE_LOOKUP_CHUNK):
+        chunk = keys[start:start + DUPLICATE_LOOKUP_CHUNK]
+        wanted = set(chunk)
+        statement = select(Telemetry.id, Telemetry.device_id, Telemetry.ts).where(
+            Telemetry.device_id.in_({device_id for device_id, _ in chunk}),
+            Telemetry.ts.in_({ts for _, ts in chunk})
+        )
+        # device_id IN (...) AND ts IN (...) may over-match across pairs, so filter exactly
+        for row in session.exec(statement).all():
+            key = (row.device_id, row.ts)
+            if key in wanted:
+                existing[key] = row.id
+    for key in keys:
+        if answers[key] == dedup_filter.MAYBE:
+            telemetry_filter.confirm(key in existing)
+    return existing
+
+
 def get_recent_history(session: Session, device_id: str, limit: int = 10) -> list:
     """
     Get last N telemetry readings for a device (ordered oldest→newest).
     Returns list of dicts suitable for JSON serialization.
+    Served from the in-memory per-device ring buffer; the database is only read
+    the first time a device is seen (or when limit exceeds the buffer size, or
+    the buffer is off because several workers share the state).
     """
-    statement = (
-        select(Telemetry)
-        .where(Telemetry.device_id == device_id)
-        .order_by(Telemetry.ts.desc())
-        .limit(limit)
-    )
-    telemetries = session.exec(statement).all()
-    
-    # Reverse to get oldest→newest
-    telemetries = list(reversed(telemetries))
-    
-    return [
-        {
-            "device_id": t.device_id,
-            "timestamp": t.ts.isoformat(),
-            "mq3": t.mq3,
-            "mq135": t.mq135,
-            "temp_c": t.temp_c,
-            "humidity_pct": t.humidity_pct,
-            "lat": t.lat,
-            "lon": t.lon
-        }
-        for t in telemetries
-    ]
+    return history_buffer.recent(session, device_id, limit)
 
 
 def check_duplicate_alert(session: Session, device_id: str, timestamp: datetime) -> bool:
@@ -102,6 +188,30 @@ def check_debounce(session: Session, device_id: str, severity: str) -> bool:
     return recent_alert is not None
 
 
+def build_alert_message(alert: Alert, event_type: str = "new_alert") -> dict:
+    """Build the WebSocket broadcast payload for an alert"""
+    # Format timestamp as ISO with 'Z' suffix to indicate UTC
+    ts_iso = alert.ts.isoformat()
+    if not ts_iso.endswith('Z'):
+        ts_iso = ts_iso + 'Z'
+    
+    return {
+        "type": event_type,
+        "data": {
+            "id": alert.id,
+            "device_id": alert.device_id,
+            "ts": ts_iso,
+            "severity": alert.severity,
+            "short_message": alert.short_message,
+            "lat": alert.lat if alert.lat else None,
+            "lon": alert.lon if alert.lon else None,
+            "mq3": alert.mq3,
+            "mq135": alert.mq135,
+            "notified": alert.notified
+        }
+    }
+
+
 def get_or_create_device_settings(session: Session, device_id: str) -> DeviceSettings:
     """Get existing device settings or create default ones"""
     settings = session.get(DeviceSettings, device_id)
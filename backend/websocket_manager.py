@@ -0,0 +1,317 @@
+"""
+WebSocket connection manager
+Every client gets a bounded send queue drained by its own task, so one slow
+dashboard tab cannot delay the others. Broadcast messages are serialized once,
+and clients whose queue overflows or whose send fails are evicted.
+Clients can narrow what they receive (device ids, severity floor, bounding
+box); a device index keeps broadcast() from touching uninterested sockets.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from fastapi import WebSocket
+
+logger = logging.getLogger(__name__)
+
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "64"))  # pending messages per client
+WS_SEND_TIMEOUT_SECONDS = float(os.getenv("WS_SEND_TIMEOUT_SECONDS", "10"))
+
+# Close code sent to evicted clients (1013 = try again later)
+EVICTION_CLOSE_CODE = 1013
+
+SEVERITY_RANK = {"SAFE": 0, "WARNING": 1, "HIGH": 2}
+
+
+class Subscription:
+    """What one client wants to receive; the default (wildcard) matches every alert"""
+    __slots__ = ("device_ids", "min_severity", "bbox")
+
+    def __init__(self):
+        self.device_ids: Optional[Set[str]] = None  # None = all devices
+        self.min_severity = "SAFE"
+        self.bbox: Optional[Tuple[float, float, float, float]] = None  # min_lat, min_lon, max_lat, max_lon
+
+    def matches(self, data: dict) -> bool:
+        """Severity floor and bounding box check (device ids are handled by the index)"""
+        if SEVERITY_RANK.get(data.get("severity"), 0) < SEVERITY_RANK[self.min_severity]:
+            return False
+        if self.bbox is not None:
+            lat, lon = data.get("lat"), data.get("lon")
+            if lat is None or lon is None:
+                return False  # No GPS fix: cannot be placed inside the box
+            min_lat, min_lon, max_lat, max_lon = self.bbox
+            if not (min_lat <= lat <= max_lat and min_lon <= lon <= max_lon):
+                return False
+        return True
+
+    def to_dict(self) -> dict:
+        return {
+            "device_ids": sorted(self.device_ids) if self.device_ids is not None else "*",
+            "min_severity": self.min_severity,
+            "bbox": list(self.bbox) if self.bbox is not None else None
+        }
+
+
+class ClientConnection:
+    """One connected socket with its outbound queue and lag counters"""
+
+    def __init__(self, websocket: WebSocket, queue_size: int):
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.task: Optional[asyncio.Task] = None
+        self.closed = False
+        self.subscription = Subscription()
+        self.connected_at = datetime.utcnow()
+        self.sent = 0
+        self.last_lag_ms = 0.0
+        self.max_lag_ms = 0.0
+
+    def stats(self) -> dict:
+        client = getattr(self.websocket, "client", None)
+        return {
+            "client": f"{client.host}:{client.port}" if client else None,
+            "connected_at": self.connected_at.isoformat() + "Z",
+            "subscription": self.subscription.to_dict(),
+            "queued": self.queue.qsize(),
+            "sent": self.sent,
+            "last_lag_ms": round(self.last_lag_ms, 2),
+            "max_lag_ms": round(self.max_lag_ms, 2)
+        }
+
+
+class ConnectionManager:
+    def __init__(self, queue_size: int = WS_SEND_QUEUE_SIZE, send_timeout: float = WS_SEND_TIMEOUT_SECONDS):
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self.clients: Dict[WebSocket, ClientConnection] = {}
+        # Subscription index: device_id -> clients that asked for it, plus wildcard clients
+        self._by_device: Dict[str, Set[ClientConnection]] = {}
+        self._wildcard: Set[ClientConnection] = set()
+        self.broadcasts = 0
+        self.deliveries = 0
+        self.filtered = 0
+        self.evicted = 0
+
+    @property
+    def active_connections(self) -> List[WebSocket]:
+        return list(self.clients)
+
+    async def connect(self, websocket: WebSocket):
+        await websocket.accept()
+        client = ClientConnection(websocket, self.queue_size)
+        client.task = asyncio.create_task(self._sender(client))
+        self.clients[websocket] = client
+        self._wildcard.add(client)
+
+    def disconnect(self, websocket: WebSocket):
+        client = self.clients.pop(websocket, None)
+        if client:
+            self._unindex(client)
+            self._stop(client)
+
+    def subscribe(
+        self,
+        websocket: WebSocket,
+        device_ids: Optional[Iterable[str]] = None,
+        min_severity: Optional[str] = None,
+        bbox: Optional[Iterable[float]] = None
+    ) -> Optional[dict]:
+        """
+        Narrow a client's stream. Device ids are added to the ones already
+        subscribed; severity floor and bounding box replace the previous values.
+        Returns the resulting subscription, or None for an unknown socket.
+        """
+        client = self.clients.get(websocket)
+        if client is None:
+            return None
+        sub = client.subscription
+        if min_severity is not None:
+            if min_severity not in SEVERITY_RANK:
+                raise ValueError(f"min_severity must be one of {', '.join(SEVERITY_RANK)}")
+            sub.min_severity = min_severity
+        if bbox is not None:
+            sub.bbox = _parse_bbox(bbox)
+        if device_ids:
+            self._unindex(client)
+            sub.device_ids = (sub.device_ids or set()) | _id_set(device_ids)
+            self._index(client)
+        return sub.to_dict()
+
+    def unsubscribe(self, websocket: WebSocket, device_ids: Optional[Iterable[str]] = None) -> Optional[dict]:
+        """
+        Drop device ids from a client's subscription. Without device ids (or when
+        none are left) the client goes back to the wildcard default.
+        """
+        client = self.clients.get(websocket)
+        if client is None:
+            return None
+        sub = client.subscription
+        self._unindex(client)
+        if device_ids and sub.device_ids is not None:
+            sub.device_ids -= _id_set(device_ids)
+        if not device_ids or not sub.device_ids:
+            client.subscription = sub = Subscription()
+        self._index(client)
+        return sub.to_dict()
+
+    async def broadcast(self, message: dict):
+        """
+        Serialize once and enqueue for every interested client; never waits on a socket.
+        Messages carrying an alert (data.device_id) go through the subscription index,
+        anything else (pings, notices) goes to everyone.
+        """
+        data = message.get("data")
+        if isinstance(data, dict) and data.get("device_id") is not None:
+            targets = self._interested(data)
+            self.broadcasts += 1
+            if targets:
+                self._enqueue_all(targets, json.dumps(message))
+            return
+        self.broadcast_text(json.dumps(message))
+
+    def broadcast_text(self, text: str):
+        self.broadcasts += 1
+        self._enqueue_all(list(self.clients.values()), text)
+
+    async def send_personal(self, websocket: WebSocket, message: dict):
+        """Queue a message for one client (keeps per-socket ordering with broadcasts)"""
+        client = self.clients.get(websocket)
+        if client:
+            self._enqueue(client, json.dumps(message), time.monotonic())
+
+    async def broadcast_ping(self):
+        """Broadcast ping message to all connected clients"""
+        ping_message = {
+            "type": "ping",
+            "server_time": datetime.utcnow().isoformat() + "Z"
+        }
+        await self.broadcast(ping_message)
+
+    def stats(self) -> dict:
+        """Aggregate counters only: served by the public /metrics endpoint"""
+        clients = list(self.clients.values())
+        return {
+            "clients": len(clients),
+            "wildcard_clients": len(self._wildcard),
+            "subscribed_devices": len(self._by_device),
+            "queue_size": self.queue_size,
+            "queued": sum(client.queue.qsize() for client in clients),
+            "broadcasts": self.broadcasts,
+            "deliveries": self.deliveries,
+            "filtered": self.filtered,
+            "evicted": self.evicted,
+            "max_lag_ms": round(max((client.max_lag_ms for client in clients), default=0.0), 2)
+        }
+
+    def client_stats(self) -> List[dict]:
+        """Per-client address, subscription, queue depth and lag (admin only: identifies who watches which devices)"""
+        return [client.stats() for client in self.clients.values()]
+
+    def _interested(self, data: dict) -> List[ClientConnection]:
+        """Clients whose subscription matches an alert payload"""
+        candidates = self._wildcard | self._by_device.get(str(data["device_id"]), set())
+        targets = [client for client in candidates if client.subscription.matches(data)]
+        self.filtered += len(self.clients) - len(targets)
+        return targets
+
+    def _index(self, client: ClientConnection):
+        device_ids = client.subscription.device_ids
+        if device_ids is None:
+            self._wildcard.add(client)
+            return
+        for device_id in device_ids:
+            self._by_device.setdefault(device_id, set()).add(client)
+
+    def _unindex(self, client: ClientConnection):
+        self._wildcard.discard(client)
+        for device_id in client.subscription.device_ids or ():
+            subscribers = self._by_device.get(device_id)
+            if subscribers is not None:
+                subscribers.discard(client)
+                if not subscribers:
+                    del self._by_device[device_id]
+
+    def _enqueue_all(self, clients: List[ClientConnection], text: str):
+        enqueued_at = time.monotonic()
+        for client in clients:
+            self._enqueue(client, text, enqueued_at)
+
+    def _enqueue(self, client: ClientConnection, text: str, enqueued_at: float):
+        try:
+            client.queue.put_nowait((enqueued_at, text))
+            self.deliveries += 1
+        except asyncio.QueueFull:
+            self._evict(client, "send queue overflow")
+
+    async def _sender(self, client: ClientConnection):
+        """Drain one client's queue; a failed or stuck send evicts the client"""
+        while not client.closed:
+            enqueued_at, text = await client.queue.get()
+            try:
+                await self._send(client.websocket, text)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._evict(client, f"send failed: {e!r}")
+                return
+            client.sent += 1
+            client.last_lag_ms = (time.monotonic() - enqueued_at) * 1000
+            client.max_lag_ms = max(client.max_lag_ms, client.last_lag_ms)
+
+    def _evict(self, client: ClientConnection, reason: str):
+        if self.clients.pop(client.websocket, None) is None:
+            return
+        self.evicted += 1
+        logger.warning(f"Evicting WebSocket client ({reason}), {len(self.clients)} remaining")
+        self._unindex(client)
+        self._stop(client)
+        asyncio.get_running_loop().create_task(self._close(client.websocket))
+
+    async def _send(self, websocket: WebSocket, text: str):
+        """send_text with a timeout; unlike wait_for (3.11 and older) it never swallows a cancel"""
+        send = asyncio.ensure_future(websocket.send_text(text))
+        try:
+            done, _ = await asyncio.wait({send}, timeout=self.send_timeout)
+        except asyncio.CancelledError:
+            send.cancel()
+            raise
+        if not done:
+            send.cancel()
+            raise asyncio.TimeoutError(f"send took longer than {self.send_timeout}s")
+        send.result()
+
+    @staticmethod
+    def _stop(client: ClientConnection):
+        client.closed = True
+        if client.task and client.task is not asyncio.current_task():
+            client.task.cancel()
+
+    @staticmethod
+    async def _close(websocket: WebSocket):
+        try:
+            await websocket.close(code=EVICTION_CLOSE_CODE)
+        except Exception:
+            pass
+
+
+def _id_set(device_ids) -> Set[str]:
+    if isinstance(device_ids, str):
+        return {device_ids}
+    return {str(d) for d in device_ids}
+
+
+def _parse_bbox(bbox: Iterable[float]) -> Tuple[float, float, float, float]:
+    """[min_lat, min_lon, max_lat, max_lon] → validated tuple"""
+    values = tuple(float(v) for v in bbox)
+    if len(values) != 4:
+        raise ValueError("bbox must be [min_lat, min_lon, max_lat, max_lon]")
+    min_lat, min_lon, max_lat, max_lon = values
+    if not (-90 <= min_lat <= max_lat <= 90 and -180 <= min_lon <= max_lon <= 180):
+        raise ValueError("bbox must be [min_lat, min_lon, max_lat, max_lon] within valid coordinates")
+    return values
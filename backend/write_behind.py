@@ -0,0 +1,425 @@
+"""
+Write-behind buffer for SAFE telemetry
+SAFE readings are most of the traffic and need nothing but an insert, so with
+WRITE_BEHIND_ENABLED they are acknowledged as soon as they are queued. A
+background task writes the queue every WRITE_BEHIND_FLUSH_MS (or as soon as
+WRITE_BEHIND_MAX_ROWS are waiting) in one transaction: one commit for many
+readings. WARNING/HIGH readings still commit on the request path.
+
+Crash safety (WRITE_BEHIND_JOURNAL):
+  - "flush" (default): every queued reading is appended to a local journal and
+    handed to the OS before it is acknowledged; survives a process crash
+  - "fsync": also fsyncs each append; survives power loss
+  - "off": readings still queued at a crash are lost
+Journal segments are deleted once their readings are committed. At startup any
+segment not held by a running worker is replayed with INSERT ... ON CONFLICT DO
+NOTHING, so readings committed just before the crash are not stored twice.
+
+A failed flush puts the readings back for the next one. When the error cannot
+be fixed by retrying (bad values, constraint violations) or a batch has failed
+WRITE_BEHIND_MAX_ATTEMPTS times, the batch is bisected: every part that can be
+written is, and a reading that fails on its own goes to telemetry_dead_letters.
+One bad reading therefore cannot block the queue. Readings failing with a
+transient error are only dead-lettered when the rest of the batch went through;
+if nothing could be written, the database is down and they wait for the next flush.
+"""
+
+import asyncio
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import exc
+from sqlmodel import Session
+
+from backend.database import engine as default_engine
+from backend.models import Telemetry, TelemetryDeadLetter
+from backend.utils import _conflict_insert, insert_telemetry_or_duplicate
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+WRITE_BEHIND_ENABLED = os.getenv("WRITE_BEHIND_ENABLED", "false").lower() == "true"
+WRITE_BEHIND_FLUSH_MS = int(os.getenv("WRITE_BEHIND_FLUSH_MS", "50"))
+WRITE_BEHIND_MAX_ROWS = int(os.getenv("WRITE_BEHIND_MAX_ROWS", "500"))  # rows that trigger an early flush
+WRITE_BEHIND_MAX_QUEUE = int(os.getenv("WRITE_BEHIND_MAX_QUEUE", "10000"))  # beyond this, ingest commits inline
+WRITE_BEHIND_JOURNAL = os.getenv("WRITE_BEHIND_JOURNAL", "flush")  # "flush", "fsync" or "off"
+WRITE_BEHIND_JOURNAL_PATH = os.getenv("WRITE_BEHIND_JOURNAL_PATH", "./telemetry_journal")
+WRITE_BEHIND_MAX_ATTEMPTS = int(os.getenv("WRITE_BEHIND_MAX_ATTEMPTS", "3"))  # failed flushes before bisecting
+JOURNAL_MODES = ("flush", "fsync", "off")
+
+# Bound parameters per statement on SQLite before 3.32 (SQLITE_MAX_VARIABLE_NUMBER)
+SQLITE_MAX_PARAMS = 999
+
+# Errors a retry can fix: locked, unreachable or overloaded database
+TRANSIENT_ERRORS = (exc.OperationalError, exc.InterfaceError, exc.DisconnectionError, exc.TimeoutError)
+
+Entry = Tuple[dict, str]  # (Telemetry column values, payload JSON kept if it turns out to be a duplicate)
+
+
+def _try_lock(handle) -> bool:
+    """Non-blocking exclusive lock; held for as long as the file stays open"""
+    try:
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+def _encode(entry: Entry) -> str:
+    values, payload_json = entry
+    record = {k: (v.isoformat() if isinstance(v, datetime) else v) for k, v in values.items()}
+    return json.dumps({"values": record, "payload": payload_json}) + "\n"
+
+
+def _chunks(rows: List[dict]):
+    """Multi-row INSERT batches whose bound parameters (rows x columns) stay within SQLITE_MAX_PARAMS"""
+    size = max(1, SQLITE_MAX_PARAMS // max(1, len(rows[0]))) if rows else 1
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def _decode(line: str) -> Entry:
+    record = json.loads(line)
+    values = record["values"]
+    for key in ("ts", "received_at"):
+        values[key] = datetime.fromisoformat(values[key])
+    return values, record["payload"]
+
+
+class JournalSegment:
+    """One append-only journal file, locked by the worker writing it"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.handle = open(path, "a", encoding="utf-8")
+        _try_lock(self.handle)
+        self.entries = 0
+
+    def append(self, entry: Entry, fsync: bool):
+        self.handle.write(_encode(entry))
+        self.handle.flush()
+        if fsync:
+            os.fsync(self.handle.fileno())
+        self.entries += 1
+
+    def discard(self):
+        """Delete once every reading in it is committed"""
+        self.handle.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class TelemetryWriteBehind:
+    """Queue of SAFE readings written to the database in group commits"""
+
+    def __init__(
+        self,
+        engine=None,
+        enabled: bool = WRITE_BEHIND_ENABLED,
+        flush_ms: int = WRITE_BEHIND_FLUSH_MS,
+        max_rows: int = WRITE_BEHIND_MAX_ROWS,
+        max_queue: int = WRITE_BEHIND_MAX_QUEUE,
+        journal: str = WRITE_BEHIND_JOURNAL,
+        journal_path: str = WRITE_BEHIND_JOURNAL_PATH,
+        max_attempts: int = WRITE_BEHIND_MAX_ATTEMPTS,
+        on_flush: Optional[Callable[[Session, List[dict]], None]] = None
+    ):
+        if journal not in JOURNAL_MODES:
+            raise ValueError(f"journal must be one of {JOURNAL_MODES}, got {journal!r}")
+        self.engine = engine if engine is not None else default_engine
+        self.configured = enabled
+        self.flush_seconds = flush_ms / 1000
+        self.max_rows = max(1, max_rows)
+        self.max_queue = max_queue
+        self.journal = journal
+        self.journal_path = journal_path
+        self.max_attempts = max(1, max_attempts)
+        # Called with the flush session and the values of newly inserted rows, after commit
+        self.on_flush = on_flush
+
+        self._pending: List[Entry] = []
+        self._lock = threading.Lock()  # queue and active journal segment
+        self._flush_lock = threading.Lock()  # one flush at a time
+        self._segment: Optional[JournalSegment] = None
+        self._drained: List[JournalSegment] = []  # segments whose rows are being (re)flushed
+        self._segment_seq = 0
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._failed_attempts = 0  # consecutive failed flushes
+
+        self.queued = 0
+        self.rejected = 0
+        self.flushes = 0
+        self.rows_flushed = 0
+        self.duplicates = 0
+        self.failed_flushes = 0
+        self.dead_lettered = 0
+        self.recovered = 0
+        self.last_flush_rows = 0
+        self.last_flush_ms = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        """Readings are only accepted while the flush task runs"""
+        return self.configured and self._task is not None
+
+    def depth(self) -> int:
+        return len(self._pending)
+
+    def submit(self, values: dict, payload_json: str) -> bool:
+        """
+        Queue a SAFE reading (journaled first, if enabled).
+        Returns False when write-behind is off or the queue is full; the caller then commits inline.
+        """
+        if not self.enabled:
+            return False
+        with self._lock:
+            if len(self._pending) >= self.max_queue:
+                self.rejected += 1
+                return False
+            if self.journal != "off":
+                if self._segment is None:
+                    self._segment_seq += 1
+                    self._segment = JournalSegment(f"{self.journal_path}.{os.getpid()}.{self._segment_seq}")
+                self._segment.append((values, payload_json), fsync=self.journal == "fsync")
+            self._pending.append((values, payload_json))
+            self.queued += 1
+            depth = len(self._pending)
+        if depth >= self.max_rows:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        return True
+
+    def start(self):
+        """Start the flush task (call from the running event loop, e.g. lifespan)"""
+        if not self.configured or self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="telemetry-write-behind")
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await run_in_threadpool(self.flush)
+
+    async def stop(self):
+        """Stop accepting readings and write out everything still queued"""
+        task, self._task = self._task, None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        await run_in_threadpool(self.flush)
+        if self._pending:
+            logger.error(
+                f"Write-behind: {len(self._pending)} readings not written at shutdown"
+                + (" (kept in the journal for the next start)" if self.journal != "off" else "")
+            )
+
+    def flush(self) -> int:
+        """Write all queued readings in one transaction; returns the number written"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+                if self._segment is not None:
+                    self._drained.append(self._segment)
+                    self._segment = None
+            if not batch:
+                return 0
+            started = time.monotonic()
+            dead_before = self.dead_lettered
+            try:
+                self._write(batch)
+                retry = []
+            except Exception as e:
+                self.failed_flushes += 1
+                self._failed_attempts += 1
+                if isinstance(e, TRANSIENT_ERRORS) and self._failed_attempts < self.max_attempts:
+                    logger.error(f"Write-behind flush of {len(batch)} readings failed: {e}")
+                    retry = batch
+                else:
+                    logger.warning(f"Write-behind flush of {len(batch)} readings failed ({e}); isolating bad readings")
+                    retry = self._isolate(batch)
+            if retry:
+                # Put the readings back in front; their journal segments stay until a flush succeeds
+                with self._lock:
+                    self._pending[:0] = retry
+                return 0
+            self._failed_attempts = 0
+            for segment in self._drained:
+                segment.discard()
+            self._drained = []
+            written = len(batch) - (self.dead_lettered - dead_before)
+            self.flushes += 1
+            self.rows_flushed += written
+            self.last_flush_rows = written
+            self.last_flush_ms = round((time.monotonic() - started) * 1000, 3)
+            return written
+
+    def _isolate(self, batch: List[Entry], replay: bool = False) -> List[Entry]:
+        """
+        Bisect a failing batch: write every part that goes through and dead-letter readings
+        that fail on their own. A reading failing with a transient error is only dead-lettered
+        if other parts were written (the database works). Returns the readings still to retry.
+        """
+        stack = [batch]
+        suspects = []  # (entry, error) that failed alone with a transient error
+        written = False
+        while stack:
+            part = stack.pop()
+            try:
+                self._write(part, replay=replay)
+                written = True
+                continue
+            except Exception as e:
+                error = e
+            if len(part) > 1:
+                middle = len(part) // 2
+                stack += [part[middle:], part[:middle]]
+            elif isinstance(error, TRANSIENT_ERRORS):
+                suspects.append((part[0], error))
+            elif not self._try_dead_letter(part[0], error):
+                return part + [entry for rest in reversed(stack) for entry in rest] + [entry for entry, _ in suspects]
+        if not written:
+            return [entry for entry, _ in suspects]
+        retry = []
+        for entry, error in suspects:
+            if not self._try_dead_letter(entry, error):
+                retry.append(entry)
+        return retry
+
+    def _try_dead_letter(self, entry: Entry, error: Exception) -> bool:
+        try:
+            self._dead_letter(entry, error)
+            return True
+        except Exception as e:
+            logger.error(f"Write-behind: dead-lettering a reading failed ({e}); retrying later")
+            return False
+
+    def _dead_letter(self, entry: Entry, error: Exception):
+        values, _ = entry
+        with Session(self.engine) as session:
+            session.add(TelemetryDeadLetter(
+                device_id=str(values.get("device_id")), record_json=_encode(entry).strip(),
+                error=str(error)[:1000], attempts=max(1, self._failed_attempts)
+            ))
+            session.commit()
+        self.dead_lettered += 1
+        logger.error(f"Write-behind: reading from {values.get('device_id')} moved to telemetry_dead_letters: {error}")
+
+    def _write(self, batch: List[Entry], replay: bool = False):
+        """
+        Insert a batch in one transaction. Readings that lose the unique conflict are
+        recorded as duplicates, except when replaying the journal (committed before a crash).
+        """
+        telemetry = Telemetry.__table__
+        with Session(self.engine) as session:
+            inserted = set()
+            for rows in _chunks([values for values, _ in batch]):
+                inserted.update(session.execute(
+                    _conflict_insert(session, telemetry)
+                    .values(rows)
+                    .on_conflict_do_nothing(index_elements=["device_id", "ts"])
+                    .returning(telemetry.c.device_id, telemetry.c.ts)
+                ).all())
+            if replay:
+                session.commit()
+                return
+
+            # Readings that lost the conflict are recorded as duplicates, like on the request path
+            new_rows = []
+            duplicates = 0
+            for values, payload_json in batch:
+                key = (values["device_id"], values["ts"])
+                if key in inserted:
+                    inserted.discard(key)
+                    new_rows.append(values)
+                else:
+                    insert_telemetry_or_duplicate(session, values, payload_json)
+                    duplicates += 1
+            session.commit()
+            self.duplicates += duplicates
+            if self.on_flush is not None:
+                try:
+                    self.on_flush(session, new_rows)
+                except Exception as e:
+                    # Rows are committed; a failing hook must not put them back in the queue
+                    logger.error(f"Write-behind flush hook failed: {e}")
+
+    def recover(self) -> int:
+        """Replay journal segments left behind by a worker that is no longer running"""
+        entries = []
+        segments = []
+        for path in sorted(glob.glob(f"{glob.escape(self.journal_path)}.*.*")):
+            handle = open(path, "r+", encoding="utf-8")
+            if not _try_lock(handle):
+                handle.close()  # held by a live worker
+                continue
+            for line in handle:
+                if line.strip():
+                    try:
+                        entries.append(_decode(line))
+                    except (ValueError, KeyError):
+                        logger.warning(f"Write-behind: skipping torn journal line in {path}")
+            segments.append((path, handle))
+        if not segments:
+            return 0
+
+        try:
+            self._write(entries, replay=True)
+        except Exception as e:
+            logger.warning(f"Write-behind: journal replay failed ({e}); isolating bad readings")
+            retry = self._isolate(entries, replay=True)
+            if retry:
+                for _, handle in segments:
+                    handle.close()
+                raise RuntimeError(f"{len(retry)} journaled readings could not be replayed: database unavailable")
+        for path, handle in segments:
+            handle.close()
+            os.remove(path)
+        self.recovered += len(entries)
+        logger.info(f"Write-behind: replayed {len(entries)} journaled readings from {len(segments)} segment(s)")
+        return len(entries)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "depth": self.depth(),
+            "max_queue": self.max_queue,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "flushes": self.flushes,
+            "rows_flushed": self.rows_flushed,
+            "duplicates": self.duplicates,
+            "failed_flushes": self.failed_flushes,
+            "dead_lettered": self.dead_lettered,
+            "last_flush_rows": self.last_flush_rows,
+            "last_flush_ms": self.last_flush_ms,
+            "journal": self.journal,
+            "recovered": self.recovered
+        }
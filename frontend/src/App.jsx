@@ -31,7 +31,7 @@ function AppContent() {
   const [ws, setWs] = useState(null);
   const [modalAlert, setModalAlert] = useState(null);
   const [lastStatus, setLastStatus] = useState('SAFE'); // Track last status for change detection
-  const { setWsConnected, addAlert, updateRealTimeData, realTimeStatus } = useStore();
+  const { setWsConnected, addAlert, updateAlert, updateRealTimeData, realTimeStatus } = useStore();
   const { isAuthenticated, init } = useAuthStore();
   
   // Initialize theme on mount (only loads from backend if authenticated)
@@ -121,6 +121,10 @@ function AppContent() {
             }
           }
         }
+      } else if (data.type === 'alert_updated' && data.data) {
+        // AI explanation arrived after the alert was created
+        updateAlert(data.data);
+        setModalAlert(prev => (prev && prev.id === data.data.id ? { ...prev, ...data.data } : prev));
       } else if (data.type === 'ping') {
         // Handle ping messages for connection status
         // ConnectedIndicator will handle this via store
@@ -214,7 +218,7 @@ function AppContent() {
       websocket.close();
       window.wsConnection = null;
     };
-  }, [isAuthenticated, setWsConnected, addAlert, updateRealTimeData, realTimeStatus]);
+  }, [isAuthenticated, setWsConnected, addAlert, updateAlert, updateRealTimeData, realTimeStatus]);
 
   const removeNotification = (id) => {
     setNotifications(prev => prev.filter(n => n.id !== id));
@@ -13,7 +13,7 @@ export const fetchAlerts = async (limit = 50, latOnly = false) => {
 
 export const exportAlertsCSV = async (latOnly = true, limit = 1000) => {
   const response = await api.get(
-    `/api/v1/alerts/export?lat_only=${latOnly}&limit=${limit}`,
+    `/api/v1/alerts/export?lat_only=${latOnly}&limit=${limit}&order=desc`,
     { responseType: 'blob' }
   );
   return response.data;
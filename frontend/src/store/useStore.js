@@ -57,6 +57,13 @@ const useStore = create((set, get) => ({
     alerts: [alert, ...state.alerts].slice(0, 50)
   })),
   
+  // Merge enriched text (alert_updated) into an alert already in the list
+  updateAlert: (alert) => set((state) => ({
+    alerts: state.alerts.map((existing) =>
+      existing.id === alert.id ? { ...existing, ...alert } : existing
+    )
+  })),
+  
   updateRealTimeData: (data) => {
     const status = {
       mq3: data.mq3 || 0,